@@ -1,6 +1,7 @@
 import os
+import sys
+import time
 import logging
-from logging.handlers import RotatingFileHandler
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_socketio import SocketIO
@@ -8,21 +9,31 @@ from flask_migrate import Migrate
 from sqlalchemy.orm import DeclarativeBase
 from dotenv import load_dotenv
 
+from database import RoutingSession, init_database
+from query_audit import install_query_audit
+from metrics import install_metrics
+from page_cache import install_page_cache
+from logging_setup import configure_logging
+import nltk_resources
+
+# Measured from here to the end of this module in the start-up report
+_started = time.perf_counter()
+
+# Dependencies only extraction, rendering and categorisation need; a web
+# worker that has them loaded at start-up has an eager import somewhere
+HEAVY_MODULES = ('fitz', 'PIL', 'numpy', 'sklearn', 'scipy', 'nltk', 'cv2')
+
 # Load environment variables from .env file
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+db = SQLAlchemy(model_class=Base, session_options={'class_': RoutingSession})
 
 # Create the app
 app = Flask(__name__)
 app.config.from_pyfile('config.py')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(app.instance_path, 'researchnest.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = os.path.join(app.instance_path, 'uploads')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
@@ -30,40 +41,21 @@ app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY') or 'dev-key-123'
 app.config['DEBUG'] = True
 
 # Configure logging
-if not os.path.exists('logs'):
-    os.makedirs('logs')
-
-# File handler for logging
-file_handler = RotatingFileHandler('logs/app.log', maxBytes=10240, backupCount=10)
-file_handler.setFormatter(logging.Formatter(
-    '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'))
-file_handler.setLevel(logging.INFO)
-
-# Console handler for development
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.DEBUG)
-console_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-
-# Get the root logger
-logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
-
-# Set Werkzeug logger level
-logging.getLogger('werkzeug').setLevel(logging.INFO)
+configure_logging(app.config, app.name)
 
 # Initialize extensions
-db.init_app(app)
-socketio = SocketIO(app, cors_allowed_origins="*", logger=True, engineio_logger=True)
+init_database(app, db)
+install_query_audit(app, db)
+install_metrics(app)
+install_page_cache(app)
+nltk_resources.set_data_dir(app.config['NLTK_DATA_DIR'])
+# Loggers rather than True, which would give them handlers of their own;
+# their levels come from LOG_LEVELS
+socketio = SocketIO(app, cors_allowed_origins="*", logger=logging.getLogger('socketio'),
+                    engineio_logger=logging.getLogger('engineio'),
+                    message_queue=app.config.get('SOCKETIO_MESSAGE_QUEUE'))
 migrate = Migrate(app, db)
 
-# Configure logging for SocketIO
-socketio_log = logging.getLogger('socketio')
-socketio_log.setLevel(logging.ERROR)
-engineio_log = logging.getLogger('engineio')
-engineio_log.setLevel(logging.ERROR)
-
 # Create upload directory if it doesn't exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
@@ -256,9 +248,37 @@ def from_json_filter(value):
     except (TypeError, json.JSONDecodeError):
         return []
 
+# Keyset pagination links keep the current filters
+from pagination import cursor_url  # noqa: E402
+app.add_template_global(cursor_url)
+
 # Import routes after app initialization
 from routes import *  # noqa: E402, F403
 from auth import *  # noqa: E402, F403
+import progress  # noqa: E402, F401  -- Socket.IO progress rooms
+
+@app.before_request
+def ensure_embedded_worker():
+    """Run background jobs in this process when it plays every role.
+
+    Not under TESTING: tests run queued jobs themselves with
+    ``worker.Worker.run_once``.
+    """
+    if app.config['PROCESS_ROLE'] == 'all' and not app.testing:
+        import worker
+        worker.start_embedded_worker(app)
 
 with app.app_context():
-    initialize_database()
\ No newline at end of file
+    initialize_database()
+
+def log_startup_report():
+    """Log how long start-up took and what it loaded."""
+    heavy = [name for name in HEAVY_MODULES if name in sys.modules]
+    logging.info("Started in %.2fs; heavy modules loaded: %s",
+                 time.perf_counter() - _started, ', '.join(heavy) or 'none')
+    missing = nltk_resources.missing_resources()
+    if missing:
+        logging.warning("NLTK data missing from %s: %s (question categorisation falls back to plain tokenising)",
+                        app.config['NLTK_DATA_DIR'], ', '.join(missing))
+
+log_startup_report()
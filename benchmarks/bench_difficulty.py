@@ -0,0 +1,62 @@
+"""Benchmark difficulty classification over the labelled question banks.
+
+    python -m benchmarks.bench_difficulty --copies 50
+
+Classifies the DS, SQL and RDBMS banks, repeated ``--copies`` times to make
+a large document, in one batch and one question at a time, and reports the
+time per question of each, of the keyword scan that feeds them, and the
+accuracy per bank.
+"""
+import time
+import argparse
+
+from benchmarks.question_banks import load_banks
+from difficulty import get_classifier
+from question_features import scan_question
+
+
+def columns(questions):
+    texts = [question['text'] for question in questions]
+    scans = [scan_question(text) for text in texts]
+    return (texts, [question['marks'] for question in questions], [scan.question_type for scan in scans],
+            [scan.has_formula for scan in scans], [scan.verb_counts for scan in scans])
+
+
+def timed(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--copies', type=int, default=20, help='how many times the banks are repeated')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    classifier = get_classifier()
+    banks = load_banks()
+    for name, questions in banks.items():
+        levels = [level for level, _ in classifier.classify(*columns(questions))]
+        correct = sum(level == question['difficulty'] for level, question in zip(levels, questions))
+        print(f'{name:<6} {len(questions):4d} questions   accuracy {correct / len(questions):.1%}')
+
+    questions = [question for bank in banks.values() for question in bank] * args.copies
+    scan, (texts, marks, types, formulas, verbs) = timed(lambda: columns(questions), args.repeat)
+    count = len(texts)
+    batch, _ = timed(lambda: classifier.classify(texts, marks, types, formulas, verbs), args.repeat)
+    single, _ = timed(lambda: [classifier.classify(texts[i:i + 1], marks[i:i + 1], types[i:i + 1], formulas[i:i + 1],
+                                                   verbs[i:i + 1])
+                               for i in range(count)], args.repeat)
+    print(f'{count} questions')
+    print(f'  keyword scan {scan / count * 1e6:8.1f} us/question')
+    print(f'  batch        {batch / count * 1e6:8.1f} us/question')
+    print(f'  one by one   {single / count * 1e6:8.1f} us/question   ({single / batch:.0f}x slower)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Benchmark PDF metadata extraction over a generated corpus.
+
+    python -m benchmarks.bench_pdf_metadata --count 200
+
+Generates research-paper-like PDFs with known title, authors, abstract,
+keywords and year (half of them without document properties, so everything
+has to come from the page text), then reports per-file extraction time for a
+cold cache and a warm cache, and how many fields were recovered exactly.
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+import fitz  # PyMuPDF
+
+import pdf_metadata
+
+FIELDS = ('title', 'authors', 'abstract', 'keywords', 'publication_year')
+
+TOPICS = ['Graph Partitioning', 'Sparse Matrices', 'Query Optimization', 'Neural Networks',
+          'Distributed Consensus', 'Compiler Design', 'Cache Replacement', 'Image Segmentation']
+FIRST_NAMES = ['Ada', 'Alan', 'Grace', 'Edsger', 'Barbara', 'Donald', 'Frances', 'John']
+LAST_NAMES = ['Lovelace', 'Turing', 'Hopper', 'Dijkstra', 'Liskov', 'Knuth', 'Allen', 'McCarthy']
+FILLER = ('We evaluate the proposed method on several public datasets and compare it with '
+          'established baselines under identical conditions. ')
+
+
+def make_paper(rng, index):
+    topic, other = rng.sample(TOPICS, 2)
+    title = f'A Study of {topic} for {other} Workloads'
+    authors = ', '.join(f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}' for _ in range(rng.randint(1, 3)))
+    abstract = (f'This paper studies {topic.lower()} in the context of {other.lower()}. '
+                f'We present a new approach and show that it improves throughput by {rng.randint(10, 60)} '
+                f'percent over prior work on realistic workloads.')
+    keywords = f'{topic.lower()}, {other.lower()}, performance'
+    year = rng.randint(1995, 2024)
+    return {'title': title, 'authors': authors, 'abstract': abstract,
+            'keywords': keywords, 'publication_year': year, 'with_properties': index % 2 == 0}
+
+
+def write_pdf(path, paper, pages=3):
+    doc = fitz.open()
+    page = doc.new_page()
+    width = page.rect.width
+    page.insert_textbox(fitz.Rect(72, 60, width - 72, 120), paper['title'], fontsize=18, fontname='hebo')
+    page.insert_text((72, 140), paper['authors'], fontsize=11)
+    page.insert_text((72, 156), f'Department of Computer Science, {paper["publication_year"]}', fontsize=9)
+    page.insert_text((72, 190), 'Abstract', fontsize=11, fontname='hebo')
+    page.insert_textbox(fitz.Rect(72, 196, width - 72, 280), paper['abstract'], fontsize=10)
+    page.insert_text((72, 300), f'Keywords: {paper["keywords"]}', fontsize=10)
+    page.insert_text((72, 330), '1 Introduction', fontsize=12, fontname='hebo')
+    page.insert_textbox(fitz.Rect(72, 340, width - 72, 760), FILLER * 12, fontsize=10)
+    for _ in range(pages - 1):
+        doc.new_page().insert_textbox(fitz.Rect(72, 72, width - 72, 760), FILLER * 20, fontsize=10)
+    if paper['with_properties']:
+        doc.set_metadata({'title': paper['title'], 'author': paper['authors']})
+    doc.save(path)
+    doc.close()
+
+
+def build_corpus(directory, count, seed=0):
+    rng = random.Random(seed)
+    corpus = []
+    for index in range(count):
+        paper = make_paper(rng, index)
+        path = os.path.join(directory, f'paper_{index:04d}.pdf')
+        write_pdf(path, paper)
+        corpus.append((path, paper))
+    return corpus
+
+
+def time_pass(corpus):
+    timings = []
+    results = []
+    for path, _ in corpus:
+        start = time.perf_counter()
+        results.append(pdf_metadata.extract_metadata(path))
+        timings.append(time.perf_counter() - start)
+    return timings, results
+
+
+def summarize(label, timings):
+    ms = [t * 1000 for t in timings]
+    print(f'{label:<12} mean {statistics.mean(ms):7.2f} ms   median {statistics.median(ms):7.2f} ms   '
+          f'max {max(ms):7.2f} ms   total {sum(ms) / 1000:6.2f} s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--count', type=int, default=100, help='number of PDFs to generate')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        corpus = build_corpus(directory, args.count, args.seed)
+        pdf_metadata.clear_cache()
+
+        cold, results = time_pass(corpus)
+        warm, _ = time_pass(corpus)
+
+        print(f'{len(corpus)} PDFs')
+        summarize('cold cache', cold)
+        summarize('warm cache', warm)
+
+        print('fields recovered exactly:')
+        for field in FIELDS:
+            hits = sum(result[field] == paper[field] for (_, paper), result in zip(corpus, results))
+            print(f'  {field:<17} {hits}/{len(corpus)}')
+
+
+if __name__ == '__main__':
+    main()
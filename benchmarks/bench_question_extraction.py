@@ -0,0 +1,85 @@
+"""Benchmark question extraction modes over generated exam papers.
+
+    python -m benchmarks.bench_question_extraction --pages 20
+
+Generates a single-column and a two-column exam paper with known questions,
+runs both extraction modes over each and reports time per page and whether
+the questions came out complete and in order.
+"""
+import os
+import time
+import argparse
+import tempfile
+
+import fitz  # PyMuPDF
+
+import app  # noqa: F401  -- set up the app before question_processor
+from question_processor import PDFQuestionExtractor, EXTRACTION_MODES
+
+QUESTIONS_PER_COLUMN = 5
+TOPICS = ['a stack using two queues', 'the cost of inserting into a heap', 'breadth first search',
+          'normalization to third normal form', 'an AVL tree rotation', 'hash table collisions']
+
+
+def question_text(number):
+    topic = TOPICS[number % len(TOPICS)]
+    return f'Explain {topic} with a suitable example and state its complexity. ({number % 5 + 2} marks)'
+
+
+def write_exam(path, pages, columns):
+    """Write an exam paper and return the expected question numbers in reading order."""
+    doc = fitz.open()
+    expected = []
+    number = 1
+    for _ in range(pages):
+        page = doc.new_page()
+        width = page.rect.width
+        page.insert_text((72, 80), 'Section A: Data Structures', fontsize=12, fontname='hebo')
+        column_width = (width - 144 - 24 * (columns - 1)) / columns
+        first = number
+        # Write row by row, as many exporters do, so the content stream
+        # interleaves the columns
+        for row in range(QUESTIONS_PER_COLUMN):
+            y = 110 + row * 110
+            for column in range(columns):
+                x = 72 + column * (column_width + 24)
+                label = first + column * QUESTIONS_PER_COLUMN + row
+                page.insert_text((x, y), f'{label}.', fontsize=10, fontname='hebo')
+                page.insert_textbox(fitz.Rect(x + 18, y - 9, x + column_width, y + 60),
+                                    question_text(label), fontsize=10)
+        expected.extend(str(first + i) for i in range(columns * QUESTIONS_PER_COLUMN))
+        number += columns * QUESTIONS_PER_COLUMN
+        page.insert_text((width / 2, page.rect.height - 30), f'{page.number + 1}', fontsize=9)
+    doc.save(path)
+    doc.close()
+    return expected
+
+
+def run(path, mode):
+    start = time.perf_counter()
+    extractor = PDFQuestionExtractor(path, mode=mode)
+    questions = extractor.extract_questions()
+    elapsed = time.perf_counter() - start
+    return elapsed, questions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--pages', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for columns in (1, 2):
+            path = os.path.join(directory, f'exam_{columns}col.pdf')
+            expected = write_exam(path, args.pages, columns)
+            print(f'{columns}-column paper, {args.pages} pages, {len(expected)} questions')
+            for mode in EXTRACTION_MODES:
+                elapsed, questions = min((run(path, mode) for _ in range(args.repeat)), key=lambda r: r[0])
+                numbers = [q.question_number for q in questions]
+                print(f'  {mode:<7} {elapsed / args.pages * 1000:7.2f} ms/page   '
+                      f'{len(questions):4d} found   in order: {"yes" if numbers == expected else "no"}')
+
+
+if __name__ == '__main__':
+    main()
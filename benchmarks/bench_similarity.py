@@ -0,0 +1,94 @@
+"""Benchmark topic matching and the similar-question index.
+
+    python -m benchmarks.bench_similarity --vectors 200000
+
+Assigns the topics of the labelled DS, SQL and RDBMS banks with the TF-IDF
+and the semantic categorizer and reports, per bank, how many questions got
+the hand-labelled topic and how many got any topic. It then builds an index
+of ``--vectors`` embeddings of the bank questions, each with a few words
+dropped at random. The index is built once scanned in full and once with IVF
+lists. For each build the benchmark reports the build time and the time per
+search. For the IVF build it also reports the recall against the full scan.
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+
+import numpy as np
+
+import app  # noqa: F401  (categorizer needs the models)
+from benchmarks.question_banks import load_banks
+from categorizer import make_categorizer
+from embeddings import get_embedder
+from vector_index import build_index, load_index
+
+
+def topic_accuracy(questions, method):
+    topics = sorted({question['topic'] for question in questions})
+    categorizer = make_categorizer([(1, '', list(enumerate(topics)))], method)
+    categories = categorizer.categorize([question['text'] for question in questions])
+    correct = sum(category.topic_id is not None and topics[category.topic_id] == question['topic']
+                  for category, question in zip(categories, questions))
+    assigned = sum(category.topic_id is not None for category in categories)
+    return correct / len(questions), assigned / len(questions)
+
+
+def variants(texts, count, rng):
+    """``count`` texts, each a bank question with up to two words dropped."""
+    for _ in range(count):
+        words = rng.choice(texts).split()
+        for _ in range(min(2, len(words) - 1)):
+            words.pop(rng.randrange(len(words)))
+        yield ' '.join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--vectors', type=int, default=50000, help='size of the index')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--probes', type=int, default=8, help='IVF lists scanned per search')
+    args = parser.parse_args()
+
+    banks = {name: [question for question in questions if question.get('topic')]
+             for name, questions in load_banks().items()}
+    for name, questions in banks.items():
+        scores = '   '.join(f'{method} {correct:6.1%} right, {assigned:6.1%} assigned'
+                           for method in ('tfidf', 'semantic')
+                           for correct, assigned in [topic_accuracy(questions, method)])
+        print(f'{name:<6} {len(questions):4d} questions   {scores}')
+
+    embedder = get_embedder()
+    texts = [question['text'] for questions in banks.values() for question in questions]
+    rng = random.Random(0)
+    start = time.perf_counter()
+    vectors = embedder.embed(list(variants(texts, args.vectors, rng)))
+    print(f'{args.vectors} embeddings in {time.perf_counter() - start:.1f}s')
+    queries = embedder.embed(list(variants(texts, args.queries, rng)))
+
+    with tempfile.TemporaryDirectory() as folder:
+        results = {}
+        for name, ivf_min_vectors in (('full scan', args.vectors + 1), ('ivf', 1)):
+            batches = ((range(offset, offset + 10000), vectors[offset:offset + 10000])
+                       for offset in range(0, args.vectors, 10000))
+            start = time.perf_counter()
+            build_index(os.path.join(folder, name.replace(' ', '_')), 'bench', batches, embedder.dim, embedder.name,
+                        ivf_min_vectors=ivf_min_vectors)
+            built = time.perf_counter() - start
+            index = load_index(os.path.join(folder, name.replace(' ', '_')), 'bench')
+            start = time.perf_counter()
+            results[name] = [[score for _, score in index.search(query, 10, probes=args.probes)]
+                             for query in queries]
+            searched = (time.perf_counter() - start) / args.queries
+            line = f'{name:<10} built in {built:6.1f}s   {searched * 1e3:7.2f} ms/search'
+            if name == 'ivf':
+                # Near-duplicate questions tie, so a result counts if it scores as well as the 10th exact one
+                recall = np.mean([sum(score >= exact[-1] - 1e-4 for score in found) / len(exact)
+                                  for found, exact in zip(results['ivf'], results['full scan'])])
+                line += f'   recall@10 {recall:.1%} ({index.meta["lists"]} lists, {args.probes} probed)'
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Benchmark web process start-up.
+
+    python -m benchmarks.bench_startup --runs 5
+
+Imports the app in fresh interpreters (as a web worker does on boot) and
+reports wall time, the time spent importing ``app``, peak RSS and which of
+the modules in ``app.HEAVY_MODULES`` ended up loaded. Run from the repository root;
+the database defaults to in-memory SQLite so only import cost is measured.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+CHILD = f"""
+import json, resource, sys, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    'import_seconds': elapsed,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'heavy_modules': [name for name in app.HEAVY_MODULES if name in sys.modules],
+}}))
+"""
+
+
+def run_once(env):
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', CHILD], env=env, check=True,
+                            capture_output=True, text=True).stdout
+    wall = time.perf_counter() - start
+    result = json.loads(output.strip().splitlines()[-1])
+    result['wall_seconds'] = wall
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=5, help='number of fresh interpreters to start')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', 'sqlite://')
+    results = [run_once(env) for _ in range(args.runs)]
+
+    for field, unit in (('wall_seconds', 's'), ('import_seconds', 's'), ('max_rss_mb', 'MB')):
+        values = [result[field] for result in results]
+        print(f'{field:<15} median {statistics.median(values):8.2f} {unit:<2}  '
+              f'min {min(values):8.2f} {unit:<2}  max {max(values):8.2f} {unit}')
+    print('heavy modules loaded:', ', '.join(results[-1]['heavy_modules']) or 'none')
+
+
+if __name__ == '__main__':
+    main()
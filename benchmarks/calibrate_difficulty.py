@@ -0,0 +1,125 @@
+"""Check and refit the difficulty classifier against the labelled question banks.
+
+    python -m benchmarks.calibrate_difficulty
+    python -m benchmarks.calibrate_difficulty --fit --output difficulty_weights.json
+
+Scores the DS, SQL and RDBMS banks (see :mod:`benchmarks.question_banks`)
+with the current weights and reports accuracy per bank next to the
+always-``medium`` baseline, the confusion matrix and the expected
+calibration error (ECE): the gap between the stored confidence and the
+share of questions it gets right, averaged over confidence bins.
+
+``--fit`` fits new weights by multinomial logistic regression. Each bank is
+first scored by weights fitted on the other banks only, which shows how well
+the fit carries over to an unseen subject; the weights fitted on all banks
+are then printed, or written with ``--output`` for ``DIFFICULTY_WEIGHTS_FILE``.
+"""
+import json
+import argparse
+
+import numpy as np
+
+from benchmarks.question_banks import load_banks
+from difficulty import LEVELS, DifficultyClassifier, feature_matrix, get_classifier
+from question_features import scan_question
+
+CONFIDENCE_BINS = 10
+
+
+def bank_features(questions):
+    texts = [question['text'] for question in questions]
+    scans = [scan_question(text) for text in texts]
+    return feature_matrix(texts, [question['marks'] for question in questions],
+                          [scan.question_type for scan in scans], [scan.has_formula for scan in scans],
+                          [scan.verb_counts for scan in scans])
+
+
+def labels(questions):
+    return np.array([LEVELS.index(question['difficulty']) for question in questions])
+
+
+def expected_calibration_error(confidence, correct, bins=CONFIDENCE_BINS):
+    edges = np.linspace(0, 1, bins + 1)
+    error = 0.0
+    for low, high in zip(edges[:-1], edges[1:]):
+        in_bin = (confidence > low) & (confidence <= high)
+        if in_bin.any():
+            error += in_bin.mean() * abs(confidence[in_bin].mean() - correct[in_bin].mean())
+    return error
+
+
+def evaluate(classifier, features, truth):
+    probabilities = classifier.probabilities(features)
+    predicted = probabilities.argmax(axis=1)
+    confidence = probabilities.max(axis=1)
+    correct = predicted == truth
+    confusion = np.zeros((len(LEVELS), len(LEVELS)), dtype=int)
+    np.add.at(confusion, (truth, predicted), 1)
+    return {
+        'accuracy': float(correct.mean()),
+        'baseline': float((truth == LEVELS.index('medium')).mean()),
+        'mean_confidence': float(confidence.mean()),
+        'ece': float(expected_calibration_error(confidence, correct)),
+        'confusion': confusion,
+    }
+
+
+def fit(features, truth, regularization=1.0):
+    """Weights and biases of a multinomial logistic regression, in LEVELS order."""
+    from sklearn.linear_model import LogisticRegression
+
+    model = LogisticRegression(C=regularization, max_iter=2000).fit(features, truth)
+    order = [list(model.classes_).index(level) for level in range(len(LEVELS))]
+    return DifficultyClassifier(model.coef_[order].T, model.intercept_[order])
+
+
+def print_report(name, result):
+    print(f"{name:<10} accuracy {result['accuracy']:.1%} (always medium {result['baseline']:.1%}), "
+          f"mean confidence {result['mean_confidence']:.2f}, ECE {result['ece']:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--weights', help='JSON weights file to check instead of the defaults')
+    parser.add_argument('--fit', action='store_true', help='fit new weights on the banks')
+    parser.add_argument('--regularization', type=float, default=1.0, help='inverse regularization strength (C)')
+    parser.add_argument('--output', help='write the fitted weights to this JSON file')
+    args = parser.parse_args()
+
+    banks = load_banks()
+    data = {name: (bank_features(questions), labels(questions)) for name, questions in banks.items()}
+    every = (np.vstack([features for features, _ in data.values()]),
+             np.concatenate([truth for _, truth in data.values()]))
+
+    classifier = get_classifier(args.weights)
+    print('Current weights')
+    for name, (features, truth) in data.items():
+        print_report(name, evaluate(classifier, features, truth))
+    overall = evaluate(classifier, *every)
+    print_report('all', overall)
+    print('Confusion (rows: labelled, columns: predicted; easy, medium, hard)')
+    print(overall['confusion'])
+
+    if not args.fit:
+        return
+    print('\nFitted on the other banks')
+    for name, (features, truth) in data.items():
+        others = [other for other in data if other != name]
+        held_out = fit(np.vstack([data[other][0] for other in others]),
+                       np.concatenate([data[other][1] for other in others]), args.regularization)
+        print_report(name, evaluate(held_out, features, truth))
+
+    fitted = fit(*every, regularization=args.regularization)
+    print('\nFitted on all banks')
+    print_report('all', evaluate(fitted, *every))
+    weights = json.dumps(fitted.to_dict(), indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(weights)
+        print(f'Wrote {args.output}')
+    else:
+        print(weights)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Synthetic data for the benchmark suite.
+
+Exam papers come from :func:`benchmarks.bench_question_extraction.write_exam`
+and research paper metadata from :func:`benchmarks.bench_pdf_metadata.make_paper`.
+Question banks are generated the way the ``generate_*_questions.py`` scripts
+build theirs (a subject with units and topics, an approved question document
+and questions of mixed difficulty and marks), but in bulk and from a seed so
+two runs see the same data. Everything here needs an app context.
+"""
+import random
+from datetime import datetime, timedelta
+
+from app import db
+from models import (Department, DownloadLog, Question, QuestionDocument, ResearchPaper,
+                    Subject, Topic, Unit, User)
+from keyword_index import index_paper_keywords
+from benchmarks.bench_pdf_metadata import make_paper
+from benchmarks.bench_question_extraction import write_exam  # noqa: F401  -- re-exported
+
+UNITS = {
+    'Arrays and Linked Lists': ['Array Operations', 'Singly Linked Lists', 'Circular Linked Lists'],
+    'Stacks and Queues': ['Stack Applications', 'Queue Implementations', 'Priority Queues'],
+    'Trees and Graphs': ['Binary Search Trees', 'Graph Traversal', 'Shortest Paths'],
+    'Relational Databases': ['Normalization', 'SQL Joins', 'Transactions'],
+}
+STEMS = {
+    'easy': ['Define {topic}.', 'List the main operations of {topic}.', 'State one application of {topic}.'],
+    'medium': ['Explain {topic} with a suitable example.', 'Compare two approaches to {topic}.',
+               'Describe how {topic} is implemented in practice.'],
+    'hard': ['Analyze the complexity of {topic} in the worst case.', 'Design an algorithm based on {topic}.',
+             'Prove a correctness property of {topic}.'],
+}
+MARKS = {'easy': (1, 2), 'medium': (2, 5), 'hard': (5, 10)}
+DIFFICULTY_WEIGHTS = {'easy': 0.3, 'medium': 0.5, 'hard': 0.2}
+
+# Rows inserted per flush when building large tables
+CHUNK_SIZE = 1000
+
+
+def admin_user():
+    return User.query.filter_by(is_admin=True).first()
+
+
+def build_question_bank(count, seed=0, name='Benchmark Data Structures'):
+    """Create a subject with ``count`` approved questions; returns the subject id."""
+    rng = random.Random(seed)
+    subject = Subject(name=name, code=f'BENCH{seed}',
+                      department_id=Department.query.order_by(Department.id).first().id)
+    db.session.add(subject)
+    db.session.flush()
+
+    topics = []
+    for index, (unit_name, topic_names) in enumerate(UNITS.items(), 1):
+        unit = Unit(name=unit_name, subject_id=subject.id, order_index=index)
+        db.session.add(unit)
+        db.session.flush()
+        for topic_name in topic_names:
+            topic = Topic(name=topic_name, unit_id=unit.id)
+            db.session.add(topic)
+            topics.append(topic)
+    db.session.flush()
+
+    document = QuestionDocument(
+        title=f'{name} Question Bank', filename='bench_bank.txt', original_filename='bench_bank.txt',
+        file_path='/nonexistent/bench_bank.txt', file_size=0, subject_id=subject.id,
+        document_type='question_bank', status='approved', extraction_status='completed',
+        extraction_progress=100, total_questions=count, total_pages=1, processed_pages=1,
+        uploader_id=admin_user().id
+    )
+    db.session.add(document)
+    db.session.flush()
+
+    levels, weights = zip(*DIFFICULTY_WEIGHTS.items())
+    rows = []
+    for number in range(1, count + 1):
+        topic = rng.choice(topics)
+        level = rng.choices(levels, weights)[0]
+        rows.append({
+            'question_text': rng.choice(STEMS[level]).format(topic=topic.name.lower()),
+            'question_type': 'text',
+            'difficulty_level': level,
+            'marks': rng.randint(*MARKS[level]),
+            'unit_id': topic.unit_id,
+            'topic_id': topic.id,
+            'document_id': document.id,
+            'page_number': 1,
+            'question_number': str(number),
+            'created_at': datetime.utcnow(),
+        })
+    for start in range(0, len(rows), CHUNK_SIZE):
+        db.session.execute(Question.__table__.insert(), rows[start:start + CHUNK_SIZE])
+    db.session.commit()
+    return subject.id
+
+
+def build_papers(count, seed=0, downloads_per_paper=2):
+    """Create ``count`` approved research papers with keywords and downloads."""
+    rng = random.Random(seed)
+    departments = [d.id for d in Department.query.order_by(Department.id)]
+    uploader_id = admin_user().id
+    now = datetime.now()
+
+    for start in range(0, count, CHUNK_SIZE):
+        papers = []
+        for index in range(start, min(count, start + CHUNK_SIZE)):
+            meta = make_paper(rng, index)
+            papers.append(ResearchPaper(
+                title=meta['title'], authors=meta['authors'], abstract=meta['abstract'],
+                keywords=meta['keywords'], publication_year=meta['publication_year'],
+                filename=f'bench_{index}.pdf', original_filename=f'bench_{index}.pdf',
+                file_path=f'/nonexistent/bench_{index}.pdf', file_size=rng.randint(10**5, 10**7),
+                department_id=rng.choice(departments), uploader_id=uploader_id, status='approved',
+                uploaded_at=now - timedelta(days=rng.randint(0, 730))
+            ))
+        db.session.add_all(papers)
+        db.session.flush()
+        index_paper_keywords((paper.id, paper.keywords) for paper in papers)
+        db.session.add_all(
+            DownloadLog(paper_id=paper.id, user_id=uploader_id,
+                        downloaded_at=paper.uploaded_at + timedelta(days=rng.randint(0, 60)))
+            for paper in papers for _ in range(downloads_per_paper))
+        db.session.commit()
@@ -0,0 +1,41 @@
+"""The hand-labelled questions of the ``generate_*_questions.py`` scripts.
+
+Each script inserts a bank of questions with a difficulty and marks chosen
+by hand. The question dicts are read from the scripts' source, so the banks
+are available without a database or running the scripts. ``ds`` combines the
+three data structures banks.
+"""
+import os
+import ast
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BANKS = {
+    'ds': ('generate_ds_questions.py', 'generate_stacks_queues_questions.py', 'generate_trees_graphs_questions.py'),
+    'sql': ('generate_sql_questions.py',),
+    'rdbms': ('generate_rdbms_questions.py',),
+}
+
+
+def read_script(filename):
+    """Question dicts with ``text``, ``marks`` and ``difficulty`` in a generator script."""
+    with open(os.path.join(ROOT, filename)) as f:
+        tree = ast.parse(f.read(), filename)
+    questions = []
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Dict):
+            continue
+        keys = {key.value for key in node.keys if isinstance(key, ast.Constant)}
+        if {'text', 'marks', 'difficulty'} <= keys:
+            try:
+                questions.append((node.lineno, ast.literal_eval(node)))
+            except ValueError:
+                continue
+    # ast.walk is breadth first; keep the order of the source
+    return [question for _, question in sorted(questions, key=lambda item: item[0])]
+
+
+def load_banks(names=None):
+    """``{bank: [question dict]}`` for the named banks, default all."""
+    return {name: [question for filename in BANKS[name] for question in read_script(filename)]
+            for name in (names or BANKS)}
@@ -0,0 +1,293 @@
+"""Benchmark suite: extraction, question selection, paper generation and search.
+
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --baseline results.json --threshold 0.25
+
+Builds a throwaway database and upload folder, fills them with generated exam
+PDFs, a question bank and research papers, then times each case and writes
+the timings as JSON. Given a baseline from an earlier run, each case whose
+median got slower by more than the threshold (and by at least
+``MIN_DELTA_MS``) is reported as a regression and the exit status is 1, so
+the suite can gate a CI job. A case that ran in the baseline but now raises,
+or is no longer run, is a regression too. Compare runs of the same
+``--scale`` only.
+
+Set ``DATABASE_URL`` to benchmark against another database; the suite adds
+its own subject and papers to it.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+
+FORMAT_VERSION = 1
+
+# Parameters of each --scale
+SCALES = {
+    'small': {'pages': 5, 'questions': 1000, 'papers': 500, 'saves': 100, 'repeat': 5},
+    'full': {'pages': 20, 'questions': 10000, 'papers': 5000, 'saves': 500, 'repeat': 10},
+}
+
+# Slowdowns smaller than this are noise whatever the ratio
+MIN_DELTA_MS = 1.0
+
+DIFFICULTY_DISTRIBUTION = {'easy': 0.3, 'medium': 0.5, 'hard': 0.2}
+
+
+class Case:
+    """One timed operation. ``run`` does the work and returns how many items it handled."""
+
+    def __init__(self, name, run, setup=None, teardown=None, repeat=None, threshold=None):
+        self.name = name
+        self.run = run
+        self.setup = setup
+        self.teardown = teardown
+        self.repeat = repeat
+        self.threshold = threshold
+
+
+def measure(case, repeat):
+    """Time ``case`` once to warm up and then ``repeat`` times."""
+    timings = []
+    items = None
+    for attempt in range(repeat + 1):
+        if case.setup:
+            case.setup()
+        start = time.perf_counter()
+        items = case.run()
+        elapsed = time.perf_counter() - start
+        if case.teardown:
+            case.teardown()
+        if attempt:
+            timings.append(elapsed)
+
+    ms = sorted(t * 1000 for t in timings)
+    result = {
+        'runs': len(ms),
+        'median_ms': statistics.median(ms),
+        'mean_ms': statistics.mean(ms),
+        'min_ms': ms[0],
+        'max_ms': ms[-1],
+        'p95_ms': ms[min(len(ms) - 1, round(0.95 * (len(ms) - 1)))],
+    }
+    if case.threshold is not None:
+        result['threshold'] = case.threshold
+    if items:
+        result['items'] = items
+        result['items_per_second'] = items / (result['median_ms'] / 1000)
+    return result
+
+
+def compare(results, baseline, threshold):
+    """Rows of ``(name, baseline ms, current ms, change, regressed)`` for the cases timed in the baseline.
+
+    A case that now fails or is missing has None for its current ms and change, and counts as regressed.
+    """
+    rows = []
+    for name, before in baseline.get('cases', {}).items():
+        if 'median_ms' not in before:
+            continue
+        current = results['cases'].get(name)
+        if not current or 'median_ms' not in current:
+            rows.append((name, before['median_ms'], None, None, True))
+            continue
+        change = current['median_ms'] / before['median_ms'] - 1 if before['median_ms'] else 0.0
+        limit = current.get('threshold', threshold)
+        regressed = change > limit and current['median_ms'] - before['median_ms'] >= MIN_DELTA_MS
+        rows.append((name, before['median_ms'], current['median_ms'], change, regressed))
+    return rows
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_cases(app, params, workdir):
+    """Generate the data and return the cases to time."""
+    from app import db
+    from models import Question, QuestionDocument
+    from question_processor import PDFQuestionExtractor, QuestionExtractor
+    from benchmarks import corpus
+
+    cases = []
+
+    for columns in (1, 2):
+        path = os.path.join(workdir, f'exam_{columns}col.pdf')
+        corpus.write_exam(path, params['pages'], columns)
+        cases.append(Case(f'extract_questions.{columns}col',
+                          lambda path=path: len(PDFQuestionExtractor(path).extract_questions())))
+
+    with app.app_context():
+        subject_id = corpus.build_question_bank(params['questions'])
+        corpus.build_papers(params['papers'])
+        scratch = QuestionDocument(
+            title='Benchmark scratch', filename='scratch.pdf', original_filename='scratch.pdf',
+            file_path='/nonexistent/scratch.pdf', file_size=0, subject_id=subject_id,
+            uploader_id=corpus.admin_user().id)
+        db.session.add(scratch)
+        db.session.commit()
+        scratch_id = scratch.id
+
+    extractor = QuestionExtractor()
+    context = app.app_context()
+
+    def enter():
+        context.push()
+
+    def leave():
+        db.session.remove()
+        context.pop()
+
+    def save_questions():
+        document = db.session.get(QuestionDocument, scratch_id)
+        for number in range(params['saves']):
+            extractor.save_question({'question_number': str(number), 'page_number': 1,
+                                     'question_text': f'Explain benchmark question {number}.'}, document)
+        return params['saves']
+
+    def clear_scratch():
+        Question.query.filter_by(document_id=scratch_id).delete()
+        db.session.commit()
+        leave()
+
+    cases.append(Case('save_question', save_questions, setup=enter, teardown=clear_scratch))
+    cases.append(Case(
+        'select_questions',
+        lambda: extractor.select_questions(subject_id, None, None, 100, DIFFICULTY_DISTRIBUTION) and None,
+        setup=enter, teardown=leave))
+
+    def generate_paper():
+        filename, path = extractor.generate_question_paper(subject_id, total_marks=100)
+        os.remove(path)
+
+    cases.append(Case('generate_question_paper', generate_paper, setup=enter, teardown=leave,
+                      repeat=max(1, params['repeat'] // 2), threshold=0.5))
+
+    client = app.test_client()
+    client.post('/login', data={'email': 'admin@researchnest.local', 'password': 'admin123'})
+
+    def get(url):
+        def run():
+            response = client.get(url)
+            if response.status_code != 200:
+                raise RuntimeError(f'GET {url} returned {response.status_code}')
+        return run
+
+    for name, url in (('search.text', '/search?query=Graph'),
+                      ('search.keyword', '/search?keywords=performance'),
+                      ('search.filtered', '/search?query=Study&year_from=2005&year_to=2015&department_id=1'),
+                      ('analytics.papers_by_department', '/api/analytics/papers-by-department'),
+                      ('analytics.uploads_by_month', '/api/analytics/uploads-by-month'),
+                      ('analytics.downloads_by_month', '/api/analytics/downloads-by-month'),
+                      ('analytics.top_keywords', '/api/analytics/top-keywords')):
+        cases.append(Case(name, get(url)))
+    return cases
+
+
+def run_suite(scale='small', only=None, repeat=None):
+    """Run the suite and return the results document."""
+    params = dict(SCALES[scale])
+    if repeat:
+        params['repeat'] = repeat
+    workdir = tempfile.mkdtemp(prefix='researchnest-bench-')
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    try:
+        from app import app, db
+        # No embedded worker, and keep the app's debug logging out of the timings
+        app.testing = True
+        app.config.update(UPLOAD_FOLDER=workdir, WTF_CSRF_ENABLED=False)
+        logging.disable(logging.WARNING)
+        with app.app_context():
+            dialect = db.engine.dialect.name
+
+        results = {
+            'format': FORMAT_VERSION,
+            'created_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': dialect,
+            'scale': scale,
+            'params': params,
+            'cases': {},
+        }
+        for case in build_cases(app, params, workdir):
+            if only and not any(case.name.startswith(prefix) for prefix in only):
+                continue
+            try:
+                results['cases'][case.name] = measure(case, case.repeat or params['repeat'])
+            except Exception as e:
+                results['cases'][case.name] = {'error': str(e).splitlines()[0]}
+        return results
+    finally:
+        logging.disable(logging.NOTSET)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def report(results, rows=None):
+    by_name = {row[0]: row for row in rows or ()}
+    for name, result in results['cases'].items():
+        if 'error' in result:
+            print(f'{name:<34} error: {result["error"]}' + ('   REGRESSION' if name in by_name else ''))
+            continue
+        line = (f'{name:<34} median {result["median_ms"]:9.2f} ms   p95 {result["p95_ms"]:9.2f} ms')
+        if 'items_per_second' in result:
+            line += f'   {result["items_per_second"]:9.1f} items/s'
+        if name in by_name:
+            _, before, _, change, regressed = by_name[name]
+            line += f'   {change:+7.1%} vs {before:.2f} ms' + ('   REGRESSION' if regressed else '')
+        print(line)
+    for name in by_name:
+        if name not in results['cases']:
+            print(f'{name:<34} not run   REGRESSION')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--repeat', type=int, help='timed runs per case (default depends on --scale)')
+    parser.add_argument('--only', action='append', help='run cases whose name starts with this (repeatable)')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', help='results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed slowdown of a median before it counts as a regression (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('scale') != args.scale:
+            parser.error(f"baseline was run with --scale {baseline.get('scale')}")
+        if args.only:
+            # Cases left out on purpose are not missing
+            baseline['cases'] = {name: case for name, case in baseline.get('cases', {}).items()
+                                 if any(name.startswith(prefix) for prefix in args.only)}
+
+    results = run_suite(args.scale, args.only, args.repeat)
+    rows = compare(results, baseline, args.threshold) if baseline else []
+    report(results, rows)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    regressions = [row[0] for row in rows if row[4]]
+    if regressions:
+        print(f'{len(regressions)} regression(s): {", ".join(regressions)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+"""Bulk paper ingest.
+
+The upload request only streams the files to disk and records a
+:class:`~models.BulkUploadBatch` with one :class:`~models.BulkUploadItem`
+per file, queues a ``bulk_ingest`` job and returns the batch id. A worker
+fans metadata extraction out to a process pool and inserts the resulting
+papers ``BULK_INGEST_COMMIT_SIZE`` at a time, reporting progress over
+Socket.IO (``bulk_upload_progress``, see :mod:`progress`) and through the
+batch status endpoint.
+
+Every file goes through :func:`resolve_paper_fields`, whether it runs in a
+worker process or inline (``BULK_INGEST_WORKERS = 0``), so parallel and
+serial ingest produce the same papers in the same order.
+"""
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from app import db
+from keyword_index import index_paper_keywords
+from models import BulkUploadBatch, BulkUploadItem, ResearchPaper
+from pdf_optimizer import queue_optimization
+from progress import publish_batch
+from utils import extract_pdf_metadata, extract_keywords_from_text, save_uploaded_file, allowed_file
+from storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+METADATA_FIELDS = ('title', 'authors', 'abstract', 'keywords')
+
+
+def resolve_paper_fields(file_path, defaults):
+    """Work out the metadata of one bulk-uploaded file.
+
+    ``defaults`` holds the metadata shared by the batch; blank fields are
+    filled from the PDF. Returns ``(fields, error)``. Runs in a worker
+    process, so it must not touch the database.
+    """
+    fields = {key: defaults.get(key) or '' for key in METADATA_FIELDS}
+
+    if not fields['title'] or not fields['authors']:
+        extracted = extract_pdf_metadata(file_path)
+        for key in METADATA_FIELDS:
+            if not fields[key]:
+                fields[key] = extracted.get(key, '')
+
+    # Extract keywords from abstract if still no keywords
+    if not fields['keywords'] and fields['abstract']:
+        fields['keywords'] = ', '.join(extract_keywords_from_text(fields['abstract'])[:5])
+
+    if not fields['title']:
+        return fields, 'Could not determine title'
+    if not fields['authors']:
+        return fields, 'Could not determine authors'
+    return fields, None
+
+
+def _resolve_safely(args):
+    file_path, defaults = args
+    try:
+        return resolve_paper_fields(file_path, defaults)
+    except Exception as e:
+        return None, str(e)
+
+
+def create_bulk_batch(files, department, publication_year, uploader_id, defaults):
+    """Save ``files`` to disk and record them as a pending batch."""
+    batch = BulkUploadBatch(
+        uploader_id=uploader_id,
+        department_id=department.id,
+        publication_year=publication_year,
+        status=BulkUploadBatch.STATUS_PENDING,
+        total_files=len(files),
+        succeeded_files=0,
+        failed_files=0,
+        **{key: defaults.get(key) or '' for key in METADATA_FIELDS}
+    )
+
+    for file in files:
+        item = BulkUploadItem(original_filename=(file.filename if file else '') or 'Unknown file',
+                              status=BulkUploadItem.STATUS_PENDING)
+        if file and allowed_file(file.filename):
+            # file.save() copies the spooled upload to disk in chunks
+            filename, file_path = save_uploaded_file(file, None, department.name, publication_year)
+            if filename and file_path:
+                item.filename = filename
+                item.file_path = file_path
+                item.file_size = get_storage().size(file_path)
+            else:
+                item.status = BulkUploadItem.STATUS_FAILED
+                item.error = 'Error saving file'
+        else:
+            item.status = BulkUploadItem.STATUS_FAILED
+            item.error = 'Invalid file type'
+
+        if item.status == BulkUploadItem.STATUS_FAILED:
+            item.processed_at = datetime.now()
+            batch.failed_files += 1
+        batch.items.append(item)
+
+    db.session.add(batch)
+    db.session.commit()
+    return batch
+
+
+def _remove_file(file_path):
+    if file_path:
+        try:
+            get_storage().delete(file_path)
+        except OSError as e:
+            logger.error("Error cleaning up file %s: %s", file_path, e)
+
+
+def _fail_item(batch, item, error):
+    item.status = BulkUploadItem.STATUS_FAILED
+    item.error = (error or 'Unknown error')[:255]
+    item.processed_at = datetime.now()
+    batch.failed_files += 1
+    _remove_file(item.file_path)
+
+
+def _commit_chunk(batch, chunk):
+    """Insert the papers of one chunk of ``(item, fields, error)`` and commit."""
+    resolved = []
+    failed = False
+    for item, fields, error in chunk:
+        if error:
+            _fail_item(batch, item, error)
+            failed = True
+        else:
+            resolved.append((item, fields))
+    # Their files are gone, so the failures must not be rolled back with the insert
+    if failed:
+        db.session.commit()
+
+    papers = [ResearchPaper(
+        title=fields['title'],
+        authors=fields['authors'],
+        abstract=fields['abstract'] or '',
+        keywords=fields['keywords'] or '',
+        filename=item.filename,
+        original_filename=item.original_filename,
+        file_path=item.file_path,
+        file_size=item.file_size or 0,
+        publication_year=batch.publication_year,
+        department_id=batch.department_id,
+        uploader_id=batch.uploader_id,
+        status='approved'  # Auto-approve for simplicity
+    ) for item, fields in resolved]
+
+    try:
+        if papers:
+            db.session.add_all(papers)
+            db.session.flush()
+            index_paper_keywords([(paper.id, paper.keywords) for paper in papers if paper.keywords])
+
+        now = datetime.now()
+        for (item, _), paper in zip(resolved, papers):
+            item.status = BulkUploadItem.STATUS_COMPLETED
+            item.paper_id = paper.id
+            item.processed_at = now
+        batch.succeeded_files += len(papers)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error("Error inserting bulk upload chunk for batch %s: %s", batch.id, e, exc_info=True)
+        for item, _ in resolved:
+            _fail_item(batch, item, str(e))
+        db.session.commit()
+    else:
+        queue_optimization(paper_ids=[paper.id for paper in papers])
+
+    publish_batch(batch)
+
+
+def run_bulk_ingest(app, batch_id):
+    """Extract metadata for every pending file of a batch and insert the papers."""
+    with app.app_context():
+        batch = db.session.get(BulkUploadBatch, batch_id)
+        if not batch:
+            logger.error("Bulk upload batch %s not found", batch_id)
+            return
+
+        batch.status = BulkUploadBatch.STATUS_PROCESSING
+        batch.started_at = datetime.now()
+        db.session.commit()
+        publish_batch(batch)
+
+        items = BulkUploadItem.query.filter_by(batch_id=batch_id, status=BulkUploadItem.STATUS_PENDING)\
+            .order_by(BulkUploadItem.id).all()
+        defaults = {key: getattr(batch, key) for key in METADATA_FIELDS}
+        storage = get_storage(app)
+        jobs = [(storage.local_path(item.file_path), defaults) for item in items]
+        workers = min(app.config.get('BULK_INGEST_WORKERS', 0), len(jobs))
+        commit_size = max(1, app.config.get('BULK_INGEST_COMMIT_SIZE', 50))
+
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 0 else None
+        try:
+            # map() yields in submission order, so papers are inserted in
+            # upload order no matter which worker finishes first
+            results = executor.map(_resolve_safely, jobs) if executor else map(_resolve_safely, jobs)
+            chunk = []
+            for item, (fields, error) in zip(items, results):
+                chunk.append((item, fields, error))
+                if len(chunk) >= commit_size:
+                    _commit_chunk(batch, chunk)
+                    chunk = []
+            if chunk:
+                _commit_chunk(batch, chunk)
+
+            batch.status = BulkUploadBatch.STATUS_COMPLETED
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Bulk upload batch %s failed: %s", batch_id, e, exc_info=True)
+            batch.status = BulkUploadBatch.STATUS_FAILED
+            for item in items:
+                if item.status == BulkUploadItem.STATUS_PENDING:
+                    _fail_item(batch, item, f'Batch failed: {e}')
+        finally:
+            if executor:
+                executor.shutdown()
+
+        batch.completed_at = datetime.now()
+        db.session.commit()
+        publish_batch(batch)
+        logger.info("Bulk upload batch %s finished: %s of %s files imported",
+                    batch_id, batch.succeeded_files, batch.total_files)
@@ -0,0 +1,159 @@
+"""Units and topics of questions, from their similarity to the subject's syllabus.
+
+A subject's units and topics (name and description) are the labels. A
+:class:`TfidfCategorizer` fits one TF-IDF vocabulary on the labels of a
+subject, so a whole batch of questions is scored against every unit and
+topic with one sparse matrix product. The best unit and the best topic are
+picked independently, and each needs a cosine similarity above
+``MIN_SCORE`` to be assigned.
+
+:class:`SemanticCategorizer` (``TOPIC_CATEGORIZER=semantic``) scores the
+same labels with an embedder from :mod:`embeddings` instead, which also
+matches inflections, abbreviations and, with a model, paraphrases. A unit's
+label includes the names of its topics there, since unit names alone are
+often too short to match.
+
+Categorizers are built from plain data (:func:`subject_taxonomies`), so
+worker processes can build their own without a database connection.
+"""
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+
+from models import Topic, Unit
+from nltk_resources import english_stopwords
+
+logger = logging.getLogger(__name__)
+
+# Lowest similarity that assigns a unit or topic
+MIN_SCORE = 0.1
+SEMANTIC_MIN_SCORE = 0.1
+
+
+@dataclass(frozen=True)
+class Category:
+    """Best unit and topic of a question; None where nothing scored above the categorizer's ``min_score``."""
+    unit_id: Optional[int] = None
+    unit_confidence: float = 0.0
+    topic_id: Optional[int] = None
+    topic_confidence: float = 0.0
+
+
+def subject_taxonomies(subject_ids):
+    """``{subject_id: ((unit_id, unit_text, ((topic_id, topic_text), ...)), ...)}`` for the subjects.
+
+    The taxonomies are tuples, so they can key :func:`cached_categorizer`.
+    """
+    taxonomies = {subject_id: [] for subject_id in subject_ids}
+    if not taxonomies:
+        return taxonomies
+    units = Unit.query.filter(Unit.subject_id.in_(list(taxonomies))).order_by(Unit.id).all()
+    topics = {}
+    for topic in Topic.query.filter(Topic.unit_id.in_([unit.id for unit in units])).order_by(Topic.id):
+        topics.setdefault(topic.unit_id, []).append((topic.id, f"{topic.name} {topic.description or ''}"))
+    for unit in units:
+        taxonomies[unit.subject_id].append((unit.id, f"{unit.name} {unit.description or ''}",
+                                            tuple(topics.get(unit.id, ()))))
+    return {subject_id: tuple(taxonomy) for subject_id, taxonomy in taxonomies.items()}
+
+
+class TfidfCategorizer:
+    """TF-IDF cosine similarity between questions and one subject's units and topics."""
+
+    min_score = MIN_SCORE
+
+    def __init__(self, taxonomy):
+        # scikit-learn is only loaded by processes that categorise questions
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        self.unit_ids = [unit_id for unit_id, _, _ in taxonomy]
+        self.topic_ids = [topic_id for _, _, topics in taxonomy for topic_id, _ in topics]
+        texts = [text for _, text, _ in taxonomy] + [text for _, _, topics in taxonomy for _, text in topics]
+        self.vectorizer = None
+        if not texts:
+            return
+        try:
+            self.vectorizer = TfidfVectorizer(stop_words=sorted(english_stopwords()) or None)
+            labels = self.vectorizer.fit_transform(texts)
+        except ValueError:
+            # Nothing but stop words in the unit and topic names
+            logger.warning("Units %s have no words to match questions against", self.unit_ids)
+            self.vectorizer = None
+            return
+        self.units = labels[:len(self.unit_ids)].T.tocsr()
+        self.topics = labels[len(self.unit_ids):].T.tocsr()
+
+    def scores(self, texts):
+        """Similarity of each text to each unit and to each topic, as two dense arrays."""
+        questions = self.vectorizer.transform(texts)
+        return (questions @ self.units).toarray(), (questions @ self.topics).toarray()
+
+    def categorize(self, texts):
+        """A :class:`Category` for each text."""
+        if self.vectorizer is None or not len(texts):
+            return [Category() for _ in texts]
+        return _categories(self, texts)
+
+
+class SemanticCategorizer:
+    """Embedding similarity between questions and one subject's units and topics."""
+
+    min_score = SEMANTIC_MIN_SCORE
+
+    def __init__(self, taxonomy, embedder):
+        self.unit_ids = [unit_id for unit_id, _, _ in taxonomy]
+        self.topic_ids = [topic_id for _, _, topics in taxonomy for topic_id, _ in topics]
+        self.units = embedder.label_scorer([' '.join([text] + [topic for _, topic in topics])
+                                            for _, text, topics in taxonomy])
+        self.topics = embedder.label_scorer([text for _, _, topics in taxonomy for _, text in topics])
+
+    def scores(self, texts):
+        """Similarity of each text to each unit and to each topic, as two dense arrays."""
+        return self.units(texts), self.topics(texts)
+
+    def categorize(self, texts):
+        """A :class:`Category` for each text."""
+        if not self.unit_ids or not len(texts):
+            return [Category() for _ in texts]
+        return _categories(self, texts)
+
+
+def make_categorizer(taxonomy, method='tfidf', embedding_model=None, embedding_dim=None):
+    """The categorizer for ``TOPIC_CATEGORIZER`` (``tfidf`` or ``semantic``)."""
+    if method == 'semantic':
+        # The embedders are only loaded by processes that categorise questions
+        from embeddings import DEFAULT_DIM, get_embedder
+        return SemanticCategorizer(taxonomy, get_embedder(embedding_model or None, embedding_dim or DEFAULT_DIM))
+    if method != 'tfidf':
+        raise ValueError(f"Unknown TOPIC_CATEGORIZER: {method}")
+    return TfidfCategorizer(taxonomy)
+
+
+@lru_cache(maxsize=64)
+def cached_categorizer(taxonomy, method='tfidf', embedding_model=None, embedding_dim=None):
+    """:func:`make_categorizer`, reused for as long as the taxonomy is unchanged.
+
+    Fitting the labels, or embedding them with a model, is the expensive part
+    of a categorizer, so the same one should serve every question of a subject.
+    """
+    return make_categorizer(taxonomy, method, embedding_model, embedding_dim)
+
+
+def _categories(categorizer, texts):
+    unit_scores, topic_scores = categorizer.scores(texts)
+    return [Category(unit_id, unit_score, topic_id, topic_score) for (unit_id, unit_score), (topic_id, topic_score)
+            in zip(_best(categorizer.unit_ids, unit_scores, categorizer.min_score),
+                   _best(categorizer.topic_ids, topic_scores, categorizer.min_score))]
+
+
+def _best(ids, scores, min_score):
+    """``(id, score)`` of the best label of each row, or ``(None, 0.0)`` at or below ``min_score``."""
+    if not ids:
+        return [(None, 0.0)] * len(scores)
+    best = scores.argmax(axis=1)
+    top = scores[np.arange(len(best)), best]
+    return [(ids[index], round(float(score), 3)) if score > min_score else (None, 0.0)
+            for index, score in zip(best, top)]
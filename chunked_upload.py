@@ -0,0 +1,244 @@
+"""Resumable uploads in chunks, for files past the request size limit.
+
+A client opens an upload with the file's name and size, then sends the file
+as a series of ``PATCH`` requests, each carrying the offset it starts at.
+The offset the server holds is the size of the partial file, so after a
+dropped connection the client asks for it and carries on from there:
+
+    POST   /uploads              {"filename", "size", "purpose", "sha256"?}
+    GET    /uploads/<token>      -> {"offset", "size", "status", ...}
+    PATCH  /uploads/<token>      Upload-Offset: <offset>, body: the chunk
+    DELETE /uploads/<token>
+
+Chunks are streamed from the request into the partial file of the storage
+backend and into a SHA-256 hash, so memory per upload stays at one read
+buffer however large the file. The hash state lives in the process that
+received the previous chunk; another process (or a restart) rebuilds it by
+reading the partial file back once. Uploads that do not start like a PDF
+(``%PDF-`` within the first 1024 bytes) are refused as soon as those bytes
+arrive, not after the whole file.
+
+Once the last byte is in, the file is stored under a key of the upload's
+purpose and the session is ``complete``. The upload form then names the
+session (``upload_id``) instead of carrying the file, and
+:func:`attach_upload` hands the stored file over. Sessions that received no
+chunk for ``UPLOAD_SESSION_TTL`` seconds, whether unfinished or complete but
+unattached, are removed together with their files; an upload that is still
+sending chunks is never removed, however long it takes.
+
+Chunks of one upload are expected one at a time; a process serialises the
+chunks it receives, but two processes writing the same upload at once are
+not guarded against.
+"""
+import uuid
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app import db
+from models import UploadSession
+from storage import PAPERS, QUESTION_DOCUMENTS, get_storage
+from utils import allowed_file, generate_unique_filename
+
+logger = logging.getLogger(__name__)
+
+PURPOSES = (PAPERS, QUESTION_DOCUMENTS)
+
+# A PDF header may be preceded by up to this many bytes of junk
+HEADER_BYTES = 1024
+PDF_MAGIC = b'%PDF-'
+
+_lock = threading.Lock()
+_upload_locks = {}
+_hashers = {}  # token -> (offset, sha256 object)
+
+
+class UploadError(Exception):
+    """A request the upload cannot accept; ``status`` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+def _upload_lock(token):
+    with _lock:
+        return _upload_locks.setdefault(token, threading.Lock())
+
+
+def _forget(token):
+    with _lock:
+        _upload_locks.pop(token, None)
+        _hashers.pop(token, None)
+
+
+def _hasher_at(storage, token, offset):
+    """The hash of the first ``offset`` bytes, kept from the last chunk or read back."""
+    cached = _hashers.get(token)
+    if cached and cached[0] == offset:
+        return cached[1]
+    hasher = hashlib.sha256()
+    if not offset:
+        return hasher
+    with storage.open_partial(token) as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            hasher.update(block)
+    return hasher
+
+
+class _HashingReader:
+    """Hashes what is read from ``stream`` and refuses to read past ``limit`` bytes."""
+
+    def __init__(self, stream, hasher, limit):
+        self.stream = stream
+        self.hasher = hasher
+        self.remaining = limit
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        if len(data) > self.remaining:
+            raise UploadError('Chunk runs past the end of the file', 413)
+        self.remaining -= len(data)
+        self.hasher.update(data)
+        return data
+
+
+def looks_like_pdf(head):
+    return PDF_MAGIC in head[:HEADER_BYTES]
+
+
+def upload_state(upload):
+    """JSON-ready state of ``upload``; the offset is where the next chunk starts."""
+    offset = upload.size if upload.status in (UploadSession.STATUS_COMPLETE, UploadSession.STATUS_ATTACHED) \
+        else get_storage().partial_size(upload.token)
+    return {
+        'id': upload.token,
+        'filename': upload.filename,
+        'size': upload.size,
+        'offset': offset,
+        'status': upload.status,
+        'sha256': upload.sha256,
+        'error': upload.error,
+        'chunk_size': current_app.config['UPLOAD_CHUNK_SIZE'],
+    }
+
+
+def create_upload(user_id, filename, size, purpose, expected_sha256=None):
+    """Open an upload session; raises UploadError for a file that cannot be accepted."""
+    if purpose not in PURPOSES:
+        raise UploadError(f'Unknown upload purpose: {purpose}')
+    if not filename or not allowed_file(filename):
+        raise UploadError('Only PDF files are allowed', 415)
+    if not isinstance(size, int) or size <= 0:
+        raise UploadError('File size is required')
+    if size > current_app.config['UPLOAD_MAX_FILE_SIZE']:
+        raise UploadError('File is too large', 413)
+
+    purge_expired_uploads()
+    upload = UploadSession(token=uuid.uuid4().hex, user_id=user_id, purpose=purpose,
+                           filename=filename[:255], size=size,
+                           expected_sha256=(expected_sha256 or '').lower() or None)
+    db.session.add(upload)
+    db.session.commit()
+    return upload
+
+
+def _fail(storage, upload, message):
+    storage.discard_partial(upload.token)
+    _forget(upload.token)
+    upload.status = UploadSession.STATUS_FAILED
+    upload.error = message[:255]
+    db.session.commit()
+
+
+def receive_chunk(upload, offset, stream):
+    """Append the chunk in ``stream`` at ``offset``; completes the upload after its last byte."""
+    if upload.status != UploadSession.STATUS_UPLOADING:
+        raise UploadError(f'Upload is {upload.status}', 409)
+    storage = get_storage()
+    token = upload.token
+
+    with _upload_lock(token):
+        current = storage.partial_size(token)
+        if offset != current:
+            raise UploadError('Chunk does not start at the upload offset', 409, offset=current)
+
+        hasher = _hasher_at(storage, token, current)
+        try:
+            received = storage.append_partial(token, _HashingReader(stream, hasher, upload.size - current))
+        except BaseException:
+            # The hash may be ahead of the file now; rebuild it next time
+            _hashers.pop(token, None)
+            raise
+        _hashers[token] = (received, hasher)
+        upload.last_activity_at = datetime.utcnow()
+
+        if current < HEADER_BYTES and received >= min(HEADER_BYTES, upload.size):
+            with storage.open_partial(token) as f:
+                head = f.read(HEADER_BYTES)
+            if not looks_like_pdf(head):
+                _fail(storage, upload, 'Not a PDF file')
+                raise UploadError('Not a PDF file', 415)
+
+        if received == upload.size:
+            _complete(storage, upload, hasher.hexdigest())
+        else:
+            db.session.commit()
+    return received
+
+
+def _complete(storage, upload, digest):
+    if upload.expected_sha256 and upload.expected_sha256 != digest:
+        _fail(storage, upload, 'Checksum mismatch')
+        raise UploadError('Checksum mismatch', 422)
+    key = storage.key_for(upload.purpose, generate_unique_filename(upload.filename))
+    storage.commit_partial(upload.token, key)
+    _forget(upload.token)
+    upload.storage_key = key
+    upload.sha256 = digest
+    upload.status = UploadSession.STATUS_COMPLETE
+    upload.completed_at = datetime.utcnow()
+    db.session.commit()
+    logger.info("Upload %s complete: %s (%d bytes)", upload.token, key, upload.size)
+
+
+def cancel_upload(upload):
+    storage = get_storage()
+    storage.discard_partial(upload.token)
+    if upload.status == UploadSession.STATUS_COMPLETE and upload.storage_key:
+        storage.delete(upload.storage_key)
+    _forget(upload.token)
+    db.session.delete(upload)
+    db.session.commit()
+
+
+def attach_upload(token, user_id, purpose):
+    """Take over the stored file of a complete upload; returns ``(filename, key, original filename)``."""
+    upload = UploadSession.query.filter_by(token=token, user_id=user_id, purpose=purpose).first()
+    if upload is None or upload.status != UploadSession.STATUS_COMPLETE:
+        raise UploadError('Upload not found or not complete', 404)
+    upload.status = UploadSession.STATUS_ATTACHED
+    db.session.commit()
+    return upload.storage_key.rsplit('/', 1)[-1], upload.storage_key, upload.filename
+
+
+def purge_expired_uploads():
+    """Remove sessions (and their files) that received no chunk for too long."""
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['UPLOAD_SESSION_TTL'])
+    expired = UploadSession.query.filter(UploadSession.last_activity_at < cutoff).limit(100).all()
+    if not expired:
+        return 0
+    storage = get_storage()
+    for upload in expired:
+        if upload.status == UploadSession.STATUS_UPLOADING:
+            storage.discard_partial(upload.token)
+        elif upload.status == UploadSession.STATUS_COMPLETE and upload.storage_key:
+            storage.delete(upload.storage_key)
+        _forget(upload.token)
+        db.session.delete(upload)
+    db.session.commit()
+    return len(expired)
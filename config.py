@@ -10,10 +10,163 @@ SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
     'sqlite:///' + os.path.join(basedir, 'instance', 'researchnest.db')
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+# Connection pool (PostgreSQL; SQLite uses the pool size for readers only)
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+
+# SQLite tuning
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 30000))
+SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 65536))
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+SQLITE_SERIALIZE_WRITES = os.environ.get('SQLITE_SERIALIZE_WRITES', 'true').lower() in ['true', 'on', '1']
+
+# Count SQL statements per request and warn when a view exceeds its budget
+QUERY_AUDIT_ENABLED = os.environ.get('QUERY_AUDIT_ENABLED', 'true').lower() in ['true', 'on', '1']
+
+# Request metrics on /metrics (Prometheus text format): on/off, an optional
+# bearer token scrapers must send, and the latency above which a request is
+# logged with its SQL statements (0 turns the slow-request log off)
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ['true', 'on', '1']
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 1000))
+
 # File uploads
 UPLOAD_FOLDER = os.path.join(basedir, 'uploads')
 MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
 
+# Chunked uploads (chunked_upload.py) for files past MAX_CONTENT_LENGTH:
+# bytes per chunk (must stay below MAX_CONTENT_LENGTH), largest accepted
+# file and seconds without a chunk before an unfinished or unattached upload
+# is removed
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))
+UPLOAD_MAX_FILE_SIZE = int(os.environ.get('UPLOAD_MAX_FILE_SIZE', 1024 * 1024 * 1024))
+UPLOAD_SESSION_TTL = int(os.environ.get('UPLOAD_SESSION_TTL', 24 * 60 * 60))
+
+# Storage of uploaded PDFs: 'local' (files under STORAGE_ROOT, default the
+# upload folder) or 's3' (an S3-compatible bucket; needs boto3). Keys are
+# sharded into STORAGE_FANOUT levels of hash-named directories. The s3
+# driver keeps local copies for PDF processing in STORAGE_CACHE_DIR
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local')
+STORAGE_ROOT = os.environ.get('STORAGE_ROOT')
+STORAGE_FANOUT = int(os.environ.get('STORAGE_FANOUT', 2))
+STORAGE_CACHE_DIR = os.environ.get('STORAGE_CACHE_DIR')
+S3_BUCKET = os.environ.get('S3_BUCKET')
+S3_PREFIX = os.environ.get('S3_PREFIX', '')
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')
+S3_REGION = os.environ.get('S3_REGION')
+S3_ACCESS_KEY_ID = os.environ.get('S3_ACCESS_KEY_ID')
+S3_SECRET_ACCESS_KEY = os.environ.get('S3_SECRET_ACCESS_KEY')
+S3_URL_EXPIRY = int(os.environ.get('S3_URL_EXPIRY', 300))
+
+# Bulk uploads: request size limit, metadata worker processes (0 runs
+# extraction in the ingest thread) and papers inserted per commit
+BULK_UPLOAD_MAX_CONTENT_LENGTH = int(os.environ.get('BULK_UPLOAD_MAX_CONTENT_LENGTH', 512 * 1024 * 1024))
+BULK_INGEST_WORKERS = int(os.environ.get('BULK_INGEST_WORKERS', min(4, os.cpu_count() or 1)))
+BULK_INGEST_COMMIT_SIZE = int(os.environ.get('BULK_INGEST_COMMIT_SIZE', 50))
+
+# PDF optimization after upload (pdf_optimizer.py): on/off, images shown
+# above PDF_OPTIMIZE_IMAGE_DPI are resampled to PDF_OPTIMIZE_TARGET_DPI as
+# JPEGs of the given quality (0 leaves images alone), the least saving in
+# percent for the copy to replace the upload, and worker processes (0
+# rewrites in the job thread)
+PDF_OPTIMIZE_ENABLED = os.environ.get('PDF_OPTIMIZE_ENABLED', 'false').lower() in ['true', 'on', '1']
+PDF_OPTIMIZE_IMAGE_DPI = int(os.environ.get('PDF_OPTIMIZE_IMAGE_DPI', 200))
+PDF_OPTIMIZE_TARGET_DPI = int(os.environ.get('PDF_OPTIMIZE_TARGET_DPI', 150))
+PDF_OPTIMIZE_JPEG_QUALITY = int(os.environ.get('PDF_OPTIMIZE_JPEG_QUALITY', 80))
+PDF_OPTIMIZE_MIN_SAVING = int(os.environ.get('PDF_OPTIMIZE_MIN_SAVING', 5))
+PDF_OPTIMIZE_WORKERS = int(os.environ.get('PDF_OPTIMIZE_WORKERS', min(2, os.cpu_count() or 1)))
+
+# Question extraction: 'layout' reads positioned text blocks (handles
+# multi-column papers), 'text' splits the flat page text on newlines
+QUESTION_EXTRACTION_MODE = os.environ.get('QUESTION_EXTRACTION_MODE', 'layout')
+
+# Difficulty of extracted questions (difficulty.py): a JSON file of weights
+# fitted with python -m benchmarks.calibrate_difficulty; unset uses the
+# weights fitted on the bundled question banks
+DIFFICULTY_WEIGHTS_FILE = os.environ.get('DIFFICULTY_WEIGHTS_FILE')
+
+# Figure crops next to extracted questions (layout mode): render DPI, file
+# format (webp, falling back to png), worker processes and how many dHash
+# bits two crops may differ by and still count as the same figure
+FIGURE_EXTRACTION_ENABLED = os.environ.get('FIGURE_EXTRACTION_ENABLED', 'true').lower() in ['true', 'on', '1']
+FIGURE_DPI = int(os.environ.get('FIGURE_DPI', 150))
+FIGURE_IMAGE_FORMAT = os.environ.get('FIGURE_IMAGE_FORMAT', 'webp')
+FIGURE_IMAGE_QUALITY = int(os.environ.get('FIGURE_IMAGE_QUALITY', 80))
+FIGURE_WORKERS = int(os.environ.get('FIGURE_WORKERS', min(4, os.cpu_count() or 1)))
+FIGURE_HASH_DISTANCE = int(os.environ.get('FIGURE_HASH_DISTANCE', 4))
+
+# Re-extraction after EXTRACTOR_VERSION changes (reextract.py): worker
+# processes (0 extracts in the job thread), how many documents may start per
+# minute (0 for no limit) and the nice level of the workers
+REEXTRACT_WORKERS = int(os.environ.get('REEXTRACT_WORKERS', 1))
+REEXTRACT_DOCUMENTS_PER_MINUTE = int(os.environ.get('REEXTRACT_DOCUMENTS_PER_MINUTE', 20))
+REEXTRACT_NICE = int(os.environ.get('REEXTRACT_NICE', 10))
+
+# Re-classification of stored questions (reclassify.py): worker processes
+# (0 classifies in the job thread) and questions read per chunk
+RECLASSIFY_WORKERS = int(os.environ.get('RECLASSIFY_WORKERS', min(2, os.cpu_count() or 1)))
+RECLASSIFY_CHUNK_SIZE = int(os.environ.get('RECLASSIFY_CHUNK_SIZE', 1000))
+
+# Semantic matching (embeddings.py, vector_index.py): how questions get a
+# unit and topic ('tfidf' or 'semantic'), a local sentence-transformers model
+# (name or path; empty uses hashed n-gram embeddings), the size of the hashed
+# embeddings, where the similar-question index is kept (defaults to
+# instance/embeddings), from how many questions it is searched through IVF
+# lists and how many of those lists a search scans
+TOPIC_CATEGORIZER = os.environ.get('TOPIC_CATEGORIZER', 'tfidf')
+EMBEDDING_MODEL = os.environ.get('EMBEDDING_MODEL', '')
+EMBEDDING_DIM = int(os.environ.get('EMBEDDING_DIM', 512))
+EMBEDDING_INDEX_FOLDER = os.environ.get('EMBEDDING_INDEX_FOLDER')
+EMBEDDING_IVF_MIN_VECTORS = int(os.environ.get('EMBEDDING_IVF_MIN_VECTORS', 50000))
+EMBEDDING_IVF_PROBES = int(os.environ.get('EMBEDDING_IVF_PROBES', 8))
+
+# Page images on the question document page: cache folder (defaults to
+# instance/page_cache), byte budget, render worker processes (0 renders in
+# the request), zoom scales (level 0 is the thumbnail), tile size in pixels
+# and how long browsers may keep a tile
+PAGE_CACHE_FOLDER = os.environ.get('PAGE_CACHE_FOLDER')
+PAGE_CACHE_MAX_BYTES = int(os.environ.get('PAGE_CACHE_MAX_BYTES', 1024 * 1024 * 1024))
+PAGE_RENDER_WORKERS = int(os.environ.get('PAGE_RENDER_WORKERS', min(2, os.cpu_count() or 1)))
+PAGE_ZOOM_LEVELS = [float(scale) for scale in os.environ.get('PAGE_ZOOM_LEVELS', '0.25,1,2').split(',')]
+PAGE_TILE_SIZE = int(os.environ.get('PAGE_TILE_SIZE', 512))
+PAGE_IMAGE_FORMAT = os.environ.get('PAGE_IMAGE_FORMAT', 'webp')
+PAGE_IMAGE_QUALITY = int(os.environ.get('PAGE_IMAGE_QUALITY', 80))
+PAGE_CACHE_MAX_AGE = int(os.environ.get('PAGE_CACHE_MAX_AGE', 365 * 24 * 3600))
+
+# Process roles: 'web' serves requests and only queues background jobs,
+# 'worker' runs them (python -m worker), 'all' does both in one process
+PROCESS_ROLE = os.environ.get('PROCESS_ROLE', 'all')
+
+# Background jobs: job threads per worker process, seconds between polls of
+# an idle queue, attempts before a job fails, seconds without a heartbeat
+# before a running job is handed to another worker, how often workers
+# report in and how recent a report must be for a worker to count as alive
+WORKER_CONCURRENCY = int(os.environ.get('WORKER_CONCURRENCY', 2))
+WORKER_POLL_INTERVAL = float(os.environ.get('WORKER_POLL_INTERVAL', 1))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+JOB_STALE_SECONDS = int(os.environ.get('JOB_STALE_SECONDS', 300))
+WORKER_HEARTBEAT_SECONDS = int(os.environ.get('WORKER_HEARTBEAT_SECONDS', 10))
+WORKER_HEALTH_TIMEOUT = int(os.environ.get('WORKER_HEALTH_TIMEOUT', 30))
+
+# Live progress over Socket.IO: least seconds between progress events per
+# document or batch, and the message queue (e.g. redis://localhost:6379/0)
+# that lets separate worker processes push events to the web process
+PROGRESS_EMIT_INTERVAL = float(os.environ.get('PROGRESS_EMIT_INTERVAL', 0.5))
+SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+
+# How pages follow progress: 'sse' (server-sent events, any WSGI server) or
+# 'socketio'; SSE streams re-read the database and send a heartbeat when
+# quiet for SSE_HEARTBEAT_SECONDS and end after SSE_MAX_SECONDS (browsers
+# reconnect on their own)
+PROGRESS_TRANSPORT = os.environ.get('PROGRESS_TRANSPORT', 'sse')
+SSE_HEARTBEAT_SECONDS = int(os.environ.get('SSE_HEARTBEAT_SECONDS', 15))
+SSE_MAX_SECONDS = int(os.environ.get('SSE_MAX_SECONDS', 300))
+
+# NLTK data directory (populate with `python nltk_resources.py --download`)
+NLTK_DATA_DIR = os.environ.get('NLTK_DATA_DIR') or os.path.join(basedir, 'nltk_data')
+
 # Secret key for session management
 SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-key-123'
 
@@ -23,9 +176,19 @@ PERMANENT_SESSION_LIFETIME = timedelta(days=7)
 # Debug mode
 DEBUG = True
 
-# Logging
-LOG_LEVEL = 'INFO'
-LOG_FILE = 'logs/app.log'
+# Logging: the root level, per-logger levels as "name=LEVEL,name=LEVEL",
+# text or json lines, the log file (empty for console only) and its rotation
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_LEVELS = os.environ.get('LOG_LEVELS', 'werkzeug=INFO,socketio=ERROR,engineio=ERROR')
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text').lower()
+LOG_FILE = os.environ.get('LOG_FILE', 'logs/app.log')
+LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', 10))
+
+# Sampling of repeated DEBUG/INFO messages: at most LOG_SAMPLE_BURST of the
+# same message per logger every LOG_SAMPLE_WINDOW seconds (0 keeps them all)
+LOG_SAMPLE_BURST = int(os.environ.get('LOG_SAMPLE_BURST', 20))
+LOG_SAMPLE_WINDOW = float(os.environ.get('LOG_SAMPLE_WINDOW', 10))
 
 # Email configuration
 MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
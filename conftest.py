@@ -0,0 +1,61 @@
+"""Shared test setup.
+
+Tests run against an in-memory SQLite database unless ``DATABASE_URL`` names
+another one; it is set here, before any test module imports the app. The
+``make_pdf`` fixture builds the exam and paper PDFs the tests feed in.
+
+Run the suite with ``python -m pytest``.
+"""
+import os
+import re
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+import fitz  # PyMuPDF
+import pytest
+
+QUESTION_LINE = re.compile(r'(\d+\.)\s+(.*)')
+
+
+def build_pdf(pages, path=None, *, top=72, left=72, spacing=100, fontsize=11, bold_numbers=True, page_size=None,
+              metadata=None, **save_options):
+    """Write a PDF to ``path`` and return the path, or return its bytes without one.
+
+    ``pages`` holds one list of lines per page, written ``spacing`` points
+    apart from ``top`` down. A line is a string or ``(text, fontsize)``; in a
+    question (``"3. Explain ..."``) the number is set in bold, as layout-mode
+    extraction expects, unless ``bold_numbers`` is false. A callable line
+    draws on the page instead, e.g.
+    ``lambda page: page.draw_circle((300, 400), 80)``.
+    """
+    doc = fitz.open()
+    for lines in pages:
+        page = doc.new_page(**dict(zip(('width', 'height'), page_size or ())))
+        y = top
+        for line in lines:
+            if callable(line):
+                line(page)
+                continue
+            text, size = (line, fontsize) if isinstance(line, str) else line
+            question = bold_numbers and QUESTION_LINE.fullmatch(text)
+            if question:
+                page.insert_text((left, y), question.group(1), fontsize=size, fontname='hebo')
+                page.insert_text((left + 18, y), question.group(2), fontsize=size)
+            else:
+                page.insert_text((left, y), text, fontsize=size)
+            y += spacing
+    if metadata:
+        doc.set_metadata(metadata)
+    try:
+        if path is None:
+            return doc.tobytes(**save_options)
+        doc.save(str(path), **save_options)
+        return str(path)
+    finally:
+        doc.close()
+
+
+@pytest.fixture(scope='session')
+def make_pdf():
+    """:func:`build_pdf`."""
+    return build_pdf
@@ -0,0 +1,160 @@
+"""Database engine bootstrap.
+
+Builds the engine options for the configured ``SQLALCHEMY_DATABASE_URI`` and
+installs the connection hooks that make SQLite usable from both the request
+path and the background extraction threads:
+
+* every SQLite connection gets WAL journaling, ``synchronous=NORMAL``, a
+  larger page cache, memory-mapped I/O and a busy timeout;
+* writes go through a dedicated single-connection "writer" engine whose
+  transactions start with ``BEGIN IMMEDIATE``, so concurrent writers queue on
+  the pool instead of failing with "database is locked";
+* reads keep using the regular connection pool.
+
+For any other backend (PostgreSQL in production) only the pool settings are
+applied and all statements use the default engine.
+"""
+import os
+import logging
+
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql.dml import UpdateBase
+
+logger = logging.getLogger(__name__)
+
+# Bind key of the single-connection engine used for SQLite writes
+WRITER_BIND_KEY = '__writer__'
+
+
+class RoutingSession(Session):
+    """Session that sends SQLite writes through the writer engine.
+
+    Once a transaction flushes (or executes an INSERT/UPDATE/DELETE construct)
+    it sticks to the writer connection until it ends, so later reads in the
+    same transaction see its own uncommitted changes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            writer = self._db.engines.get(WRITER_BIND_KEY)
+            if writer is not None:
+                if self._flushing or isinstance(clause, UpdateBase):
+                    self.info['use_writer'] = True
+                if self.info.get('use_writer'):
+                    return writer
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_transaction_end')
+def _release_writer(session, transaction):
+    """Go back to the reader pool once the outermost transaction ends."""
+    if transaction.parent is None:
+        session.info.pop('use_writer', None)
+
+
+def is_sqlite_file(uri):
+    """Return True if ``uri`` points at an on-disk SQLite database."""
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def normalize_database_uri(uri):
+    """Accept the legacy ``postgres://`` scheme still handed out by some hosts."""
+    if uri and uri.startswith('postgres://'):
+        return 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+
+def _sqlite_pragmas(config):
+    return [
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        # Negative cache_size is in KiB rather than pages
+        f"PRAGMA cache_size=-{int(config['SQLITE_CACHE_SIZE_KB'])}",
+        f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}",
+        'PRAGMA temp_store=MEMORY',
+    ]
+
+
+def configure_database(app):
+    """Fill in engine options from config. Must run before ``db.init_app``."""
+    config = app.config
+    uri = normalize_database_uri(config['SQLALCHEMY_DATABASE_URI'])
+    config['SQLALCHEMY_DATABASE_URI'] = uri
+    engine_options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+
+    if is_sqlite_file(uri):
+        database = make_url(uri).database
+        if os.path.isabs(database):
+            os.makedirs(os.path.dirname(database), exist_ok=True)
+
+        timeout = config['SQLITE_BUSY_TIMEOUT_MS'] / 1000.0
+        connect_args = engine_options.setdefault('connect_args', {})
+        connect_args.setdefault('timeout', timeout)
+        # Background extraction threads share pooled connections
+        connect_args.setdefault('check_same_thread', False)
+        engine_options.setdefault('pool_size', config['DB_POOL_SIZE'])
+        engine_options.setdefault('max_overflow', config['DB_MAX_OVERFLOW'])
+
+        if config['SQLITE_SERIALIZE_WRITES']:
+            binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+            binds[WRITER_BIND_KEY] = {
+                'url': uri,
+                'connect_args': dict(connect_args),
+                # One connection: writers wait on the pool, never on SQLITE_BUSY
+                'pool_size': 1,
+                'max_overflow': 0,
+                'pool_timeout': timeout,
+            }
+            config['SQLALCHEMY_BINDS'] = binds
+    elif make_url(uri).get_backend_name() != 'sqlite':
+        engine_options.setdefault('pool_size', config['DB_POOL_SIZE'])
+        engine_options.setdefault('max_overflow', config['DB_MAX_OVERFLOW'])
+        engine_options.setdefault('pool_timeout', config['DB_POOL_TIMEOUT'])
+        engine_options.setdefault('pool_recycle', config['DB_POOL_RECYCLE'])
+        engine_options.setdefault('pool_pre_ping', True)
+
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
+
+
+def install_engine_hooks(app, db):
+    """Attach connect/begin listeners to the engines created by ``db``."""
+    with app.app_context():
+        engines = db.engines
+
+    pragmas = _sqlite_pragmas(app.config)
+
+    for bind_key, engine in engines.items():
+        if engine.dialect.name != 'sqlite' or not is_sqlite_file(str(engine.url)):
+            continue
+
+        is_writer = bind_key == WRITER_BIND_KEY
+
+        @event.listens_for(engine, 'connect')
+        def _on_connect(dbapi_connection, connection_record, is_writer=is_writer):
+            cursor = dbapi_connection.cursor()
+            try:
+                for pragma in pragmas:
+                    cursor.execute(pragma)
+            finally:
+                cursor.close()
+            if is_writer:
+                # Let SQLAlchemy emit BEGIN itself (see the 'begin' hook below)
+                dbapi_connection.isolation_level = None
+
+        if is_writer:
+            @event.listens_for(engine, 'begin')
+            def _on_begin(connection):
+                connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+        logger.info("Configured SQLite %s engine for %s", 'writer' if is_writer else 'reader', engine.url)
+
+
+def init_database(app, db):
+    """Configure engines for ``app`` and register the ``db`` extension."""
+    configure_database(app)
+    db.init_app(app)
+    install_engine_hooks(app, db)
@@ -0,0 +1,153 @@
+"""Difficulty of questions from their wording, marks, length and type.
+
+Command verbs follow Bloom's taxonomy: recall verbs (define, list, state)
+point to easy questions, comprehension verbs (explain, describe, compare) to
+medium ones and analysis, evaluation and design verbs (analyze, prove,
+design) to hard ones. The summed level of a question's verbs and their
+number, together with the marks, the number of words, a required bound such
+as O(n log n), the question type and the presence of a formula, form a short
+feature vector per question. A linear score per level, turned into
+probabilities with a softmax, picks the level; its probability is stored as
+``Question.difficulty_confidence``.
+
+The verbs are counted by the keyword scan each question already gets during
+extraction (:mod:`question_features`), and a document's questions are
+scored together with one matrix product.
+
+The weights below were fitted on the generated DS, SQL and RDBMS question
+banks by ``python -m benchmarks.calibrate_difficulty``, which also reports
+accuracy and how well the confidence is calibrated. Weights fitted on other
+labelled questions can be saved as JSON and named in
+``DIFFICULTY_WEIGHTS_FILE``.
+"""
+import re
+import json
+import logging
+from functools import lru_cache
+
+import numpy as np
+
+from question_features import DIFFICULTY_VERBS, scan_question
+
+logger = logging.getLogger(__name__)
+
+LEVELS = ('easy', 'medium', 'hard')
+
+# Question types (question_features.determine_question_type) grouped by
+# the effort they usually take
+TYPE_GROUPS = {
+    'recall_type': ('Multiple Choice', 'True/False', 'Matching', 'Fill-in-the-Blank'),
+    'problem_type': ('Problem Solving', 'Diagram-based', 'Calculation'),
+    'proof_type': ('Proof',),
+    'extended_type': ('Essay', 'Case Study', 'Long Answer'),
+}
+
+# A required bound such as "in O(n) time" marks the harder algorithm questions
+BOUND_PATTERN = re.compile(r'\b[OΘΩ]\s*\(\s*[\w^*+ ]*\)')
+
+FEATURES = ('verb_level', 'verbs', 'log_marks', 'log_words', 'has_bound', *TYPE_GROUPS, 'has_formula')
+
+# Fitted weights, one column per level, and the bias of each level
+DEFAULT_WEIGHTS = [
+    [-0.738, 0.389, 0.349],     # verb_level
+    [-0.187, 0.261, -0.074],    # verbs
+    [-3.447, 0.743, 2.704],     # log_marks
+    [-0.033, -0.176, 0.209],    # log_words
+    [-0.243, -0.539, 0.782],    # has_bound
+    [0.39, -0.074, -0.316],     # recall_type
+    [-0.07, 0.036, 0.033],      # problem_type
+    [0.0, 0.0, 0.0],            # proof_type
+    [0.0, 0.0, 0.0],            # extended_type
+    [-0.934, 0.367, 0.566],     # has_formula
+]
+DEFAULT_BIAS = [3.996, 0.004, -3.999]
+
+
+# easy -1, medium 0, hard +1: the level is ordinal, so verbs the labelled
+# banks rarely use still push towards their own end; and the verb count
+VERB_FEATURES = np.array([[-1, 1], [0, 1], [1, 1]], dtype=np.float32)
+
+
+def feature_matrix(texts, marks, question_types=None, has_formula=None, verb_counts=None):
+    """One row of FEATURES per question.
+
+    ``verb_counts`` are the (easy, medium, hard) verb counts of each question
+    from :func:`question_features.scan_question`; the texts are scanned when
+    they are not given.
+    """
+    count = len(texts)
+    features = np.zeros((count, len(FEATURES)), dtype=np.float32)
+    if not count:
+        return features
+
+    if verb_counts is None:
+        verb_counts = [scan_question(text).verb_counts for text in texts]
+    features[:, 0:2] = np.asarray(verb_counts, dtype=np.float32) @ VERB_FEATURES
+    features[:, 2] = np.log1p(np.asarray([max(m or 1, 1) for m in marks], dtype=np.float32))
+    features[:, 3] = np.log1p(np.fromiter((len(text.split()) for text in texts), dtype=np.float32, count=count))
+    features[:, 4] = [BOUND_PATTERN.search(text) is not None for text in texts]
+    if question_types is not None:
+        for column, group in enumerate(TYPE_GROUPS.values(), 5):
+            features[:, column] = [question_type in group for question_type in question_types]
+    if has_formula is not None:
+        features[:, -1] = np.asarray(has_formula, dtype=np.float32)
+    return features
+
+
+class DifficultyClassifier:
+    """Softmax over one linear score per level."""
+
+    def __init__(self, weights=DEFAULT_WEIGHTS, bias=DEFAULT_BIAS):
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = np.asarray(bias, dtype=np.float32)
+        if self.weights.shape != (len(FEATURES), len(LEVELS)) or self.bias.shape != (len(LEVELS),):
+            raise ValueError(f"Difficulty weights must be {len(FEATURES)} x {len(LEVELS)} plus {len(LEVELS)} biases")
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data['weights'], data['bias'])
+
+    def to_dict(self):
+        return {'features': list(FEATURES), 'levels': list(LEVELS),
+                'weights': self.weights.astype(float).round(3).tolist(),
+                'bias': self.bias.astype(float).round(3).tolist()}
+
+    def probabilities(self, features):
+        scores = features @ self.weights + self.bias
+        scores -= scores.max(axis=1, keepdims=True)
+        exp = np.exp(scores)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def classify(self, texts, marks, question_types=None, has_formula=None, verb_counts=None):
+        """``[(level, confidence)]`` for each question."""
+        if not len(texts):
+            return []
+        probabilities = self.probabilities(feature_matrix(texts, marks, question_types, has_formula, verb_counts))
+        best = probabilities.argmax(axis=1)
+        return [(LEVELS[index], round(float(probabilities[row, index]), 3)) for row, index in enumerate(best)]
+
+
+@lru_cache(maxsize=4)
+def get_classifier(weights_file=None):
+    """The classifier with the weights in ``weights_file``, or the fitted defaults."""
+    if weights_file:
+        try:
+            return DifficultyClassifier.from_file(weights_file)
+        except (OSError, ValueError, KeyError) as e:
+            logger.error("Could not load difficulty weights from %s, using the defaults: %s", weights_file, e)
+    return DifficultyClassifier()
+
+
+def classify_questions(questions, weights_file=None):
+    """Set ``difficulty`` and ``difficulty_confidence`` of ExtractedQuestions in one batch."""
+    results = get_classifier(weights_file).classify(
+        [question.question_text for question in questions],
+        [question.marks for question in questions],
+        [question.question_type for question in questions],
+        [question.has_formula for question in questions],
+        [(question.features or scan_question(question.question_text)).verb_counts for question in questions])
+    for question, (level, confidence) in zip(questions, results):
+        question.difficulty = level
+        question.difficulty_confidence = confidence
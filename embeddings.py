@@ -0,0 +1,174 @@
+"""Text embeddings for semantic matching, computed locally on the CPU.
+
+Two embedders share one interface. ``embed(texts)`` returns an
+L2-normalised float32 matrix with one row per text, and
+``label_scorer(labels)`` returns a function giving the cosine similarity of
+texts to each of a fixed set of labels:
+
+* :class:`HashingEmbedder`, the default, needs nothing beyond numpy. Each
+  content word adds its own feature, its character 3-5 grams and the
+  initials of the runs of three and four words it starts. These features are
+  hashed into ``EMBEDDING_DIM`` signed buckets. The n-grams link inflections
+  ("insert", "insertion"). The initials let an abbreviation meet the phrase
+  it stands for ("BST", "Binary Search Trees"). Labels are scored on the
+  exact features, without the collisions of the buckets.
+* :class:`ModelEmbedder` runs a sentence-transformers model named by
+  ``EMBEDDING_MODEL`` (a model name or a local path). The model has to be
+  on disk already, as nothing is downloaded. Without the package the hashing
+  embedder is used, and a warning is logged.
+
+An embedder's ``name`` identifies the space its vectors live in, so an index
+built with one embedder is never searched with vectors of another.
+"""
+import os
+import re
+import zlib
+import logging
+import importlib.util
+from functools import lru_cache
+
+import numpy as np
+
+from nltk_resources import english_stopwords
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIM = 512
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Character n-gram lengths, and the runs of words abbreviated (two letters
+# would match far too many unrelated pairs of words)
+NGRAM_SIZES = (3, 4, 5)
+INITIALS = (3, 4)
+
+
+# Used when NLTK's stop word corpus is missing; without any, function words
+# make up most of a question's features and drown its topic
+FALLBACK_STOP_WORDS = frozenset('''
+a about above after all also an and any are as at be because been before being below between both but by can
+could did do does doing down during each few for from further had has have having he her here hers him his how
+i if in into is it its itself just may me might more most must my no nor not now of off on once only or other
+our out over own same she should so some such than that the their them then there these they this those
+through to too under until up very was we were what when where which while who whom why will with would you
+your
+'''.split())
+
+
+def _hash(feature):
+    return zlib.crc32(feature.encode())
+
+
+class HashingEmbedder:
+    """Hashed word, character n-gram and initials features."""
+
+    def __init__(self, dim=DEFAULT_DIM):
+        self.dim = dim
+        self.name = f'hashing-{dim}'
+        self._word_features = lru_cache(maxsize=65536)(self._hash_word)
+
+    @staticmethod
+    def _hash_word(word):
+        """``(hashes, weights)`` of a word and its n-grams; the n-grams weigh as much as the word."""
+        padded = f'<{word}>'
+        grams = [padded[start:start + size] for size in NGRAM_SIZES for start in range(len(padded) - size + 1)]
+        hashes = [_hash('w:' + word)] + [_hash('g:' + gram) for gram in grams]
+        weights = [1.0] + [1.0 / len(grams)] * len(grams)
+        return np.array(hashes, dtype=np.int64), np.array(weights, dtype=np.float32)
+
+    def features(self, text):
+        """``(hashes, weights)`` of the distinct features of ``text``, weights L2-normalised."""
+        stop_words = english_stopwords() or FALLBACK_STOP_WORDS
+        words = [word for word in TOKEN_RE.findall((text or '').lower()) if word not in stop_words]
+        parts = [self._word_features(word) for word in words]
+        initials = [word[0] for word in words if word[0].isalpha()]
+        # Same feature as the abbreviation written out as a word
+        abbreviations = [_hash('w:' + ''.join(initials[start:start + size]))
+                         for start in range(len(initials))
+                         for size in INITIALS if start + size <= len(initials)]
+        if abbreviations:
+            parts.append((np.array(abbreviations, dtype=np.int64), np.ones(len(abbreviations), dtype=np.float32)))
+        if not parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        hashes, inverse = np.unique(np.concatenate([hashes for hashes, _ in parts]), return_inverse=True)
+        weights = np.bincount(inverse, weights=np.concatenate([weights for _, weights in parts])).astype(np.float32)
+        return hashes, weights / np.linalg.norm(weights)
+
+    def embed(self, texts):
+        """An L2-normalised ``(len(texts), dim)`` float32 matrix of the features hashed into ``dim`` buckets."""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in zip(matrix, texts):
+            hashes, weights = self.features(text)
+            np.add.at(row, hashes % self.dim, np.where(hashes & 0x80000000, weights, -weights))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms > 0, norms, 1)
+
+    def label_scorer(self, labels):
+        """A function scoring texts against ``labels``: cosine similarities as a ``(texts, labels)`` array.
+
+        Labels are few, so texts are compared on their exact features rather
+        than on the hashed vectors, which would add collision noise.
+        """
+        label_features = [self.features(label) for label in labels]
+        vocabulary = np.unique(np.concatenate([hashes for hashes, _ in label_features] or [np.empty(0, np.int64)]))
+        matrix = np.zeros((len(labels), len(vocabulary)), dtype=np.float32)
+        for row, (hashes, weights) in zip(matrix, label_features):
+            row[np.searchsorted(vocabulary, hashes)] = weights
+
+        def scores(texts):
+            questions = np.zeros((len(texts), len(vocabulary)), dtype=np.float32)
+            for row, text in zip(questions, texts):
+                hashes, weights = self.features(text)
+                columns = np.searchsorted(vocabulary, hashes).clip(max=max(len(vocabulary) - 1, 0))
+                known = vocabulary[columns] == hashes if len(vocabulary) else np.zeros(len(hashes), bool)
+                row[columns[known]] = weights[known]
+            return questions @ matrix.T
+        return scores
+
+
+class ModelEmbedder:
+    """A sentence-transformers model, loaded from disk on first use."""
+
+    def __init__(self, model):
+        self.model_name = model
+        self.name = f'model:{model}'
+        self._model = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            # Never reach out to the model hub
+            os.environ.setdefault('HF_HUB_OFFLINE', '1')
+            from sentence_transformers import SentenceTransformer
+            self._model = SentenceTransformer(self.model_name, device='cpu')
+        return self._model
+
+    @property
+    def dim(self):
+        return self.model.get_sentence_embedding_dimension()
+
+    def embed(self, texts):
+        """An L2-normalised ``(len(texts), dim)`` float32 matrix."""
+        return self.model.encode(list(texts), batch_size=64, normalize_embeddings=True,
+                                 convert_to_numpy=True).astype(np.float32)
+
+    def label_scorer(self, labels):
+        """A function scoring texts against ``labels``: cosine similarities as a ``(texts, labels)`` array."""
+        matrix = self.embed(labels) if len(labels) else None
+
+        def scores(texts):
+            if matrix is None:
+                return np.zeros((len(texts), 0), dtype=np.float32)
+            return self.embed(texts) @ matrix.T
+        return scores
+
+
+@lru_cache(maxsize=4)
+def get_embedder(model=None, dim=DEFAULT_DIM):
+    """The model embedder for ``model``, or the hashing embedder without one."""
+    if model:
+        if importlib.util.find_spec('sentence_transformers') is not None:
+            return ModelEmbedder(model)
+        logger.warning("EMBEDDING_MODEL is set but sentence-transformers is not installed; "
+                       "using hashed n-gram embeddings")
+    return HashingEmbedder(dim)
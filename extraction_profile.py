@@ -0,0 +1,152 @@
+"""Per-stage timings of question extraction.
+
+An :class:`ExtractionProfile` collects how long one document spent in each
+stage of the extraction job:
+
+- ``open``: opening the PDF
+- ``page_text``: reading the text of each page from PyMuPDF
+- ``segmentation``: splitting page text into questions
+- ``classification``: question type, marks, formula and diagram heuristics
+- ``figures``: cropping figures next to the questions
+- ``topics``: matching the questions to the subject's units and topics
+- ``persistence``: saving the questions
+- ``status_updates``: progress commits and pushes to the status page
+
+Stages nest, and a stage's time excludes the stages timed inside it, so the
+stages add up to the time spent in any of them. The job stores the summary
+with the document (``QuestionDocument.extraction_timings``); the status
+endpoint and the admin profiling page read it from there.
+
+An extracted document can be timed again under a profiler (``cprofile``,
+or ``pyinstrument`` when it is installed) with :func:`capture`, by the
+``profile_extraction`` job, which saves no questions; the report is stored
+as text in ``QuestionDocument.extraction_profile_report``.
+"""
+import io
+import time
+import pstats
+import logging
+import cProfile
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('open', 'page_text', 'segmentation', 'classification', 'figures', 'topics',
+          'persistence', 'status_updates')
+
+PROFILERS = ('cprofile', 'pyinstrument')
+
+# Functions listed in a cProfile report
+REPORT_LINES = 40
+
+
+class ExtractionProfile:
+    """Exclusive time, call count and slowest call of each stage."""
+
+    def __init__(self):
+        self.stages = {}
+        self._stack = []
+        self.started = time.perf_counter()
+        self.finished = None
+        self.counters = {}
+
+    @contextmanager
+    def stage(self, name):
+        """Time the ``with`` block as ``name``, minus the stages nested in it."""
+        frame = [time.perf_counter(), 0.0]  # start, time spent in nested stages
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            elapsed = time.perf_counter() - frame[0]
+            if self._stack:
+                self._stack[-1][1] += elapsed
+            self._add(name, elapsed - frame[1])
+
+    def _add(self, name, seconds):
+        total, count, slowest = self.stages.get(name, (0.0, 0, 0.0))
+        self.stages[name] = (total + seconds, count + 1, max(slowest, seconds))
+
+    def count(self, name, amount=1):
+        """Count something other than time, e.g. pages or SQL statements."""
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    def as_dict(self):
+        """JSON-ready summary: total and per-stage milliseconds."""
+        end = self.finished or time.perf_counter()
+        ordered = [name for name in STAGES if name in self.stages]
+        ordered += sorted(name for name in self.stages if name not in STAGES)
+        stages = {}
+        for name in ordered:
+            total, count, slowest = self.stages[name]
+            stages[name] = {'ms': round(total * 1000, 2), 'count': count,
+                            'max_ms': round(slowest * 1000, 2)}
+        return {
+            'total_ms': round((end - self.started) * 1000, 2),
+            'stages': stages,
+            'counters': dict(self.counters),
+        }
+
+
+class _NullProfile:
+    """Stands in for a profile when nobody is collecting timings."""
+
+    @contextmanager
+    def stage(self, name):
+        yield
+
+    def count(self, name, amount=1):
+        pass
+
+
+NULL_PROFILE = _NullProfile()
+
+
+class Capture:
+    """The report of a profiler run, filled in when :func:`capture` exits."""
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.report = None
+
+
+@contextmanager
+def capture(profiler):
+    """Run the ``with`` block under ``profiler`` (one of PROFILERS, or None for no profiler)."""
+    result = Capture(profiler)
+    if not profiler:
+        yield result
+        return
+    if profiler not in PROFILERS:
+        raise ValueError(f"Unknown profiler: {profiler}")
+
+    if profiler == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            logger.warning("pyinstrument is not installed; profiling with cProfile instead")
+            result.profiler = profiler = 'cprofile'
+
+    if profiler == 'pyinstrument':
+        sampler = Profiler()
+        sampler.start()
+        try:
+            yield result
+        finally:
+            sampler.stop()
+            result.report = sampler.output_text(unicode=True, color=False)
+        return
+
+    tracer = cProfile.Profile()
+    tracer.enable()
+    try:
+        yield result
+    finally:
+        tracer.disable()
+        out = io.StringIO()
+        pstats.Stats(tracer, stream=out).strip_dirs().sort_stats('cumulative').print_stats(REPORT_LINES)
+        result.report = out.getvalue()
@@ -1,11 +1,20 @@
 from datetime import datetime
 from flask_wtf import FlaskForm
 from flask_wtf.file import FileField, FileRequired, FileAllowed
-from wtforms import StringField, TextAreaField, SelectField, IntegerField, SubmitField, PasswordField, SelectMultipleField, BooleanField
-from wtforms.validators import DataRequired, Length, Email, NumberRange, EqualTo
+from wtforms import StringField, TextAreaField, SelectField, IntegerField, SubmitField, PasswordField, SelectMultipleField, BooleanField, HiddenField
+from wtforms.validators import DataRequired, Length, Email, NumberRange, EqualTo, StopValidation
 from models import Department, Subject, Unit, Topic, QuestionDocument
 
 
+class FileRequiredUnlessUploaded(FileRequired):
+    """FileRequired, unless the file was sent ahead in chunks and the form names the upload."""
+    
+    def __call__(self, form, field):
+        if form.upload_id.data:
+            raise StopValidation()
+        super().__call__(form, field)
+
+
 class LoginForm(FlaskForm):
     email = StringField('Email', validators=[DataRequired(), Length(max=120)])
     password = PasswordField('Password', validators=[DataRequired()])
@@ -26,8 +35,9 @@ class SignupForm(FlaskForm):
 
 
 class UploadPaperForm(FlaskForm):
+    upload_id = HiddenField()
     file = FileField('PDF File', validators=[
-        FileRequired(),
+        FileRequiredUnlessUploaded(),
         FileAllowed(['pdf'], 'Only PDF files are allowed!')
     ], render_kw={'multiple': True})
     is_bulk_upload = SelectField('Upload Type', choices=[
@@ -84,8 +94,9 @@ class ChangePasswordForm(FlaskForm):
     submit = SubmitField('Change Password')
 
 class UploadQuestionDocumentForm(FlaskForm):
+    upload_id = HiddenField()
     file = FileField('PDF File', validators=[
-        FileRequired(),
+        FileRequiredUnlessUploaded(),
         FileAllowed(['pdf'], 'Only PDF files are allowed!')
     ])
     title = StringField('Document Title', validators=[DataRequired(), Length(max=255)])
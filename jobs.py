@@ -0,0 +1,185 @@
+"""Database-backed job queue shared by the web and worker roles.
+
+The web role records background work as :class:`~models.Job` rows with
+:func:`enqueue` and only ever reads their status. Worker processes
+(``python -m worker``, see :mod:`worker`) claim jobs with a compare-and-set
+UPDATE on the row, so any number of workers on any number of hosts can share
+one queue through the database.
+
+A job that raises is retried with exponential backoff until it has been
+attempted ``max_attempts`` times. A running job whose worker stops sending
+heartbeats for ``JOB_STALE_SECONDS`` goes back in the queue.
+
+Job handlers are registered with :func:`job_handler` in :mod:`tasks`, which
+only worker processes import.
+"""
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, update
+
+from app import db
+from models import Job, WorkerHeartbeat
+
+logger = logging.getLogger(__name__)
+
+# Job kinds
+EXTRACT_QUESTIONS = 'extract_questions'
+BULK_INGEST = 'bulk_ingest'
+REEXTRACT = 'reextract'
+RENDER_PAGE = 'render_page'
+INDEX_KEYWORDS = 'index_keywords'
+MIGRATE_STORAGE = 'migrate_storage'
+OPTIMIZE_PDFS = 'optimize_pdfs'
+RECLASSIFY = 'reclassify_questions'
+EMBED_QUESTIONS = 'index_question_embeddings'
+PROFILE_EXTRACTION = 'profile_extraction'
+
+# Seconds before the first retry of a failed job; doubles with every attempt
+RETRY_BACKOFF = 30
+
+# Runnable jobs looked at per claim; another worker may take the first ones
+CLAIM_CANDIDATES = 5
+
+# Set whenever this process enqueues a job, so a worker running in the same
+# process starts on it without waiting for its next poll
+wakeup = threading.Event()
+
+_handlers = {}
+
+
+def job_handler(kind):
+    """Register ``func(app, payload)`` as the handler of ``kind`` jobs."""
+    def register(func):
+        _handlers[kind] = func
+        return func
+    return register
+
+
+def handler_for(kind):
+    return _handlers.get(kind)
+
+
+def enqueue(kind, payload=None, priority=0, dedupe=False):
+    """Queue a job and commit.
+
+    With ``dedupe``, an identical job that is still waiting in the queue is
+    returned instead of adding another one.
+    """
+    payload = json.dumps(payload or {}, sort_keys=True)
+    if dedupe:
+        existing = Job.query.filter_by(kind=kind, payload=payload, status=Job.STATUS_QUEUED).first()
+        if existing is not None:
+            return existing
+
+    job = Job(kind=kind, payload=payload, priority=priority, status=Job.STATUS_QUEUED,
+              max_attempts=current_app.config.get('JOB_MAX_ATTEMPTS', 3))
+    db.session.add(job)
+    db.session.commit()
+    wakeup.set()
+    return job
+
+
+def job_payload(job):
+    return json.loads(job.payload or '{}')
+
+
+def claim_job(worker_name, kinds=None):
+    """Claim the next runnable job for ``worker_name``; returns the Job or None."""
+    now = datetime.utcnow()
+    query = db.session.query(Job.id).filter(Job.status == Job.STATUS_QUEUED, Job.run_after <= now)
+    if kinds:
+        query = query.filter(Job.kind.in_(kinds))
+    candidates = [job_id for (job_id,) in query.order_by(Job.priority.desc(), Job.id).limit(CLAIM_CANDIDATES)]
+    db.session.commit()
+
+    for job_id in candidates:
+        result = db.session.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == Job.STATUS_QUEUED)
+            .values(status=Job.STATUS_RUNNING, locked_by=worker_name, attempts=Job.attempts + 1,
+                    started_at=now, heartbeat_at=now)
+        )
+        db.session.commit()
+        if result.rowcount == 1:
+            return db.session.get(Job, job_id)
+    return None
+
+
+def finish_job(job, error=None):
+    """Mark a claimed job completed, or failed (queued again while it has attempts left)."""
+    now = datetime.utcnow()
+    job.heartbeat_at = now
+    if error is None:
+        job.status = Job.STATUS_COMPLETED
+        job.error = None
+        job.finished_at = now
+    elif job.attempts < job.max_attempts:
+        job.status = Job.STATUS_QUEUED
+        job.error = error
+        job.locked_by = None
+        job.run_after = now + timedelta(seconds=RETRY_BACKOFF * 2 ** max(job.attempts - 1, 0))
+    else:
+        job.status = Job.STATUS_FAILED
+        job.error = error
+        job.finished_at = now
+    db.session.commit()
+
+
+def touch_jobs(job_ids):
+    """Refresh the heartbeat of running jobs."""
+    if job_ids:
+        db.session.execute(
+            update(Job).where(Job.id.in_(job_ids), Job.status == Job.STATUS_RUNNING)
+            .values(heartbeat_at=datetime.utcnow())
+        )
+        db.session.commit()
+
+
+def requeue_stale_jobs(stale_seconds):
+    """Return running jobs whose worker went silent to the queue; returns how many."""
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_seconds)
+    stale = db.session.query(Job.id, Job.attempts, Job.max_attempts)\
+        .filter(Job.status == Job.STATUS_RUNNING, Job.heartbeat_at < cutoff).all()
+    db.session.commit()
+    if not stale:
+        return 0
+
+    failed = [job_id for job_id, attempts, max_attempts in stale if attempts >= max_attempts]
+    requeued = [job_id for job_id, attempts, max_attempts in stale if attempts < max_attempts]
+    running = (Job.status == Job.STATUS_RUNNING, Job.heartbeat_at < cutoff)
+    if failed:
+        db.session.execute(
+            update(Job).where(Job.id.in_(failed), *running)
+            .values(status=Job.STATUS_FAILED, error='Worker stopped responding', finished_at=datetime.utcnow())
+        )
+    if requeued:
+        db.session.execute(
+            update(Job).where(Job.id.in_(requeued), *running)
+            .values(status=Job.STATUS_QUEUED, locked_by=None, error='Worker stopped responding')
+        )
+    db.session.commit()
+    logger.warning("Stale jobs: %d requeued, %d failed", len(requeued), len(failed))
+    return len(requeued)
+
+
+def live_workers(timeout):
+    """Worker heartbeats seen within the last ``timeout`` seconds."""
+    cutoff = datetime.utcnow() - timedelta(seconds=timeout)
+    return WorkerHeartbeat.query.filter(WorkerHeartbeat.last_seen >= cutoff).all()
+
+
+def queue_stats():
+    """Queued and running job counts and the age of the oldest queued job."""
+    counts = dict(db.session.query(Job.status, func.count(Job.id))
+                  .filter(Job.status.in_((Job.STATUS_QUEUED, Job.STATUS_RUNNING)))
+                  .group_by(Job.status).all())
+    oldest = db.session.query(func.min(Job.created_at)).filter(Job.status == Job.STATUS_QUEUED).scalar()
+    return {
+        'queued': counts.get(Job.STATUS_QUEUED, 0),
+        'running': counts.get(Job.STATUS_RUNNING, 0),
+        'oldest_queued_seconds': round((datetime.utcnow() - oldest).total_seconds(), 1) if oldest else 0
+    }
@@ -0,0 +1,138 @@
+"""Normalized paper keywords.
+
+``ResearchPaper.keywords`` stays as the comma-separated string shown in the
+UI; every keyword is also stored once in ``keywords`` and linked to its papers
+through ``paper_keywords`` so search can filter by exact keyword through an
+index instead of ``ILIKE '%term%'`` over the whole table.
+
+Keyword frequencies are maintained with a single
+``INSERT ... ON CONFLICT (name) DO UPDATE SET frequency = frequency + excluded.frequency``
+per batch, which is atomic under concurrent uploads.
+"""
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import select
+
+from app import db
+from models import Keyword, paper_keywords
+
+# Rows per INSERT statement; keeps well under SQLite's bound-parameter limit
+BATCH_SIZE = 500
+
+MAX_KEYWORD_LENGTH = Keyword.__table__.c.name.type.length
+
+
+def parse_keywords(text):
+    """Split a comma-separated keyword string into unique, normalized names."""
+    if not text:
+        return []
+    names = []
+    for part in text.split(','):
+        name = ' '.join(part.split()).lower()[:MAX_KEYWORD_LENGTH]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def _dialect_insert(table):
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(table)
+
+
+def _chunks(items, size=BATCH_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def upsert_keyword_counts(counts):
+    """Add ``counts`` ({name: n}) to keyword frequencies and return {name: id}."""
+    if not counts:
+        return {}
+
+    table = Keyword.__table__
+    now = datetime.now()
+    rows = [{'name': name, 'frequency': n, 'created_at': now} for name, n in sorted(counts.items())]
+
+    for chunk in _chunks(rows):
+        stmt = _dialect_insert(table)
+        if stmt is not None:
+            stmt = stmt.values(chunk).on_conflict_do_update(
+                index_elements=[table.c.name],
+                set_={'frequency': table.c.frequency + stmt.excluded.frequency}
+            )
+            db.session.execute(stmt)
+        else:
+            # Portable fallback: bump what exists, insert the rest
+            for row in chunk:
+                updated = db.session.execute(
+                    table.update().where(table.c.name == row['name'])
+                    .values(frequency=table.c.frequency + row['frequency'])
+                ).rowcount
+                if not updated:
+                    db.session.execute(table.insert().values(**row))
+
+    ids = {}
+    names = list(counts)
+    for chunk in _chunks(names):
+        ids.update({name: keyword_id for keyword_id, name in
+                    db.session.execute(select(table.c.id, table.c.name).where(table.c.name.in_(chunk)))})
+    return ids
+
+
+def _linked_names(paper_ids):
+    """Names of the keywords already linked to each of ``paper_ids``, as {paper_id: set}."""
+    linked = {}
+    for chunk in _chunks(sorted(set(paper_ids))):
+        rows = db.session.execute(select(paper_keywords.c.paper_id, Keyword.name)
+                                  .join(Keyword, Keyword.id == paper_keywords.c.keyword_id)
+                                  .where(paper_keywords.c.paper_id.in_(chunk)))
+        for paper_id, name in rows:
+            linked.setdefault(paper_id, set()).add(name)
+    return linked
+
+
+def index_paper_keywords(entries):
+    """Link papers to their keywords and bump keyword frequencies.
+
+    ``entries`` is an iterable of ``(paper_id, keyword_string)``; the whole
+    batch costs one lookup of existing links, one upsert, one id lookup and
+    one association insert per ``BATCH_SIZE`` rows. Keywords a paper is
+    already linked to are skipped, so indexing a paper again (a retried job)
+    does not count them twice. The caller commits.
+    """
+    parsed = [(paper_id, parse_keywords(text)) for paper_id, text in entries]
+    linked = _linked_names(paper_id for paper_id, _ in parsed)
+    new = []
+    for paper_id, names in parsed:
+        seen = linked.setdefault(paper_id, set())
+        names = [name for name in names if name not in seen]
+        seen.update(names)
+        new.append((paper_id, names))
+
+    counts = Counter(name for _, names in new for name in names)
+    ids = upsert_keyword_counts(counts)
+
+    links = [{'paper_id': paper_id, 'keyword_id': ids[name]}
+             for paper_id, names in new for name in names]
+    for chunk in _chunks(links):
+        stmt = _dialect_insert(paper_keywords)
+        if stmt is not None:
+            stmt = stmt.values(chunk).on_conflict_do_nothing()
+        else:
+            stmt = paper_keywords.insert().values(chunk)
+        db.session.execute(stmt)
+    return len(links)
+
+
+def papers_with_keyword(name):
+    """Subquery of paper ids tagged with exactly ``name``."""
+    return (select(paper_keywords.c.paper_id)
+            .join(Keyword, Keyword.id == paper_keywords.c.keyword_id)
+            .where(Keyword.name == ' '.join(name.split()).lower()))
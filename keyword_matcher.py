@@ -0,0 +1,77 @@
+"""Counting the keywords of many lists in one pass over a text.
+
+:class:`KeywordMatcher` builds an Aho–Corasick automaton from named keyword
+groups once; :meth:`KeywordMatcher.count` then walks a text a single time
+and returns how often each group was hit, however many groups and keywords
+there are. Each group says where a keyword must start and end: anywhere
+(``ANYWHERE``, like ``keyword in text``), at the start of a word (``START``,
+like ``\\bkeyword``) or as whole words (``WORD``, like ``\\bkeyword\\b``).
+A keyword may belong to several groups and hits may overlap; every hit is
+counted.
+"""
+from collections import deque
+
+ANYWHERE = 0
+START = 1
+END = 2
+WORD = START | END
+
+
+def is_word_char(char):
+    """Whether ``char`` counts as part of a word for ``\\b``."""
+    return char.isalnum() or char == '_'
+
+
+class KeywordMatcher:
+    """Aho–Corasick automaton over ``[(group, keywords, bounds)]``."""
+
+    def __init__(self, groups):
+        self.groups = tuple(name for name, _, _ in groups)
+        goto = [{}]
+        outputs = [[]]
+        for index, (_, keywords, bounds) in enumerate(groups):
+            for keyword in keywords:
+                state = 0
+                for char in keyword:
+                    following = goto[state].get(char)
+                    if following is None:
+                        following = goto[state][char] = len(goto)
+                        goto.append({})
+                        outputs.append([])
+                    state = following
+                outputs[state].append((len(keyword), index, bounds))
+
+        # Breadth first, so the failure state of each state (its longest
+        # proper suffix in the trie) is complete before it is needed. Every
+        # state gets the full transition table, which makes matching one
+        # dict lookup per character.
+        fail = [0] * len(goto)
+        transitions = [None] * len(goto)
+        transitions[0] = dict(goto[0])
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            transitions[state] = {**transitions[fail[state]], **goto[state]}
+            for char, following in goto[state].items():
+                fail[following] = transitions[fail[state]].get(char, 0)
+                outputs[following] = outputs[following] + outputs[fail[following]]
+                queue.append(following)
+        self._transitions = transitions
+        self._outputs = [tuple(output) for output in outputs]
+
+    def count(self, text):
+        """Hits of each group in ``text``, in the order of ``groups``."""
+        counts = [0] * len(self.groups)
+        transitions = self._transitions
+        outputs = self._outputs
+        state = 0
+        for end, char in enumerate(text, 1):
+            state = transitions[state].get(char, 0)
+            if outputs[state]:
+                for length, group, bounds in outputs[state]:
+                    if bounds & START and end > length and is_word_char(text[end - length - 1]):
+                        continue
+                    if bounds & END and end < len(text) and is_word_char(text[end]):
+                        continue
+                    counts[group] += 1
+        return counts
@@ -0,0 +1,184 @@
+"""Logging off the request and job threads.
+
+:func:`configure_logging` gives the root logger a single :class:`LogQueueHandler`.
+Callers only put records on an in-memory queue; a ``QueueListener`` thread
+formats them and writes the log file and the console, so slow disks and
+terminals no longer hold up requests or extraction.
+
+- Levels: the root logger gets ``LOG_LEVEL`` and ``LOG_LEVELS`` overrides it
+  per logger (``"werkzeug=INFO,question_processor=DEBUG"``). Records below a
+  logger's level are dropped before their message is formatted, so log with
+  ``%``-style arguments rather than f-strings.
+- Sampling: a DEBUG or INFO message (same logger, same format string) is
+  written at most ``LOG_SAMPLE_BURST`` times every ``LOG_SAMPLE_WINDOW``
+  seconds; the next one written carries the number suppressed. Warnings and
+  errors are always written.
+- Output: ``LOG_FORMAT=text`` or ``json`` (one object per line, with any
+  ``extra=`` fields).
+"""
+import os
+import json
+import copy
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# LogRecord attributes that are not ``extra=`` fields
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'suppressed'}
+
+_listener = None
+
+
+def parse_levels(spec):
+    """``"name=LEVEL,name=LEVEL"`` as a dict; unknown levels raise ValueError."""
+    levels = {}
+    for item in (spec or '').split(','):
+        if not item.strip():
+            continue
+        name, _, level = item.partition('=')
+        level = level.strip().upper()
+        if not isinstance(logging.getLevelName(level), int):
+            raise ValueError(f"Unknown log level in LOG_LEVELS: {item.strip()}")
+        levels[name.strip()] = level
+    return levels
+
+
+class SamplingFilter(logging.Filter):
+    """Let through at most ``burst`` of each DEBUG/INFO message per ``window`` seconds."""
+
+    def __init__(self, burst, window):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.lock = threading.Lock()
+        self.seen = {}  # (logger, format string) -> [window start, written, suppressed]
+
+    def filter(self, record):
+        if not self.burst or record.levelno >= logging.WARNING:
+            return True
+        key = (record.name, record.msg if isinstance(record.msg, str) else type(record.msg))
+        with self.lock:
+            entry = self.seen.get(key)
+            if entry is None or record.created - entry[0] >= self.window:
+                if entry is not None and entry[2]:
+                    record.suppressed = entry[2]
+                if entry is None and len(self.seen) > 10000:
+                    self.seen.clear()
+                self.seen[key] = [record.created, 1, 0]
+                return True
+            if entry[1] < self.burst:
+                entry[1] += 1
+                return True
+            entry[2] += 1
+            return False
+
+
+class LogQueueHandler(QueueHandler):
+    """Puts records on the queue with their message merged but not yet formatted.
+
+    The stock handler formats the whole record (timestamp, traceback) in the
+    calling thread; here that is left to the listener. The message is merged
+    with its arguments now because the arguments may change once the caller
+    moves on.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        text = super().format(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        return f'{text} [{suppressed} similar suppressed]' if suppressed else text
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno,
+            'thread': record.threadName,
+        }
+        if getattr(record, 'suppressed', 0):
+            entry['suppressed'] = record.suppressed
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRIBUTES and not name.startswith('_'):
+                entry[name] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+def _formatter(config):
+    if config.get('LOG_FORMAT', 'text') == 'json':
+        return JsonFormatter()
+    return TextFormatter(TEXT_FORMAT)
+
+
+def configure_logging(config, app_name=None):
+    """Route all logging through a queue as ``config`` says; safe to call again."""
+    global _listener
+    stop_logging()
+
+    formatter = _formatter(config)
+    handlers = [logging.StreamHandler()]
+    log_file = config.get('LOG_FILE')
+    if log_file:
+        os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+        handlers.append(RotatingFileHandler(log_file, maxBytes=config.get('LOG_MAX_BYTES', 10 * 1024 * 1024),
+                                            backupCount=config.get('LOG_BACKUP_COUNT', 10)))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    records = queue.SimpleQueue()
+    queue_handler = LogQueueHandler(records)
+    queue_handler.addFilter(SamplingFilter(config.get('LOG_SAMPLE_BURST', 20),
+                                           config.get('LOG_SAMPLE_WINDOW', 10)))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    level = config.get('LOG_LEVEL', 'INFO').upper()
+    root.setLevel(level)
+    if app_name:
+        # Flask would put its own logger on DEBUG in debug mode
+        logging.getLogger(app_name).setLevel(level)
+    for name, name_level in parse_levels(config.get('LOG_LEVELS')).items():
+        logging.getLogger(name).setLevel(name_level)
+
+    _listener = QueueListener(records, *handlers)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Write out the queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,180 @@
+"""Request metrics in the Prometheus text format.
+
+:func:`install_metrics` times every request and records, per endpoint,
+method and status code:
+
+- ``researchnest_request_duration_seconds``: latency histogram
+- ``researchnest_request_sql_statements``: SQL statements per request
+- ``researchnest_request_sql_seconds``: time spent in SQL per request
+- ``researchnest_response_size_bytes``: body size (streams of unknown length are skipped)
+
+SQL is counted by the :mod:`query_audit` recorder; requests reuse the one the
+audit opens, or get their own when ``QUERY_AUDIT_ENABLED`` is off. The
+``/metrics`` view renders these together with gauges read at scrape time
+(job queue depth, live workers). Metrics live in the process that served
+the request, so scrape every web process.
+
+Requests slower than ``SLOW_REQUEST_MS`` are logged to the ``slow_requests``
+logger with their SQL statements, slowest first.
+
+Recording a request costs a lock, a few dict lookups and a bisect per
+histogram; the statement list the slow log needs is a list append per
+statement, which the query audit keeps anyway.
+"""
+import time
+import bisect
+import logging
+import threading
+
+from flask import g, request
+
+from query_audit import current_recorder, start_recording, stop_recording
+
+slow_logger = logging.getLogger('slow_requests')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+SQL_TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Statements listed for one slow request
+SLOW_LOG_STATEMENTS = 20
+
+LABELS = ('endpoint', 'method', 'status')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values. Callers hold ``RequestMetrics.lock``."""
+
+    def __init__(self, name, documentation, labels, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.series = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, label_values, value):
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for label_values, series in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                le = 'le="%s"' % _format_number(float(bound))
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}')
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f'{self.name}_sum{labels} {_format_number(float(series[-1]))}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class RequestMetrics:
+    """The request histograms of one process."""
+
+    def __init__(self, slow_request_ms=1000):
+        self.slow_request_ms = slow_request_ms
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.duration = Histogram('researchnest_request_duration_seconds',
+                                  'Time to handle a request.', LABELS, LATENCY_BUCKETS)
+        self.sql_statements = Histogram('researchnest_request_sql_statements',
+                                        'SQL statements issued by a request.', LABELS, SQL_COUNT_BUCKETS)
+        self.sql_seconds = Histogram('researchnest_request_sql_seconds',
+                                     'Time a request spent in SQL statements.', LABELS, SQL_TIME_BUCKETS)
+        self.response_size = Histogram('researchnest_response_size_bytes',
+                                       'Size of a response body.', LABELS, SIZE_BUCKETS)
+
+    def record(self, endpoint, method, status, seconds, recorder=None, size=None):
+        key = (endpoint, method, str(status))
+        with self.lock:
+            self.duration.observe(key, seconds)
+            if recorder is not None:
+                self.sql_statements.observe(key, recorder.count)
+                self.sql_seconds.observe(key, recorder.total_time)
+            if size is not None:
+                self.response_size.observe(key, size)
+
+    def render(self, gauges=()):
+        """The metrics in the Prometheus text format; ``gauges`` are ``(name, help, value)``."""
+        with self.lock:
+            lines = []
+            for histogram in (self.duration, self.sql_statements, self.sql_seconds, self.response_size):
+                lines.extend(histogram.render())
+        lines += ['# HELP researchnest_process_start_time_seconds Start time of the process.',
+                  '# TYPE researchnest_process_start_time_seconds gauge',
+                  f'researchnest_process_start_time_seconds {self.started}']
+        for name, documentation, value in gauges:
+            lines += [f'# HELP {name} {documentation}', f'# TYPE {name} gauge', f'{name} {_format_number(value)}']
+        return '\n'.join(lines) + '\n'
+
+
+def _log_slow_request(seconds, recorder, status):
+    statements = sorted(recorder.statements, key=lambda item: item[1], reverse=True) if recorder else []
+    slow_logger.warning(
+        "Slow request %s %s -> %s: %.0f ms, %d SQL statements in %.1f ms",
+        request.method, request.full_path.rstrip('?'), status, seconds * 1000,
+        recorder.count if recorder else 0, recorder.total_time * 1000 if recorder else 0.0
+    )
+    for statement, duration in statements[:SLOW_LOG_STATEMENTS]:
+        slow_logger.warning("  %.2f ms  %s", duration * 1000, ' '.join(statement.split()))
+
+
+def install_metrics(app):
+    """Record every request of ``app`` into ``app.extensions['metrics']``."""
+    metrics = app.extensions['metrics'] = RequestMetrics(app.config.get('SLOW_REQUEST_MS', 1000))
+    if not app.config.get('METRICS_ENABLED', True):
+        return metrics
+
+    @app.before_request
+    def _start_request_metrics():
+        g.metrics_started = time.perf_counter()
+        if current_recorder() is None:
+            # Keep the statements only if a slow request may need to list them
+            g.metrics_token = start_recording(keep_statements=metrics.slow_request_ms > 0)
+
+    @app.after_request
+    def _finish_request_metrics(response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        seconds = time.perf_counter() - started
+        recorder = current_recorder()
+        size = response.content_length  # unknown for streamed bodies
+        metrics.record(request.endpoint or 'unmatched', request.method, response.status_code,
+                       seconds, recorder, size)
+        if metrics.slow_request_ms and seconds * 1000 >= metrics.slow_request_ms:
+            _log_slow_request(seconds, recorder, response.status_code)
+        return response
+
+    @app.teardown_request
+    def _reset_request_metrics(exc=None):
+        token = g.pop('metrics_token', None)
+        if token is not None:
+            stop_recording(token)
+
+    return metrics
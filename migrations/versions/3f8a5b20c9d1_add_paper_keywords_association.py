@@ -0,0 +1,67 @@
+"""Add paper_keywords association and backfill it from research_papers.keywords
+
+Revision ID: 3f8a5b20c9d1
+Revises: 7c1d9e4a2b63
+Create Date: 2026-10-19 11:40:05.118276
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f8a5b20c9d1'
+down_revision = '7c1d9e4a2b63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'paper_keywords',
+        sa.Column('paper_id', sa.Integer(), nullable=False),
+        sa.Column('keyword_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['paper_id'], ['research_papers.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['keyword_id'], ['keywords.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('paper_id', 'keyword_id')
+    )
+    op.create_index('ix_paper_keywords_keyword_id_paper_id', 'paper_keywords', ['keyword_id', 'paper_id'], unique=False)
+
+    # Backfill links for existing papers; frequencies of known keywords were
+    # already counted at upload time, only newly seen names are added
+    bind = op.get_bind()
+    papers = sa.table('research_papers', sa.column('id', sa.Integer), sa.column('keywords', sa.Text))
+    keywords = sa.table('keywords', sa.column('id', sa.Integer), sa.column('name', sa.String),
+                        sa.column('frequency', sa.Integer), sa.column('created_at', sa.DateTime))
+    links = sa.table('paper_keywords', sa.column('paper_id', sa.Integer), sa.column('keyword_id', sa.Integer))
+
+    tagged = []
+    for paper_id, text in bind.execute(sa.select(papers.c.id, papers.c.keywords)):
+        names = []
+        for part in (text or '').split(','):
+            name = ' '.join(part.split()).lower()[:100]
+            if name and name not in names:
+                names.append(name)
+        tagged.append((paper_id, names))
+
+    keyword_ids = {name: keyword_id for keyword_id, name in bind.execute(sa.select(keywords.c.id, keywords.c.name))}
+    missing = {}
+    for _, names in tagged:
+        for name in names:
+            if name not in keyword_ids:
+                missing[name] = missing.get(name, 0) + 1
+    if missing:
+        op.bulk_insert(keywords, [{'name': name, 'frequency': n, 'created_at': datetime.now()}
+                                  for name, n in missing.items()])
+        keyword_ids = {name: keyword_id for keyword_id, name in bind.execute(sa.select(keywords.c.id, keywords.c.name))}
+
+    rows = [{'paper_id': paper_id, 'keyword_id': keyword_ids[name]} for paper_id, names in tagged for name in names]
+    if rows:
+        op.bulk_insert(links, rows)
+
+
+def downgrade():
+    op.drop_index('ix_paper_keywords_keyword_id_paper_id', table_name='paper_keywords')
+    op.drop_table('paper_keywords')
@@ -0,0 +1,32 @@
+"""Add (sort column, id) indexes for keyset pagination
+
+Revision ID: 7c1d9e4a2b63
+Revises: 2155839e3385
+Create Date: 2026-10-19 10:12:31.402113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c1d9e4a2b63'
+down_revision = '2155839e3385'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_users_created_at_id', 'users', ['created_at', 'id'], unique=False)
+    op.create_index('ix_research_papers_uploaded_at_id', 'research_papers', ['uploaded_at', 'id'], unique=False)
+    op.create_index('ix_research_papers_status_uploaded_at_id', 'research_papers', ['status', 'uploaded_at', 'id'], unique=False)
+    op.create_index('ix_question_documents_uploaded_at_id', 'question_documents', ['uploaded_at', 'id'], unique=False)
+    op.create_index('ix_questions_created_at_id', 'questions', ['created_at', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_questions_created_at_id', table_name='questions')
+    op.drop_index('ix_question_documents_uploaded_at_id', table_name='question_documents')
+    op.drop_index('ix_research_papers_status_uploaded_at_id', table_name='research_papers')
+    op.drop_index('ix_research_papers_uploaded_at_id', table_name='research_papers')
+    op.drop_index('ix_users_created_at_id', table_name='users')
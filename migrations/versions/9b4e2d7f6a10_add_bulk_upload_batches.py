@@ -0,0 +1,66 @@
+"""Add bulk_upload_batches and bulk_upload_items
+
+Revision ID: 9b4e2d7f6a10
+Revises: 3f8a5b20c9d1
+Create Date: 2026-10-19 14:02:47.530912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b4e2d7f6a10'
+down_revision = '3f8a5b20c9d1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'bulk_upload_batches',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('uploader_id', sa.Integer(), nullable=False),
+        sa.Column('department_id', sa.Integer(), nullable=False),
+        sa.Column('publication_year', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=255), nullable=True),
+        sa.Column('authors', sa.Text(), nullable=True),
+        sa.Column('abstract', sa.Text(), nullable=True),
+        sa.Column('keywords', sa.Text(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('total_files', sa.Integer(), nullable=True),
+        sa.Column('succeeded_files', sa.Integer(), nullable=True),
+        sa.Column('failed_files', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['department_id'], ['departments.id']),
+        sa.ForeignKeyConstraint(['uploader_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'bulk_upload_items',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('batch_id', sa.Integer(), nullable=False),
+        sa.Column('original_filename', sa.String(length=255), nullable=False),
+        sa.Column('filename', sa.String(length=255), nullable=True),
+        sa.Column('file_path', sa.String(length=500), nullable=True),
+        sa.Column('file_size', sa.Integer(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('error', sa.String(length=255), nullable=True),
+        sa.Column('paper_id', sa.Integer(), nullable=True),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['batch_id'], ['bulk_upload_batches.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['paper_id'], ['research_papers.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('bulk_upload_items', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_bulk_upload_items_batch_id'), ['batch_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('bulk_upload_items', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_bulk_upload_items_batch_id'))
+
+    op.drop_table('bulk_upload_items')
+    op.drop_table('bulk_upload_batches')
@@ -0,0 +1,32 @@
+"""Keep the original file of optimized PDFs
+
+Revision ID: a6d1e8f35b92
+Revises: f2b7c4d91e58
+Create Date: 2026-10-20 00:41:19.208734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6d1e8f35b92'
+down_revision = 'f2b7c4d91e58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('research_papers', 'question_documents'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('original_file_path', sa.String(length=500), nullable=True))
+            batch_op.add_column(sa.Column('original_file_size', sa.Integer(), nullable=True))
+            batch_op.add_column(sa.Column('optimized_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    for table in ('question_documents', 'research_papers'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('optimized_at')
+            batch_op.drop_column('original_file_size')
+            batch_op.drop_column('original_file_path')
@@ -0,0 +1,26 @@
+"""Add difficulty confidence to questions
+
+Revision ID: b3c8f1d67a04
+Revises: a6d1e8f35b92
+Create Date: 2026-10-20 01:27:44.610583
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3c8f1d67a04'
+down_revision = 'a6d1e8f35b92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('questions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('difficulty_confidence', sa.Float(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('questions', schema=None) as batch_op:
+        batch_op.drop_column('difficulty_confidence')
@@ -0,0 +1,37 @@
+"""Add extractor version stamps and manual edit flag
+
+Revision ID: c5e1a7d3f820
+Revises: 9b4e2d7f6a10
+Create Date: 2026-10-19 18:52:11.204417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e1a7d3f820'
+down_revision = '9b4e2d7f6a10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing documents keep a NULL version, so reextract.py treats them as
+    # outdated. Edits made before this revision left no trace, so existing
+    # questions start out as not manually edited.
+    with op.batch_alter_table('question_documents', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('extractor_version', sa.Integer(), nullable=True))
+
+    with op.batch_alter_table('questions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('extractor_version', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('manually_edited', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+
+def downgrade():
+    with op.batch_alter_table('questions', schema=None) as batch_op:
+        batch_op.drop_column('manually_edited')
+        batch_op.drop_column('extractor_version')
+
+    with op.batch_alter_table('question_documents', schema=None) as batch_op:
+        batch_op.drop_column('extractor_version')
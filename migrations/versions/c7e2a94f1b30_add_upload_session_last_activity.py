@@ -0,0 +1,33 @@
+"""Add last activity time to upload sessions
+
+Revision ID: c7e2a94f1b30
+Revises: b3c8f1d67a04
+Create Date: 2026-10-20 09:41:18.306215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7e2a94f1b30'
+down_revision = 'b3c8f1d67a04'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('upload_sessions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('last_activity_at', sa.DateTime(), nullable=True))
+
+    op.execute('UPDATE upload_sessions SET last_activity_at = COALESCE(completed_at, created_at)')
+
+    with op.batch_alter_table('upload_sessions', schema=None) as batch_op:
+        batch_op.alter_column('last_activity_at', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_index(batch_op.f('ix_upload_sessions_last_activity_at'), ['last_activity_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('upload_sessions', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_upload_sessions_last_activity_at'))
+        batch_op.drop_column('last_activity_at')
@@ -0,0 +1,28 @@
+"""Add extraction stage timings and profiler report
+
+Revision ID: e4a9c27b5d13
+Revises: d8f3b6a41e27
+Create Date: 2026-10-19 22:05:48.316204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a9c27b5d13'
+down_revision = 'd8f3b6a41e27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('question_documents', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('extraction_timings', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('extraction_profile_report', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('question_documents', schema=None) as batch_op:
+        batch_op.drop_column('extraction_profile_report')
+        batch_op.drop_column('extraction_timings')
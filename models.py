@@ -1,3 +1,4 @@
+import json
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
@@ -6,6 +7,10 @@ from flask_login import UserMixin
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        # Keyset pagination on the admin users list
+        db.Index('ix_users_created_at_id', 'created_at', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(256), nullable=False)
@@ -46,8 +51,22 @@ class Department(db.Model):
     # Relationships
     papers = db.relationship('ResearchPaper', backref='dept', lazy=True)
 
+# Normalized paper <-> keyword links; ResearchPaper.keywords keeps the display string
+paper_keywords = db.Table(
+    'paper_keywords',
+    db.Column('paper_id', db.Integer, db.ForeignKey('research_papers.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('keyword_id', db.Integer, db.ForeignKey('keywords.id', ondelete='CASCADE'), primary_key=True),
+    # Exact-match keyword search looks papers up by keyword
+    db.Index('ix_paper_keywords_keyword_id_paper_id', 'keyword_id', 'paper_id')
+)
+
 class ResearchPaper(db.Model):
     __tablename__ = 'research_papers'
+    __table_args__ = (
+        # Keyset pagination on search and the admin papers list
+        db.Index('ix_research_papers_uploaded_at_id', 'uploaded_at', 'id'),
+        db.Index('ix_research_papers_status_uploaded_at_id', 'status', 'uploaded_at', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255), nullable=False)
     authors = db.Column(db.Text, nullable=False)  # Comma-separated or JSON
@@ -59,6 +78,10 @@ class ResearchPaper(db.Model):
     original_filename = db.Column(db.String(255), nullable=False)
     file_path = db.Column(db.String(500), nullable=False)
     file_size = db.Column(db.Integer)
+    # The uploaded file, kept when file_path points at an optimized copy (pdf_optimizer.py)
+    original_file_path = db.Column(db.String(500), nullable=True)
+    original_file_size = db.Column(db.Integer, nullable=True)
+    optimized_at = db.Column(db.DateTime, nullable=True)
     
     # Metadata
     publication_year = db.Column(db.Integer, nullable=False)
@@ -77,6 +100,7 @@ class ResearchPaper(db.Model):
     
     # Relationships
     downloads = db.relationship('DownloadLog', backref='paper', lazy=True)
+    keyword_tags = db.relationship('Keyword', secondary=paper_keywords, backref='papers', lazy=True)
 
 class DownloadLog(db.Model):
     __tablename__ = 'download_logs'
@@ -87,6 +111,94 @@ class DownloadLog(db.Model):
     user_agent = db.Column(db.String(500))
     downloaded_at = db.Column(db.DateTime, default=datetime.now)
 
+class BulkUploadBatch(db.Model):
+    """A set of papers uploaded together with shared metadata."""
+    __tablename__ = 'bulk_upload_batches'
+    
+    # Status constants
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    uploader_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    department_id = db.Column(db.Integer, db.ForeignKey('departments.id'), nullable=False)
+    publication_year = db.Column(db.Integer, nullable=False)
+    
+    # Metadata shared by every file; blank fields are extracted per file
+    title = db.Column(db.String(255))
+    authors = db.Column(db.Text)
+    abstract = db.Column(db.Text)
+    keywords = db.Column(db.Text)
+    
+    status = db.Column(db.String(20), default=STATUS_PENDING)
+    total_files = db.Column(db.Integer, default=0)
+    succeeded_files = db.Column(db.Integer, default=0)
+    failed_files = db.Column(db.Integer, default=0)
+    
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    started_at = db.Column(db.DateTime, nullable=True)
+    completed_at = db.Column(db.DateTime, nullable=True)
+    
+    # Relationships
+    items = db.relationship('BulkUploadItem', backref='batch', lazy=True,
+                            cascade='all, delete-orphan', order_by='BulkUploadItem.id')
+    
+    @property
+    def processed_files(self):
+        return (self.succeeded_files or 0) + (self.failed_files or 0)
+    
+    def get_status_info(self, include_items=False):
+        """Get the batch progress as a dictionary."""
+        info = {
+            'batch_id': self.id,
+            'status': self.status,
+            'total': self.total_files,
+            'processed': self.processed_files,
+            'succeeded': self.succeeded_files,
+            'failed': self.failed_files,
+            'progress': int(100 * self.processed_files / self.total_files) if self.total_files else 100,
+            'is_complete': self.status in [self.STATUS_COMPLETED, self.STATUS_FAILED],
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+        if include_items:
+            info['items'] = [item.get_status_info() for item in self.items]
+        return info
+    
+    def __repr__(self):
+        return f'<BulkUploadBatch {self.id} ({self.status})>'
+
+class BulkUploadItem(db.Model):
+    """One file of a bulk upload and what became of it."""
+    __tablename__ = 'bulk_upload_items'
+    
+    STATUS_PENDING = 'pending'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    batch_id = db.Column(db.Integer, db.ForeignKey('bulk_upload_batches.id', ondelete='CASCADE'),
+                         nullable=False, index=True)
+    original_filename = db.Column(db.String(255), nullable=False)
+    filename = db.Column(db.String(255))
+    file_path = db.Column(db.String(500))
+    file_size = db.Column(db.Integer)
+    status = db.Column(db.String(20), default=STATUS_PENDING)
+    error = db.Column(db.String(255))
+    paper_id = db.Column(db.Integer, db.ForeignKey('research_papers.id', ondelete='SET NULL'), nullable=True)
+    processed_at = db.Column(db.DateTime, nullable=True)
+    
+    def get_status_info(self):
+        return {
+            'id': self.id,
+            'filename': self.original_filename,
+            'status': self.status,
+            'error': self.error,
+            'paper_id': self.paper_id
+        }
+
 class Keyword(db.Model):
     __tablename__ = 'keywords'
     id = db.Column(db.Integer, primary_key=True)
@@ -133,6 +245,9 @@ class Topic(db.Model):
 
 class QuestionDocument(db.Model):
     __tablename__ = 'question_documents'
+    __table_args__ = (
+        db.Index('ix_question_documents_uploaded_at_id', 'uploaded_at', 'id'),
+    )
     
     # Status constants
     STATUS_PENDING = 'pending'
@@ -148,6 +263,10 @@ class QuestionDocument(db.Model):
     original_filename = db.Column(db.String(255), nullable=False)
     file_path = db.Column(db.String(500), nullable=False)
     file_size = db.Column(db.Integer)
+    # The uploaded file, kept when file_path points at an optimized copy (pdf_optimizer.py)
+    original_file_path = db.Column(db.String(500), nullable=True)
+    original_file_size = db.Column(db.Integer, nullable=True)
+    optimized_at = db.Column(db.DateTime, nullable=True)
     subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id'), nullable=False)
     document_type = db.Column(db.String(50), default='question_paper')
     academic_year = db.Column(db.String(20))
@@ -162,10 +281,15 @@ class QuestionDocument(db.Model):
     uploaded_at = db.Column(db.DateTime, default=datetime.now)
     extraction_started_at = db.Column(db.DateTime, nullable=True)
     processed_at = db.Column(db.DateTime, nullable=True)
+    extractor_version = db.Column(db.Integer, nullable=True)  # EXTRACTOR_VERSION of the last extraction
+    extraction_timings = db.Column(db.Text, nullable=True)  # JSON stage timings of the last extraction
+    # Profiler output of the last extraction run with a profiler; only loaded when read
+    extraction_profile_report = db.deferred(db.Column(db.Text, nullable=True))
     uploader_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     
     # Relationships
     questions = db.relationship('Question', backref='document', lazy=True, cascade='all, delete-orphan')
+    uploader = db.relationship('User', backref='question_documents', lazy=True)
     
     def update_status(self, status, message=None, progress=None):
         """Update the extraction status and log the change."""
@@ -183,6 +307,15 @@ class QuestionDocument(db.Model):
         
         db.session.commit()
     
+    def get_timings(self):
+        """Stage timings of the last extraction (see extraction_profile), or None."""
+        if not self.extraction_timings:
+            return None
+        try:
+            return json.loads(self.extraction_timings)
+        except ValueError:
+            return None
+    
     def get_status_info(self):
         """Get the current status information as a dictionary."""
         return {
@@ -203,10 +336,14 @@ class QuestionDocument(db.Model):
 
 class Question(db.Model):
     __tablename__ = 'questions'
+    __table_args__ = (
+        db.Index('ix_questions_created_at_id', 'created_at', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     question_text = db.Column(db.Text, nullable=False)
     question_type = db.Column(db.String(50), default='text')  # text, image, formula, mixed
     difficulty_level = db.Column(db.String(20), default='medium')  # easy, medium, hard
+    difficulty_confidence = db.Column(db.Float, nullable=True)  # set by difficulty.py, None when chosen by hand
     marks = db.Column(db.Integer, default=1)
     
     # Question content
@@ -227,6 +364,10 @@ class Question(db.Model):
     topic_confidence = db.Column(db.Float, default=0.0)
     unit_confidence = db.Column(db.Float, default=0.0)
     
+    # Extraction provenance: re-extraction leaves manually edited questions alone
+    extractor_version = db.Column(db.Integer, nullable=True)
+    manually_edited = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    
     created_at = db.Column(db.DateTime, default=datetime.now)
 
 class GeneratedQuestionPaper(db.Model):
@@ -253,3 +394,80 @@ class GeneratedQuestionPaper(db.Model):
     # Relationships
     generator = db.relationship('User', backref='generated_papers', lazy=True)
     subject = db.relationship('Subject', backref='generated_papers', lazy=True)
+
+class Job(db.Model):
+    """A unit of background work, queued by the web role and run by a worker."""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        # Workers claim the highest-priority runnable job of the kinds they serve
+        db.Index('ix_jobs_status_priority_id', 'status', 'priority', 'id'),
+    )
+    
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON
+    status = db.Column(db.String(20), nullable=False, default=STATUS_QUEUED)
+    priority = db.Column(db.Integer, nullable=False, default=0)  # higher runs first
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100), nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    def get_status_info(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'attempts': self.attempts,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class WorkerHeartbeat(db.Model):
+    """Last sign of life of a worker process, for health checks."""
+    __tablename__ = 'worker_heartbeats'
+    
+    name = db.Column(db.String(100), primary_key=True)  # host:pid
+    role = db.Column(db.String(20), nullable=False)
+    kinds = db.Column(db.String(255), nullable=True)  # comma-separated, empty for all
+    concurrency = db.Column(db.Integer, nullable=False, default=1)
+    running_jobs = db.Column(db.Integer, nullable=False, default=0)
+    completed_jobs = db.Column(db.Integer, nullable=False, default=0)
+    failed_jobs = db.Column(db.Integer, nullable=False, default=0)
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_seen = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class UploadSession(db.Model):
+    """A file being uploaded in chunks; see :mod:`chunked_upload`."""
+    __tablename__ = 'upload_sessions'
+    
+    STATUS_UPLOADING = 'uploading'
+    STATUS_COMPLETE = 'complete'
+    STATUS_ATTACHED = 'attached'  # the file now belongs to a paper or question document
+    STATUS_FAILED = 'failed'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    token = db.Column(db.String(32), unique=True, nullable=False)  # names the upload in URLs
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    purpose = db.Column(db.String(30), nullable=False)  # storage namespace
+    filename = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default=STATUS_UPLOADING)
+    expected_sha256 = db.Column(db.String(64), nullable=True)
+    sha256 = db.Column(db.String(64), nullable=True)
+    storage_key = db.Column(db.String(500), nullable=True)
+    error = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    last_activity_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)  # last chunk
+    completed_at = db.Column(db.DateTime, nullable=True)
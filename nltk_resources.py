@@ -0,0 +1,108 @@
+"""NLTK data for question categorisation.
+
+The data lives in one known directory, ``NLTK_DATA_DIR`` (``nltk_data/``
+next to the code by default), which is put first on NLTK's search path.
+Nothing is downloaded at import or request time. Fetch the data once when
+building the deployment and check it offline:
+
+    python nltk_resources.py --download
+    python nltk_resources.py
+
+NLTK itself is imported on first use, so processes that never categorise
+questions (the web workers) do not load it. If data is missing, that is
+logged once and tokenising falls back to a regular expression.
+"""
+import os
+import re
+import sys
+import logging
+import argparse
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nltk_data')
+
+# Resource name -> path inside the data directory (a folder or a .zip)
+RESOURCES = {
+    'punkt_tab': os.path.join('tokenizers', 'punkt_tab'),
+    'stopwords': os.path.join('corpora', 'stopwords'),
+}
+
+WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+_data_dir = DEFAULT_DATA_DIR
+
+
+def set_data_dir(path):
+    """Use ``path`` as the NLTK data directory (before the first use of NLTK)."""
+    global _data_dir
+    _data_dir = path or DEFAULT_DATA_DIR
+
+
+def missing_resources(data_dir=None):
+    """Names of the resources not present in the data directory. Does not import NLTK."""
+    data_dir = data_dir or _data_dir
+    return [name for name, path in RESOURCES.items()
+            if not os.path.exists(os.path.join(data_dir, path))
+            and not os.path.exists(os.path.join(data_dir, path + '.zip'))]
+
+
+@lru_cache(maxsize=1)
+def _available():
+    missing = missing_resources()
+    if missing:
+        logger.warning("NLTK data missing from %s: %s; run `python nltk_resources.py --download`",
+                       _data_dir, ', '.join(missing))
+    return frozenset(RESOURCES) - frozenset(missing)
+
+
+@lru_cache(maxsize=1)
+def _nltk():
+    import nltk
+    if _data_dir not in nltk.data.path:
+        nltk.data.path.insert(0, _data_dir)
+    return nltk
+
+
+@lru_cache(maxsize=1)
+def english_stopwords():
+    """English stop words, or an empty set when the corpus is missing."""
+    if 'stopwords' not in _available():
+        return frozenset()
+    _nltk()
+    from nltk.corpus import stopwords
+    return frozenset(stopwords.words('english'))
+
+
+def word_tokens(text):
+    """Split ``text`` into word tokens with NLTK's tokenizer when available."""
+    if 'punkt_tab' in _available():
+        return _nltk().word_tokenize(text)
+    return WORD_RE.findall(text)
+
+
+def download(data_dir=None):
+    """Download the required resources into the data directory."""
+    data_dir = data_dir or _data_dir
+    os.makedirs(data_dir, exist_ok=True)
+    import nltk
+    return all(nltk.download(name, download_dir=data_dir, quiet=True) for name in RESOURCES)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check or download the NLTK data used for categorisation.')
+    parser.add_argument('--data-dir', default=os.environ.get('NLTK_DATA_DIR') or DEFAULT_DATA_DIR)
+    parser.add_argument('--download', action='store_true', help='download missing resources first')
+    args = parser.parse_args()
+
+    if args.download and missing_resources(args.data_dir):
+        download(args.data_dir)
+    missing = missing_resources(args.data_dir)
+    for name in RESOURCES:
+        print(f"{name:<10} {'missing' if name in missing else 'ok'}")
+    sys.exit(1 if missing else 0)
+
+
+if __name__ == '__main__':
+    main()
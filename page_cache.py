@@ -0,0 +1,345 @@
+"""Rendered page images for question documents.
+
+Pages are rasterised on demand with ``get_pixmap`` at the scales listed in
+``PAGE_ZOOM_LEVELS`` and cut into ``PAGE_TILE_SIZE`` pixel square tiles.
+Level 0 is small enough that a page fits in one tile, so tile ``(0, 0)`` of
+level 0 is the page thumbnail.
+
+Tiles are written under ``PAGE_CACHE_FOLDER``, keyed by a token derived
+from the PDF's path, size and modification time. Because a changed file
+gets a new token, and with it new URLs, tiles can be served with a
+long-lived ``immutable`` cache header. The folder is kept under
+``PAGE_CACHE_MAX_BYTES`` by deleting the least recently used tiles.
+
+Cold tiles are rendered in a process pool. The request that finds a tile
+missing queues the render and returns straight away (the route answers
+``202 Accepted``), so no request thread waits for a render.
+``PAGE_RENDER_WORKERS = 0`` renders inline instead, which is handy when
+debugging. A web-only process (``PROCESS_ROLE=web``) does not render at all:
+it queues a ``render_page`` job and a worker renders every tile of that
+page and zoom level into the shared folder.
+
+PyMuPDF and PIL are only imported once a page is measured or rendered, so
+they are not loaded when the app starts.
+"""
+import os
+import json
+import math
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import cached_property
+
+from question_figures import image_format
+
+logger = logging.getLogger(__name__)
+
+# Evicting stops once the cache is back under this share of its budget
+EVICT_TO_SHARE = 0.9
+
+# Cache hits refresh a tile's mtime (its LRU position) at most this often
+TOUCH_INTERVAL = 60
+
+# Open documents kept per rendering thread
+OPEN_DOCUMENTS = 4
+
+# A page queued for rendering elsewhere is not queued again for this long
+DISPATCH_INTERVAL = 30
+
+# PyMuPDF documents are not thread-safe, so each thread (a request thread
+# rendering inline, a job thread) opens and closes its own
+_local = threading.local()
+
+
+def source_token(pdf_path):
+    """Short token naming the current contents of ``pdf_path``."""
+    stat = os.stat(pdf_path)
+    key = f'{os.path.realpath(pdf_path)}:{stat.st_size}:{stat.st_mtime_ns}'
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def _open_document(pdf_path, token):
+    """Return an open document, reusing recent ones within this thread."""
+    import fitz  # PyMuPDF
+
+    open_documents = getattr(_local, 'documents', None)
+    if open_documents is None:
+        open_documents = _local.documents = OrderedDict()
+    doc = open_documents.get(token)
+    if doc is None:
+        doc = fitz.open(pdf_path)
+        open_documents[token] = doc
+        while len(open_documents) > OPEN_DOCUMENTS:
+            open_documents.popitem(last=False)[1].close()
+    else:
+        open_documents.move_to_end(token)
+    return doc
+
+
+def _replace_atomically(path, write):
+    """Call ``write(tmp_path)`` and move the result to ``path``.
+
+    Readers never see a partial file, and the temporary name is unique, so
+    threads and processes writing the same file do not collide.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    os.close(fd)
+    try:
+        write(tmp_path)
+        # mkstemp creates the file private to its owner
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def render_tile(job):
+    """Render one tile to disk and return its size in bytes.
+
+    ``job`` is ``(pdf_path, token, page_index, scale, x, y, tile_size,
+    out_path, preferred_format, quality)``.
+    """
+    import fitz  # PyMuPDF
+    from PIL import Image
+
+    pdf_path, token, page_index, scale, x, y, tile_size, out_path, preferred_format, quality = job
+    page = _open_document(pdf_path, token)[page_index]
+
+    step = tile_size / scale
+    clip = fitz.Rect(x * step, y * step, (x + 1) * step, (y + 1) * step) & page.rect
+    if clip.is_empty:
+        raise ValueError(f'Tile {x},{y} is outside page {page_index + 1}')
+    pixmap = page.get_pixmap(matrix=fitz.Matrix(scale, scale), clip=clip, alpha=False)
+    image = Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    pil_format, _ = image_format(preferred_format)
+    if pil_format == 'WEBP':
+        _replace_atomically(out_path, lambda tmp_path: image.save(tmp_path, pil_format, quality=quality, method=4))
+    else:
+        _replace_atomically(out_path, lambda tmp_path: image.save(tmp_path, pil_format, optimize=True))
+    return os.path.getsize(out_path)
+
+
+class PageCache:
+    """Disk cache of page tiles with a background renderer."""
+
+    def __init__(self, folder, max_bytes, workers=0, zoom_levels=(0.25, 1.0, 2.0), tile_size=512,
+                 preferred_format='webp', quality=80):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.zoom_levels = tuple(zoom_levels)
+        self.tile_size = tile_size
+        self.preferred_format = preferred_format
+        self.quality = quality
+
+        self._lock = threading.RLock()
+        self._pending = {}
+        self._dispatched = {}
+        self._executor = None
+        self._size = None
+
+    @cached_property
+    def mimetype(self):
+        return 'image/' + image_format(self.preferred_format)[0].lower()
+
+    @cached_property
+    def extension(self):
+        return image_format(self.preferred_format)[1]
+
+    def _document_dir(self, token):
+        return os.path.join(self.folder, token[:2], token)
+
+    def manifest(self, pdf_path, token=None):
+        """Page sizes and tile grid of ``pdf_path``, cached next to its tiles."""
+        token = token or source_token(pdf_path)
+        path = os.path.join(self._document_dir(token), 'manifest.json')
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+
+        import fitz  # PyMuPDF
+        with fitz.open(pdf_path) as doc:
+            pages = [{'width': round(page.rect.width, 2), 'height': round(page.rect.height, 2)} for page in doc]
+        manifest = {
+            'token': token,
+            'tile_size': self.tile_size,
+            'zoom_levels': list(self.zoom_levels),
+            'pages': pages
+        }
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        def write(tmp_path):
+            with open(tmp_path, 'w') as f:
+                json.dump(manifest, f)
+        _replace_atomically(path, write)
+        return manifest
+
+    def tile_count(self, page, zoom):
+        """Number of tile columns and rows of a page (a manifest entry) at ``zoom``."""
+        scale = self.zoom_levels[zoom]
+        return (math.ceil(page['width'] * scale / self.tile_size),
+                math.ceil(page['height'] * scale / self.tile_size))
+
+    def tile_path(self, token, page_index, zoom, x, y):
+        return os.path.join(self._document_dir(token), f'p{page_index}', f'z{zoom}', f'{x}_{y}{self.extension}')
+
+    def tile(self, pdf_path, token, page_index, zoom, x, y, render=True):
+        """Return the path of a rendered tile, or None while it is being rendered.
+
+        With ``render=False`` a missing tile is left for a worker to render.
+        """
+        path = self.tile_path(token, page_index, zoom, x, y)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            pass
+        else:
+            self._touch(path, stat)
+            return path
+        if not render:
+            return None
+
+        job = (pdf_path, token, page_index, self.zoom_levels[zoom], x, y, self.tile_size,
+               path, self.preferred_format, self.quality)
+        if self.workers <= 0:
+            self._account(render_tile(job))
+            return path
+
+        with self._lock:
+            if path not in self._pending:
+                future = self._submit(job)
+                self._pending[path] = future
+                future.add_done_callback(lambda done: self._finished(path, done))
+        return None
+
+    def should_dispatch(self, token, page_index, zoom):
+        """True if this process has not queued a render of the page recently."""
+        key = (token, page_index, zoom)
+        now = time.monotonic()
+        with self._lock:
+            if now - self._dispatched.get(key, -DISPATCH_INTERVAL) < DISPATCH_INTERVAL:
+                return False
+            self._dispatched = {k: t for k, t in self._dispatched.items() if now - t < DISPATCH_INTERVAL}
+            self._dispatched[key] = now
+        return True
+
+    def render_page(self, pdf_path, token, page_index, zoom):
+        """Render the missing tiles of one page at ``zoom`` inline; returns how many."""
+        columns, rows = self.tile_count(self.manifest(pdf_path, token)['pages'][page_index], zoom)
+        rendered = 0
+        for y in range(rows):
+            for x in range(columns):
+                path = self.tile_path(token, page_index, zoom, x, y)
+                if not os.path.exists(path):
+                    self._account(render_tile((pdf_path, token, page_index, self.zoom_levels[zoom], x, y,
+                                               self.tile_size, path, self.preferred_format, self.quality)))
+                    rendered += 1
+        return rendered
+
+    def _submit(self, job):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        try:
+            return self._executor.submit(render_tile, job)
+        except BrokenProcessPool:
+            logger.warning("Page render pool broke; starting a new one")
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor.submit(render_tile, job)
+
+    def _finished(self, path, future):
+        with self._lock:
+            self._pending.pop(path, None)
+        try:
+            size = future.result()
+        except Exception as e:
+            logger.error("Could not render %s: %s", path, e)
+            return
+        self._account(size)
+
+    def _touch(self, path, stat):
+        """Move a tile to the fresh end of the LRU order."""
+        if stat.st_mtime < time.time() - TOUCH_INTERVAL:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+
+    def _account(self, size):
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan()[0]
+            else:
+                self._size += size
+            over_budget = self._size > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def _scan(self):
+        """Return ``(total bytes, [(mtime, size, path)])`` of the cached tiles."""
+        total = 0
+        entries = []
+        for root, _, files in os.walk(self.folder):
+            for name in files:
+                if name == 'manifest.json' or name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                total += stat.st_size
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return total, entries
+
+    def evict(self):
+        """Delete least recently used tiles until the cache is under budget."""
+        total, entries = self._scan()
+        target = self.max_bytes * EVICT_TO_SHARE
+        removed = 0
+        if total > self.max_bytes:
+            for _, size, path in sorted(entries):
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                total -= size
+                removed += 1
+            logger.info("Evicted %d page tiles, cache now %d bytes", removed, total)
+        with self._lock:
+            self._size = total
+        return removed
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+def install_page_cache(app):
+    """Create the app's :class:`PageCache` from its config."""
+    folder = app.config.get('PAGE_CACHE_FOLDER') or os.path.join(app.instance_path, 'page_cache')
+    app.extensions['page_cache'] = PageCache(
+        folder=folder,
+        max_bytes=app.config['PAGE_CACHE_MAX_BYTES'],
+        workers=app.config['PAGE_RENDER_WORKERS'],
+        zoom_levels=app.config['PAGE_ZOOM_LEVELS'],
+        tile_size=app.config['PAGE_TILE_SIZE'],
+        preferred_format=app.config['PAGE_IMAGE_FORMAT'],
+        quality=app.config['PAGE_IMAGE_QUALITY']
+    )
+    return app.extensions['page_cache']
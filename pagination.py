@@ -0,0 +1,199 @@
+"""Keyset (cursor) pagination for list views.
+
+Offset pagination (``LIMIT n OFFSET k``) has to scan and throw away ``k`` rows
+and ``paginate()`` also runs ``COUNT(*)`` over the whole filtered set, so every
+page is slower than the one before it. Keyset pagination instead remembers the
+``(sort column, id)`` of the last row shown and asks for the rows strictly
+after it, which an index on ``(sort column, id)`` answers directly no matter
+how deep the page is.
+
+Cursors are opaque, URL-safe strings passed around as ``?after=`` and
+``?before=`` query parameters.
+"""
+import json
+import base64
+import logging
+from datetime import date, datetime
+
+from flask import request, url_for
+from sqlalchemy import and_, or_, func
+
+logger = logging.getLogger(__name__)
+
+# Rows counted before the total is reported as "N+" instead of an exact figure
+DEFAULT_COUNT_CAP = 1000
+
+# How trustworthy KeysetPage.total is
+COUNT_EXACT = 'exact'
+COUNT_CAPPED = 'capped'
+COUNT_ESTIMATED = 'estimated'
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor cannot be decoded."""
+
+
+def encode_cursor(values):
+    """Encode a tuple of sort key values as an opaque cursor string."""
+    payload = json.dumps(
+        [v.isoformat() if isinstance(v, (date, datetime)) else v for v in values],
+        separators=(',', ':')
+    )
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    """Decode ``cursor`` back into values typed like ``columns``."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(str(e)) from e
+
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise InvalidCursor('cursor does not match the sort key')
+
+    decoded = []
+    for value, column in zip(values, columns):
+        try:
+            python_type = column.type.python_type
+        except NotImplementedError:
+            python_type = None
+        if value is not None and python_type in (datetime, date):
+            try:
+                value = python_type.fromisoformat(value)
+            except (TypeError, ValueError) as e:
+                raise InvalidCursor(str(e)) from e
+        decoded.append(value)
+    return decoded
+
+
+class KeysetPage:
+    """One page of results plus the cursors needed to move around."""
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None,
+                 total=None, total_accuracy=COUNT_EXACT):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+        self.total_accuracy = total_accuracy
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    @property
+    def total_display(self):
+        """Human readable total, e.g. ``42``, ``1,000+`` or ``about 52,000``."""
+        if self.total is None:
+            return ''
+        if self.total_accuracy == COUNT_CAPPED:
+            return f'{self.total:,}+'
+        if self.total_accuracy == COUNT_ESTIMATED:
+            return f'about {self.total:,}'
+        return f'{self.total:,}'
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _after(columns, values, descending):
+    """Build ``(a, b) < (x, y)`` (or ``>``) without relying on row-value support."""
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [columns[j] == values[j] for j in range(i)]
+        step = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*equal, step))
+    return or_(*clauses)
+
+
+def estimate_count(query, cap=DEFAULT_COUNT_CAP):
+    """Return ``(count, accuracy)`` for ``query`` without a full ``COUNT(*)``.
+
+    PostgreSQL uses the planner's row estimate. Other backends count at most
+    ``cap`` rows, so the cost is bounded no matter how large the result is.
+    """
+    base = query.order_by(None).enable_eagerloads(False)
+    session = query.session
+
+    if session.get_bind().dialect.name == 'postgresql':
+        try:
+            statement = base.statement
+            compiled = statement.compile(dialect=session.get_bind().dialect)
+            plan = session.connection().exec_driver_sql(
+                'EXPLAIN (FORMAT JSON) ' + str(compiled), compiled.params
+            ).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]['Plan']['Plan Rows']), COUNT_ESTIMATED
+        except Exception as e:
+            logger.warning("Falling back to capped count, EXPLAIN failed: %s", e)
+
+    capped = base.limit(cap).subquery()
+    count = session.query(func.count()).select_from(capped).scalar()
+    return count, (COUNT_EXACT if count < cap else COUNT_CAPPED)
+
+
+def keyset_paginate(query, sort_column, id_column, after=None, before=None,
+                    per_page=20, descending=True, with_total=False, count_cap=DEFAULT_COUNT_CAP):
+    """Return a :class:`KeysetPage` of ``query`` ordered by ``(sort_column, id_column)``.
+
+    ``after`` fetches the page following that cursor, ``before`` the page
+    preceding it; with neither the first page is returned. Unreadable cursors
+    are ignored so stale links fall back to the first page.
+    """
+    columns = [sort_column, id_column]
+    total, total_accuracy = estimate_count(query, count_cap) if with_total else (None, COUNT_EXACT)
+
+    backwards = False
+    cursor_values = None
+    for cursor, is_before in ((before, True), (after, False)):
+        if cursor:
+            try:
+                cursor_values = decode_cursor(cursor, columns)
+                backwards = is_before
+                break
+            except InvalidCursor:
+                logger.debug("Ignoring invalid cursor %r", cursor)
+
+    # Walking backwards flips the order; the page is reversed again below
+    scan_descending = descending != backwards
+    if cursor_values is not None:
+        query = query.filter(_after(columns, cursor_values, scan_descending))
+    order = [c.desc() if scan_descending else c.asc() for c in columns]
+    rows = query.order_by(*order).limit(per_page + 1).all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    def key_of(row):
+        return encode_cursor([getattr(row, c.key) for c in columns])
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if backwards:
+            next_cursor = key_of(rows[-1])
+            prev_cursor = key_of(rows[0]) if has_more else None
+        else:
+            next_cursor = key_of(rows[-1]) if has_more else None
+            prev_cursor = key_of(rows[0]) if cursor_values is not None else None
+
+    return KeysetPage(rows, per_page, next_cursor, prev_cursor, total, total_accuracy)
+
+
+def cursor_url(endpoint, **cursor_args):
+    """``url_for`` that keeps the current filters but replaces the cursor."""
+    args = {k: v for k, v in request.args.items() if k not in ('after', 'before', 'page')}
+    args.update({k: v for k, v in cursor_args.items() if v is not None})
+    return url_for(endpoint, **args)
@@ -0,0 +1,261 @@
+"""Single-pass PDF metadata extraction.
+
+Each PDF is opened once and the first few pages are read with
+``page.get_text("dict")``, which gives every line together with its font size,
+weight and position. Title, authors, abstract, keywords and year are then
+derived in one walk over those lines:
+
+* the title is the run of largest-font lines at the top of page one,
+* authors are the byline or list of names between the title and the abstract,
+* abstract and keywords are the text following their headings, up to the
+  next section heading or paragraph break.
+
+Parsed text is cached by file content hash, so re-reading the same upload
+(metadata extraction, then question extraction, then a re-run) costs a hash
+instead of a re-parse.
+
+This module does not import the Flask app so it can run in worker processes.
+PyMuPDF is imported on the first read, not when the app starts.
+"""
+import re
+import hashlib
+import logging
+import threading
+from collections import Counter, OrderedDict, namedtuple
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Pages read for metadata; title, authors and abstract live up front
+MAX_PAGES = 3
+
+# Parsed documents kept in memory, most recently used first out last
+CACHE_SIZE = 128
+
+# A line counts as a title when its font is this much larger than body text
+TITLE_SIZE_RATIO = 1.15
+
+# PyMuPDF span flag for bold text
+FLAG_BOLD = 1 << 4
+
+TextLine = namedtuple('TextLine', 'page block text size bold x0 y0 x1 y1')
+
+ABSTRACT_RE = re.compile(r'^abstract\b[\s:.\-–—]*', re.IGNORECASE)
+KEYWORDS_RE = re.compile(r'^(?:keywords?|key\s+words|index\s+terms)\b[\s:.\-–—]*', re.IGNORECASE)
+SECTION_RE = re.compile(r'^(?:(?:\d+|[IVX]+)\.?\s+)?(?:introduction|background|related\s+work|references)\b'
+                        r'|^\d+(?:\.\d+)*\.?\s+[A-Z]', re.IGNORECASE)
+BYLINE_RE = re.compile(r'^(?:by|authors?)\b[\s:]*(.+)$', re.IGNORECASE)
+NAME_RE = re.compile(r"^[A-Z][a-zA-Z'\-]+\.?(?:\s+[A-Z]\.)*(?:\s+[A-Z][a-zA-Z'\-]+)+$")
+NAME_SEPARATOR_RE = re.compile(r'\s*(?:,|;|\band\b|&)\s*')
+AFFILIATION_MARK_RE = re.compile(r'[\d*†‡]+')
+YEAR_RE = re.compile(r'\b(?:19|20)\d{2}\b')
+TITLE_WORDS = ('analysis', 'study', 'research', 'approach', 'method')
+NOT_TITLE_PREFIXES = ('abstract', 'introduction', 'keywords', 'references')
+
+
+class DocumentText:
+    """The lines of the first pages of a PDF plus its document properties."""
+
+    def __init__(self, digest, properties, page_count, lines):
+        self.digest = digest
+        self.properties = properties
+        self.page_count = page_count
+        self.lines = lines
+        self._metadata = None
+
+        # Body text size: the size most characters are set in
+        sizes = Counter()
+        for line in lines:
+            sizes[line.size] += len(line.text)
+        self.body_size = sizes.most_common(1)[0][0] if sizes else 0
+
+    @property
+    def text(self):
+        return '\n'.join(line.text for line in self.lines)
+
+    @property
+    def metadata(self):
+        if self._metadata is None:
+            self._metadata = derive_metadata(self)
+        return dict(self._metadata)
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def file_digest(file_path):
+    """SHA-256 of the file contents, read in chunks."""
+    with open(file_path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+
+def _read_lines(doc, max_pages):
+    import fitz  # PyMuPDF
+
+    lines = []
+    for page_number in range(min(max_pages, doc.page_count)):
+        page_dict = doc[page_number].get_text('dict', flags=fitz.TEXTFLAGS_TEXT, sort=True)
+        for block_number, block in enumerate(page_dict['blocks']):
+            for line in block.get('lines', ()):
+                spans = [span for span in line['spans'] if span['text'].strip()]
+                if not spans:
+                    continue
+                text = ' '.join(''.join(span['text'] for span in line['spans']).split())
+                size = round(max(span['size'] for span in spans), 1)
+                bold = all(span['flags'] & FLAG_BOLD or 'bold' in span['font'].lower() for span in spans)
+                lines.append(TextLine(page_number, block_number, text, size, bold, *line['bbox']))
+    return lines
+
+
+def read_document(file_path, max_pages=MAX_PAGES):
+    """Return the cached :class:`DocumentText` for ``file_path``."""
+    digest = file_digest(file_path)
+    with _cache_lock:
+        cached = _cache.get(digest)
+        if cached is not None:
+            _cache.move_to_end(digest)
+            return cached
+
+    import fitz  # PyMuPDF
+    with fitz.open(file_path) as doc:
+        properties = {key: (value or '').strip() for key, value in (doc.metadata or {}).items()
+                      if isinstance(value, str) or value is None}
+        document = DocumentText(digest, properties, doc.page_count, _read_lines(doc, max_pages))
+
+    with _cache_lock:
+        _cache[digest] = document
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return document
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+def _names_in(text):
+    """Return ``text`` if it reads as a list of personal names, else ''."""
+    if not 5 < len(text) < 100:
+        return ''
+    parts = [AFFILIATION_MARK_RE.sub('', part).strip() for part in NAME_SEPARATOR_RE.split(text)]
+    parts = [part for part in parts if part]
+    if parts and len(parts) <= 10 and all(NAME_RE.match(part) for part in parts):
+        return text
+    return ''
+
+
+def _fallback_title(text):
+    """Title heuristic for PDFs without a distinct title font."""
+    if (10 < len(text) < 150 and
+            not text.lower().startswith(NOT_TITLE_PREFIXES) and
+            not re.match(r'^\d+\.', text) and
+            re.search(r'[a-zA-Z]', text)):
+        preferred = text.isupper() or text.istitle() or any(word in text.lower() for word in TITLE_WORDS)
+        return text, preferred
+    return None, False
+
+
+def derive_metadata(document):
+    """Derive title, authors, abstract, keywords and year in one pass over the lines."""
+    properties = document.properties
+    metadata = {
+        'title': properties.get('title', ''),
+        'authors': properties.get('author', ''),
+        'keywords': properties.get('keywords', ''),
+        'abstract': '',
+        'publication_year': None
+    }
+
+    first_page = [line for line in document.lines[:200] if line.page == 0]
+    title_size = max((line.size for line in first_page if re.search(r'[a-zA-Z]', line.text)), default=0)
+    has_title_font = title_size >= document.body_size * TITLE_SIZE_RATIO
+
+    title_lines = []
+    title_done = bool(metadata['title'])
+    fallback_title = preferred_title = None
+    abstract_lines = []
+    keyword_lines = []
+    section = None
+    section_block = None
+    seen_abstract = False
+    years = []
+    current_year = datetime.now().year
+
+    for index, line in enumerate(document.lines):
+        text = line.text
+        years.extend(int(year) for year in YEAR_RE.findall(text))
+
+        # Abstract and keywords: a heading starts a section, the next
+        # heading or paragraph break ends it
+        heading = KEYWORDS_RE.match(text)
+        if heading:
+            section, section_block = 'keywords', None
+        else:
+            heading = ABSTRACT_RE.match(text)
+            if heading:
+                section, section_block = 'abstract', None
+                seen_abstract = True
+        if heading:
+            text = text[heading.end():]
+            if not text:
+                continue
+        elif section and (SECTION_RE.match(text) or (section_block is not None and line.block != section_block)):
+            section = None
+
+        if section:
+            section_block = line.block
+            (abstract_lines if section == 'abstract' else keyword_lines).append(text)
+            continue
+
+        if line.page != 0 or seen_abstract:
+            continue
+
+        # Title: the first run of lines set in the largest font on page one
+        if not title_done:
+            if has_title_font:
+                if line.size == title_size:
+                    title_lines.append(text)
+                    continue
+                if title_lines:
+                    title_done = True
+            elif index < 15 and not preferred_title:
+                candidate, preferred = _fallback_title(text)
+                if candidate and (preferred or (not fallback_title and len(candidate) > 20)):
+                    fallback_title = candidate
+                    preferred_title = candidate if preferred else None
+                    continue
+
+        # Authors: a byline or a list of names after the title
+        if not metadata['authors'] and (title_lines or fallback_title or metadata['title']):
+            byline = BYLINE_RE.match(text)
+            metadata['authors'] = byline.group(1) if byline and 5 < len(byline.group(1)) < 100 else _names_in(text)
+
+    if not metadata['title']:
+        metadata['title'] = ' '.join(title_lines) or fallback_title or ''
+
+    abstract = ' '.join(abstract_lines)
+    if 50 < len(abstract) < 2000:
+        metadata['abstract'] = abstract
+
+    if not metadata['keywords']:
+        keywords = ' '.join(keyword_lines)
+        if 10 < len(keywords) < 300:
+            metadata['keywords'] = keywords
+
+    years = [year for year in years if 1990 <= year <= current_year]
+    if years:
+        # Prefer years closer to current year for recent research
+        metadata['publication_year'] = max(years)
+
+    # Clean up extracted data
+    for key, value in metadata.items():
+        if isinstance(value, str):
+            metadata[key] = re.sub(r'\s+', ' ', value).strip()
+    return metadata
+
+
+def extract_metadata(file_path):
+    """Return title, authors, keywords, abstract and publication_year of a PDF."""
+    return read_document(file_path).metadata
@@ -0,0 +1,267 @@
+"""Smaller copies of uploaded PDFs.
+
+Scanned exam papers often embed every page as a 300-600 DPI image and are
+many times larger than they need to be; each download and page render pays
+for that. With ``PDF_OPTIMIZE_ENABLED``, every uploaded paper and question
+document is queued as a low-priority ``optimize_pdfs`` job that rewrites the
+file with PyMuPDF:
+
+* images shown at more than ``PDF_OPTIMIZE_IMAGE_DPI`` are resampled to
+  ``PDF_OPTIMIZE_TARGET_DPI`` and stored as JPEG, where that is smaller;
+  masks, transparent and 1-bit images are left alone,
+* unused and duplicate objects are dropped, streams and fonts compressed
+  and objects packed into object streams,
+* the file is linearised ("fast web view") when the MuPDF build still can;
+  MuPDF 1.26.1 (the version tested) refuses with "Linearisation is no longer
+  supported". Downloads are served with HTTP range support either way, so
+  viewers can fetch the first page early.
+
+The copy is stored under a new key and replaces ``file_path`` only if it is
+at least ``PDF_OPTIMIZE_MIN_SAVING`` percent smaller. The uploaded file stays
+in storage; ``original_file_path`` and ``original_file_size`` keep it, so the
+saving of a row is ``original_file_size - file_size``. Every row is tried
+once (``optimized_at``). Files still under absolute paths are skipped until
+:mod:`storage_migration` has moved them.
+
+Rewrites run in a pool of ``PDF_OPTIMIZE_WORKERS`` processes
+(0 rewrites in the job thread). Rows uploaded before optimization was turned
+on are queued from the admin dashboard, or:
+
+    python pdf_optimizer.py --limit 100
+"""
+import os
+import logging
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+
+from flask import current_app
+from sqlalchemy import func
+
+import jobs
+from app import db
+from models import BulkUploadItem, QuestionDocument, ResearchPaper
+from storage import PAPERS, QUESTION_DOCUMENTS, get_storage
+
+logger = logging.getLogger(__name__)
+
+# Files rewritten between commits
+BATCH_SIZE = 20
+
+SAVE_OPTIONS = {'garbage': 4, 'deflate': True, 'deflate_images': True, 'deflate_fonts': True}
+
+
+@lru_cache(maxsize=1)
+def linearization_supported():
+    """Whether this MuPDF build still writes linearised files."""
+    # PyMuPDF is only loaded by processes that rewrite PDFs
+    import fitz  # PyMuPDF
+
+    with fitz.open() as doc:
+        doc.new_page()
+        try:
+            doc.tobytes(linear=True)
+        except Exception:
+            return False
+    return True
+
+
+def image_resolutions(doc):
+    """``{xref: (dpi, page_number)}`` of the lowest resolution each image is shown at."""
+    resolutions = {}
+    for page in doc:
+        for info in page.get_image_info(xrefs=True):
+            xref = info['xref']
+            x0, y0, x1, y1 = info['bbox']
+            if xref <= 0 or min(x1 - x0, y1 - y0) < 1:
+                continue
+            # Longest sides, so rotated placements compare the right edges
+            dpi = max(info['width'], info['height']) * 72 / max(x1 - x0, y1 - y0)
+            if xref not in resolutions or dpi < resolutions[xref][0]:
+                resolutions[xref] = (dpi, page.number)
+    return resolutions
+
+
+def resample_image(doc, page, xref, scale, quality):
+    """Replace image ``xref`` by a JPEG ``scale`` times its size; returns the bytes saved."""
+    if doc.xref_get_key(xref, 'SMask')[0] != 'null' or doc.xref_get_key(xref, 'ImageMask')[1] == 'true' \
+            or doc.xref_get_key(xref, 'BitsPerComponent')[1] == '1':
+        return 0
+    import fitz  # PyMuPDF
+    pixmap = fitz.Pixmap(doc, xref)
+    if pixmap.alpha or pixmap.colorspace is None:
+        return 0
+    if pixmap.colorspace.n > 3:
+        pixmap = fitz.Pixmap(fitz.csRGB, pixmap)
+    smaller = fitz.Pixmap(pixmap, max(1, round(pixmap.width * scale)), max(1, round(pixmap.height * scale)), None)
+    data = smaller.tobytes('jpeg', jpg_quality=quality)
+    before = len(doc.xref_stream_raw(xref))
+    if len(data) >= before:
+        return 0
+    page.replace_image(xref, stream=data)
+    return before - len(data)
+
+
+def optimize_pdf(job):
+    """Write an optimized copy of a PDF; returns what was done, or None for a PDF that cannot be rewritten.
+
+    ``job`` is ``(source_path, target_path, image_dpi, target_dpi, quality)``.
+    """
+    import fitz  # PyMuPDF
+
+    source_path, target_path, image_dpi, target_dpi, quality = job
+    with fitz.open(source_path) as doc:
+        if doc.needs_pass:
+            return None
+        resampled = 0
+        if image_dpi and quality:
+            for xref, (dpi, page_number) in image_resolutions(doc).items():
+                if dpi <= image_dpi:
+                    continue
+                try:
+                    if resample_image(doc, doc[page_number], xref, target_dpi / dpi, quality):
+                        resampled += 1
+                except Exception as e:
+                    logger.debug("Left image %s of %s as it is: %s", xref, source_path, e)
+
+        linear = linearization_supported()
+        if linear:
+            doc.save(target_path, linear=True, **SAVE_OPTIONS)
+        else:
+            doc.save(target_path, use_objstms=1, **SAVE_OPTIONS)
+    return {'size': os.path.getsize(target_path), 'images': resampled, 'linearized': linear}
+
+
+def _optimization_job(config, source_path, target_path):
+    return (source_path, target_path, config.get('PDF_OPTIMIZE_IMAGE_DPI', 200),
+            config.get('PDF_OPTIMIZE_TARGET_DPI', 150), config.get('PDF_OPTIMIZE_JPEG_QUALITY', 80))
+
+
+def optimized_key(storage, namespace, file_path):
+    stem = os.path.splitext(file_path.rsplit('/', 1)[-1])[0]
+    return storage.key_for(namespace, f'{stem}.optimized.pdf')
+
+
+def _pending(model):
+    return model.query.filter(model.optimized_at.is_(None), ~model.file_path.like('/%'))
+
+
+def count_pending_rows():
+    return sum(_pending(model).count() for model in (ResearchPaper, QuestionDocument))
+
+
+def pending_rows(model, ids=None, limit=None):
+    """Rows of ``model`` (or of ``ids``) not optimized yet, oldest first."""
+    query = _pending(model)
+    if ids is not None:
+        query = query.filter(model.id.in_(ids))
+    query = query.order_by(model.id)
+    return query.limit(limit).all() if limit else query.all()
+
+
+def optimization_savings():
+    """``(rows optimized, bytes saved)`` over papers and question documents."""
+    rows = saved = 0
+    for model in (ResearchPaper, QuestionDocument):
+        count, total = db.session.query(func.count(model.id), func.sum(model.original_file_size - model.file_size))\
+            .filter(model.original_file_path.isnot(None)).one()
+        rows += count
+        saved += total or 0
+    return rows, saved
+
+
+def queue_optimization(paper_ids=(), document_ids=()):
+    """Queue the rewrite of new uploads when optimization is on."""
+    if not current_app.config.get('PDF_OPTIMIZE_ENABLED') or not (paper_ids or document_ids):
+        return None
+    # Below extraction, so a new document's questions come first
+    return jobs.enqueue(jobs.OPTIMIZE_PDFS, {'paper_ids': list(paper_ids), 'document_ids': list(document_ids)},
+                        priority=-5)
+
+
+def _apply(storage, row, namespace, result, temp_path, min_saving, totals):
+    original_size = storage.size(row.file_path)
+    row.optimized_at = datetime.now()
+    if result is None or result['size'] > original_size * (100 - min_saving) / 100:
+        totals['kept'] += 1
+        return
+
+    key = optimized_key(storage, namespace, row.file_path)
+    storage.save_file(temp_path, key)
+    if isinstance(row, ResearchPaper):
+        BulkUploadItem.query.filter_by(file_path=row.file_path).update({'file_path': key},
+                                                                      synchronize_session=False)
+    row.original_file_path = row.file_path
+    row.original_file_size = original_size
+    row.file_path = key
+    row.file_size = result['size']
+    totals['optimized'] += 1
+    totals['saved_bytes'] += original_size - result['size']
+    totals['images'] += result['images']
+    logger.info("Optimized %s %s: %d -> %d bytes, %d images resampled", row.__tablename__, row.id,
+                original_size, result['size'], result['images'])
+
+
+def run_optimization(app, paper_ids=None, document_ids=None, limit=None):
+    """Optimize the given rows, or every row not tried yet; returns the totals."""
+    totals = {'optimized': 0, 'kept': 0, 'failed': 0, 'saved_bytes': 0, 'images': 0}
+    everything = paper_ids is None and document_ids is None
+    workers = app.config.get('PDF_OPTIMIZE_WORKERS', 1)
+    min_saving = app.config.get('PDF_OPTIMIZE_MIN_SAVING', 5)
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 0 else None
+    try:
+        with app.app_context():
+            storage = get_storage(app)
+            for model, namespace, ids in ((ResearchPaper, PAPERS, paper_ids),
+                                          (QuestionDocument, QUESTION_DOCUMENTS, document_ids)):
+                if not everything and not ids:
+                    continue
+                rows = pending_rows(model, None if everything else ids, limit)
+                for start in range(0, len(rows), BATCH_SIZE):
+                    _optimize_batch(app, storage, rows[start:start + BATCH_SIZE], namespace, executor,
+                                    min_saving, totals)
+            db.session.remove()
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+    return totals
+
+
+def _optimize_batch(app, storage, rows, namespace, executor, min_saving, totals):
+    temp_dir = tempfile.mkdtemp(prefix='pdf-optimize-')
+    try:
+        pending = []
+        for row in rows:
+            job = _optimization_job(app.config, storage.local_path(row.file_path),
+                                    os.path.join(temp_dir, f'{row.id}.pdf'))
+            pending.append((row, job, executor.submit(optimize_pdf, job) if executor else None))
+
+        for row, job, future in pending:
+            try:
+                result = future.result() if future else optimize_pdf(job)
+                _apply(storage, row, namespace, result, job[1], min_saving, totals)
+            except Exception as e:
+                logger.error("Could not optimize %s %s: %s", row.__tablename__, row.id, e)
+                row.optimized_at = datetime.now()
+                totals['failed'] += 1
+        db.session.commit()
+    finally:
+        for name in os.listdir(temp_dir):
+            os.remove(os.path.join(temp_dir, name))
+        os.rmdir(temp_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--limit', type=int, help='optimize at most this many files of each kind')
+    args = parser.parse_args()
+
+    from app import app
+    totals = run_optimization(app, limit=args.limit)
+    print(', '.join(f'{key}: {value}' for key, value in totals.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+"""Live progress of question extraction and bulk uploads over Socket.IO.
+
+A page joins a room by emitting ``subscribe`` with ``{'document_id': id}``
+(room ``doc_<id>``) or ``{'batch_id': id}`` (room ``bulk_<id>``). Only the
+uploader or an admin may join, and anonymous sockets are refused on connect.
+The joining socket is sent the last known state straight away, so a page
+that reconnects catches up without a request to the status endpoint.
+
+Producers publish through :func:`publish_document` and :func:`publish_batch`.
+Progress events for a room go out at most once per
+``PROGRESS_EMIT_INTERVAL`` seconds; a change of status (and so the final
+event) is always sent at once. Every event carries ``ts`` so a client can
+ignore anything older than the state it already shows.
+
+Jobs running in a separate worker process reach the browsers through
+``SOCKETIO_MESSAGE_QUEUE`` when one is configured. Without it only a process
+running every role can push, and pages fall back to polling.
+
+Deployments that cannot run Socket.IO use server-sent events instead
+(``PROGRESS_TRANSPORT = 'sse'``): :func:`event_response` streams the same
+events to an ``EventSource`` from an in-process subscription to the room.
+A stream opens with the current state and closes after the final one. While
+nothing is published it re-reads the state from the database every
+``SSE_HEARTBEAT_SECONDS``, which also picks up jobs run by other processes,
+and otherwise sends a heartbeat comment to keep proxies from timing out.
+After ``SSE_MAX_SECONDS`` the stream ends and the browser reconnects.
+"""
+import json
+import time
+import queue
+import logging
+import threading
+
+from flask import Response, current_app, stream_with_context
+from flask_login import current_user
+from flask_socketio import emit, join_room, leave_room
+from sqlalchemy import func
+
+from app import db, socketio
+from models import BulkUploadBatch, Question, QuestionDocument
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_EVENT = 'status_update'
+BATCH_EVENT = 'bulk_upload_progress'
+
+# Milliseconds an EventSource waits before reconnecting
+SSE_RETRY_MS = 3000
+
+# room -> (monotonic time of the last emit, latest state)
+_rooms = {}
+# room -> queues of the event streams open in this process
+_listeners = {}
+_lock = threading.Lock()
+
+
+def document_state(doc, question_count=None):
+    """Status of a question document as sent to its room."""
+    if question_count is None:
+        question_count = db.session.query(func.count(Question.id))\
+            .filter(Question.document_id == doc.id).scalar()
+    state = doc.get_status_info()
+    state.update(document_id=doc.id, question_count=question_count)
+    return state
+
+
+def _publish(event, room, state):
+    """Emit ``state`` to ``room`` unless the room got a progress event very recently."""
+    interval = current_app.config.get('PROGRESS_EMIT_INTERVAL', 0.5)
+    now = time.monotonic()
+    state['ts'] = time.time()
+    final = state.get('is_complete') or state.get('is_failed')
+    with _lock:
+        sent_at, last = _rooms.get(room, (None, None))
+        due = (last is None or last.get('status') != state.get('status')
+               or now - sent_at >= interval or final)
+        if final:
+            # Later subscribers read the final state from the database
+            _rooms.pop(room, None)
+        else:
+            _rooms[room] = (now if due else sent_at, state)
+        if due:
+            for listener in _listeners.get(room, ()):
+                _offer(listener, state)
+    if not due:
+        return False
+    try:
+        socketio.emit(event, state, room=room)
+    except Exception as e:
+        logger.error("Error sending %s to %s: %s", event, room, e)
+    return True
+
+
+def publish_document(doc, question_count=None):
+    """Push the progress of a question document; returns False if throttled."""
+    return _publish(DOCUMENT_EVENT, f'doc_{doc.id}', document_state(doc, question_count))
+
+
+def publish_batch(batch):
+    """Push the progress of a bulk upload batch; returns False if throttled."""
+    return _publish(BATCH_EVENT, f'bulk_{batch.id}', batch.get_status_info())
+
+
+def _offer(listener, state):
+    """Hand ``state`` to a stream; a slow stream only needs the newest state."""
+    try:
+        listener.put_nowait(state)
+    except queue.Full:
+        try:
+            listener.get_nowait()
+        except queue.Empty:
+            pass
+        listener.put_nowait(state)
+
+
+def _latest(room):
+    with _lock:
+        entry = _rooms.get(room)
+    return dict(entry[1]) if entry else None
+
+
+def _may_watch(uploader_id):
+    return current_user.is_admin or uploader_id == current_user.id
+
+
+@socketio.on('connect')
+def on_connect(auth=None):
+    # Returning False refuses the connection
+    return current_user.is_authenticated
+
+
+@socketio.on('subscribe')
+def on_subscribe(data):
+    """Join the room of a document or batch and receive its current state."""
+    data = data or {}
+    try:
+        if data.get('document_id') is not None:
+            model, prefix, event = QuestionDocument, 'doc', DOCUMENT_EVENT
+            target_id = int(data['document_id'])
+        elif data.get('batch_id') is not None:
+            model, prefix, event = BulkUploadBatch, 'bulk', BATCH_EVENT
+            target_id = int(data['batch_id'])
+        else:
+            return {'error': 'document_id or batch_id required'}
+    except (TypeError, ValueError):
+        return {'error': 'Invalid id'}
+    target = db.session.get(model, target_id)
+    if target is None or not _may_watch(target.uploader_id):
+        return {'error': 'Not found'}
+
+    room = f'{prefix}_{target_id}'
+    join_room(room)
+    state = _latest(room)
+    if state is None:
+        state = document_state(target) if event == DOCUMENT_EVENT else target.get_status_info()
+        state['ts'] = time.time()
+    emit(event, state)
+    return {'room': room}
+
+
+@socketio.on('unsubscribe')
+def on_unsubscribe(data):
+    data = data or {}
+    if data.get('document_id') is not None:
+        leave_room(f'doc_{data["document_id"]}')
+    elif data.get('batch_id') is not None:
+        leave_room(f'bulk_{data["batch_id"]}')
+
+
+def _is_final(state):
+    return bool(state.get('is_complete') or state.get('is_failed'))
+
+
+def _same(a, b):
+    return {k: v for k, v in a.items() if k != 'ts'} == {k: v for k, v in b.items() if k != 'ts'}
+
+
+def _sse(event, state):
+    return f"event: {event}\nid: {state['ts']}\ndata: {json.dumps(state)}\n\n"
+
+
+def _event_stream(room, event, load_state, heartbeat, max_seconds):
+    listener = queue.Queue(maxsize=1)
+    with _lock:
+        _listeners.setdefault(room, set()).add(listener)
+    try:
+        yield f'retry: {SSE_RETRY_MS}\n\n'
+        last = _latest(room) or load_state()
+        last.setdefault('ts', time.time())
+        yield _sse(event, last)
+
+        deadline = time.monotonic() + max_seconds
+        while not _is_final(last) and time.monotonic() < deadline:
+            try:
+                state = listener.get(timeout=heartbeat)
+            except queue.Empty:
+                # Nothing published in this process; the job may run elsewhere
+                state = load_state()
+                state['ts'] = time.time()
+                if _same(state, last):
+                    yield ': heartbeat\n\n'
+                    continue
+            last = state
+            yield _sse(event, state)
+    finally:
+        with _lock:
+            listeners = _listeners.get(room)
+            if listeners is not None:
+                listeners.discard(listener)
+                if not listeners:
+                    del _listeners[room]
+
+
+def event_response(room, event, load_state):
+    """A ``text/event-stream`` response following ``room``.
+
+    ``load_state`` reads the current state from the database; it is called
+    when the stream opens and whenever it has been quiet for a heartbeat.
+    """
+    def load():
+        try:
+            return load_state()
+        finally:
+            # Do not hold a pooled connection between heartbeats
+            db.session.close()
+
+    stream = _event_stream(room, event, load,
+                           current_app.config.get('SSE_HEARTBEAT_SECONDS', 15),
+                           current_app.config.get('SSE_MAX_SECONDS', 300))
+    response = Response(stream_with_context(stream), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx: pass events straight through
+    return response
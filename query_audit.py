@@ -0,0 +1,135 @@
+"""SQL statement auditing.
+
+Counts (and times) every statement issued through the app's engines while a
+:class:`QueryRecorder` is active. A recorder is opened automatically for each
+request when ``QUERY_AUDIT_ENABLED`` is set, and can be opened explicitly with
+:func:`record_queries` from tests, benchmarks and background jobs.
+
+Views declare how many statements they are allowed to issue with the
+:func:`query_budget` decorator; requests that go over budget are logged and
+the test suite asserts the budgets route by route.
+"""
+import time
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import request, current_app
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+_current_recorder = ContextVar('query_recorder', default=None)
+
+
+class QueryRecorder:
+    """Collects the statements executed while it is active."""
+
+    def __init__(self, keep_statements=True):
+        self.keep_statements = keep_statements
+        self.count = 0
+        self.total_time = 0.0
+        self.statements = []
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.total_time += duration
+        if self.keep_statements:
+            self.statements.append((statement, duration))
+
+    def __repr__(self):
+        return f'<QueryRecorder {self.count} statements, {self.total_time * 1000:.1f} ms>'
+
+
+@contextmanager
+def record_queries(keep_statements=True):
+    """Record every SQL statement executed inside the ``with`` block."""
+    recorder = QueryRecorder(keep_statements)
+    token = _current_recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current_recorder.reset(token)
+
+
+def current_recorder():
+    """Return the active recorder, or None."""
+    return _current_recorder.get()
+
+
+def start_recording(keep_statements=True):
+    """Make a new recorder active; returns the token :func:`stop_recording` takes."""
+    return _current_recorder.set(QueryRecorder(keep_statements))
+
+
+def stop_recording(token):
+    _current_recorder.reset(token)
+
+
+def query_budget(max_statements):
+    """Declare the maximum number of SQL statements a view may issue."""
+    def decorator(f):
+        f.query_budget = max_statements
+        return f
+    return decorator
+
+
+def budget_for(endpoint):
+    """Return the declared statement budget for ``endpoint`` (None if unset)."""
+    view = current_app.view_functions.get(endpoint)
+    return getattr(view, 'query_budget', None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_recorder.get() is not None:
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    recorder = _current_recorder.get()
+    if recorder is not None:
+        starts = conn.info.get('query_start')
+        duration = time.perf_counter() - starts.pop() if starts else 0.0
+        recorder.record(statement, duration)
+
+
+def install_query_audit(app, db):
+    """Hook the statement counters into every engine and request."""
+    with app.app_context():
+        engines = list(db.engines.values())
+
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+    if not app.config.get('QUERY_AUDIT_ENABLED'):
+        return
+
+    @app.before_request
+    def _start_query_audit():
+        request.environ['query_audit.token'] = _current_recorder.set(QueryRecorder())
+
+    @app.after_request
+    def _finish_query_audit(response):
+        recorder = _current_recorder.get()
+        if recorder is None:
+            return response
+
+        response.headers['X-SQL-Query-Count'] = str(recorder.count)
+        response.headers['X-SQL-Query-Time-Ms'] = f'{recorder.total_time * 1000:.2f}'
+
+        budget = budget_for(request.endpoint)
+        if budget is not None and recorder.count > budget:
+            logger.warning(
+                "Query budget exceeded for %s: %d statements (budget %d)",
+                request.endpoint, recorder.count, budget
+            )
+            for statement, duration in recorder.statements:
+                logger.debug("  %.2f ms  %s", duration * 1000, statement)
+        return response
+
+    @app.teardown_request
+    def _reset_query_audit(exc=None):
+        token = request.environ.pop('query_audit.token', None)
+        if token is not None:
+            _current_recorder.reset(token)
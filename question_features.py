@@ -0,0 +1,198 @@
+"""Question type, formula, diagram and difficulty cues from one scan of the text.
+
+Every keyword list the classification heuristics use (question type cues,
+mathematical words and symbols, diagram and shape words, the difficulty
+verbs) is a group of one :class:`keyword_matcher.KeywordMatcher`, built
+once. :func:`scan_question` walks the lower-cased question once and gets
+the hits of every group, its feature vector; the question type, formula and
+diagram flags and the difficulty verb counts are all read from it.
+
+Cues that are not plain keywords stay regular expressions, but only run
+when a keyword or character they need was hit: ``FORMULA_PATTERN`` when the
+text holds an operator, digit or markup character, ``DIAGRAM_PATTERN`` when
+it names a figure but no diagram word decided it already, and so on. The
+results are those of the regular expressions alone.
+"""
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+
+from keyword_matcher import ANYWHERE, START, WORD, KeywordMatcher
+
+# Mathematical content; any alternative matching marks a formula
+FORMULA_PATTERN = re.compile('|'.join(f'(?:{pattern})' for pattern in (
+    # Basic math symbols
+    r'[∑∫∂∆√∛∜∞≤≥≠≈≡±×÷∈∉⊆⊂∪∩∅]|\\[a-zA-Z]+|\^[0-9a-zA-Z{}()]+|_[0-9a-zA-Z{}()]+',
+    r'\b(?:sin|cos|tan|cot|sec|csc|log|ln|exp|sqrt|integral|derivative|lim|sum|prod|int|iint|iiint)\b',
+    r'\$[^$]+\$',  # LaTeX inline math
+    r'\\\(.*?\\\)|\\\[.*?\\\]',  # LaTeX display math
+    r'\b(?:eq\.?|equation|formula|theorem|proof|corollary|lemma|proposition)\b',
+    r'[a-zA-Z]\s*[=≠≈]\s*[a-zA-Z0-9+\-*/^()]+',  # Equations like x = 2y + 3
+    r'\d+\s*[a-zA-Zα-ωΑ-Ω]\b',  # Variables with coefficients
+    r'[a-zA-Z]\s*[+\-*/^]\s*[a-zA-Z0-9()]',  # Basic operations with variables
+    r'\b(?:if|then|therefore|because|since|given|let|assume|suppose|consider)\b.*?[=≠≈<>]',  # Conditional math
+    r'[a-zA-Z]\s*[{}]\s*[=:]',  # Set notation or function definitions
+)), re.IGNORECASE | re.DOTALL)
+
+# Diagrams, figures, coordinates and shapes
+DIAGRAM_PATTERN = re.compile('|'.join(f'(?:{pattern})' for pattern in (
+    r'\b(?:diagram|figure|draw|sketch|illustration|graph|chart|plot|image|picture|schematic|blueprint|map)\b',
+    r'\blabel\s*(?:the|each|all|any|every|some|these|those|following|below|above|on|in|at|for|with|of)?\s*',
+    r'\b(?:show|indicate|mark|identify|point out|highlight|circle|box|shade|color|colour|outline|trace|plot)\b.*\b(on|in|at|for|with|of)\b.*\b(diagram|figure|graph|chart|image|picture|drawing|illustration)',
+    r'\b(refer|according|see|based on|using|use|given|following|shown|displayed|illustrated|depicted|represented)\b.*\b(diagram|figure|graph|chart|image|picture|drawing|illustration)',
+    r'\b(diagram|figure|graph|chart|image|picture|drawing|illustration)\s*[0-9]*\s*(?:shows|showing|illustrates|depicts|represents|demonstrates|presents|displays|contains|includes)',
+    r'\b(?:as|like|similar to|resembling|in the style of|in the form of|in the shape of|in the pattern of)\b.*\b(diagram|figure|graph|chart|image|picture|drawing|illustration)',
+    r'\b(?:with|having|containing|including|featuring|showing|displaying|illustrating|depicting|representing|demonstrating|presenting)\b.*\b(diagram|figure|graph|chart|image|picture|drawing|illustration)',
+    # Coordinate system references
+    r'\b(?:x-?axis|y-?axis|origin|coordinate\s*system|grid|axes|quadrant|abscissa|ordinate)\b',
+    # Geometric shape references
+    r'\b(?:point|line|segment|ray|angle|triangle|square|rectangle|circle|ellipse|polygon|polyhedron|prism|pyramid|cylinder|cone|sphere|cube|rhombus|trapezoid|parallelogram|pentagon|hexagon|octagon|dodecagon|tetrahedron|octahedron|dodecahedron|icosahedron|ellipsoid|hyperboloid|paraboloid|torus)\b',
+)), re.IGNORECASE)
+
+# Cues of determine_question_type that need more than a keyword
+ROMAN_OPTION_PATTERN = re.compile(r'\([ivx]+\)')
+MATCHING_PATTERN = re.compile(r'match\s+(?:column|the following|items?|pairs?|statements?)'
+                              r'|column\s+(a|i).*column\s+(b|ii)', re.DOTALL)
+FILL_PATTERN = re.compile(r'\bfill\s*(?:in|the\s*blank)')
+BLANK_PATTERN = re.compile(r'\b_+\b')
+ANSWER_PATTERN = re.compile(r'\b(?:write|provide|give|state)\s+(?:the|a)?\s*[^\n?]*\?')
+PROOF_PATTERN = re.compile(r'\b(?:prove|show)\s+(?:that\s+)?[A-Z]')
+GIVEN_PATTERN = re.compile(r'\bgiven\s+(?:that\s+)?[A-Z]')
+
+# Bloom-style command verbs and phrases per level
+DIFFICULTY_VERBS = {
+    'easy': ['define', 'list', 'identify', 'name', 'recall', 'state', 'match', 'label', 'what is', 'what are',
+             'which', 'mention', 'give', 'write down', 'select', 'choose', 'outline'],
+    'medium': ['explain', 'describe', 'summarize', 'summarise', 'classify', 'compare', 'contrast', 'illustrate',
+               'differentiate', 'distinguish', 'discuss', 'convert', 'trace', 'write', 'implement', 'demonstrate',
+               'how would', 'how does', 'why'],
+    'hard': ['analyze', 'analyse', 'evaluate', 'justify', 'critique', 'design', 'formulate', 'prove', 'derive',
+             'optimize', 'optimise', 'assess', 'construct', 'develop', 'devise', 'propose', 'critically'],
+}
+
+FIGURE_WORDS = ('diagram', 'figure', 'graph', 'chart', 'image', 'picture', 'drawing', 'illustration')
+
+# (group, keywords, where a hit must start and end), one matcher for all
+KEYWORD_GROUPS = (
+    # Question types, in the order determine_question_type tries them
+    ('choice_word', ('true', 'false', 't', 'f'), WORD),
+    ('choice_letter', ('a)', 'b)', 'c)', 'd)', 'e)'), START),
+    ('true_false_cue', ('circle', 'select', 'choose', 'tick', 'mark'), ANYWHERE),
+    ('matching_cue', ('match', 'column'), ANYWHERE),
+    ('complete', ('complete',), START),
+    ('fill', ('fill',), START),
+    ('answer_verb', ('write', 'provide', 'give', 'state'), START),
+    ('calculation_cue', ('calculate', 'compute', 'solve for', 'find', 'determine', 'evaluate', 'simplify'),
+     ANYWHERE),
+    ('quantity_question', ('what is', 'what are', 'how much', 'how many', 'how long', 'how far', 'how fast',
+                           'how tall', 'how wide', 'how high'), WORD),
+    ('proof_cue', ('prove', 'show that', 'demonstrate', 'verify', 'derive'), ANYWHERE),
+    ('show', ('show',), START),
+    ('case_cue', ('case study', 'case of', 'scenario', 'situation'), ANYWHERE),
+    ('given', ('given',), START),
+    ('essay_cue', ('discuss', 'analyze', 'critique', 'evaluate', 'justify', 'examine', 'explore', 'elaborate',
+                   'compare and contrast'), ANYWHERE),
+    ('short_cue', ('what', 'when', 'where', 'who', 'which', 'why', 'how', 'name', 'list'), ANYWHERE),
+    # Formulas
+    ('math_symbol', tuple('∑∫∂∆√∛∜∞≤≥≠≈≡±×÷∈∉⊆⊂∪∩∅'), ANYWHERE),
+    ('math_word', ('sin', 'cos', 'tan', 'cot', 'sec', 'csc', 'log', 'ln', 'exp', 'sqrt', 'integral', 'derivative',
+                   'lim', 'sum', 'prod', 'int', 'iint', 'iiint', 'eq', 'equation', 'formula', 'theorem', 'proof',
+                   'corollary', 'lemma', 'proposition'), WORD),
+    ('math_syntax', tuple('\\^_$=<>+-*/{}0123456789'), ANYWHERE),
+    # Diagrams
+    ('diagram_word', ('diagram', 'figure', 'draw', 'sketch', 'illustration', 'graph', 'chart', 'plot', 'image',
+                      'picture', 'schematic', 'blueprint', 'map',
+                      'x-axis', 'xaxis', 'y-axis', 'yaxis', 'origin', 'grid', 'axes', 'quadrant', 'abscissa',
+                      'ordinate',
+                      'point', 'line', 'segment', 'ray', 'angle', 'triangle', 'square', 'rectangle', 'circle',
+                      'ellipse', 'polygon', 'polyhedron', 'prism', 'pyramid', 'cylinder', 'cone', 'sphere', 'cube',
+                      'rhombus', 'trapezoid', 'parallelogram', 'pentagon', 'hexagon', 'octagon', 'dodecagon',
+                      'tetrahedron', 'octahedron', 'dodecahedron', 'icosahedron', 'ellipsoid', 'hyperboloid',
+                      'paraboloid', 'torus'), WORD),
+    ('label', ('label',), START),
+    ('figure_mention', FIGURE_WORDS + ('coordinate',), START),
+    # Difficulty
+    *((f'{level}_verbs', tuple(verbs), WORD) for level, verbs in DIFFICULTY_VERBS.items()),
+)
+GROUPS = tuple(name for name, _, _ in KEYWORD_GROUPS)
+VERB_GROUPS = tuple(GROUPS.index(f'{level}_verbs') for level in DIFFICULTY_VERBS)
+
+
+@lru_cache(maxsize=1)
+def keyword_matcher():
+    return KeywordMatcher(KEYWORD_GROUPS)
+
+
+@dataclass(frozen=True)
+class QuestionFeatures:
+    """What one scan of a question found; ``counts`` is the hits of each of GROUPS."""
+    counts: tuple
+    question_type: str
+    has_formula: bool
+    has_diagram: bool
+
+    @property
+    def verb_counts(self):
+        """Difficulty verbs of each level (easy, medium, hard)."""
+        return tuple(self.counts[group] for group in VERB_GROUPS)
+
+
+def _question_type(text, text_lower, hits, has_formula, has_diagram):
+    if hits['choice_letter'] or hits['choice_word'] or ROMAN_OPTION_PATTERN.search(text_lower):
+        return "Multiple Choice"
+
+    # Unreachable while true/false words already mean multiple choice
+    if hits['choice_word'] and hits['true_false_cue']:
+        return "True/False"
+
+    if hits['matching_cue'] and MATCHING_PATTERN.search(text_lower):
+        return "Matching"
+
+    if (hits['complete'] or (hits['fill'] and FILL_PATTERN.search(text_lower))
+            or ('_' in text and BLANK_PATTERN.search(text))
+            or (hits['answer_verb'] and '?' in text_lower and ANSWER_PATTERN.search(text_lower))):
+        return "Fill-in-the-Blank"
+
+    if has_diagram:
+        return "Diagram-based"
+
+    if hits['calculation_cue'] or hits['quantity_question'] or has_formula:
+        return "Problem Solving"
+
+    if hits['proof_cue'] or (hits['show'] and PROOF_PATTERN.search(text)):
+        return "Proof"
+
+    if hits['case_cue'] or (hits['given'] and GIVEN_PATTERN.search(text)):
+        return "Case Study"
+
+    words = len(text.split())
+    if hits['essay_cue'] or words > 50:  # Long questions are likely essays
+        return "Essay"
+
+    if hits['short_cue'] or '?' in text_lower or words < 30:
+        return "Short Answer"
+
+    return "Long Answer"
+
+
+def scan_question(text: str) -> QuestionFeatures:
+    """Scan ``text`` once and classify it."""
+    text_lower = text.lower()
+    counts = keyword_matcher().count(text_lower)
+    hits = dict(zip(GROUPS, counts))
+    has_formula = bool(hits['math_symbol'] or hits['math_word']
+                       or (hits['math_syntax'] and FORMULA_PATTERN.search(text_lower)))
+    has_diagram = bool(hits['diagram_word'] or hits['label']
+                       or (hits['figure_mention'] and DIAGRAM_PATTERN.search(text_lower)))
+    return QuestionFeatures(tuple(counts), _question_type(text, text_lower, hits, has_formula, has_diagram),
+                            has_formula, has_diagram)
+
+
+def determine_question_type(text: str) -> str:
+    """
+    Determine the type of question based on its content, structure, and keywords.
+    Returns one of: 'Multiple Choice', 'True/False', 'Matching', 'Fill-in-the-Blank',
+    'Short Answer', 'Long Answer', 'Problem Solving', 'Diagram-based', 'Essay', 'Calculation',
+    'Proof', 'Case Study', or 'Other'.
+    """
+    return scan_question(text).question_type
@@ -0,0 +1,243 @@
+"""Figure and diagram crops for extracted questions.
+
+Layout-mode extraction records where each question sits on its page. A
+question's zone runs from its top down to the next question in the same
+column (or the bottom of the page); embedded images and clusters of vector
+drawings inside that zone are the question's figures.
+
+Each figure is rendered at ``dpi`` in a worker process, hashed with a
+difference hash (dHash) and written as a compressed WebP or PNG named after
+the hash. Crops whose hashes are within ``max_distance`` bits of an earlier
+crop (repeated logos, the same diagram reused by several sub-questions) are
+collapsed into one file. :func:`store_question_figures` then moves the
+crops into the storage backend, and the storage keys are what questions
+record.
+
+This module does not import the Flask app so it can run in worker processes.
+PyMuPDF, numpy and PIL are imported inside the functions that use them, so
+web processes importing it for :func:`image_format` load none of them.
+"""
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from storage import FIGURES
+
+logger = logging.getLogger(__name__)
+
+# Figures smaller than this on either side (points) are rules, bullets or noise
+MIN_FIGURE_SIZE = 24
+
+# Drawings covering more of the page than this are page frames, not figures
+MAX_FIGURE_PAGE_SHARE = 0.8
+
+# Space added around each crop, in points
+CROP_PADDING = 4
+
+# Crops with less grey-level spread than this are blank
+MIN_CONTRAST = 8
+
+# Bottom share of the page treated as footer when closing the last zone
+FOOTER_SHARE = 0.06
+
+HASH_SIZE = 8  # 8x8 dHash, 64 bits
+
+
+def dhash(image, size=HASH_SIZE):
+    """Difference hash of a PIL image as a hex string."""
+    import numpy as np
+    from PIL import Image
+
+    grey = np.asarray(image.convert('L').resize((size + 1, size), Image.LANCZOS), dtype=np.int16)
+    bits = np.packbits((grey[:, 1:] > grey[:, :-1]).flatten())
+    return bits.tobytes().hex()
+
+
+def hamming(a, b):
+    return (int(a, 16) ^ int(b, 16)).bit_count()
+
+
+def image_format(preferred):
+    """Return ('WEBP', '.webp') or ('PNG', '.png') depending on what PIL can write."""
+    from PIL import features
+
+    if preferred.lower() == 'webp' and features.check('webp'):
+        return 'WEBP', '.webp'
+    return 'PNG', '.png'
+
+
+def _question_zones(questions, page_rect):
+    """Map question index -> zone Rect for the questions of one page, in order."""
+    import fitz  # PyMuPDF
+
+    bottom = page_rect.height * (1 - FOOTER_SHARE)
+    zones = {}
+    for position, (index, bbox) in enumerate(questions):
+        x0, y0, x1, y1 = bbox
+        zone_bottom = bottom
+        for _, other in questions[position + 1:]:
+            # Next question below this one in the same column
+            if other[1] > y0 and other[0] < x1 and other[2] > x0:
+                zone_bottom = min(zone_bottom, other[1])
+        zones[index] = fitz.Rect(x0 - CROP_PADDING, y0, x1 + CROP_PADDING, max(zone_bottom, y1))
+    return zones
+
+
+def _figure_rects(page):
+    """Embedded images and vector drawing clusters on a page."""
+    import fitz  # PyMuPDF
+
+    page_area = abs(page.rect)
+    rects = [fitz.Rect(info['bbox']) for info in page.get_image_info()]
+    try:
+        rects.extend(page.cluster_drawings())
+    except (AttributeError, ValueError, RuntimeError) as e:
+        logger.debug("Could not cluster drawings on page %s: %s", page.number + 1, e)
+
+    figures = []
+    for rect in rects:
+        rect = rect & page.rect
+        if rect.width < MIN_FIGURE_SIZE or rect.height < MIN_FIGURE_SIZE:
+            continue
+        if abs(rect) > page_area * MAX_FIGURE_PAGE_SHARE:
+            continue
+        if any(rect in other for other in figures):
+            continue
+        figures = [other for other in figures if other not in rect]
+        figures.append(rect)
+    return figures
+
+
+def find_figures(doc, questions):
+    """Return crop jobs ``(question index, page index, rect)`` for ``questions``.
+
+    ``questions`` are ExtractedQuestion objects; only those with a bbox
+    (layout mode) can be matched to figures.
+    """
+    import fitz  # PyMuPDF
+
+    by_page = {}
+    for index, question in enumerate(questions):
+        if question.bbox:
+            by_page.setdefault(question.page_number - 1, []).append((index, question.bbox))
+
+    jobs = []
+    for page_index, page_questions in sorted(by_page.items()):
+        page = doc[page_index]
+        figures = _figure_rects(page)
+        if not figures:
+            continue
+        zones = _question_zones(page_questions, page.rect)
+        for rect in figures:
+            # A figure belongs to the question whose zone it overlaps most;
+            # a frame drawn around the question text is not a figure
+            best, best_area = None, 0
+            for index, zone in zones.items():
+                if fitz.Rect(questions[index].bbox) in rect:
+                    continue
+                area = abs(rect & zone)
+                if area > best_area:
+                    best, best_area = index, area
+            if best is not None:
+                jobs.append((best, page_index, tuple(rect + (-CROP_PADDING, -CROP_PADDING,
+                                                             CROP_PADDING, CROP_PADDING))))
+    return jobs
+
+
+def render_crop(job):
+    """Render, hash and save one crop; returns ``(hash, path)`` or None for blank crops.
+
+    ``job`` is ``(pdf_path, page_index, rect, dpi, out_dir, preferred_format, quality)``.
+    """
+    import fitz  # PyMuPDF
+    import numpy as np
+    from PIL import Image
+
+    pdf_path, page_index, rect, dpi, out_dir, preferred_format, quality = job
+    with fitz.open(pdf_path) as doc:
+        pixmap = doc[page_index].get_pixmap(dpi=dpi, clip=fitz.Rect(rect), alpha=False)
+        image = Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+
+    grey = np.asarray(image.convert('L'))
+    if grey.size == 0 or int(grey.max()) - int(grey.min()) < MIN_CONTRAST:
+        return None
+
+    digest = dhash(image)
+    pil_format, extension = image_format(preferred_format)
+    path = os.path.join(out_dir, digest + extension)
+    if not os.path.exists(path):
+        # Write to a temporary name first so readers never see a partial file
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        if pil_format == 'WEBP':
+            image.save(tmp_path, pil_format, quality=quality, method=4)
+        else:
+            image.save(tmp_path, pil_format, optimize=True)
+        os.replace(tmp_path, path)
+    return digest, path
+
+
+def extract_question_figures(pdf_path, questions, out_dir, dpi=150, preferred_format='webp',
+                             quality=80, workers=0, max_distance=4):
+    """Crop the figures of ``questions`` and return ``{question index: [paths]}``."""
+    import fitz  # PyMuPDF
+
+    with fitz.open(pdf_path) as doc:
+        jobs = find_figures(doc, questions)
+    if not jobs:
+        return {}
+
+    os.makedirs(out_dir, exist_ok=True)
+    args = [(pdf_path, page_index, rect, dpi, out_dir, preferred_format, quality)
+            for _, page_index, rect in jobs]
+    workers = min(workers, len(args))
+    if workers > 0:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(render_crop, args))
+    else:
+        results = [render_crop(arg) for arg in args]
+
+    # Collapse near-duplicate crops onto the first one seen
+    canonical = []
+    paths = {}
+    for (index, _, _), result in zip(jobs, results):
+        if result is None:
+            continue
+        digest, path = result
+        for known_digest, known_path in canonical:
+            if hamming(digest, known_digest) <= max_distance:
+                if path != known_path and os.path.exists(path):
+                    os.remove(path)
+                path = known_path
+                break
+        else:
+            canonical.append((digest, path))
+        question_paths = paths.setdefault(index, [])
+        if path not in question_paths:
+            question_paths.append(path)
+    return paths
+
+
+def store_question_figures(storage, document_id, figure_paths, dry_run=False):
+    """Move cropped figures into ``storage``; returns ``{question index: [keys]}``.
+
+    Keys are ``figures/ab/cd/<document id>_<crop name>``. A crop is named
+    after its hash, so one already stored under its key (from an earlier
+    extraction of the document) is not uploaded again. With ``dry_run`` the
+    keys are returned but nothing is stored.
+    """
+    keys = {}
+    stored = {}
+    for index, paths in figure_paths.items():
+        for path in paths:
+            if path not in stored:
+                key = storage.key_for(FIGURES, f'{document_id}_{os.path.basename(path)}')
+                if not dry_run and not storage.exists(key):
+                    storage.save_file(path, key)
+                stored[path] = key
+            keys.setdefault(index, []).append(stored[path])
+    for path in stored:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    return keys
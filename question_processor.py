@@ -1,68 +1,80 @@
 import os
 import re
 import json
-import fitz  # PyMuPDF
-import cv2
-import numpy as np
-from PIL import Image
+import logging
+import bisect
+import tempfile
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 from dataclasses import dataclass
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize, sent_tokenize
 from app import app, db
 from models import Question, QuestionDocument, Unit, Topic, Subject
+from question_figures import extract_question_figures, store_question_figures
+from extraction_profile import NULL_PROFILE
+from question_features import (DIAGRAM_PATTERN, DIFFICULTY_VERBS, FORMULA_PATTERN, QuestionFeatures,  # noqa: F401
+                               determine_question_type, scan_question)
+from storage import StorageError, get_storage
 
-# Set up NLTK data path
-import nltk
-import shutil
+# Question number patterns, tried in order
+QUESTION_PATTERNS = [re.compile(pattern) for pattern in (
+    # Numbered questions (1., 2., etc.)
+    r'^(\d+)[\.\)\]\}\s]\s*(.*)',
+    # Lettered questions (a), b), etc.)
+    r'^\(?([a-z])\)\s*(.*)',
+    # Q1, Q2 or Q1:, Q2:
+    r'^[Qq]\s*(\d+)[\.\)\:]?\s*(.*)',
+    # Question 1, Problem 2, etc.
+    r'^(?:Question|Problem|Exercise|Task)\s*(\d+)[\.\)\: ]?\s*(.*)',
+    # Section-based numbering (1.1, 1.2, etc.)
+    r'^(\d+\.\d+)[\.\)\s]\s*(.*)',
+    # Bullet points with numbers or letters
+    r'^[•\-*]\s*(\d+|[a-z])\)?\s*(.*)'
+)]
 
-# Define NLTK data paths
-nltk_data_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nltk_data')
-os.makedirs(nltk_data_path, exist_ok=True)
+SECTION_PATTERN = re.compile(r'Section\s+([A-Z]):\s*([^\n]+)')
 
-# Add our custom path to the beginning of the NLTK data path
-nltk.data.path.insert(0, nltk_data_path)
+# Lines that end the current question, checked against every line scanned
+QUESTION_END_PATTERN = re.compile('|'.join(f'(?:{pattern})' for pattern in (
+    r'\b(?:end\s+of\s+questions?|stop|that\s+is\s+all|no\s+more\s+questions)',
+    r'\b(?:total|maximum|max)\s*[\[({]?\s*\d+\s*(?:marks?|points?|pts?\b)\s*[\])}]?',
+    r'\b(?:page|p\.?\s*)\d+\s*(?:of|/)\s*\d+\s*$',
+    r'\b(?:continued\s+on\s+next\s+page|cont\.?\s*\d+)\b',
+    r'\b(?:section|part|chapter)\s+[A-Z0-9]+\b',
+    r'^\s*\*{3,}\s*$',  # Lines with *** or more
+    r'^\s*_{3,}\s*$',  # Lines with ___ or more
+    r'^\s*-{3,}\s*$'   # Lines with --- or more
+)), re.IGNORECASE)
+HEADER_LINE_PATTERN = re.compile(r'^\s*[A-Z][A-Z\s]+$')
+# Just a number, or "Month Year" and similar footers
+FOOTER_LINE_PATTERN = re.compile(r'^\s*\d+\s*$|^[A-Za-z]+\s+\d+\s*$')
 
-# Function to manually load NLTK data
-def load_nltk_data():
-    # Check if we have the required data files
-    punkt_path = os.path.join(nltk_data_path, 'tokenizers', 'punkt')
-    stopwords_path = os.path.join(nltk_data_path, 'corpora', 'stopwords')
-    tagger_path = os.path.join(nltk_data_path, 'taggers', 'averaged_perceptron_tagger')
-    
-    # Check and load punkt
-    if os.path.exists(punkt_path):
-        print(f"Found punkt data at {punkt_path}")
-    else:
-        print("Downloading punkt data...")
-        nltk.download('punkt', download_dir=nltk_data_path, quiet=False)
-    
-    # Check and load stopwords
-    if os.path.exists(stopwords_path):
-        print(f"Found stopwords data at {stopwords_path}")
-    else:
-        print("Downloading stopwords data...")
-        nltk.download('stopwords', download_dir=nltk_data_path, quiet=False)
-    
-    # Check and load averaged_perceptron_tagger
-    if os.path.exists(os.path.join(tagger_path, 'averaged_perceptron_tagger.pickle')):
-        print(f"Found averaged_perceptron_tagger data at {tagger_path}")
-    else:
-        print("Downloading averaged_perceptron_tagger data...")
-        nltk.download('averaged_perceptron_tagger', download_dir=nltk_data_path, quiet=False)
+# Extraction modes: 'layout' reads positioned text blocks, 'text' splits
+# the flat page text on newlines
+EXTRACTION_MODES = ('layout', 'text')
+
+# Bump whenever a change to PDFQuestionExtractor changes what it extracts;
+# documents stamped with an older version are re-extracted by reextract.py
+EXTRACTOR_VERSION = 2
 
-# Load required NLTK data
-print("Loading NLTK data...")
-try:
-    load_nltk_data()
-    print("NLTK data loaded successfully")
-except Exception as e:
-    print(f"Error loading NLTK data: {str(e)}")
-    raise
+# Layout mode geometry, in PDF points
+MIN_GUTTER_WIDTH = 12          # blank vertical strip that separates columns
+MARGIN_TOLERANCE = 8           # how far right of a column's margin an anchor may start
+MIN_COLUMN_SHARE = 0.15        # share of the text a column needs to count as one
+HEADER_FOOTER_SHARE = 0.06     # top/bottom share of the page skipped as running headers
+
+# PyMuPDF span flag for bold text
+FLAG_BOLD = 1 << 4
+
+@dataclass
+class LayoutLine:
+    """A line of positioned text from ``page.get_text("dict")``."""
+    text: str
+    x0: float
+    y0: float
+    x1: float
+    y1: float
+    bold: bool
+    column: int = -1  # -1 spans all columns
 
 @dataclass
 class ExtractedQuestion:
@@ -76,17 +88,87 @@ class ExtractedQuestion:
     has_formula: bool = False
     has_diagram: bool = False
     metadata: Optional[Dict[str, Any]] = None
+    bbox: Optional[tuple] = None  # (x0, y0, x1, y1) on the page, layout mode only
+    difficulty: str = 'medium'
+    difficulty_confidence: Optional[float] = None
+    features: Optional[QuestionFeatures] = None  # keyword scan the classifications came from
+
+def question_data(extracted, image_paths=None):
+    """The question dict :meth:`QuestionExtractor.save_question` takes, for an ExtractedQuestion."""
+    return {
+        'question_number': extracted.question_number,
+        'question_text': extracted.question_text,
+        'page_number': extracted.page_number,
+        'section': extracted.section,
+        'question_type': extracted.question_type,
+        'marks': extracted.marks,
+        'has_formula': extracted.has_formula,
+        'has_diagram': extracted.has_diagram,
+        'difficulty_level': extracted.difficulty,
+        'difficulty_confidence': extracted.difficulty_confidence,
+        'image_paths': image_paths,
+        'metadata': json.dumps(extracted.metadata) if extracted.metadata else None
+    }
+
+def figure_options(config):
+    """Keyword arguments of ``extract_question_figures`` from the app config, except ``workers``."""
+    return {
+        'dpi': config.get('FIGURE_DPI', 150),
+        'preferred_format': config.get('FIGURE_IMAGE_FORMAT', 'webp'),
+        'quality': config.get('FIGURE_IMAGE_QUALITY', 80),
+        'max_distance': config.get('FIGURE_HASH_DISTANCE', 4)
+    }
+
+def question_columns(question_data):
+    """Question column values set by extraction, from a question dict."""
+    image_paths = question_data.get('image_paths')
+    return {
+        'question_number': question_data.get('question_number', ''),
+        'question_text': question_data.get('question_text', ''),
+        'page_number': question_data.get('page_number', 1),
+        'question_type': question_data.get('question_type', 'text'),
+        'marks': question_data.get('marks', 1),
+        'difficulty_level': question_data.get('difficulty_level', 'medium'),
+        'difficulty_confidence': question_data.get('difficulty_confidence'),
+        'has_formula': question_data.get('has_formula', False),
+        'has_image': bool(image_paths) or question_data.get('has_diagram', False),  # Map has_diagram to has_image
+        'image_paths': json.dumps(image_paths) if image_paths else None
+    }
+
+def assign_category(question, category):
+    """Put ``question`` in the unit and topic of a ``categorizer.Category`` (or None) that were matched."""
+    if category is None:
+        return
+    if category.unit_id:
+        question.unit_id = category.unit_id
+        question.unit_confidence = category.unit_confidence
+    if category.topic_id:
+        question.topic_id = category.topic_id
+        question.topic_confidence = category.topic_confidence
 
 class PDFQuestionExtractor:
     """Extract questions from PDF documents with improved text and structure analysis."""
     
-    def __init__(self, pdf_path: str):
-        """Initialize with path to PDF file."""
+    def __init__(self, pdf_path: str, mode: Optional[str] = None, profile=None):
+        """Initialize with path to PDF file.
+        
+        ``mode`` is one of EXTRACTION_MODES and defaults to the
+        QUESTION_EXTRACTION_MODE setting. ``profile`` is an
+        :class:`extraction_profile.ExtractionProfile` collecting stage timings.
+        """
         self.pdf_path = pdf_path
-        self.doc = fitz.open(pdf_path)
+        self.mode = mode or app.config.get('QUESTION_EXTRACTION_MODE', 'layout')
+        if self.mode not in EXTRACTION_MODES:
+            raise ValueError(f"Unknown extraction mode: {self.mode}")
+        self.profile = profile or NULL_PROFILE
+        # PyMuPDF, numpy and the classifiers are only loaded by processes that extract
+        import fitz  # PyMuPDF
+        with self.profile.stage('open'):
+            self.doc = fitz.open(pdf_path)
         self.current_section = ""
         self.progress_callback = None
         self.total_pages = len(self.doc)
+        self.questions_found = 0
     
     def set_progress_callback(self, callback):
         """Set a callback function to report progress.
@@ -105,7 +187,7 @@ class PDFQuestionExtractor:
     
     def extract_questions(self) -> List[ExtractedQuestion]:
         """Extract all questions from the PDF with progress reporting."""
-        app.logger.info(f"Extracting questions from: {os.path.basename(self.pdf_path)}")
+        app.logger.info("Extracting questions from: %s", os.path.basename(self.pdf_path))
         questions = []
         
         try:
@@ -120,22 +202,31 @@ class PDFQuestionExtractor:
                     f"Extracting questions from page {page_num + 1} of {self.total_pages}..."
                 )
                 
-                # Get page text and update section
-                text = page.get_text()
-                self._update_section(text)
-                
                 # Extract questions from this page
-                page_questions = self._extract_questions_from_page(text, page_num + 1)
+                with self.profile.stage('segmentation'):
+                    if self.mode == 'layout':
+                        page_questions = self._extract_questions_from_layout(page, page_num + 1)
+                    else:
+                        with self.profile.stage('page_text'):
+                            text = page.get_text()
+                        self._update_section(text)
+                        page_questions = self._extract_questions_from_page(text, page_num + 1)
+                self.profile.count('pages')
                 questions.extend(page_questions)
+                self.questions_found = len(questions)
                 
                 # Log progress
                 if page_num % 5 == 0 or page_num == len(self.doc) - 1:
                     app.logger.info(
-                        f"Processed page {page_num + 1}/{len(self.doc)} - "
-                        f"Found {len(page_questions)} questions on this page, "
-                        f"Total so far: {len(questions)}"
+                        "Processed page %d/%d - Found %d questions on this page, Total so far: %d",
+                        page_num + 1, len(self.doc), len(page_questions), len(questions)
                     )
                 
+            # Difficulty is scored over all questions of the document at once
+            from difficulty import classify_questions
+            with self.profile.stage('classification'):
+                classify_questions(questions, app.config.get('DIFFICULTY_WEIGHTS_FILE'))
+            
             # Final progress update
             self._report_progress(
                 len(self.doc) - 1,
@@ -155,7 +246,7 @@ class PDFQuestionExtractor:
     
     def _update_section(self, text: str) -> None:
         """Update current section based on section headers in text."""
-        section_match = re.search(r'Section\s+([A-Z]):\s*([^\n]+)', text)
+        section_match = SECTION_PATTERN.search(text)
         if section_match:
             self.current_section = section_match.group(2).strip()
     
@@ -223,122 +314,189 @@ class PDFQuestionExtractor:
                     
                     i += 1
                 
-                # Clean up question text
-                full_text = ' '.join(question_text).strip()
-                
                 # Skip if question text is too short (likely a false positive)
-                if len(full_text) < 10:
+                question = self._make_question(question_num, question_text, page_num)
+                if question is None:
                     i += 1
                     continue
-                    
-                # Create the question object
-                question = ExtractedQuestion(
-                    question_number=question_num,
-                    question_text=full_text,
-                    page_number=page_num,
-                    section=self.current_section,
-                    question_type=self._determine_question_type(full_text),
-                    marks=self._extract_marks(full_text),
-                    has_formula=self._contains_formula(full_text),
-                    has_diagram=self._contains_diagram_marker(full_text)
-                )
                 questions.append(question)
-                
-                # If we've identified this as a multiple choice question, try to extract the options
-                if question.question_type == "Multiple Choice":
-                    self._extract_multiple_choice_options(question, question_text)
             else:
                 i += 1
                 
         return questions
     
-    def _match_question_pattern(self, text: str) -> re.Match:
-        """Match text against various question patterns."""
-        patterns = [
-            # Numbered questions (1., 2., etc.)
-            r'^(\d+)[\.\)\]\}\s]\s*(.*)',
-            # Lettered questions (a), b), etc.)
-            r'^\(?([a-z])\)\s*(.*)',
-            # Q1, Q2 or Q1:, Q2:
-            r'^[Qq]\s*(\d+)[\.\)\:]?\s*(.*)',
-            # Question 1, Problem 2, etc.
-            r'^(?:Question|Problem|Exercise|Task)\s*(\d+)[\.\)\: ]?\s*(.*)',
-            # Section-based numbering (1.1, 1.2, etc.)
-            r'^(\d+\.\d+)[\.\)\s]\s*(.*)',
-            # Bullet points with numbers or letters
-            r'^[•\-*]\s*(\d+|[a-z])\)?\s*(.*)'
-        ]
+    def _make_question(self, question_num: str, question_text: List[str], page_num: int,
+                       bbox: Optional[tuple] = None) -> Optional[ExtractedQuestion]:
+        """Build a question from its lines; None if the text is too short to be one."""
+        full_text = ' '.join(question_text).strip()
+        if len(full_text) < 10:
+            return None
         
-        for pattern in patterns:
-            match = re.match(pattern, text)
-            if match:
-                return match
-        return None
+        with self.profile.stage('classification'):
+            # One keyword scan gives the type, formula and diagram flags and
+            # the difficulty verbs
+            features = scan_question(full_text)
+            question = ExtractedQuestion(
+                question_number=question_num,
+                question_text=full_text,
+                page_number=page_num,
+                section=self.current_section,
+                question_type=features.question_type,
+                marks=self._extract_marks(full_text),
+                has_formula=features.has_formula,
+                has_diagram=features.has_diagram,
+                bbox=bbox,
+                features=features
+            )
+            
+            # If we've identified this as a multiple choice question, try to extract the options
+            if question.question_type == "Multiple Choice":
+                self._extract_multiple_choice_options(question, question_text)
+        return question
     
-    def _determine_question_type(self, text: str) -> str:
-        """
-        Determine the type of question based on its content, structure, and keywords.
-        Returns one of: 'Multiple Choice', 'True/False', 'Matching', 'Fill-in-the-Blank', 
-        'Short Answer', 'Long Answer', 'Problem Solving', 'Diagram-based', 'Essay', 'Calculation',
-        'Proof', 'Case Study', or 'Other'.
+    def _read_layout_lines(self, page) -> List[LayoutLine]:
+        """Positioned text lines of a page, top to bottom, without running headers and footers."""
+        height = page.rect.height
+        top, bottom = height * HEADER_FOOTER_SHARE, height * (1 - HEADER_FOOTER_SHARE)
+        
+        import fitz  # PyMuPDF
+        lines = []
+        page_dict = page.get_text('dict', flags=fitz.TEXTFLAGS_TEXT, sort=True)
+        for block in page_dict['blocks']:
+            for line in block.get('lines', ()):
+                spans = [span for span in line['spans'] if span['text'].strip()]
+                if not spans:
+                    continue
+                x0, y0, x1, y1 = line['bbox']
+                if y1 < top or y0 > bottom:
+                    continue
+                first = spans[0]
+                lines.append(LayoutLine(
+                    text=' '.join(''.join(span['text'] for span in line['spans']).split()),
+                    x0=x0, y0=y0, x1=x1, y1=y1,
+                    bold=bool(first['flags'] & FLAG_BOLD) or 'bold' in first['font'].lower()
+                ))
+        return lines
+    
+    def _detect_gutters(self, lines: List[LayoutLine], page_width: float) -> List[float]:
+        """Find the x positions of blank vertical strips that separate text columns."""
+        narrow = [line for line in lines if line.x1 - line.x0 < page_width * 0.6]
+        if len(narrow) < 4:
+            return []
+        
+        # Project the narrow lines onto the x axis and look for uncovered runs
+        left = int(min(line.x0 for line in narrow))
+        right = int(max(line.x1 for line in narrow)) + 1
+        covered = bytearray(right - left)
+        for line in narrow:
+            start, end = int(line.x0) - left, int(line.x1) - left + 1
+            covered[start:end] = b'\x01' * (end - start)
+        
+        total = sum(line.x1 - line.x0 for line in narrow)
+        gutters = []
+        for run in re.finditer(rb'\x00{%d,}' % MIN_GUTTER_WIDTH, bytes(covered)):
+            gutter = left + (run.start() + run.end()) / 2
+            if not page_width * 0.25 < gutter < page_width * 0.75:
+                continue
+            # Both sides need real text, not just right-aligned marks
+            left_mass = sum(line.x1 - line.x0 for line in narrow if line.x1 < gutter)
+            if min(left_mass, total - left_mass) >= total * MIN_COLUMN_SHARE:
+                gutters.append(gutter)
+        return gutters
+    
+    def _order_lines(self, lines: List[LayoutLine], gutters: List[float]) -> List[LayoutLine]:
+        """Reading order: column by column, between lines that span the columns."""
+        if not gutters:
+            for line in lines:
+                line.column = 0
+            return lines
+        
+        ordered = []
+        columns = [[] for _ in range(len(gutters) + 1)]
+        for line in lines:
+            if any(line.x0 < gutter < line.x1 for gutter in gutters):
+                # Full-width line (heading, instructions): finish the band above it
+                for column in columns:
+                    ordered.extend(column)
+                    column.clear()
+                line.column = -1
+                ordered.append(line)
+            else:
+                line.column = bisect.bisect(gutters, (line.x0 + line.x1) / 2)
+                columns[line.column].append(line)
+        for column in columns:
+            ordered.extend(column)
+        return ordered
+    
+    def _extract_questions_from_layout(self, page, page_num: int) -> List[ExtractedQuestion]:
+        """Extract questions from a page's positioned text in one pass.
+        
+        A line starts a question when it matches a question number pattern and
+        sits on its column's left margin or is set in bold; indented numbering
+        such as sub-parts stays with the question it belongs to.
         """
-        text_lower = text.lower().strip()
+        with self.profile.stage('page_text'):
+            lines = self._read_layout_lines(page)
+        if not lines:
+            return []
+        gutters = self._detect_gutters(lines, page.rect.width)
+        lines = self._order_lines(lines, gutters)
         
-        # Check for multiple choice (A), B), C), etc. or (i), (ii), (iii), etc.)
-        if (re.search(r'\b(a|b|c|d|e)\)', text_lower) or 
-            re.search(r'\([ivx]+\)', text_lower) or
-            re.search(r'\b(true|false|t|f)\b', text_lower, re.IGNORECASE)):
-            return "Multiple Choice"
-            
-        # Check for true/false questions
-        if (re.search(r'\b(true|false)\b', text_lower) and 
-            any(word in text_lower for word in ['circle', 'select', 'choose', 'tick', 'mark'])):
-            return "True/False"
-            
-        # Check for matching questions
-        if (re.search(r'match\s+(?:column|the following|items?|pairs?|statements?)', text_lower) or
-            re.search(r'column\s+(a|i).*column\s+(b|ii)', text_lower, re.DOTALL)):
-            return "Matching"
-            
-        # Check for fill-in-the-blank
-        if (re.search(r'\b(?:fill\s*in|complete|fill\s*the\s*blank)', text_lower) or
-            re.search(r'\b_+\b', text) or  # Underscore placeholders
-            re.search(r'\b(?:write|provide|give|state)\s+(?:the|a)?\s*[^\n?]*\?', text_lower)):
-            return "Fill-in-the-Blank"
-        
-        # Check for diagram-based questions
-        if self._contains_diagram_marker(text_lower):
-            return "Diagram-based"
-            
-        # Check for calculation problems
-        if (any(word in text_lower for word in ['calculate', 'compute', 'solve for', 'find', 'determine', 'evaluate', 'simplify']) or
-            re.search(r'\b(?:what is|what are|how (?:much|many|long|far|fast|tall|wide|high))\b', text_lower) or
-            self._contains_formula(text_lower)):
-            return "Problem Solving"
+        margins = {}
+        for line in lines:
+            margins[line.column] = min(margins.get(line.column, line.x0), line.x0)
+        
+        questions = []
+        current = None  # [number, text lines, [x0, y0, x1, y1]]
+        
+        def close():
+            if current is not None:
+                question = self._make_question(current[0], current[1], page_num, tuple(current[2]))
+                if question is not None:
+                    questions.append(question)
+        
+        for line in lines:
+            text = line.text
             
-        # Check for proof questions
-        if (any(word in text_lower for word in ['prove', 'show that', 'demonstrate', 'verify', 'derive']) or
-            re.search(r'\b(?:prove|show)\s+(?:that\s+)?[A-Z]', text)):
-            return "Proof"
+            section_match = SECTION_PATTERN.search(text)
+            if section_match:
+                self.current_section = section_match.group(2).strip()
             
-        # Check for case studies
-        if (any(word in text_lower for word in ['case study', 'case of', 'scenario', 'situation']) or
-            re.search(r'\bgiven\s+(?:that\s+)?[A-Z]', text)):
-            return "Case Study"
+            match = None
+            if line.bold or line.x0 - margins[line.column] <= MARGIN_TOLERANCE:
+                match = self._match_question_pattern(text)
+            if match:
+                close()
+                current = [match.group(1).strip(), [match.group(2).strip() if match.group(2) else ''],
+                           [line.x0, line.y0, line.x1, line.y1]]
+                continue
             
-        # Check for essay questions
-        if (any(word in text_lower for word in ['discuss', 'analyze', 'critique', 'evaluate', 'justify', 'examine', 'explore', 'elaborate', 'compare and contrast']) or
-            len(text.split()) > 50):  # Long questions are likely essays
-            return "Essay"
+            if current is None:
+                continue
             
-        # Check for short answer
-        if (any(word in text_lower for word in ['what', 'when', 'where', 'who', 'which', 'why', 'how', 'name', 'list']) or
-            '?' in text_lower or
-            len(text.split()) < 30):  # Short questions
-            return "Short Answer"
+            if self._is_question_end(text, current[1]):
+                close()
+                current = None
+                continue
             
-        # Default to long answer for anything that doesn't fit above
-        return "Long Answer"
+            current[1].append(text)
+            bbox = current[2]
+            bbox[0], bbox[1] = min(bbox[0], line.x0), min(bbox[1], line.y0)
+            bbox[2], bbox[3] = max(bbox[2], line.x1), max(bbox[3], line.y1)
+        
+        close()
+        return questions
+    
+    def _match_question_pattern(self, text: str) -> re.Match:
+        """Match text against various question patterns."""
+        for pattern in QUESTION_PATTERNS:
+            match = pattern.match(text)
+            if match:
+                return match
+        return None
+    
+    def _determine_question_type(self, text: str) -> str:
+        return determine_question_type(text)
     
     def _extract_marks(self, text: str) -> int:
         """Extract marks from question text if specified."""
@@ -355,33 +513,7 @@ class PDFQuestionExtractor:
     
     def _contains_formula(self, text: str) -> bool:
         """Check if question contains mathematical formulas with enhanced detection."""
-        # Basic math symbols
-        math_symbols = r'[∑∫∂∆√∛∜∞≤≥≠≈≡±×÷∈∉⊆⊂∪∩∅]|\\[a-zA-Z]+|\^[0-9a-zA-Z{}()]+|_[0-9a-zA-Z{}()]+|\b(?:sin|cos|tan|cot|sec|csc|log|ln|exp|sqrt|integral|derivative|lim|sum|prod|int|iint|iiint)\b'
-        
-        # Common formula patterns
-        formula_patterns = [
-            r'\$[^$]+\$',  # LaTeX inline math
-            r'\\\(.*?\\\)|\\\[.*?\\\]',  # LaTeX display math
-            r'\b(?:eq\.?|equation|formula|theorem|proof|corollary|lemma|proposition)\b',
-            r'[a-zA-Z]\s*[=≠≈]\s*[a-zA-Z0-9+\-*/^()]+',  # Equations like x = 2y + 3
-            r'\d+\s*[a-zA-Zα-ωΑ-Ω]\b',  # Variables with coefficients
-            r'[a-zA-Z]\s*[+\-*/^]\s*[a-zA-Z0-9()]',  # Basic operations with variables
-            r'\b(?:if|then|therefore|because|since|given|let|assume|suppose|consider)\b.*?[=≠≈<>]',  # Conditional math
-        ]
-        
-        # Check for any math symbols or patterns
-        if re.search(math_symbols, text, re.IGNORECASE):
-            return True
-            
-        # Check for formula patterns
-        if any(re.search(pattern, text, re.IGNORECASE | re.DOTALL) for pattern in formula_patterns):
-            return True
-            
-        # Check for common math notation
-        if re.search(r'[a-zA-Z]\s*[{}]\s*[=:]', text):  # Set notation or function definitions
-            return True
-            
-        return False
+        return scan_question(text).has_formula
     
     def _is_question_end(self, line: str, question_text: List[str]) -> bool:
         """
@@ -395,30 +527,17 @@ class PDFQuestionExtractor:
             bool: True if this line indicates the end of the question
         """
         # Common question endings
-        endings = [
-            r'\b(?:end\s+of\s+questions?|stop|that\s+is\s+all|no\s+more\s+questions)',
-            r'\b(?:total|maximum|max)\s*[\[({]?\s*\d+\s*(?:marks?|points?|pts?\b)\s*[\])}]?',
-            r'\b(?:page|p\.?\s*)\d+\s*(?:of|/)\s*\d+\s*$',
-            r'\b(?:continued\s+on\s+next\s+page|cont\.?\s*\d+)\b',
-            r'\b(?:section|part|chapter)\s+[A-Z0-9]+\b',
-            r'^\s*\*{3,}\s*$',  # Lines with *** or more
-            r'^\s*_{3,}\s*$',  # Lines with ___ or more
-            r'^\s*-{3,}\s*$'   # Lines with --- or more
-        ]
-        
-        # Check for ending patterns
-        if any(re.search(pattern, line, re.IGNORECASE) for pattern in endings):
+        if QUESTION_END_PATTERN.search(line):
             return True
             
         # Check if this looks like the start of a new section or header
-        if (re.match(r'^\s*[A-Z][A-Z\s]+$', line) and  # All caps line
+        if (HEADER_LINE_PATTERN.match(line) and  # All caps line
             len(line.split()) < 5 and  # Short line (likely a header)
             len(question_text) > 1):  # Already have some question text
             return True
             
         # Check for page numbers or footers
-        if (re.search(r'^\s*\d+\s*$', line) or  # Just a number
-            re.search(r'^[A-Za-z]+\s+\d+\s*$', line)):  # Month Year or similar
+        if FOOTER_LINE_PATTERN.search(line):
             return True
             
         return False
@@ -455,7 +574,7 @@ class PDFQuestionExtractor:
         
         # Update the question object with the extracted options
         if options:
-            if not hasattr(question, 'metadata'):
+            if question.metadata is None:
                 question.metadata = {}
             question.metadata['options'] = options
             
@@ -474,30 +593,7 @@ class PDFQuestionExtractor:
     
     def _contains_diagram_marker(self, text: str) -> bool:
         """Check if question contains diagram-related markers with enhanced detection."""
-        # Basic diagram indicators
-        diagram_indicators = [
-            r'\b(?:diagram|figure|draw|sketch|illustration|graph|chart|plot|image|picture|schematic|blueprint|map)\b',
-            r'\blabel\s*(?:the|each|all|any|every|some|these|those|following|below|above|on|in|at|for|with|of)?\s*',
-            r'\b(?:show|indicate|mark|identify|point out|highlight|circle|box|shade|color|colour|outline|trace|plot)\b.*\b(on|in|at|for|with|of)\b.*\b(diagram|figure|graph|chart|image|picture|drawing|illustration)',
-            r'\b(refer|according|see|based on|using|use|given|following|shown|displayed|illustrated|depicted|represented)\b.*\b(diagram|figure|graph|chart|image|picture|drawing|illustration)',
-            r'\b(diagram|figure|graph|chart|image|picture|drawing|illustration)\s*[0-9]*\s*(?:shows|showing|illustrates|depicts|represents|demonstrates|presents|displays|contains|includes)',
-            r'\b(?:as|like|similar to|resembling|in the style of|in the form of|in the shape of|in the pattern of)\b.*\b(diagram|figure|graph|chart|image|picture|drawing|illustration)',
-            r'\b(?:with|having|containing|including|featuring|showing|displaying|illustrating|depicting|representing|demonstrating|presenting)\b.*\b(diagram|figure|graph|chart|image|picture|drawing|illustration)',
-        ]
-        
-        # Check for any diagram indicators
-        if any(re.search(pattern, text, re.IGNORECASE) for pattern in diagram_indicators):
-            return True
-            
-        # Check for coordinate system references
-        if re.search(r'\b(?:x-?axis|y-?axis|origin|coordinate\s*system|grid|axes|quadrant|abscissa|ordinate)\b', text, re.IGNORECASE):
-            return True
-            
-        # Check for geometric shape references
-        if re.search(r'\b(?:point|line|segment|ray|angle|triangle|square|rectangle|circle|ellipse|polygon|polyhedron|prism|pyramid|cylinder|cone|sphere|cube|rhombus|trapezoid|parallelogram|pentagon|hexagon|octagon|dodecagon|tetrahedron|octahedron|dodecahedron|icosahedron|ellipsoid|hyperboloid|paraboloid|torus)\b', text, re.IGNORECASE):
-            return True
-            
-        return False
+        return scan_question(text).has_diagram
     
     def __del__(self):
         """Ensure the PDF document is properly closed."""
@@ -507,7 +603,6 @@ class PDFQuestionExtractor:
 
 class QuestionExtractor:
     def __init__(self):
-        self.stop_words = set(stopwords.words('english'))
         self.current_section = ""
         self.progress_callback = None
         self.total_pages = 0
@@ -544,12 +639,8 @@ class QuestionExtractor:
             'differentiate', 'graph', 'plot', 'matrix', 'vector', 'theorem', 'proof'
         ]
         
-        # Difficulty indicators
-        self.difficulty_indicators = {
-            'easy': ['define', 'list', 'identify', 'name', 'recall', 'state', 'match'],
-            'medium': ['explain', 'describe', 'summarize', 'classify', 'compare', 'contrast'],
-            'hard': ['analyze', 'evaluate', 'justify', 'critique', 'design', 'formulate', 'prove']
-        }
+        # Difficulty indicators, used by difficulty.classify_questions
+        self.difficulty_indicators = DIFFICULTY_VERBS
     
     def set_progress_callback(self, callback):
         """Set a callback function to report progress.
@@ -566,41 +657,50 @@ class QuestionExtractor:
         if self.progress_callback and self.total_pages > 0:
             self.progress_callback(current_page, self.total_pages, message)
         
-    def process_document(self, document_id):
+    def process_document(self, document_id, profile=None):
         """Process a document and extract questions.
         
         Args:
             document_id: ID of the document to process
+            profile: Optional ExtractionProfile collecting stage timings
             
         Returns:
             bool: True if processing was successful, False otherwise
         """
         document = QuestionDocument.query.get(document_id)
         if not document:
-            app.logger.error(f"Document {document_id} not found")
+            app.logger.error("Document %s not found", document_id)
             return False
+        profile = profile or NULL_PROFILE
             
         try:
-            app.logger.info(f"Starting extraction for document {document_id}")
+            app.logger.info("Starting extraction for document %s", document_id)
+            
+            pdf_path = get_storage(app).local_path(document.file_path)
             
             # Open the PDF to get total pages for progress tracking
             try:
-                doc = fitz.open(document.file_path)
-                self.total_pages = len(doc)
-                doc.close()
-                app.logger.info(f"Document has {self.total_pages} pages")
+                import fitz  # PyMuPDF
+                with profile.stage('open'):
+                    doc = fitz.open(pdf_path)
+                    self.total_pages = len(doc)
+                    doc.close()
+                app.logger.info("Document has %d pages", self.total_pages)
             except Exception as e:
-                app.logger.warning(f"Could not get total pages for document {document_id}: {str(e)}")
+                app.logger.warning("Could not get total pages for document %s: %s", document_id, e)
                 self.total_pages = 0
             
             # Report initial progress
             self._report_progress(0, "Starting document processing...")
             
             # Extract questions from PDF
-            extractor = PDFQuestionExtractor(document.file_path)
+            extractor = PDFQuestionExtractor(pdf_path, profile=profile)
             
             # Set up progress reporting for the extractor
+            self.questions_found = 0
+            
             def extraction_progress(page_num, total_pages, message):
+                self.questions_found = extractor.questions_found
                 self._report_progress(page_num, message)
                 
             extractor.set_progress_callback(extraction_progress)
@@ -608,6 +708,14 @@ class QuestionExtractor:
             # Extract questions with progress reporting
             extracted_questions = extractor.extract_questions()
             
+            # Crop figures next to each question (layout mode only)
+            with profile.stage('figures'):
+                figure_paths = self.extract_figures(document, extracted_questions)
+            
+            # Match all the questions to the subject's units and topics at once
+            with profile.stage('topics'):
+                categories = self.categorize_questions(document, [eq.question_text for eq in extracted_questions])
+            
             # Report progress before saving to database
             self._report_progress(
                 self.total_pages - 1 if self.total_pages > 0 else 0,
@@ -616,58 +724,104 @@ class QuestionExtractor:
             
             # Save extracted questions to database
             saved_count = 0
-            for eq in extracted_questions:
-                try:
-                    self.save_question({
-                        'question_number': eq.question_number,
-                        'question_text': eq.question_text,
-                        'page_number': eq.page_number,
-                        'section': eq.section,
-                        'question_type': eq.question_type,
-                        'marks': eq.marks,
-                        'has_formula': eq.has_formula,
-                        'has_diagram': eq.has_diagram,
-                        'metadata': json.dumps(eq.metadata) if hasattr(eq, 'metadata') else None
-                    }, document)
-                    saved_count += 1
+            with profile.stage('persistence'):
+                for index, eq in enumerate(extracted_questions):
+                    try:
+                        self.save_question(question_data(eq, figure_paths.get(index)), document,
+                                           category=categories[index])
+                        saved_count += 1
                     
-                    # Update progress every 5 questions
-                    if saved_count % 5 == 0:
-                        self._report_progress(
-                            self.total_pages - 1 if self.total_pages > 0 else 0,
-                            f"Saved {saved_count} of {len(extracted_questions)} questions..."
-                        )
+                        # Update progress every 5 questions
+                        if saved_count % 5 == 0:
+                            self._report_progress(
+                                self.total_pages - 1 if self.total_pages > 0 else 0,
+                                f"Saved {saved_count} of {len(extracted_questions)} questions..."
+                            )
                         
-                except Exception as save_error:
-                    app.logger.error(f"Error saving question {eq.question_number if hasattr(eq, 'question_number') else 'unknown'}: {str(save_error)}", exc_info=True)
-                    continue  # Continue with next question even if one fails
+                    except Exception as save_error:
+                        app.logger.error("Error saving question %s: %s", getattr(eq, 'question_number', 'unknown'),
+                                         save_error, exc_info=True)
+                        continue  # Continue with next question even if one fails
+            profile.count('questions', saved_count)
             
             # Update document status
             try:
                 document.extraction_status = 'completed'
                 document.total_questions = saved_count
+                document.extractor_version = EXTRACTOR_VERSION
                 document.processed_at = datetime.utcnow()
                 db.session.commit()
                 
-                app.logger.info(f"Successfully extracted and saved {saved_count} questions from document {document_id}")
+                app.logger.info("Successfully extracted and saved %d questions from document %s", saved_count, document_id)
                 return True
                 
             except Exception as commit_error:
-                app.logger.error(f"Error updating document status: {str(commit_error)}", exc_info=True)
+                app.logger.error("Error updating document status: %s", commit_error, exc_info=True)
                 db.session.rollback()
                 raise  # Re-raise to be caught by outer exception handler
                 
         except Exception as e:
-            app.logger.error(f"Error processing document {document_id}: {str(e)}", exc_info=True)
+            app.logger.error("Error processing document %s: %s", document_id, e, exc_info=True)
             try:
                 if document:
                     document.extraction_status = 'failed'
                     db.session.commit()
             except Exception as status_error:
-                app.logger.error(f"Error updating document status to failed: {str(status_error)}", exc_info=True)
+                app.logger.error("Error updating document status to failed: %s", status_error, exc_info=True)
                 db.session.rollback()
             return False
     
+    def profile_document(self, document, profile):
+        """Run the extraction stages over ``document`` without saving anything; returns the question count.
+
+        Questions are extracted, their figures cropped and their topics
+        matched as in :meth:`process_document`, but the crops and results
+        are thrown away.
+        """
+        pdf_path = get_storage(app).local_path(document.file_path)
+        extracted_questions = PDFQuestionExtractor(pdf_path, profile=profile).extract_questions()
+        with profile.stage('figures'):
+            self.extract_figures(document, extracted_questions, store=False)
+        with profile.stage('topics'):
+            self.categorize_questions(document, [eq.question_text for eq in extracted_questions])
+        profile.count('questions', len(extracted_questions))
+        return len(extracted_questions)
+    
+    def extract_figures(self, document, extracted_questions, store=True):
+        """Crop figures for the extracted questions; returns {question index: [storage keys]}.
+
+        With ``store=False`` the crops are rendered and thrown away, e.g. to time them.
+        """
+        if not app.config.get('FIGURE_EXTRACTION_ENABLED', True):
+            return {}
+        
+        storage = get_storage(app)
+        try:
+            with tempfile.TemporaryDirectory(prefix='figures-') as out_dir:
+                figure_paths = extract_question_figures(
+                    storage.local_path(document.file_path), extracted_questions, out_dir,
+                    workers=app.config.get('FIGURE_WORKERS', 0), **figure_options(app.config)
+                )
+                if store:
+                    figure_paths = store_question_figures(storage, document.id, figure_paths)
+            app.logger.info("Cropped figures for %d questions of document %s", len(figure_paths), document.id)
+            return figure_paths
+        except Exception as e:
+            app.logger.warning("Figure extraction failed for document %s: %s", document.id, e, exc_info=True)
+            return {}
+    
+    def figure_path(self, key, question_id):
+        """A local path of the stored figure ``key``, or None if it is missing."""
+        try:
+            path = get_storage(app).local_path(key)
+        except (OSError, StorageError) as e:
+            app.logger.warning("Figure %s of question %s could not be read: %s", key, question_id, e)
+            return None
+        if not os.path.exists(path):
+            app.logger.warning("Figure %s of question %s is missing", key, question_id)
+            return None
+        return path
+    
     def extract_questions_from_pdf(self, pdf_path):
         """Extract questions from a PDF file."""
         try:
@@ -687,95 +841,52 @@ class QuestionExtractor:
             } for q in extracted_questions]
             
         except Exception as e:
-            app.logger.error(f"Error extracting questions from PDF {pdf_path}: {str(e)}", exc_info=True)
+            app.logger.error("Error extracting questions from PDF %s: %s", pdf_path, e, exc_info=True)
             return []
     
-    def save_question(self, question_data, document):
-        """Save a question to the database."""
+    def save_question(self, question_data, document, category=None):
+        """Save a question, in the unit and topic of ``category`` if given, to the database."""
         try:
             question = Question(
-                question_number=question_data.get('question_number', ''),
-                question_text=question_data.get('question_text', ''),
-                page_number=question_data.get('page_number', 1),
-                question_type=question_data.get('question_type', 'text'),
-                marks=question_data.get('marks', 1),
-                has_formula=question_data.get('has_formula', False),
-                has_image=question_data.get('has_diagram', False),  # Map has_diagram to has_image
+                **question_columns(question_data),
                 document_id=document.id,
+                extractor_version=EXTRACTOR_VERSION,
                 created_at=datetime.utcnow()
             )
+            assign_category(question, category)
             db.session.add(question)
             db.session.commit()
-            app.logger.debug(f"Saved question {question.id} for document {document.id}")
+            if app.logger.isEnabledFor(logging.DEBUG):
+                # Reading the ids after the commit reloads both rows
+                app.logger.debug("Saved question %s for document %s", question.id, document.id)
             return question
         except Exception as e:
-            app.logger.error(f"Error saving question for document {document.id}: {str(e)}", exc_info=True)
+            app.logger.error("Error saving question for document %s: %s", document.id, e, exc_info=True)
             db.session.rollback()
             return None
     
-    def categorize_question(self, question, subject):
-        """Automatically categorize question by topic and unit."""
-        if not subject:
-            return
-            
+    def categorize_questions(self, document, texts):
+        """The unit and topic of each question text, as a list of ``categorizer.Category``.
+
+        One categorizer serves the whole document, and is reused by later
+        documents of the subject until its units or topics change.
+        """
+        if not document.subject_id or not texts:
+            return [None] * len(texts)
+        from categorizer import cached_categorizer, subject_taxonomies
+        
         # Get all units and topics for this subject
-        units = Unit.query.filter_by(subject_id=subject.id).all()
-        if not units:
-            return
-            
-        # Prepare text for analysis
-        question_text = question.question_text.lower()
-        tokens = word_tokenize(question_text)
-        tokens = [token for token in tokens if token.isalpha() and token not in self.stop_words]
-        clean_text = ' '.join(tokens)
-        
-        best_unit = None
-        best_topic = None
-        best_unit_score = 0
-        best_topic_score = 0
-        
-        # Compare with each unit and its topics
-        for unit in units:
-            unit_text = f"{unit.name} {unit.description or ''}".lower()
-            unit_score = self.calculate_similarity(clean_text, unit_text)
-            
-            if unit_score > best_unit_score:
-                best_unit_score = unit_score
-                best_unit = unit
-            
-            # Check topics within this unit
-            for topic in unit.topics:
-                topic_text = f"{topic.name} {topic.description or ''}".lower()
-                topic_score = self.calculate_similarity(clean_text, topic_text)
-                
-                if topic_score > best_topic_score:
-                    best_topic_score = topic_score
-                    best_topic = topic
-        
-        # Assign if confidence is above threshold
-        if best_unit_score > 0.1:  # Threshold for unit assignment
-            question.unit_id = best_unit.id
-            question.unit_confidence = best_unit_score
-            
-        if best_topic_score > 0.1:  # Threshold for topic assignment
-            question.topic_id = best_topic.id
-            question.topic_confidence = best_topic_score
-    
-    def calculate_similarity(self, text1, text2):
-        """Calculate similarity between two texts using TF-IDF."""
-        if not text1.strip() or not text2.strip():
-            return 0
-            
+        taxonomy = subject_taxonomies([document.subject_id])[document.subject_id]
+        if not taxonomy:
+            return [None] * len(texts)
+        
         try:
-            vectorizer = TfidfVectorizer()
-            tfidf_matrix = vectorizer.fit_transform([text1, text2])
-            similarity = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])
-            return similarity[0][0]
-        except:
-            return 0
-
-    def __init__(self):
-        pass
+            return cached_categorizer(taxonomy, app.config.get('TOPIC_CATEGORIZER', 'tfidf'),
+                                      app.config.get('EMBEDDING_MODEL'), app.config.get('EMBEDDING_DIM'))\
+                .categorize(texts)
+        except Exception as e:
+            app.logger.warning("Topic matching failed for document %s: %s", document.id, e, exc_info=True)
+            return [None] * len(texts)
     
     def generate_question_paper(self, subject_id, unit_ids=None, topic_ids=None, 
                           total_marks=100, difficulty_distribution=None):
@@ -1092,9 +1203,9 @@ class QuestionExtractor:
             # Add images if present
             if question.has_image and question.image_paths:
                 try:
-                    image_paths = json.loads(question.image_paths)
-                    for img_path in image_paths:
-                        if os.path.exists(img_path):
+                    for image_key in json.loads(question.image_paths):
+                        img_path = self.figure_path(image_key, question.id)
+                        if img_path:
                             # Try to get image dimensions and maintain aspect ratio
                             try:
                                 from PIL import Image as PILImage
@@ -1139,7 +1250,12 @@ class QuestionExtractor:
         from sqlalchemy import or_
         
         # Start building the query
-        query = Question.query.join(QuestionDocument).filter(
+        from sqlalchemy.orm import joinedload
+        
+        query = Question.query.join(QuestionDocument).options(
+            joinedload(Question.unit),
+            joinedload(Question.topic)
+        ).filter(
             QuestionDocument.subject_id == subject_id,
             QuestionDocument.status == 'approved',
             Question.marks > 0  # Only include questions with positive marks
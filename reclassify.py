@@ -0,0 +1,264 @@
+"""Re-classification of the questions already stored.
+
+Runs the current classifiers over stored questions:
+
+* ``type``: question type and formula flag, from one keyword scan
+  (:mod:`question_features`),
+* ``difficulty``: difficulty level and its confidence (:mod:`difficulty`),
+* ``topics``: unit and topic (:mod:`categorizer`). Only questions without a
+  unit or topic get one, unless ``reassign_topics`` is set, and a question
+  whose best match scores too low keeps what it has.
+
+Questions edited by hand (``Question.manually_edited``) are skipped.
+
+Questions are read in id order, ``RECLASSIFY_CHUNK_SIZE`` at a time and
+keyed on the last id read, so memory stays flat however large the bank is.
+Chunks are classified in a pool of ``RECLASSIFY_WORKERS`` processes with at
+most one chunk per worker waiting. The changed rows of a chunk are written
+back in one statement and committed: ``UPDATE ... FROM (VALUES ...)`` on
+PostgreSQL, an executemany elsewhere. A dry run works out the same changes
+without writing them; ``--diff`` writes each change as a line of JSON. The
+admin dashboard queues a full run as a low-priority ``reclassify_questions``
+job.
+
+    python reclassify.py --dry-run --diff changes.jsonl
+    python reclassify.py --subject 3 --only difficulty
+    python reclassify.py --only topics --reassign-topics
+"""
+import sys
+import json
+import time
+import logging
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import text, update
+
+from app import db
+from categorizer import cached_categorizer, subject_taxonomies
+from difficulty import get_classifier
+from models import Question, QuestionDocument
+from question_features import scan_question
+
+logger = logging.getLogger(__name__)
+
+# Columns each kind of classification writes
+FIELDS = {
+    'type': ('question_type', 'has_formula'),
+    'difficulty': ('difficulty_level', 'difficulty_confidence'),
+    'topics': ('unit_id', 'unit_confidence', 'topic_id', 'topic_confidence'),
+}
+
+# Confidences closer than this count as unchanged
+CONFIDENCE_TOLERANCE = 5e-4
+
+
+def classify_chunk(job):
+    """Classify a chunk of questions; returns ``[(question_id, {column: value})]``.
+
+    ``job`` is ``(rows, taxonomies, fields, weights_file, categorizer)`` with
+    rows of ``(id, question_text, marks, subject_id)`` and the
+    :func:`categorizer.make_categorizer` arguments after the taxonomy. Runs in
+    a worker process, so it must not touch the database.
+    """
+    rows, taxonomies, fields, weights_file, categorizer = job
+    texts = [question_text for _, question_text, _, _ in rows]
+    values = [{} for _ in rows]
+
+    if 'type' in fields or 'difficulty' in fields:
+        scans = [scan_question(question_text) for question_text in texts]
+        if 'type' in fields:
+            for row_values, scan in zip(values, scans):
+                row_values.update(question_type=scan.question_type, has_formula=scan.has_formula)
+        if 'difficulty' in fields:
+            levels = get_classifier(weights_file).classify(
+                texts, [marks for _, _, marks, _ in rows], [scan.question_type for scan in scans],
+                [scan.has_formula for scan in scans], [scan.verb_counts for scan in scans])
+            for row_values, (level, confidence) in zip(values, levels):
+                row_values.update(difficulty_level=level, difficulty_confidence=confidence)
+
+    if 'topics' in fields:
+        by_subject = {}
+        for index, (_, _, _, subject_id) in enumerate(rows):
+            if taxonomies.get(subject_id):
+                by_subject.setdefault(subject_id, []).append(index)
+        for subject_id, indexes in by_subject.items():
+            categories = cached_categorizer(taxonomies[subject_id], *categorizer)\
+                .categorize([texts[index] for index in indexes])
+            for index, category in zip(indexes, categories):
+                if category.unit_id is not None:
+                    values[index].update(unit_id=category.unit_id, unit_confidence=category.unit_confidence)
+                if category.topic_id is not None:
+                    values[index].update(topic_id=category.topic_id, topic_confidence=category.topic_confidence)
+
+    return [(row[0], row_values) for row, row_values in zip(rows, values)]
+
+
+def diff_question(current, values, reassign_topics=False):
+    """``{column: (old, new)}`` for the classified values that change a question."""
+    changes = {}
+    for name, value in values.items():
+        assigned = name[:name.index('_')] + '_id' if name.startswith(('unit_', 'topic_')) else None
+        if assigned and current[assigned] is not None and not reassign_topics:
+            continue
+        old = current[name]
+        if isinstance(value, float) and isinstance(old, float) and abs(old - value) < CONFIDENCE_TOLERANCE:
+            continue
+        if old != value:
+            changes[name] = (old, value)
+    return changes
+
+
+def read_chunk(after_id, size, columns, subject_ids=None):
+    """The next ``size`` questions after ``after_id`` that were not edited by hand."""
+    query = db.session.query(Question.id, Question.question_text, Question.marks, QuestionDocument.subject_id,
+                             *(getattr(Question, name) for name in columns))\
+        .outerjoin(QuestionDocument, Question.document_id == QuestionDocument.id)\
+        .filter(Question.id > after_id, Question.manually_edited.is_(False))
+    if subject_ids:
+        query = query.filter(QuestionDocument.subject_id.in_(subject_ids))
+    return query.order_by(Question.id).limit(size).all()
+
+
+def write_changes(changed, columns):
+    """Write ``[(question_id, {column: value})]`` with every column of ``columns`` set."""
+    if db.engine.dialect.name == 'postgresql':
+        _update_from_values(changed, columns)
+    else:
+        db.session.execute(update(Question), [{'id': question_id, **row} for question_id, row in changed])
+
+
+def _update_from_values(changed, columns):
+    dialect = db.engine.dialect
+    table = Question.__table__
+    names = ('id', *columns)
+    types = {name: table.c[name].type.compile(dialect=dialect) for name in names}
+    params = {}
+    rows = []
+    for index, (question_id, row) in enumerate(changed):
+        cells = []
+        for name in names:
+            params[f'{name}_{index}'] = question_id if name == 'id' else row[name]
+            cells.append(f'CAST(:{name}_{index} AS {types[name]})')
+        rows.append(f"({', '.join(cells)})")
+    db.session.execute(text(
+        f"UPDATE questions SET {', '.join(f'{name} = v.{name}' for name in columns)} "
+        f"FROM (VALUES {', '.join(rows)}) AS v({', '.join(names)}) WHERE questions.id = v.id"), params)
+
+
+def run_reclassification(app, fields=tuple(FIELDS), subject_ids=None, reassign_topics=False, dry_run=False,
+                         limit=None, diff_file=None):
+    """Re-classify stored questions; returns the totals, with the number of changes per column."""
+    columns = tuple(column for field in fields for column in FIELDS[field])
+    totals = {'questions': 0, 'changed': 0, 'failed': 0, **{column: 0 for column in columns}}
+    workers = app.config.get('RECLASSIFY_WORKERS', 1)
+    chunk_size = app.config.get('RECLASSIFY_CHUNK_SIZE', 1000)
+    weights_file = app.config.get('DIFFICULTY_WEIGHTS_FILE')
+    categorizer = (app.config.get('TOPIC_CATEGORIZER', 'tfidf'), app.config.get('EMBEDDING_MODEL'),
+                   app.config.get('EMBEDDING_DIM'))
+    started = time.monotonic()
+
+    with app.app_context():
+        taxonomies = {}
+
+        def make_job(rows):
+            if 'topics' in fields:
+                new = {row.subject_id for row in rows if row.subject_id is not None} - taxonomies.keys()
+                taxonomies.update(subject_taxonomies(new))
+            chunk_taxonomies = {row.subject_id: taxonomies.get(row.subject_id) for row in rows} \
+                if 'topics' in fields else {}
+            return ([(row.id, row.question_text, row.marks, row.subject_id) for row in rows], chunk_taxonomies,
+                    fields, weights_file, categorizer)
+
+        def finish(current, result):
+            try:
+                classified = result()
+            except Exception as e:
+                logger.error("Classifying questions %s-%s failed: %s", min(current), max(current), e, exc_info=True)
+                totals['failed'] += len(current)
+                return
+            changed = []
+            for question_id, values in classified:
+                changes = diff_question(current[question_id], values, reassign_topics)
+                if not changes:
+                    continue
+                for name in changes:
+                    totals[name] += 1
+                if diff_file is not None:
+                    diff_file.write(json.dumps({'id': question_id, **changes}) + '\n')
+                row = {name: current[question_id][name] for name in columns}
+                row.update((name, new) for name, (_, new) in changes.items())
+                changed.append((question_id, row))
+            totals['questions'] += len(classified)
+            totals['changed'] += len(changed)
+            if changed and not dry_run:
+                write_changes(changed, columns)
+            # Also ends the read transaction of a dry run
+            db.session.commit()
+
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 0 else None
+        try:
+            pending = deque()
+            after_id = 0
+            remaining = limit
+            while remaining is None or remaining > 0:
+                rows = read_chunk(after_id, min(chunk_size, remaining or chunk_size), columns, subject_ids)
+                if not rows:
+                    break
+                after_id = rows[-1].id
+                if remaining is not None:
+                    remaining -= len(rows)
+                current = {row.id: row._asdict() for row in rows}
+                job = make_job(rows)
+                if executor is None:
+                    finish(current, lambda: classify_chunk(job))
+                    continue
+                pending.append((current, executor.submit(classify_chunk, job)))
+                while len(pending) > workers:
+                    current, future = pending.popleft()
+                    finish(current, future.result)
+            while pending:
+                current, future = pending.popleft()
+                finish(current, future.result)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True)
+            db.session.remove()
+
+    elapsed = time.monotonic() - started
+    logger.info("Re-classified %d questions in %.1fs%s: %s", totals['questions'], elapsed,
+                ' (dry run)' if dry_run else '', totals)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--only', action='append', choices=list(FIELDS), dest='fields',
+                        help='classify only this (repeatable; default all)')
+    parser.add_argument('--subject', type=int, action='append', dest='subject_ids',
+                        help="only questions of this subject's documents (repeatable)")
+    parser.add_argument('--reassign-topics', action='store_true',
+                        help='also replace units and topics that are already set')
+    parser.add_argument('--limit', type=int, help='re-classify at most this many questions')
+    parser.add_argument('--dry-run', action='store_true', help='report the changes without writing them')
+    parser.add_argument('--diff', help="write every change as a line of JSON to this file ('-' for stdout)")
+    args = parser.parse_args()
+
+    from app import app
+    diff_file = None
+    if args.diff:
+        diff_file = sys.stdout if args.diff == '-' else open(args.diff, 'w')
+    try:
+        totals = run_reclassification(app, fields=tuple(args.fields or FIELDS), subject_ids=args.subject_ids,
+                                      reassign_topics=args.reassign_topics, dry_run=args.dry_run,
+                                      limit=args.limit, diff_file=diff_file)
+    finally:
+        if diff_file not in (None, sys.stdout):
+            diff_file.close()
+    print(', '.join(f'{key}: {value}' for key, value in totals.items()), file=sys.stderr if args.diff == '-' else
+          sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
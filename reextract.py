@@ -0,0 +1,268 @@
+"""Re-extraction of question documents after extractor improvements.
+
+Every extraction stamps the document and the questions it writes with
+``question_processor.EXTRACTOR_VERSION``. After the version is bumped, this job
+runs the current extractor again over outdated documents. It starts with the
+lowest version and, within a version, takes the most recently uploaded
+documents first.
+
+New results are matched to existing questions by ``(page_number,
+question_number)``:
+
+* matched questions get only the extracted columns that actually changed;
+  unit and topic assignments are never touched,
+* questions edited by hand (``Question.manually_edited``) are left as they
+  are, and the extracted question in their place is dropped,
+* new questions are inserted, in the units and topics matched for them as on
+  a first extraction, and questions the extractor no longer finds are
+  deleted.
+
+Extraction runs in a small pool of low-priority worker processes and
+documents are started no faster than ``REEXTRACT_DOCUMENTS_PER_MINUTE``, so
+a re-run over the whole archive does not starve the web workers. The admin
+dashboard queues it as a low-priority ``reextract`` job for the workers.
+
+    python reextract.py --dry-run
+    python reextract.py --limit 50
+"""
+import os
+import time
+import logging
+import argparse
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from sqlalchemy import func, or_
+
+from app import db
+from models import Question, QuestionDocument
+from question_processor import (EXTRACTOR_VERSION, PDFQuestionExtractor, QuestionExtractor, assign_category,
+                                figure_options, question_columns, question_data)
+from question_figures import extract_question_figures, store_question_figures
+from storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class QuestionDiff:
+    """Changes that bring a document's questions up to date."""
+    inserts: list = field(default_factory=list)   # question column dicts
+    updates: list = field(default_factory=list)   # (Question, {column: value})
+    deletes: list = field(default_factory=list)   # Question
+    unchanged: int = 0
+    preserved: int = 0                            # manually edited, left alone
+
+    def summary(self):
+        return {
+            'inserted': len(self.inserts),
+            'updated': len(self.updates),
+            'deleted': len(self.deletes),
+            'unchanged': self.unchanged,
+            'preserved': self.preserved
+        }
+
+
+def diff_questions(existing, extracted):
+    """Diff extracted question columns against a document's Question rows."""
+    diff = QuestionDiff()
+    by_key = {}
+    for question in existing:
+        by_key.setdefault((question.page_number, question.question_number), []).append(question)
+
+    for columns in extracted:
+        matches = by_key.get((columns['page_number'], columns['question_number']))
+        if not matches:
+            diff.inserts.append(columns)
+            continue
+        question = matches.pop(0)
+        if question.manually_edited:
+            diff.preserved += 1
+            continue
+        changes = {name: value for name, value in columns.items() if getattr(question, name) != value}
+        if changes:
+            diff.updates.append((question, changes))
+        else:
+            diff.unchanged += 1
+
+    for questions in by_key.values():
+        for question in questions:
+            if question.manually_edited:
+                diff.preserved += 1
+            else:
+                diff.deletes.append(question)
+    return diff
+
+
+def apply_diff(document, diff):
+    """Write ``diff`` and stamp the document with the current extractor version."""
+    categories = QuestionExtractor().categorize_questions(document, [columns['question_text']
+                                                                     for columns in diff.inserts])
+    for columns, category in zip(diff.inserts, categories):
+        question = Question(**columns, document_id=document.id, extractor_version=EXTRACTOR_VERSION,
+                            created_at=datetime.utcnow())
+        assign_category(question, category)
+        db.session.add(question)
+    for question, changes in diff.updates:
+        for name, value in changes.items():
+            setattr(question, name, value)
+        question.extractor_version = EXTRACTOR_VERSION
+    for question in diff.deletes:
+        db.session.delete(question)
+
+    document.extractor_version = EXTRACTOR_VERSION
+    document.total_questions = len(diff.inserts) + len(diff.updates) + diff.unchanged + diff.preserved
+    document.processed_at = datetime.utcnow()
+    db.session.commit()
+
+
+def extract_document(job):
+    """Run the extractor over one PDF and return question dicts (see ``question_data``).
+
+    ``job`` is ``(pdf_path, mode, figure_dir, figure_options)``; figures are
+    cropped into ``figure_dir``, or skipped when it is None. Runs in a worker
+    process, so it must not touch the database or the storage backend.
+    """
+    pdf_path, mode, figure_dir, figure_options = job
+    extracted = PDFQuestionExtractor(pdf_path, mode=mode).extract_questions()
+    figure_paths = {}
+    if figure_dir is not None:
+        try:
+            figure_paths = extract_question_figures(pdf_path, extracted, figure_dir, **figure_options)
+        except Exception as e:
+            logger.warning("Figure extraction failed for %s: %s", pdf_path, e)
+    return [question_data(eq, figure_paths.get(index)) for index, eq in enumerate(extracted)]
+
+
+def _lower_priority(niceness):
+    try:
+        os.nice(niceness)
+    except (AttributeError, OSError):
+        pass
+
+
+def outdated_documents(limit=None):
+    """Completed documents extracted by an older extractor, in priority order."""
+    query = QuestionDocument.query.filter(
+        QuestionDocument.extraction_status == QuestionDocument.STATUS_COMPLETED,
+        or_(QuestionDocument.extractor_version.is_(None),
+            QuestionDocument.extractor_version < EXTRACTOR_VERSION)
+    ).order_by(func.coalesce(QuestionDocument.extractor_version, 0),
+               QuestionDocument.uploaded_at.desc(), QuestionDocument.id.desc())
+    if limit:
+        query = query.limit(limit)
+    return query.all()
+
+
+def _extraction_job(app, document, figure_root):
+    figure_dir = None
+    if app.config.get('FIGURE_EXTRACTION_ENABLED', True):
+        figure_dir = os.path.join(figure_root, str(document.id))
+    return (get_storage(app).local_path(document.file_path), app.config.get('QUESTION_EXTRACTION_MODE', 'layout'),
+            figure_dir, figure_options(app.config))
+
+
+def _store_figures(document_id, extracted, dry_run):
+    """Move the figures cropped for ``extracted`` into storage, pointing the questions at their keys."""
+    figure_paths = {index: data['image_paths'] for index, data in enumerate(extracted) if data['image_paths']}
+    if figure_paths:
+        figure_keys = store_question_figures(get_storage(), document_id, figure_paths, dry_run=dry_run)
+        for index, keys in figure_keys.items():
+            extracted[index]['image_paths'] = keys
+    return extracted
+
+
+def _update_document(document_id, extracted, dry_run):
+    document = db.session.get(QuestionDocument, document_id)
+    existing = Question.query.filter_by(document_id=document_id).order_by(Question.id).all()
+    extracted = _store_figures(document_id, extracted, dry_run)
+    diff = diff_questions(existing, [question_columns(data) for data in extracted])
+    if not dry_run:
+        apply_diff(document, diff)
+    summary = diff.summary()
+    logger.info("Re-extracted document %s%s: %s", document_id, ' (dry run)' if dry_run else '', summary)
+    return summary
+
+
+def run_reextraction(app, document_ids=None, limit=None, dry_run=False):
+    """Re-extract outdated documents (or ``document_ids``); returns the totals."""
+    totals = {'documents': 0, 'failed': 0, 'inserted': 0, 'updated': 0, 'deleted': 0,
+              'unchanged': 0, 'preserved': 0}
+    workers = app.config.get('REEXTRACT_WORKERS', 1)
+    per_minute = app.config.get('REEXTRACT_DOCUMENTS_PER_MINUTE', 0)
+    interval = 60.0 / per_minute if per_minute > 0 else 0
+
+    # Figures are cropped here by the worker processes, then moved into storage
+    with app.app_context(), tempfile.TemporaryDirectory(prefix='reextract-') as figure_root:
+        if document_ids:
+            documents = QuestionDocument.query.filter(QuestionDocument.id.in_(document_ids)) \
+                .order_by(QuestionDocument.id).all()
+        else:
+            documents = outdated_documents(limit)
+        jobs = [(document.id, _extraction_job(app, document, figure_root)) for document in documents]
+        db.session.remove()
+        logger.info("Re-extracting %d documents with extractor version %d", len(jobs), EXTRACTOR_VERSION)
+
+        def finish(document_id, result):
+            try:
+                summary = _update_document(document_id, result(), dry_run)
+            except Exception as e:
+                logger.error("Re-extraction of document %s failed: %s", document_id, e, exc_info=True)
+                db.session.rollback()
+                totals['failed'] += 1
+                return
+            totals['documents'] += 1
+            for key, value in summary.items():
+                totals[key] += value
+
+        executor = None
+        if workers > 0:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_lower_priority,
+                                           initargs=(app.config.get('REEXTRACT_NICE', 10),))
+        try:
+            pending = deque()
+            next_start = time.monotonic()
+            for document_id, job in jobs:
+                # Rate limit: start documents at most every `interval` seconds
+                delay = next_start - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                next_start = max(next_start, time.monotonic()) + interval
+
+                if executor is None:
+                    finish(document_id, lambda: extract_document(job))
+                    continue
+                pending.append((document_id, executor.submit(extract_document, job)))
+                while len(pending) >= workers:
+                    document_id, future = pending.popleft()
+                    finish(document_id, future.result)
+            while pending:
+                document_id, future = pending.popleft()
+                finish(document_id, future.result)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True)
+            db.session.remove()
+
+    logger.info("Re-extraction finished: %s", totals)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--limit', type=int, help='re-extract at most this many documents')
+    parser.add_argument('--document', type=int, action='append', dest='document_ids',
+                        help='re-extract this document even if it is up to date (repeatable)')
+    parser.add_argument('--dry-run', action='store_true', help='report the changes without writing them')
+    args = parser.parse_args()
+
+    from app import app
+    totals = run_reextraction(app, document_ids=args.document_ids, limit=args.limit, dry_run=args.dry_run)
+    print(', '.join(f'{key}: {value}' for key, value in totals.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,24 +2,34 @@ from datetime import datetime, timedelta
 from flask import render_template, request, flash, redirect, url_for, send_file, jsonify, session, current_app, json
 from flask_login import current_user, login_user, logout_user
 from sqlalchemy import desc, func, exc
+from sqlalchemy.orm import joinedload
 import os
-import uuid
 import traceback
-from threading import Thread
 from werkzeug.utils import secure_filename
 
 from app import app, db, socketio
 from auth import require_login, require_admin
+from query_audit import query_budget
+from pagination import keyset_paginate
+from keyword_index import papers_with_keyword
+from bulk_ingest import create_bulk_batch
+from similar_questions import index_exists, similar_questions
+from extraction_profile import PROFILERS, STAGES
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from storage import PAPERS, QUESTION_DOCUMENTS, get_storage, send_stored_file
+from storage_migration import count_legacy_rows
+from pdf_optimizer import count_pending_rows, optimization_savings, queue_optimization
+import chunked_upload
+from chunked_upload import UploadError
+import jobs
+from progress import BATCH_EVENT, DOCUMENT_EVENT, document_state, event_response
 from models import (ResearchPaper, Department, User, DownloadLog, Keyword, 
-                   QuestionDocument, Question, Subject, Unit, Topic, GeneratedQuestionPaper)
+                   QuestionDocument, Question, Subject, Unit, Topic, GeneratedQuestionPaper,
+                   BulkUploadBatch, BulkUploadItem, UploadSession)
 from forms import (UploadPaperForm, SearchForm, UserProfileForm, LoginForm, SignupForm, 
                   ChangePasswordForm, UploadQuestionDocumentForm, GenerateQuestionPaperForm,
                   SubjectManagementForm, UnitManagementForm, TopicManagementForm, ManualQuestionForm)
 from utils import extract_pdf_metadata, extract_keywords_from_text, save_uploaded_file, format_file_size, allowed_file, generate_unique_filename
-from question_processor import QuestionExtractor
-
-# Dictionary to store extraction status
-extraction_status_dict = {}
 
 # Make session permanent
 @app.before_request
@@ -89,16 +99,19 @@ def logout():
     return redirect(url_for('index'))
 
 @app.route('/')
+@query_budget(6)
 def index():
     """Landing page - shows recent papers if logged in, otherwise landing page."""
     if current_user.is_authenticated:
         # Show recent papers and statistics
-        recent_papers = ResearchPaper.query.filter_by(status='approved').order_by(desc(ResearchPaper.uploaded_at)).limit(5).all()
+        recent_papers = ResearchPaper.query.options(joinedload(ResearchPaper.dept))\
+            .filter_by(status='approved').order_by(desc(ResearchPaper.uploaded_at)).limit(5).all()
         total_papers = ResearchPaper.query.filter_by(status='approved').count()
         total_downloads = db.session.query(func.sum(ResearchPaper.download_count)).scalar() or 0
         
         # Get popular papers
-        popular_papers = ResearchPaper.query.filter_by(status='approved').order_by(desc(ResearchPaper.download_count)).limit(5).all()
+        popular_papers = ResearchPaper.query.options(joinedload(ResearchPaper.dept))\
+            .filter_by(status='approved').order_by(desc(ResearchPaper.download_count)).limit(5).all()
         
         return render_template('index.html', 
                              recent_papers=recent_papers,
@@ -123,15 +136,24 @@ def upload_paper():
             flash('Invalid department selected.', 'error')
             return render_template('upload.html', form=form)
         
-        # Save file
-        filename, file_path = save_uploaded_file(file, None, department.name, form.publication_year.data or datetime.now().year)
+        # Save file, or take over the one sent ahead in chunks
+        if form.upload_id.data:
+            try:
+                filename, file_path, original_filename = chunked_upload.attach_upload(
+                    form.upload_id.data, current_user.id, PAPERS)
+            except UploadError:
+                filename = file_path = None
+        else:
+            filename, file_path = save_uploaded_file(file, None, department.name, form.publication_year.data or datetime.now().year)
+            original_filename = file.filename
         
         if not filename:
             flash('Error saving file. Please try again.', 'error')
             return render_template('upload.html', form=form)
         
         # Extract metadata from PDF
-        extracted_metadata = extract_pdf_metadata(file_path)
+        storage = get_storage()
+        extracted_metadata = extract_pdf_metadata(storage.local_path(file_path))
         
         # Use form data or extracted metadata
         title = form.title.data.strip() if form.title.data else extracted_metadata.get('title', '')
@@ -147,14 +169,14 @@ def upload_paper():
         # Validate required fields
         if not title:
             flash('Title is required. Please provide a title for your paper.', 'error')
-            if file_path and os.path.exists(file_path):
-                os.remove(file_path)
+            storage.delete(file_path)
+            form.upload_id.data = ''
             return render_template('upload.html', form=form)
         
         if not authors:
             flash('Authors field is required. Please provide author information.', 'error')
-            if file_path and os.path.exists(file_path):
-                os.remove(file_path)
+            storage.delete(file_path)
+            form.upload_id.data = ''
             return render_template('upload.html', form=form)
         
         # Create research paper record
@@ -164,9 +186,9 @@ def upload_paper():
             abstract=abstract or '',
             keywords=keywords or '',
             filename=filename,
-            original_filename=file.filename,
+            original_filename=original_filename,
             file_path=file_path,
-            file_size=os.path.getsize(file_path) if os.path.exists(file_path) else 0,
+            file_size=storage.size(file_path) if storage.exists(file_path) else 0,
             publication_year=form.publication_year.data or datetime.now().year,
             department_id=department.id,
             uploader_id=current_user.id,
@@ -176,18 +198,10 @@ def upload_paper():
         db.session.add(paper)
         db.session.commit()
         
-        # Update keyword frequency
+        # Keywords are linked and counted by a background job
         if keywords:
-            keyword_list = [k.strip().lower() for k in keywords.split(',') if k.strip()]
-            for keyword_text in keyword_list:
-                keyword = Keyword.query.filter_by(name=keyword_text).first()
-                if keyword:
-                    keyword.frequency += 1
-                else:
-                    keyword = Keyword(name=keyword_text, frequency=1)
-                    db.session.add(keyword)
-        
-        db.session.commit()
+            jobs.enqueue(jobs.INDEX_KEYWORDS, {'paper_ids': [paper.id]})
+        queue_optimization(paper_ids=[paper.id])
         
         flash('Paper uploaded successfully!', 'success')
         return redirect(url_for('paper_detail', id=paper.id))
@@ -198,7 +212,15 @@ def upload_paper():
 @app.route('/bulk-upload', methods=['POST'])
 @require_login
 def bulk_upload_papers():
-    """Handle bulk upload of multiple research papers with the same metadata."""
+    """Accept a bulk upload of research papers sharing the same metadata.
+    
+    Files are saved and queued as a batch; metadata extraction and inserts
+    run in the background. Poll the returned ``status_url`` (or listen for
+    ``bulk_upload_progress``) for per-file results.
+    """
+    # Batches are larger than a single paper upload
+    request.max_content_length = current_app.config['BULK_UPLOAD_MAX_CONTENT_LENGTH']
+    
     # Check if files were uploaded
     if 'files' not in request.files:
         return jsonify({'success': False, 'error': 'No files uploaded'}), 400
@@ -213,135 +235,41 @@ def bulk_upload_papers():
         department_id = int(form_data.get('department_id', 0))
         publication_year = int(form_data.get('publication_year', datetime.now().year))
         
-        # Get optional fields
-        title = form_data.get('title', '').strip()
-        authors = form_data.get('authors', '').strip()
-        abstract = form_data.get('abstract', '').strip()
-        keywords = form_data.get('keywords', '').strip()
+        # Optional fields shared by every file
+        defaults = {key: (form_data.get(key) or '').strip()
+                    for key in ('title', 'authors', 'abstract', 'keywords')}
         
         # Validate department
         department = Department.query.get(department_id)
         if not department:
             return jsonify({'success': False, 'error': 'Invalid department selected'}), 400
         
-        # Process each file
-        success_count = 0
-        error_messages = []
+        batch = create_bulk_batch(files, department, publication_year, current_user.id, defaults)
+        jobs.enqueue(jobs.BULK_INGEST, {'batch_id': batch.id})
         
-        for i, file in enumerate(files):
-            if file and allowed_file(file.filename):
-                try:
-                    # Save the file
-                    filename, file_path = save_uploaded_file(
-                        file, None, department.name, publication_year
-                    )
-                    
-                    if not filename or not file_path:
-                        error_messages.append(f"{file.filename}: Error saving file")
-                        continue
-                    
-                    # Extract metadata if not provided
-                    file_title = title
-                    file_authors = authors
-                    file_abstract = abstract
-                    file_keywords = keywords
-                    
-                    if not file_title or not file_authors:
-                        extracted_metadata = extract_pdf_metadata(file_path)
-                        
-                        if not file_title:
-                            file_title = extracted_metadata.get('title', '')
-                        if not file_authors:
-                            file_authors = extracted_metadata.get('authors', '')
-                        if not file_abstract:
-                            file_abstract = extracted_metadata.get('abstract', '')
-                        if not file_keywords:
-                            file_keywords = extracted_metadata.get('keywords', '')
-                    
-                    # Extract keywords from abstract if still no keywords
-                    if not file_keywords and file_abstract:
-                        extracted_keywords = extract_keywords_from_text(file_abstract)
-                        file_keywords = ', '.join(extracted_keywords[:5])
-                    
-                    # Validate required fields
-                    if not file_title:
-                        error_messages.append(f"{file.filename}: Could not determine title")
-                        if os.path.exists(file_path):
-                            os.remove(file_path)
-                        continue
-                        
-                    if not file_authors:
-                        error_messages.append(f"{file.filename}: Could not determine authors")
-                        if os.path.exists(file_path):
-                            os.remove(file_path)
-                        continue
-                    
-                    # Create research paper record
-                    paper = ResearchPaper(
-                        title=file_title,
-                        authors=file_authors,
-                        abstract=file_abstract or '',
-                        keywords=file_keywords or '',
-                        filename=filename,
-                        original_filename=file.filename,
-                        file_path=file_path,
-                        file_size=os.path.getsize(file_path) if os.path.exists(file_path) else 0,
-                        publication_year=publication_year,
-                        department_id=department.id,
-                        uploader_id=current_user.id,
-                        status='approved'  # Auto-approve for simplicity
-                    )
-                    
-                    db.session.add(paper)
-                    
-                    # Update keyword frequency
-                    if file_keywords:
-                        keyword_list = [k.strip().lower() for k in file_keywords.split(',') if k.strip()]
-                        for keyword_text in keyword_list:
-                            keyword = Keyword.query.filter_by(name=keyword_text).first()
-                            if keyword:
-                                keyword.frequency += 1
-                            else:
-                                keyword = Keyword(name=keyword_text, frequency=1)
-                                db.session.add(keyword)
-                    
-                    success_count += 1
-                    
-                    # Commit after each file to ensure we don't lose everything on error
-                    db.session.commit()
-                    
-                except Exception as e:
-                    db.session.rollback()
-                    error_messages.append(f"{file.filename}: {str(e)}")
-                    current_app.logger.error(f"Error processing {file.filename}: {str(e)}\n{traceback.format_exc()}")
-                    
-                    # Clean up file if it was saved but DB operation failed
-                    if 'file_path' in locals() and file_path and os.path.exists(file_path):
-                        try:
-                            os.remove(file_path)
-                        except Exception as e:
-                            current_app.logger.error(f"Error cleaning up file {file_path}: {str(e)}")
-            else:
-                error_messages.append(f"{file.filename if hasattr(file, 'filename') else 'Unknown file'}: Invalid file type")
+        error_messages = [f"{item.original_filename}: {item.error}"
+                          for item in batch.items if item.status == BulkUploadItem.STATUS_FAILED]
+        queued = batch.total_files - len(error_messages)
         
-        # Prepare response
         response = {
-            'success': success_count > 0,
-            'processed': success_count,
-            'total': len(files),
+            'success': queued > 0,
+            'batch_id': batch.id,
+            'status_url': url_for('bulk_upload_status', batch_id=batch.id),
+            'queued': queued,
+            'total': batch.total_files,
             'errors': error_messages
         }
-        
-        if success_count > 0:
-            response['message'] = f'Successfully uploaded {success_count} of {len(files)} files.'
+        if queued > 0:
+            response['message'] = f'Processing {queued} of {batch.total_files} files.'
             if error_messages:
-                response['message'] += ' Some files had errors.'
+                response['message'] += ' Some files were rejected.'
         else:
             response['message'] = 'No files were uploaded successfully.'
         
-        return jsonify(response)
+        return jsonify(response), 202
         
     except Exception as e:
+        db.session.rollback()
         current_app.logger.error(f"Error in bulk upload: {str(e)}\n{traceback.format_exc()}")
         return jsonify({
             'success': False,
@@ -350,7 +278,101 @@ def bulk_upload_papers():
         }), 500
 
 
+@app.route('/bulk-upload/<int:batch_id>')
+@require_login
+@query_budget(3)
+def bulk_upload_status(batch_id):
+    """Per-file progress of a bulk upload."""
+    batch = BulkUploadBatch.query.options(joinedload(BulkUploadBatch.items)).get_or_404(batch_id)
+    if batch.uploader_id != current_user.id and not current_user.is_admin:
+        return jsonify({'error': 'Access denied'}), 403
+    return jsonify(batch.get_status_info(include_items=True))
+
+
+@app.route('/bulk-upload/<int:batch_id>/events')
+@require_login
+@query_budget(2)
+def bulk_upload_events(batch_id):
+    """Server-sent progress events of a bulk upload."""
+    batch = BulkUploadBatch.query.get_or_404(batch_id)
+    if batch.uploader_id != current_user.id and not current_user.is_admin:
+        return jsonify({'error': 'Access denied'}), 403
+    return event_response(f'bulk_{batch_id}', BATCH_EVENT,
+                          lambda: db.session.get(BulkUploadBatch, batch_id).get_status_info())
+
+
+@app.route('/uploads', methods=['POST'])
+@require_login
+def create_upload():
+    """Open a chunked upload; see :mod:`chunked_upload`."""
+    data = request.get_json(silent=True) or {}
+    try:
+        upload = chunked_upload.create_upload(current_user.id, data.get('filename'), data.get('size'),
+                                              data.get('purpose'), data.get('sha256'))
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+    response = jsonify(chunked_upload.upload_state(upload))
+    response.headers['Location'] = url_for('upload_status', token=upload.token)
+    return response, 201
+
+
+def _own_upload(token):
+    upload = UploadSession.query.filter_by(token=token).first()
+    if upload is None or upload.user_id != current_user.id:
+        return None
+    return upload
+
+
+@app.route('/uploads/<token>')
+@require_login
+@query_budget(2)
+def upload_status(token):
+    """Offset and status of a chunked upload, for resuming it."""
+    upload = _own_upload(token)
+    if upload is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    response = jsonify(chunked_upload.upload_state(upload))
+    response.cache_control.no_store = True
+    return response
+
+
+@app.route('/uploads/<token>', methods=['PATCH'])
+@require_login
+def upload_chunk(token):
+    """Append one chunk, sent as the raw request body, at the ``Upload-Offset`` header."""
+    upload = _own_upload(token)
+    if upload is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return jsonify({'error': 'Upload-Offset header is required'}), 400
+    try:
+        chunked_upload.receive_chunk(upload, offset, request.stream)
+    except UploadError as e:
+        state = chunked_upload.upload_state(upload)
+        state['error'] = str(e)
+        if e.offset is not None:
+            state['offset'] = e.offset
+        return jsonify(state), e.status
+    return jsonify(chunked_upload.upload_state(upload))
+
+
+@app.route('/uploads/<token>', methods=['DELETE'])
+@require_login
+def cancel_upload(token):
+    """Abandon a chunked upload and remove what was received."""
+    upload = _own_upload(token)
+    if upload is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    if upload.status == UploadSession.STATUS_ATTACHED:
+        return jsonify({'error': 'Upload is already attached'}), 409
+    chunked_upload.cancel_upload(upload)
+    return '', 204
+
+
 @app.route('/search')
+@query_budget(4)
 def search():
     """Search and filter research papers."""
     form = SearchForm(request.args)
@@ -358,7 +380,7 @@ def search():
     total_results = 0
     
     # Build query
-    query = ResearchPaper.query.filter_by(status='approved')
+    query = ResearchPaper.query.options(joinedload(ResearchPaper.dept)).filter_by(status='approved')
     
     # Apply filters
     if form.query.data:
@@ -382,15 +404,17 @@ def search():
         query = query.filter(ResearchPaper.publication_year <= form.year_to.data)
     
     if form.keywords.data:
+        # Exact keyword match through the indexed paper_keywords table
         keyword_terms = [k.strip() for k in form.keywords.data.split(',')]
         for term in keyword_terms:
             if term:
-                query = query.filter(ResearchPaper.keywords.ilike(f"%{term}%"))
+                query = query.filter(ResearchPaper.id.in_(papers_with_keyword(term)))
     
-    # Execute query with pagination
-    page = request.args.get('page', 1, type=int)
-    papers_pagination = query.order_by(desc(ResearchPaper.uploaded_at)).paginate(
-        page=page, per_page=10, error_out=False
+    # Execute query with keyset pagination
+    papers_pagination = keyset_paginate(
+        query, ResearchPaper.uploaded_at, ResearchPaper.id,
+        after=request.args.get('after'), before=request.args.get('before'),
+        per_page=10, with_total=True
     )
     
     papers = papers_pagination.items
@@ -404,9 +428,13 @@ def search():
                          format_file_size=format_file_size)
 
 @app.route('/paper/<int:id>')
+@query_budget(2)
 def paper_detail(id):
     """View paper details."""
-    paper = ResearchPaper.query.get_or_404(id)
+    paper = ResearchPaper.query.options(
+        joinedload(ResearchPaper.dept),
+        joinedload(ResearchPaper.uploader)
+    ).get_or_404(id)
     
     # Check if paper is approved or user has access
     if paper.status != 'approved':
@@ -428,7 +456,7 @@ def download_paper(id):
         return render_template('403.html'), 403
     
     # Check if file exists
-    if not os.path.exists(paper.file_path):
+    if not get_storage().exists(paper.file_path):
         flash('File not found. Please contact administrator.', 'error')
         return redirect(url_for('paper_detail', id=id))
     
@@ -446,16 +474,15 @@ def download_paper(id):
     db.session.commit()
     
     # Send file
-    return send_file(paper.file_path, 
-                     as_attachment=True, 
-                     download_name=paper.original_filename,
-                     mimetype='application/pdf')
+    return send_stored_file(paper.file_path, paper.original_filename)
 
 @app.route('/my-papers')
 @require_login
+@query_budget(2)
 def my_papers():
     """View user's uploaded papers."""
-    papers = ResearchPaper.query.filter_by(uploader_id=current_user.id).order_by(desc(ResearchPaper.uploaded_at)).all()
+    papers = ResearchPaper.query.options(joinedload(ResearchPaper.dept))\
+        .filter_by(uploader_id=current_user.id).order_by(desc(ResearchPaper.uploaded_at)).all()
     return render_template('my_papers.html', papers=papers, format_file_size=format_file_size)
 
 @app.route('/profile', methods=['GET', 'POST'])
@@ -495,6 +522,7 @@ def change_password():
 # Admin routes
 @app.route('/admin')
 @require_admin
+@query_budget(6)
 def admin_dashboard():
     """Admin dashboard with analytics."""
     # Get statistics
@@ -515,17 +543,22 @@ def admin_dashboard():
 
 @app.route('/admin/papers')
 @require_admin
+@query_budget(3)
 def admin_papers():
     """Admin view of all papers."""
     status_filter = request.args.get('status', 'all')
-    page = request.args.get('page', 1, type=int)
     
-    query = ResearchPaper.query
+    query = ResearchPaper.query.options(
+        joinedload(ResearchPaper.dept),
+        joinedload(ResearchPaper.uploader)
+    )
     if status_filter != 'all':
         query = query.filter_by(status=status_filter)
     
-    papers_pagination = query.order_by(desc(ResearchPaper.uploaded_at)).paginate(
-        page=page, per_page=20, error_out=False
+    papers_pagination = keyset_paginate(
+        query, ResearchPaper.uploaded_at, ResearchPaper.id,
+        after=request.args.get('after'), before=request.args.get('before'),
+        per_page=20, with_total=True
     )
     
     return render_template('admin_papers.html', 
@@ -535,16 +568,33 @@ def admin_papers():
 
 @app.route('/admin/users')
 @require_admin
+@query_budget(5)
 def admin_users():
     """Admin view of all users."""
-    page = request.args.get('page', 1, type=int)
-    users_pagination = User.query.order_by(desc(User.created_at)).paginate(
-        page=page, per_page=20, error_out=False
+    users_pagination = keyset_paginate(
+        User.query, User.created_at, User.id,
+        after=request.args.get('after'), before=request.args.get('before'),
+        per_page=20, with_total=True
     )
     form = SignupForm()
     return render_template('admin_users.html', 
                          users=users_pagination,
-                         form=form)
+                         form=form,
+                         **user_activity_counts(users_pagination.items))
+
+def user_activity_counts(users):
+    """Count papers and downloads for a page of users with two grouped queries."""
+    user_ids = [user.id for user in users]
+    if not user_ids:
+        return {'paper_counts': {}, 'download_counts': {}}
+    
+    paper_counts = dict(db.session.query(ResearchPaper.uploader_id, func.count(ResearchPaper.id))
+                        .filter(ResearchPaper.uploader_id.in_(user_ids))
+                        .group_by(ResearchPaper.uploader_id).all())
+    download_counts = dict(db.session.query(DownloadLog.user_id, func.count(DownloadLog.id))
+                           .filter(DownloadLog.user_id.in_(user_ids))
+                           .group_by(DownloadLog.user_id).all())
+    return {'paper_counts': paper_counts, 'download_counts': download_counts}
 
 @app.route('/admin/users/add', methods=['GET', 'POST'])
 @require_admin
@@ -568,11 +618,13 @@ def admin_add_user():
         flash('User added successfully!', 'success')
         return redirect(url_for('admin_users'))
     # If GET or invalid POST, show the users page with the form and errors
-    page = request.args.get('page', 1, type=int)
-    users_pagination = User.query.order_by(desc(User.created_at)).paginate(
-        page=page, per_page=20, error_out=False
+    users_pagination = keyset_paginate(
+        User.query, User.created_at, User.id,
+        after=request.args.get('after'), before=request.args.get('before'),
+        per_page=20, with_total=True
     )
-    return render_template('admin_users.html', users=users_pagination, form=form)
+    return render_template('admin_users.html', users=users_pagination, form=form,
+                           **user_activity_counts(users_pagination.items))
 
 @app.route('/admin/users/delete/<int:user_id>', methods=['POST'])
 @require_admin
@@ -586,6 +638,171 @@ def admin_delete_user(user_id):
     flash('User deleted successfully.', 'success')
     return redirect(url_for('admin_users'))
 
+@app.route('/admin/reextract', methods=['POST'])
+@require_admin
+def admin_reextract():
+    """Re-extract question documents processed by an older extractor."""
+    # The extraction modules stay out of the web role until an admin needs them
+    from reextract import outdated_documents
+    outdated = len(outdated_documents())
+    if not outdated:
+        flash('All question documents are up to date.', 'info')
+    else:
+        # Low priority so new uploads are extracted first
+        jobs.enqueue(jobs.REEXTRACT, priority=-10, dedupe=True)
+        flash(f'Re-extracting {outdated} question documents in the background.', 'success')
+    return redirect(url_for('admin_dashboard'))
+
+@app.route('/admin/storage/migrate', methods=['POST'])
+@require_admin
+def admin_migrate_storage():
+    """Move files still stored under absolute paths into the storage backend."""
+    legacy = count_legacy_rows()
+    if not legacy:
+        flash('All files are in the storage backend.', 'info')
+    else:
+        jobs.enqueue(jobs.MIGRATE_STORAGE, priority=-10, dedupe=True)
+        flash(f'Migrating {legacy} files to the storage backend in the background.', 'success')
+    return redirect(url_for('admin_dashboard'))
+
+@app.route('/admin/pdfs/optimize', methods=['POST'])
+@require_admin
+def admin_optimize_pdfs():
+    """Rewrite uploaded PDFs that were never optimized."""
+    pending = count_pending_rows()
+    optimized, saved = optimization_savings()
+    summary = f'{optimized} files optimized so far, saving {format_file_size(saved)}.'
+    if not pending:
+        flash(f'All PDFs have been optimized. {summary}', 'info')
+    else:
+        jobs.enqueue(jobs.OPTIMIZE_PDFS, priority=-10, dedupe=True)
+        flash(f'Optimizing {pending} PDFs in the background. {summary}', 'success')
+    return redirect(url_for('admin_dashboard'))
+
+@app.route('/admin/questions/reclassify', methods=['POST'])
+@require_admin
+def admin_reclassify_questions():
+    """Re-run the type, difficulty and topic classifiers over stored questions."""
+    questions = Question.query.filter(Question.manually_edited.is_(False)).count()
+    if not questions:
+        flash('There are no questions to re-classify.', 'info')
+    else:
+        jobs.enqueue(jobs.RECLASSIFY, priority=-10, dedupe=True)
+        flash(f'Re-classifying {questions} questions in the background.', 'success')
+    return redirect(url_for('admin_dashboard'))
+
+@app.route('/admin/questions/similarity-index', methods=['POST'])
+@require_admin
+def admin_index_questions():
+    """Build the index behind the similar questions of the question page."""
+    jobs.enqueue(jobs.EMBED_QUESTIONS, priority=-10, dedupe=True)
+    action = 'Rebuilding' if index_exists(app) else 'Building'
+    flash(f'{action} the similar-question index in the background.', 'success')
+    return redirect(url_for('admin_dashboard'))
+
+@app.route('/admin/profiling')
+@require_admin
+@query_budget(3)
+def admin_profiling():
+    """Stage timings of the most recent question extractions."""
+    documents = QuestionDocument.query.filter(QuestionDocument.extraction_timings.isnot(None))\
+        .order_by(desc(QuestionDocument.processed_at), desc(QuestionDocument.id)).limit(50).all()
+    rows = [(doc, doc.get_timings()) for doc in documents]
+    rows = [(doc, timings) for doc, timings in rows if timings]
+
+    # Where the time went across all listed extractions
+    totals = {}
+    for _, timings in rows:
+        for name, stage in timings['stages'].items():
+            totals[name] = totals.get(name, 0) + stage['ms']
+    overall = sum(totals.values()) or 1
+    breakdown = [(name, totals[name], totals[name] / overall * 100)
+                 for name in sorted(totals, key=totals.get, reverse=True)]
+
+    profiled = {doc_id for doc_id, in db.session.query(QuestionDocument.id)
+                .filter(QuestionDocument.id.in_([doc.id for doc, _ in rows]),
+                        QuestionDocument.extraction_profile_report.isnot(None))}
+    return render_template('admin_profiling.html', rows=rows, stages=STAGES, breakdown=breakdown,
+                           profilers=PROFILERS, profiled=profiled)
+
+@app.route('/admin/profiling/<int:document_id>', methods=['POST'])
+@require_admin
+def admin_profile_extraction(document_id):
+    """Time one document's extraction again under a profiler, without saving its questions."""
+    doc = QuestionDocument.query.get_or_404(document_id)
+    profiler = request.form.get('profiler', PROFILERS[0])
+    if profiler not in PROFILERS:
+        flash('Unknown profiler.', 'error')
+        return redirect(url_for('admin_profiling'))
+    jobs.enqueue(jobs.PROFILE_EXTRACTION, {'document_id': doc.id, 'profiler': profiler}, dedupe=True)
+    flash(f'Profiling the extraction of "{doc.title}" with {profiler}. The report appears here when it finishes.',
+          'success')
+    return redirect(url_for('admin_profiling'))
+
+@app.route('/admin/profiling/<int:document_id>/report')
+@require_admin
+@query_budget(2)
+def admin_profile_report(document_id):
+    """Profiler report of the last profiled extraction, as plain text."""
+    report = db.session.query(QuestionDocument.extraction_profile_report)\
+        .filter(QuestionDocument.id == document_id).scalar()
+    if not report:
+        return 'No profiler report for this document.', 404, {'Content-Type': 'text/plain; charset=utf-8'}
+    return report, 200, {'Content-Type': 'text/plain; charset=utf-8'}
+
+@app.route('/healthz')
+@query_budget(4)
+def healthz():
+    """Liveness of the web role: database reachable, queue depth and live workers."""
+    try:
+        db.session.execute(db.text('SELECT 1'))
+        queue = jobs.queue_stats()
+        workers = jobs.live_workers(current_app.config['WORKER_HEALTH_TIMEOUT'])
+    except exc.SQLAlchemyError as e:
+        app.logger.error(f"Health check failed: {str(e)}")
+        return jsonify({'status': 'error', 'role': current_app.config['PROCESS_ROLE'],
+                        'error': 'database unavailable'}), 503
+    return jsonify({
+        'status': 'ok',
+        'role': current_app.config['PROCESS_ROLE'],
+        'queue': queue,
+        'workers': [{'name': worker.name, 'role': worker.role, 'running_jobs': worker.running_jobs}
+                    for worker in workers]
+    })
+
+@app.route('/metrics')
+@query_budget(3)
+def metrics():
+    """Request metrics of this process and queue gauges, in the Prometheus text format."""
+    if not current_app.config['METRICS_ENABLED']:
+        return jsonify({'error': 'Not found'}), 404
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    gauges = []
+    try:
+        queue = jobs.queue_stats()
+        workers = jobs.live_workers(current_app.config['WORKER_HEALTH_TIMEOUT'])
+        gauges += [('researchnest_jobs_queued', 'Jobs waiting for a worker.', queue['queued']),
+                   ('researchnest_jobs_running', 'Jobs being run by a worker.', queue['running']),
+                   ('researchnest_jobs_oldest_queued_seconds', 'Age of the oldest queued job.',
+                    queue['oldest_queued_seconds']),
+                   ('researchnest_workers_alive', 'Workers that reported in recently.', len(workers))]
+    except exc.SQLAlchemyError as e:
+        app.logger.error(f"Could not read queue metrics: {str(e)}")
+    return current_app.extensions['metrics'].render(gauges), 200, {'Content-Type': METRICS_CONTENT_TYPE}
+
+@app.route('/healthz/worker')
+@query_budget(1)
+def healthz_worker():
+    """200 while at least one worker is sending heartbeats, 503 otherwise."""
+    try:
+        workers = jobs.live_workers(current_app.config['WORKER_HEALTH_TIMEOUT'])
+    except exc.SQLAlchemyError:
+        workers = []
+    return jsonify({'status': 'ok' if workers else 'no workers', 'workers': len(workers)}), 200 if workers else 503
+
 @app.route('/admin/approve/<int:id>')
 @require_admin
 def approve_paper(id):
@@ -689,147 +906,24 @@ def api_top_keywords():
 
 @app.route('/questions')
 @require_login
+@query_budget(4)
 def question_documents():
     """View all question documents."""
-    page = request.args.get('page', 1, type=int)
     subject_id = request.args.get('subject_id', type=int)
     
-    query = QuestionDocument.query
+    query = QuestionDocument.query.options(joinedload(QuestionDocument.subject))
     if subject_id:
         query = query.filter_by(subject_id=subject_id)
     
-    documents = query.order_by(desc(QuestionDocument.uploaded_at)).paginate(
-        page=page, per_page=10, error_out=False
+    documents = keyset_paginate(
+        query, QuestionDocument.uploaded_at, QuestionDocument.id,
+        after=request.args.get('after'), before=request.args.get('before'),
+        per_page=10
     )
     
     subjects = Subject.query.all()
     return render_template('questions/list.html', documents=documents, subjects=subjects)
 
-def process_question_document_async(app, doc_id):
-    """Background task to process question document."""
-    with app.app_context():
-        try:
-            doc = QuestionDocument.query.get(doc_id)
-            if not doc:
-                app.logger.error(f"Document {doc_id} not found for processing")
-                return
-            
-            # Update status to processing
-            doc.update_status(
-                status=QuestionDocument.STATUS_PROCESSING,
-                message="Starting document processing...",
-                progress=10
-            )
-            
-            # Initialize extractor and get total pages for progress tracking
-            extractor = QuestionExtractor()
-            
-            # Get total pages for progress calculation
-            try:
-                import fitz  # PyMuPDF
-                doc_ref = fitz.open(doc.file_path)
-                total_pages = len(doc_ref)
-                doc_ref.close()
-                
-                # Update document with total pages
-                doc.total_pages = total_pages
-                db.session.commit()
-                
-            except Exception as e:
-                app.logger.warning(f"Could not get total pages for document {doc_id}: {str(e)}")
-                total_pages = 0
-            
-            # Process the document
-            doc.update_status(
-                status=QuestionDocument.STATUS_EXTRACTING,
-                message="Extracting questions from document...",
-                progress=30
-            )
-            
-            # Process the document with progress updates
-            def progress_callback(current_page, total_pages, message=None):
-                if total_pages > 0:
-                    progress = 30 + int(60 * (current_page / total_pages))  # 30-90% for extraction
-                    progress = min(progress, 90)  # Cap at 90% to leave room for saving
-                else:
-                    progress = 90  # Default to 90% if we can't calculate progress
-                
-                doc.update_status(
-                    status=QuestionDocument.STATUS_EXTRACTING,
-                    message=message or f"Processing page {current_page} of {total_pages if total_pages > 0 else '?'}...",
-                    progress=progress
-                )
-                doc.processed_pages = current_page
-                db.session.commit()
-            
-            # Set the progress callback in the extractor if it supports it
-            if hasattr(extractor, 'set_progress_callback'):
-                extractor.set_progress_callback(progress_callback)
-            
-            # Process the document
-            extractor.process_document(doc_id)
-            
-            # Update status to saving
-            doc.update_status(
-                status=QuestionDocument.STATUS_SAVING,
-                message="Saving extracted questions to database...",
-                progress=95
-            )
-            
-            # Refresh the object to get updated question count
-            doc = QuestionDocument.query.get(doc_id)
-            total_questions = len(doc.questions) if doc.questions else 0
-            
-            # Update status to completed
-            doc.update_status(
-                status=QuestionDocument.STATUS_COMPLETED,
-                message=f"Successfully extracted {total_questions} questions",
-                progress=100
-            )
-            
-            # Notify via WebSocket if available
-            if 'socketio' in globals():
-                socketio.emit('extraction_complete', 
-                            {'document_id': doc_id, 'status': 'completed',
-                             'question_count': total_questions},
-                            room=f'doc_{doc_id}')
-                                
-        except Exception as e:
-            error_msg = f"Error processing document {doc_id}: {str(e)}"
-            app.logger.error(error_msg, exc_info=True)
-            db.session.rollback()
-            
-            # Update status to failed
-            doc = QuestionDocument.query.get(doc_id)
-            if doc:
-                doc.update_status(
-                    status=QuestionDocument.STATUS_FAILED,
-                    message=f"Error: {str(e)[:200]}",
-                    progress=100
-                )
-            
-            # Update extraction status dict
-            if doc_id in extraction_status_dict:
-                extraction_status_dict[doc_id].update({
-                    'status': 'failed',
-                    'message': f'Error: {str(e)[:200]}',
-                    'progress': 100,
-                    'thread_alive': False
-                })
-            
-            # Log the error
-            app.logger.error(f"[Background Task] Failed to process document {doc_id}: {str(e)}", exc_info=True)
-                
-            # Notify via WebSocket if available
-            if 'socketio' in globals():
-                try:
-                    socketio.emit('extraction_complete', 
-                                {'document_id': doc_id, 'status': 'failed', 
-                                 'error': str(e)[:500]},
-                                room=f'doc_{doc_id}')
-                except Exception as ws_error:
-                    app.logger.error(f"Error sending WebSocket notification: {str(ws_error)}")
-
 @app.route('/questions/upload', methods=['GET', 'POST'])
 @require_login
 def upload_question_document():
@@ -846,7 +940,15 @@ def upload_question_document():
             subject = Subject.query.get(form.subject_id.data)
             
             try:
-                filename, file_path = save_question_document_file(file, subject, form.academic_year.data)
+                if form.upload_id.data:
+                    try:
+                        filename, file_path, original_filename = chunked_upload.attach_upload(
+                            form.upload_id.data, current_user.id, QUESTION_DOCUMENTS)
+                    except UploadError:
+                        filename = file_path = None
+                else:
+                    filename, file_path = save_question_document_file(file, subject, form.academic_year.data)
+                    original_filename = file.filename
                 
                 if not filename or not file_path:
                     flash('Failed to save the uploaded file. Please try again.', 'error')
@@ -854,20 +956,21 @@ def upload_question_document():
                     return render_template('questions/upload.html', form=form)
                 
                 # Ensure the file was actually saved
-                if not os.path.exists(file_path):
+                storage = get_storage()
+                if not storage.exists(file_path):
                     flash('Failed to save the uploaded file. The file was not found after saving.', 'error')
                     app.logger.error(f"File not found after saving: {file_path}")
                     return render_template('questions/upload.html', form=form)
                 
                 # Get file size
-                file_size = os.path.getsize(file_path)
+                file_size = storage.size(file_path)
                 
                 # Create new question document
                 doc = QuestionDocument(
                     title=form.title.data or f"{subject.name} Questions - {form.document_type.data}",
                     filename=filename,
-                    original_filename=file.filename,
-                    file_path=file_path,  # Store full path in the database
+                    original_filename=original_filename,
+                    file_path=file_path,  # Storage key
                     file_size=file_size,
                     subject_id=subject.id,
                     document_type=form.document_type.data,
@@ -890,31 +993,13 @@ def upload_question_document():
             db.session.add(doc)
             db.session.commit()
             
-            # Start background task to extract questions
-            app.logger.info(f"Starting background thread for document processing. Document ID: {doc.id}")
+            # Queue question extraction for a worker
             try:
-                thread = Thread(
-                    target=process_question_document_async,
-                    args=(current_app._get_current_object(), doc.id)
-                )
-                thread.daemon = True
-                thread.start()
-                app.logger.info(f"Background thread started successfully for document ID: {doc.id}")
-                
-                # Store extraction status
-                extraction_id = str(uuid.uuid4())
-                extraction_status_dict[doc.id] = {
-                    'status': 'pending',
-                    'progress': 0,
-                    'message': 'Waiting to start extraction',
-                    'start_time': datetime.utcnow().isoformat(),
-                    'document_id': doc.id,
-                    'thread_alive': True
-                }
-                app.logger.info(f"Extraction status dict updated for document ID: {doc.id}")
-                
+                job = jobs.enqueue(jobs.EXTRACT_QUESTIONS, {'document_id': doc.id})
+                app.logger.info(f"Queued extraction job {job.id} for document ID: {doc.id}")
+                queue_optimization(document_ids=[doc.id])
             except Exception as e:
-                app.logger.error(f"Failed to start background thread for document ID {doc.id}: {str(e)}", exc_info=True)
+                app.logger.error(f"Failed to queue extraction for document ID {doc.id}: {str(e)}", exc_info=True)
                 db.session.rollback()
                 flash('Failed to start document processing. Please try again.', 'error')
                 return render_template('questions/upload.html', form=form)
@@ -931,10 +1016,11 @@ def upload_question_document():
 
 @app.route('/questions/<int:document_id>/status')
 @require_login
+@query_budget(3)
 def get_question_document_status(document_id):
     """Get the status of a question document extraction."""
     try:
-        app.logger.debug(f"Fetching status for document ID: {document_id}")
+        app.logger.debug("Fetching status for document ID: %s", document_id)
         
         # Check if document exists
         doc = QuestionDocument.query.get(document_id)
@@ -956,21 +1042,9 @@ def get_question_document_status(document_id):
         # Get the status information from the document
         status_info = doc.get_status_info()
         
-        # Get thread status from extraction_status_dict if available
-        thread_status = {}
-        if document_id in extraction_status_dict:
-            thread_status = extraction_status_dict[document_id]
-            app.logger.debug(f"Thread status for document {document_id}: {thread_status}")
-        
-        # If document status is pending/processing but thread is not alive, mark as failed
-        if (status_info['status'] in ['pending', 'processing'] and 
-            thread_status.get('thread_alive') is False):
-            app.logger.warning(f"Thread for document {document_id} is not alive but document status is {status_info['status']}")
-            status_info.update({
-                'status': 'failed',
-                'message': 'Document processing failed. Please try uploading again.',
-                'progress': 100
-            })
+        # Count questions with a single COUNT(*) instead of loading every row
+        question_count = db.session.query(func.count(Question.id))\
+            .filter(Question.document_id == document_id).scalar()
         
         # Add additional information
         status_info.update({
@@ -978,18 +1052,19 @@ def get_question_document_status(document_id):
             'document_title': doc.title,
             'uploaded_at': doc.uploaded_at.isoformat() if doc.uploaded_at else None,
             'elapsed_seconds': (datetime.utcnow() - doc.uploaded_at).total_seconds() if doc.uploaded_at else 0,
-            'question_count': len(doc.questions) if doc.questions else 0,
-            'has_questions': len(doc.questions) > 0 if doc.questions else False,
+            'question_count': question_count,
+            'has_questions': question_count > 0,
             'total_pages': doc.total_pages,
             'processed_pages': doc.processed_pages,
             'extraction_status': doc.extraction_status,
             'extraction_message': doc.extraction_message,
             'extraction_progress': doc.extraction_progress,
+            'timings': doc.get_timings(),
             'is_complete': status_info.get('is_complete', False),
             'is_failed': status_info.get('is_failed', False)
         })
         
-        app.logger.debug(f"Returning status for document {document_id}: {status_info}")
+        app.logger.debug("Returning status for document %s: %s", document_id, status_info)
         return jsonify(status_info)
         
     except Exception as e:
@@ -999,8 +1074,20 @@ def get_question_document_status(document_id):
             'message': 'An error occurred while fetching the document status.'
         }), 500
 
+@app.route('/questions/<int:document_id>/events')
+@require_login
+@query_budget(2)
+def question_document_events(document_id):
+    """Server-sent status events of a question document extraction."""
+    doc = QuestionDocument.query.get_or_404(document_id)
+    if not current_user.is_admin and doc.uploader_id != current_user.id:
+        return jsonify({'error': 'Access denied'}), 403
+    return event_response(f'doc_{document_id}', DOCUMENT_EVENT,
+                          lambda: document_state(db.session.get(QuestionDocument, document_id)))
+
 @app.route('/questions/<int:document_id>/extraction-status')
 @require_login
+@query_budget(2)
 def question_extraction_status(document_id):
     """View the extraction status of a question document."""
     doc = QuestionDocument.query.get_or_404(document_id)
@@ -1014,13 +1101,39 @@ def question_extraction_status(document_id):
 
 @app.route('/questions/<int:document_id>')
 @require_login
+@query_budget(3)
 def question_document_detail(document_id):
     """View question document details and extracted questions."""
-    document = QuestionDocument.query.get_or_404(document_id)
-    questions = Question.query.filter_by(document_id=document_id).order_by(Question.page_number, Question.question_number).all()
+    document = QuestionDocument.query.options(
+        joinedload(QuestionDocument.subject),
+        joinedload(QuestionDocument.uploader)
+    ).get_or_404(document_id)
+    questions = Question.query.options(
+        joinedload(Question.unit),
+        joinedload(Question.topic)
+    ).filter_by(document_id=document_id).order_by(Question.page_number, Question.question_number).all()
     
     return render_template('questions/detail.html', document=document, questions=questions)
 
+@app.route('/question/<int:question_id>')
+@require_login
+@query_budget(3)
+def question_detail(question_id):
+    """One question with the questions most similar to it."""
+    question = Question.query.options(
+        joinedload(Question.unit),
+        joinedload(Question.topic),
+        joinedload(Question.document)
+    ).get_or_404(question_id)
+    similar = []
+    matches = similar_questions(question)
+    if matches:
+        by_id = {q.id: q for q in Question.query.options(joinedload(Question.document))
+                 .filter(Question.id.in_([match_id for match_id, _ in matches]))}
+        similar = [(by_id[match_id], score) for match_id, score in matches if match_id in by_id]
+
+    return render_template('questions/question.html', question=question, similar=similar)
+
 @app.route('/questions/<int:document_id>/download')
 @require_login
 def download_question_document(document_id):
@@ -1028,16 +1141,66 @@ def download_question_document(document_id):
     document = QuestionDocument.query.get_or_404(document_id)
     
     try:
-        return send_file(
-            document.file_path,
-            as_attachment=True,
-            download_name=document.original_filename,
-            mimetype='application/pdf'
-        )
+        return send_stored_file(document.file_path, document.original_filename)
     except FileNotFoundError:
         flash('File not found.', 'error')
         return redirect(url_for('question_document_detail', document_id=document_id))
 
+@app.route('/questions/<int:document_id>/pages')
+@require_login
+@query_budget(1)
+def question_document_pages(document_id):
+    """Page sizes and tile URLs for the page viewer."""
+    document = QuestionDocument.query.get_or_404(document_id)
+    page_cache = current_app.extensions['page_cache']
+    try:
+        manifest = page_cache.manifest(get_storage().local_path(document.file_path))
+    except (FileNotFoundError, RuntimeError) as e:
+        current_app.logger.warning(f"Cannot read pages of document {document_id}: {str(e)}")
+        return jsonify({'error': 'File not found'}), 404
+
+    # Tiles live at <tile_url>/<page>/<zoom>/<x>/<y>
+    manifest['tile_url'] = f"{url_for('question_document_pages', document_id=document_id)}/{manifest['token']}"
+    return jsonify(manifest)
+
+@app.route('/questions/<int:document_id>/pages/<token>/<int:page>/<int:zoom>/<int:x>/<int:y>')
+@require_login
+@query_budget(3)
+def question_document_tile(document_id, token, page, zoom, x, y):
+    """One rendered page tile; 202 while a cold tile is being rendered."""
+    document = QuestionDocument.query.get_or_404(document_id)
+    page_cache = current_app.extensions['page_cache']
+    pdf_path = get_storage().local_path(document.file_path)
+    try:
+        manifest = page_cache.manifest(pdf_path)
+    except (FileNotFoundError, RuntimeError):
+        return jsonify({'error': 'File not found'}), 404
+
+    # A stale token means the PDF changed since the viewer loaded
+    if token != manifest['token'] or page >= len(manifest['pages']) or zoom >= len(page_cache.zoom_levels):
+        return jsonify({'error': 'Tile not found'}), 404
+    columns, rows = page_cache.tile_count(manifest['pages'][page], zoom)
+    if x >= columns or y >= rows:
+        return jsonify({'error': 'Tile not found'}), 404
+
+    # A web-only process leaves rendering to the workers
+    render = current_app.config['PROCESS_ROLE'] != 'web'
+    path = page_cache.tile(pdf_path, token, page, zoom, x, y, render=render)
+    if path is None:
+        if not render and page_cache.should_dispatch(token, page, zoom):
+            jobs.enqueue(jobs.RENDER_PAGE, {'document_id': document_id, 'token': token, 'page': page, 'zoom': zoom},
+                         priority=10, dedupe=True)
+        response = jsonify({'status': 'rendering'})
+        response.status_code = 202
+        response.headers['Retry-After'] = '1'
+        response.cache_control.no_store = True
+        return response
+
+    response = send_file(path, mimetype=page_cache.mimetype, max_age=current_app.config['PAGE_CACHE_MAX_AGE'])
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    return response
+
 @app.route('/generate-paper', methods=['GET', 'POST'])
 @require_login
 def generate_question_paper():
@@ -1049,6 +1212,7 @@ def generate_question_paper():
     
     if form.validate_on_submit():
         # Generate question paper
+        from question_processor import QuestionExtractor
         extractor = QuestionExtractor()
         
         difficulty_distribution = {
@@ -1170,9 +1334,11 @@ def download_generated_paper(id):
 
 @app.route('/my-generated-papers')
 @require_login
+@query_budget(2)
 def my_generated_papers():
     """View user's generated question papers."""
-    papers = GeneratedQuestionPaper.query.filter_by(generated_by=current_user.id)\
+    papers = GeneratedQuestionPaper.query.options(joinedload(GeneratedQuestionPaper.subject))\
+        .filter_by(generated_by=current_user.id)\
         .order_by(desc(GeneratedQuestionPaper.generated_at)).all()
     
     return render_template('questions/my_generated.html', papers=papers)
@@ -1279,9 +1445,9 @@ def add_topic():
 @app.route('/manage/questions')
 @require_login
 @require_admin
+@query_budget(7)
 def manage_questions():
     """Manage all questions with filtering and pagination."""
-    page = request.args.get('page', 1, type=int)
     per_page = 20
     
     # Get filter parameters
@@ -1292,7 +1458,7 @@ def manage_questions():
     search = request.args.get('search', '').strip()
     
     # Base query
-    query = Question.query
+    query = Question.query.options(joinedload(Question.unit), joinedload(Question.topic))
     
     # Apply filters
     if subject_id:
@@ -1308,7 +1474,11 @@ def manage_questions():
         query = query.filter(Question.question_text.ilike(search))
     
     # Order and paginate
-    questions = query.order_by(Question.created_at.desc()).paginate(page=page, per_page=per_page)
+    questions = keyset_paginate(
+        query, Question.created_at, Question.id,
+        after=request.args.get('after'), before=request.args.get('before'),
+        per_page=per_page
+    )
     
     # Get filter options
     subjects = Subject.query.all()
@@ -1351,7 +1521,8 @@ def add_question():
                 image_paths=form.image_path.data if form.has_image.data and form.image_path.data else None,
                 document_id=form.document_id.data if form.document_id.data != 0 else None,
                 page_number=form.page_number.data if form.page_number.data else None,
-                question_number=form.question_number.data if form.question_number.data else None
+                question_number=form.question_number.data if form.question_number.data else None,
+                manually_edited=True
             )
             
             db.session.add(question)
@@ -1390,6 +1561,7 @@ def edit_question(question_id):
             question.document_id = form.document_id.data if form.document_id.data != 0 else None
             question.page_number = form.page_number.data if form.page_number.data else None
             question.question_number = form.question_number.data if form.question_number.data else None
+            question.manually_edited = True
             
             db.session.commit()
             flash('Question updated successfully!', 'success')
@@ -1437,41 +1609,18 @@ def api_get_topics(unit_id):
     return jsonify([{'id': t.id, 'name': t.name} for t in topics])
 
 def save_question_document_file(file, subject, academic_year):
-    """Save uploaded question document file."""
+    """Save uploaded question document file; returns its filename and storage key."""
     if file and file.filename.lower().endswith('.pdf'):
-        from werkzeug.utils import secure_filename
-        
-        # Generate a secure filename with timestamp
-        filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{secure_filename(file.filename)}"
-        
-        # Create directory structure: uploads/questions/subject_code/year/
-        base_dir = os.path.abspath(app.config.get('UPLOAD_FOLDER', 'uploads'))
-        year_dir = academic_year or datetime.now().year
-        
-        # Ensure base uploads directory exists
-        os.makedirs(base_dir, exist_ok=True, mode=0o755)
-        
-        # Ensure questions directory exists
-        questions_dir = os.path.join(base_dir, 'questions')
-        os.makedirs(questions_dir, exist_ok=True, mode=0o755)
-        
-        # Create subject and year directories
-        subject_dir = os.path.join(questions_dir, secure_filename(subject.code))
-        year_dir_path = os.path.join(subject_dir, str(year_dir))
+        # Keys share one namespace across subjects and years, so names must be unique
+        filename = generate_unique_filename(file.filename)
         
         try:
-            # Create directories with proper permissions
-            os.makedirs(year_dir_path, exist_ok=True, mode=0o755)
-            
-            # Save the file
-            file_path = os.path.join(year_dir_path, filename)
-            file.save(file_path)
-            
-            # Set permissions on the uploaded file
-            os.chmod(file_path, 0o644)
+            storage = get_storage()
+            key = storage.key_for(QUESTION_DOCUMENTS, filename)
+            storage.save(file.stream, key)
             
-            # Return both the filename and full file path
-            return filename, file_path
+            # Return both the filename and the storage key
+            return filename, key
             
         except Exception as e:
             app.logger.error(f"Error saving file: {str(e)}", exc_info=True)
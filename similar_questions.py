@@ -0,0 +1,96 @@
+"""Questions similar to a question, from an embedding index of the question bank.
+
+Every question's text is embedded (:mod:`embeddings`) into the ``questions``
+index in ``EMBEDDING_INDEX_FOLDER`` (:mod:`vector_index`). The question page
+lists the nearest questions by cosine similarity. Lookups only read the
+memory-mapped index, and the question's own vector comes from the index too.
+Only a question added since the last build is embedded in the request.
+
+**Rebuild Similarity Index** on the admin dashboard queues the first build
+as an ``index_question_embeddings`` job. After that, every extraction queues
+a rebuild. Rebuilds are low priority and deduplicated, so a bulk upload
+leads to one rebuild after it rather than one per document. A rebuild reads
+the questions in id-ordered chunks, so memory use stays flat.
+
+:mod:`embeddings` and :mod:`vector_index` (and with them numpy) are imported
+on first use, not when the web app starts.
+"""
+import os
+import time
+import logging
+
+from flask import current_app
+
+import jobs
+from app import db
+from models import Question
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = 'questions'
+
+# Questions read and embedded at a time while building
+CHUNK_SIZE = 1000
+
+
+def index_folder(app):
+    return app.config.get('EMBEDDING_INDEX_FOLDER') or os.path.join(app.instance_path, 'embeddings')
+
+
+def question_embedder(app):
+    from embeddings import DEFAULT_DIM, get_embedder
+    return get_embedder(app.config.get('EMBEDDING_MODEL') or None, app.config.get('EMBEDDING_DIM', DEFAULT_DIM))
+
+
+def index_exists(app):
+    return os.path.exists(os.path.join(index_folder(app), f'{INDEX_NAME}.json'))
+
+
+def queue_index_refresh():
+    """Queue a rebuild of the index once it exists, after questions were added."""
+    if index_exists(current_app):
+        jobs.enqueue(jobs.EMBED_QUESTIONS, priority=-10, dedupe=True)
+
+
+def build_question_index(app):
+    """Embed every question into a new build of the index; returns the totals."""
+    from vector_index import build_index
+
+    started = time.monotonic()
+    embedder = question_embedder(app)
+    with app.app_context():
+        def batches():
+            after_id = 0
+            while True:
+                rows = db.session.query(Question.id, Question.question_text)\
+                    .filter(Question.id > after_id).order_by(Question.id).limit(CHUNK_SIZE).all()
+                db.session.commit()
+                if not rows:
+                    return
+                after_id = rows[-1].id
+                yield [row.id for row in rows], embedder.embed([row.question_text for row in rows])
+
+        try:
+            count = build_index(index_folder(app), INDEX_NAME, batches(), embedder.dim, embedder.name,
+                                ivf_min_vectors=app.config.get('EMBEDDING_IVF_MIN_VECTORS', 50000))
+        finally:
+            db.session.remove()
+    return {'questions': count, 'seconds': round(time.monotonic() - started, 1)}
+
+
+def similar_questions(question, limit=5):
+    """``[(question_id, score)]`` of the questions most like ``question``, best first.
+
+    Empty until the index is built, and while it was built by another embedder.
+    """
+    from vector_index import load_index
+
+    index = load_index(index_folder(current_app), INDEX_NAME)
+    embedder = question_embedder(current_app)
+    if index is None or index.embedder != embedder.name or not len(index):
+        return []
+    vector = index.vector(question.id)
+    if vector is None:
+        vector = embedder.embed([question.question_text])[0]
+    return index.search(vector, limit, probes=current_app.config.get('EMBEDDING_IVF_PROBES', 8),
+                        exclude={question.id})
@@ -0,0 +1,97 @@
+// ResearchNest Chunked Uploads
+// Sends a file to /uploads in chunks (see chunked_upload.py) so it is not
+// bound by the request size limit. An interrupted upload of the same file
+// carries on from the offset the server holds, also after a page reload.
+
+(function() {
+    // Waits between retries of a chunk that failed on the network or server
+    const RETRY_DELAYS = [1000, 2000, 5000, 10000, 30000];
+
+    function resumeKey(file, purpose) {
+        return `upload:${purpose}:${file.name}:${file.size}:${file.lastModified}`;
+    }
+
+    function sleep(ms) {
+        return new Promise(resolve => setTimeout(resolve, ms));
+    }
+
+    async function readState(response) {
+        const state = await response.json().catch(() => ({}));
+        if (!response.ok && !state.status) {
+            throw new Error(state.error || `Upload failed (${response.status})`);
+        }
+        return state;
+    }
+
+    // The earlier upload of this file if the server still has it, else a new one
+    async function openUpload(file, purpose) {
+        const key = resumeKey(file, purpose);
+        const saved = localStorage.getItem(key);
+        if (saved) {
+            const response = await fetch(`/uploads/${saved}`);
+            if (response.ok) {
+                const state = await response.json();
+                if (state.status === 'uploading' || state.status === 'complete') return state;
+            }
+            localStorage.removeItem(key);
+        }
+
+        const response = await fetch('/uploads', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({filename: file.name, size: file.size, purpose: purpose})
+        });
+        const state = await readState(response);
+        localStorage.setItem(key, state.id);
+        return state;
+    }
+
+    async function sendChunk(file, state) {
+        const end = Math.min(state.offset + state.chunk_size, file.size);
+        try {
+            return await fetch(`/uploads/${state.id}`, {
+                method: 'PATCH',
+                headers: {'Upload-Offset': String(state.offset), 'Content-Type': 'application/offset+octet-stream'},
+                body: file.slice(state.offset, end)
+            });
+        } catch (error) {
+            return null;
+        }
+    }
+
+    // Upload ``file``; resolves with the state of the complete upload, whose
+    // ``id`` goes into the form's upload_id field
+    async function upload(file, purpose, onProgress) {
+        const key = resumeKey(file, purpose);
+        let state = await openUpload(file, purpose);
+        let failures = 0;
+        if (onProgress) onProgress(state.offset, file.size);
+
+        while (state.status === 'uploading') {
+            const response = await sendChunk(file, state);
+            if (response === null || response.status >= 500) {
+                if (failures >= RETRY_DELAYS.length) throw new Error('Upload failed; please try again.');
+                await sleep(RETRY_DELAYS[failures++]);
+                // The chunk may have arrived in part; ask where to go on from
+                state = await fetch(`/uploads/${state.id}`).then(readState).catch(() => state);
+                continue;
+            }
+
+            const next = await readState(response);
+            if (!response.ok && !(response.status === 409 && next.status === 'uploading')) {
+                localStorage.removeItem(key);
+                throw new Error(next.error || 'Upload failed.');
+            }
+            // A 409 for a stale offset carries the right one
+            failures = 0;
+            state = next;
+            if (onProgress) onProgress(state.offset, file.size);
+        }
+
+        localStorage.removeItem(key);
+        if (state.status !== 'complete') throw new Error(state.error || 'Upload failed.');
+        return state;
+    }
+
+    window.ChunkedUpload = {upload: upload};
+})();
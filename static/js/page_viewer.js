@@ -0,0 +1,156 @@
+/**
+ * @file page_viewer.js
+ * @description Page thumbnails and a tiled page viewer for question documents.
+ *
+ * The server renders pages on demand and answers 202 while a tile is still
+ * being rendered, so tiles are fetched with retries and shown once they are
+ * ready. Rendered tiles are served with long-lived cache headers; revisiting
+ * a page is served from the browser cache.
+ *
+ * @requires Bootstrap 5
+ */
+document.addEventListener('DOMContentLoaded', function() {
+    'use strict';
+
+    const container = document.getElementById('pageViewer');
+    if (!container) {
+        return;
+    }
+
+    const thumbnails = document.getElementById('pageThumbnails');
+    const stage = document.getElementById('pageStage');
+    const zoomSelect = document.getElementById('pageZoom');
+    const MAX_RETRIES = 30;
+
+    let manifest = null;
+    let currentPage = 0;
+
+    /**
+     * Fetch a tile, waiting out 202 responses, and resolve to an object URL.
+     * @param {number} page - Zero-based page index
+     * @param {number} zoom - Zoom level index
+     * @param {number} x - Tile column
+     * @param {number} y - Tile row
+     * @returns {Promise<string>}
+     */
+    function loadTile(page, zoom, x, y) {
+        const url = `${manifest.tile_url}/${page}/${zoom}/${x}/${y}`;
+        let attempt = 0;
+
+        function request() {
+            return fetch(url, { credentials: 'same-origin' }).then(response => {
+                if (response.status === 202 && attempt < MAX_RETRIES) {
+                    attempt += 1;
+                    const delay = parseFloat(response.headers.get('Retry-After') || '1') * 1000;
+                    return new Promise(resolve => setTimeout(resolve, delay)).then(request);
+                }
+                if (!response.ok) {
+                    throw new Error(`Tile ${url} failed with ${response.status}`);
+                }
+                return response.blob().then(blob => URL.createObjectURL(blob));
+            });
+        }
+        return request();
+    }
+
+    function showTile(img, page, zoom, x, y) {
+        loadTile(page, zoom, x, y)
+            .then(src => {
+                img.onload = () => URL.revokeObjectURL(src);
+                img.src = src;
+            })
+            .catch(error => console.error(error));
+    }
+
+    /**
+     * Lay out the tile grid of a page at the selected zoom level.
+     * @param {number} page - Zero-based page index
+     */
+    function showPage(page) {
+        currentPage = page;
+        const zoom = parseInt(zoomSelect.value, 10);
+        const scale = manifest.zoom_levels[zoom];
+        const size = manifest.tile_size;
+        const width = Math.ceil(manifest.pages[page].width * scale);
+        const height = Math.ceil(manifest.pages[page].height * scale);
+
+        stage.innerHTML = '';
+        stage.style.width = `${width}px`;
+        stage.style.height = `${height}px`;
+
+        for (let y = 0; y * size < height; y++) {
+            for (let x = 0; x * size < width; x++) {
+                const img = document.createElement('img');
+                img.className = 'page-tile';
+                img.alt = '';
+                img.style.left = `${x * size}px`;
+                img.style.top = `${y * size}px`;
+                stage.appendChild(img);
+                showTile(img, page, zoom, x, y);
+            }
+        }
+
+        thumbnails.querySelectorAll('.page-thumbnail').forEach(thumb => {
+            thumb.classList.toggle('border-primary', parseInt(thumb.dataset.page, 10) === page);
+        });
+    }
+
+    function showThumbnails() {
+        manifest.pages.forEach((_, page) => {
+            const thumb = document.createElement('button');
+            thumb.type = 'button';
+            thumb.className = 'page-thumbnail btn p-1 me-2 mb-2 border';
+            thumb.dataset.page = page;
+            thumb.title = `Page ${page + 1}`;
+
+            const img = document.createElement('img');
+            img.alt = `Page ${page + 1}`;
+            thumb.appendChild(img);
+            thumb.appendChild(document.createElement('br'));
+            thumb.appendChild(document.createTextNode(`${page + 1}`));
+            thumb.addEventListener('click', () => showPage(page));
+            thumbnails.appendChild(thumb);
+
+            // Level 0 fits a whole page in one tile
+            showTile(img, page, 0, 0, 0);
+        });
+    }
+
+    zoomSelect.addEventListener('change', () => showPage(currentPage));
+
+    // Page badges on the extracted questions open their page
+    document.querySelectorAll('[data-show-page]').forEach(badge => {
+        badge.addEventListener('click', () => {
+            if (manifest) {
+                showPage(parseInt(badge.dataset.showPage, 10) - 1);
+                container.scrollIntoView({ behavior: 'smooth' });
+            }
+        });
+    });
+
+    fetch(container.dataset.pagesUrl, { credentials: 'same-origin' })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`Page list failed with ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(data => {
+            manifest = data;
+            // Level 0 is the thumbnail size; offer it only if there is nothing larger
+            const firstLevel = manifest.zoom_levels.length > 1 ? 1 : 0;
+            manifest.zoom_levels.forEach((scale, level) => {
+                if (level >= firstLevel) {
+                    zoomSelect.add(new Option(`${Math.round(scale * 100)}%`, level));
+                }
+            });
+            showThumbnails();
+            if (manifest.pages.length) {
+                showPage(0);
+            }
+        })
+        .catch(error => {
+            container.querySelector('.card-body').textContent = 'Page previews are not available for this document.';
+            console.error(error);
+        });
+});
@@ -14,9 +14,18 @@ document.addEventListener('DOMContentLoaded', function() {
     const progressBar = progressContainer ? progressContainer.querySelector('.progress-bar') : null;
     const extractionStatus = document.getElementById('extractionStatus');
     const extractionMessage = document.getElementById('extractionMessage');
+    const bulkUploadSelect = document.getElementById('is_bulk_upload');
+    const progressStatus = document.getElementById('progressStatus');
+    const progressCount = document.getElementById('progressCount');
+    const uploadIdInput = document.getElementById('upload_id');
 
-    // File size limit (20MB)
-    const MAX_FILE_SIZE = 20 * 1024 * 1024;
+    // How often to poll a running bulk upload (ms), and how long a silent
+    // progress stream is trusted before falling back to polling
+    const BULK_POLL_INTERVAL = 1000;
+    const BULK_QUIET_AFTER = 15000;
+
+    // File size limit, from UPLOAD_MAX_FILE_SIZE
+    const MAX_FILE_SIZE = uploadForm ? Number(uploadForm.dataset.maxFileSize) || 20 * 1024 * 1024 : 20 * 1024 * 1024;
 
     // Initialize drag and drop
     initializeDragAndDrop();
@@ -102,7 +111,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
         // Validate file size
         if (file.size > MAX_FILE_SIZE) {
-            showAlert(`File size exceeds 20MB limit. Your file is ${formatFileSize(file.size)}.`, 'error');
+            showAlert(`File size exceeds the ${formatFileSize(MAX_FILE_SIZE)} limit. Your file is ${formatFileSize(file.size)}.`, 'error');
             clearFile();
             return;
         }
@@ -125,6 +134,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
     function clearFile() {
         if (fileInput) fileInput.value = '';
+        if (uploadIdInput) uploadIdInput.value = '';
         if (uploadPrompt) uploadPrompt.style.display = 'block';
         if (fileInfo) fileInfo.style.display = 'none';
         if (extractionStatus) extractionStatus.style.display = 'none';
@@ -144,6 +154,20 @@ document.addEventListener('DOMContentLoaded', function() {
             return;
         }
 
+        // Bulk uploads are queued server-side and tracked by polling
+        if (bulkUploadSelect && bulkUploadSelect.value === 'True') {
+            e.preventDefault();
+            submitBulkUpload();
+            return;
+        }
+
+        // Send the file ahead in chunks; the form then only names the upload
+        if (window.ChunkedUpload && uploadIdInput && !uploadIdInput.value) {
+            e.preventDefault();
+            submitChunkedUpload(fileInput.files[0]);
+            return;
+        }
+
         // Show progress
         showProgress();
         
@@ -158,6 +182,190 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    function submitChunkedUpload(file) {
+        if (submitBtn) {
+            submitBtn.disabled = true;
+            submitBtn.innerHTML = '<i data-feather="loader" class="me-1"></i>Uploading...';
+            feather.replace();
+        }
+        if (progressContainer) progressContainer.style.display = 'block';
+        showExtractionStatus('Uploading file...', 'info');
+
+        ChunkedUpload.upload(file, 'papers', (sent, total) => {
+            const percent = total ? Math.round(sent * 100 / total) : 0;
+            if (progressBar) progressBar.style.width = `${percent}%`;
+            if (progressStatus) progressStatus.textContent = `Uploading... ${percent}%`;
+            if (progressCount) progressCount.textContent = `${formatFileSize(sent)} of ${formatFileSize(total)}`;
+        })
+            .then(upload => {
+                uploadIdInput.value = upload.id;
+                fileInput.value = '';
+                showExtractionStatus('Upload complete. Extracting metadata...', 'info');
+                if (submitBtn) {
+                    submitBtn.innerHTML = '<i data-feather="loader" class="me-1"></i>Processing...';
+                    feather.replace();
+                }
+                // submit() skips the submit handler and the file input's required check
+                uploadForm.submit();
+            })
+            .catch(error => {
+                showAlert(error.message, 'error');
+                if (progressContainer) progressContainer.style.display = 'none';
+                resetSubmitButton();
+            });
+    }
+
+    function submitBulkUpload() {
+        const files = Array.from(fileInput.files);
+        const field = id => {
+            const el = document.getElementById(id);
+            return el ? el.value.trim() : '';
+        };
+
+        const formData = new FormData();
+        files.forEach(file => formData.append('files', file));
+        formData.append('form_data', JSON.stringify({
+            department_id: field('department_id'),
+            publication_year: field('publication_year') || new Date().getFullYear(),
+            title: field('title'),
+            authors: field('authors'),
+            abstract: field('abstract'),
+            keywords: field('keywords')
+        }));
+
+        if (submitBtn) {
+            submitBtn.disabled = true;
+            submitBtn.innerHTML = '<i data-feather="loader" class="me-1"></i>Uploading...';
+            feather.replace();
+        }
+        if (progressContainer) progressContainer.style.display = 'block';
+        updateBulkProgress({processed: 0, total: files.length, progress: 0}, 'Uploading files...');
+
+        fetch('/bulk-upload', {method: 'POST', body: formData})
+            .then(response => response.json())
+            .then(data => {
+                if (!data.batch_id) {
+                    throw new Error(data.error || data.message || 'Bulk upload failed.');
+                }
+                (data.errors || []).forEach(error => showAlert(error, 'warning'));
+                followBulkUpload(data.batch_id, data.status_url);
+            })
+            .catch(error => {
+                showAlert(error.message, 'error');
+                resetSubmitButton();
+            });
+    }
+
+    // Follow a bulk upload over Socket.IO when the page loads it, otherwise
+    // over server-sent events; poll only without a working stream
+    function followBulkUpload(batchId, statusUrl) {
+        if (typeof io === 'undefined') {
+            if (window.EventSource) {
+                streamBulkUpload(batchId, statusUrl);
+            } else {
+                pollBulkUpload(statusUrl);
+            }
+            return;
+        }
+        const socket = io({transports: ['websocket', 'polling']});
+        let done = false;
+        let quietTimer = null;
+
+        // The socket failed or went quiet; the status endpoint takes over.
+        // Also used once at the end to fetch the per-file results.
+        function handOver() {
+            if (done) return;
+            done = true;
+            clearTimeout(quietTimer);
+            socket.disconnect();
+            pollBulkUpload(statusUrl);
+        }
+
+        function resetQuietTimer() {
+            clearTimeout(quietTimer);
+            quietTimer = setTimeout(handOver, BULK_QUIET_AFTER);
+        }
+
+        socket.on('connect', () => {
+            socket.emit('subscribe', {batch_id: batchId}, ack => {
+                if (ack && ack.error) handOver();
+            });
+        });
+        socket.on('connect_error', handOver);
+        socket.on('bulk_upload_progress', status => {
+            if (status.batch_id !== batchId) return;
+            if (status.is_complete) {
+                handOver();
+                return;
+            }
+            resetQuietTimer();
+            updateBulkProgress(status, `Extracting metadata (${status.succeeded} imported, ${status.failed} failed)...`);
+        });
+        resetQuietTimer();
+    }
+
+    // The stream sends the current state first and closes after the last
+    // one. The server re-reads the batch while nothing is published, so a
+    // quiet stream needs no polling.
+    function streamBulkUpload(batchId, statusUrl) {
+        const source = new EventSource(`/bulk-upload/${batchId}/events`);
+        let done = false;
+
+        function handOver() {
+            if (done) return;
+            done = true;
+            source.close();
+            pollBulkUpload(statusUrl);
+        }
+
+        // The browser reconnects on its own; give up only once it stops trying
+        source.onerror = () => {
+            if (source.readyState === EventSource.CLOSED) handOver();
+        };
+        source.addEventListener('bulk_upload_progress', event => {
+            const status = JSON.parse(event.data);
+            if (status.is_complete) {
+                handOver();
+                return;
+            }
+            updateBulkProgress(status, `Extracting metadata (${status.succeeded} imported, ${status.failed} failed)...`);
+        });
+    }
+
+    function pollBulkUpload(statusUrl) {
+        fetch(statusUrl)
+            .then(response => response.json())
+            .then(status => {
+                updateBulkProgress(status, `Extracting metadata (${status.succeeded} imported, ${status.failed} failed)...`);
+                if (!status.is_complete) {
+                    setTimeout(() => pollBulkUpload(statusUrl), BULK_POLL_INTERVAL);
+                    return;
+                }
+
+                (status.items || []).filter(item => item.status === 'failed' && item.error !== 'Invalid file type')
+                    .forEach(item => showAlert(`${item.filename}: ${item.error}`, 'warning'));
+                updateBulkProgress(status, `Imported ${status.succeeded} of ${status.total} files.`);
+                showExtractionStatus(`Bulk upload finished: ${status.succeeded} imported, ${status.failed} failed.`,
+                                     status.succeeded > 0 ? 'success' : 'error');
+                resetSubmitButton();
+            })
+            .catch(() => setTimeout(() => pollBulkUpload(statusUrl), BULK_POLL_INTERVAL * 2));
+    }
+
+    function updateBulkProgress(status, message) {
+        if (progressBar) progressBar.style.width = `${status.progress}%`;
+        if (progressStatus) progressStatus.textContent = message;
+        if (progressCount) progressCount.textContent = `${status.processed}/${status.total} files`;
+    }
+
+    function resetSubmitButton() {
+        if (submitBtn) {
+            submitBtn.disabled = false;
+            submitBtn.innerHTML = '<i data-feather="upload" class="me-1"></i>Upload Paper';
+            feather.replace();
+        }
+    }
+
     function showProgress() {
         if (progressContainer) {
             progressContainer.style.display = 'block';
@@ -0,0 +1,342 @@
+"""Storage of uploaded PDFs and the figures cropped from them.
+
+Research papers and question documents are stored under a key such as
+``papers/3f/a2/<filename>``; the two fanout directories come from a hash of
+the filename, so no directory grows past a few thousand files. The key, not
+an absolute path, is what ``file_path`` columns (and the lists in
+``Question.image_paths``) hold. Rows written before this layout still hold
+absolute paths; they keep working and are moved over by
+:mod:`storage_migration`.
+
+Two drivers, picked with ``STORAGE_BACKEND``:
+
+- ``local``: files under ``STORAGE_ROOT``. Writes go to a temporary file in
+  the target directory and are renamed into place, so readers never see a
+  partial file.
+- ``s3``: objects in an S3-compatible bucket (AWS, MinIO, ...), through
+  ``boto3``. Uploads are streamed in parts and the object only appears once
+  complete. PyMuPDF needs a file on disk, so :meth:`Storage.local_path`
+  downloads an object once into ``STORAGE_CACHE_DIR``; keys are never
+  reused, so the copy never goes stale. Downloads are redirected to
+  presigned URLs.
+
+Both read and write in chunks of ``CHUNK_SIZE``; no file is held in memory.
+
+Files uploaded in chunks (:mod:`chunked_upload`) grow in a partial file on
+local disk until complete. The local driver keeps partial files under its
+root, so completing an upload is a rename; the s3 driver streams the
+finished file to the bucket.
+"""
+import os
+import shutil
+import hashlib
+import logging
+import tempfile
+
+from flask import current_app, redirect, send_file
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+PAPERS = 'papers'
+QUESTION_DOCUMENTS = 'questions'
+FIGURES = 'figures'
+
+
+class StorageError(Exception):
+    """A file could not be stored or read."""
+
+
+def shard_key(namespace, filename, fanout=2):
+    """``namespace/ab/cd/filename``, with one directory per fanout level."""
+    digest = hashlib.sha1(filename.encode()).hexdigest()
+    return '/'.join([namespace, *(digest[2 * level:2 * level + 2] for level in range(fanout)), filename])
+
+
+def is_legacy_path(file_path):
+    """True for the absolute paths stored before the sharded layout."""
+    return os.path.isabs(file_path)
+
+
+def _write_atomically(stream, path):
+    """Copy ``stream`` to ``path`` through a temporary file; returns the size."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.partial-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            shutil.copyfileobj(stream, f, CHUNK_SIZE)
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+        return size
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class Storage:
+    """Common interface; legacy absolute paths are served from the local disk by every driver."""
+
+    name = None
+
+    def __init__(self, fanout=2, partial_root=None):
+        self.fanout = fanout
+        self.partial_root = partial_root
+
+    def key_for(self, namespace, filename):
+        return shard_key(namespace, filename, self.fanout)
+
+    def save(self, stream, key):
+        """Store the rest of ``stream`` under ``key``; returns the number of bytes."""
+        if is_legacy_path(key):
+            raise StorageError(f"Not a storage key: {key}")
+        return self._save(stream, key)
+
+    def save_file(self, path, key):
+        with open(path, 'rb') as f:
+            return self.save(f, key)
+
+    def open(self, key):
+        """A binary file object to read the file from."""
+        return open(key, 'rb') if is_legacy_path(key) else self._open(key)
+
+    def exists(self, key):
+        return os.path.exists(key) if is_legacy_path(key) else self._exists(key)
+
+    def size(self, key):
+        return os.path.getsize(key) if is_legacy_path(key) else self._size(key)
+
+    def delete(self, key):
+        """Remove the file; a missing file is not an error."""
+        if is_legacy_path(key):
+            try:
+                os.remove(key)
+            except FileNotFoundError:
+                pass
+        else:
+            self._delete(key)
+
+    def local_path(self, key):
+        """A path on this machine holding the file, for libraries that need one."""
+        return key if is_legacy_path(key) else self._local_path(key)
+
+    def url(self, key, download_name=None):
+        """A URL clients can download the file from directly, or None to send it ourselves."""
+        return None
+
+    def partial_path(self, upload_id):
+        if not str(upload_id).isalnum():
+            raise StorageError(f"Invalid upload id: {upload_id}")
+        return os.path.join(self.partial_root, str(upload_id))
+
+    def append_partial(self, upload_id, stream):
+        """Append the rest of ``stream`` to a partial file; returns its new size."""
+        path = self.partial_path(upload_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'ab') as f:
+            shutil.copyfileobj(stream, f, CHUNK_SIZE)
+            return f.tell()
+
+    def partial_size(self, upload_id):
+        try:
+            return os.path.getsize(self.partial_path(upload_id))
+        except FileNotFoundError:
+            return 0
+
+    def open_partial(self, upload_id):
+        return open(self.partial_path(upload_id), 'rb')
+
+    def discard_partial(self, upload_id):
+        try:
+            os.remove(self.partial_path(upload_id))
+        except FileNotFoundError:
+            pass
+
+    def commit_partial(self, upload_id, key):
+        """Store a finished partial file under ``key``."""
+        with self.open_partial(upload_id) as f:
+            self.save(f, key)
+        self.discard_partial(upload_id)
+
+
+class LocalStorage(Storage):
+    name = 'local'
+
+    def __init__(self, root, fanout=2):
+        self.root = os.path.abspath(root)
+        super().__init__(fanout, os.path.join(self.root, '.partial'))
+
+    def _path(self, key):
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise StorageError(f"Key outside the storage root: {key}")
+        return path
+
+    def _save(self, stream, key):
+        return _write_atomically(stream, self._path(key))
+
+    def _open(self, key):
+        return open(self._path(key), 'rb')
+
+    def _exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def _size(self, key):
+        return os.path.getsize(self._path(key))
+
+    def _delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _local_path(self, key):
+        return self._path(key)
+
+    def commit_partial(self, upload_id, key):
+        # Same file system, so the finished file is renamed into place
+        path = self._path(key)
+        partial = self.partial_path(upload_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(partial, 'rb') as f:
+            os.fsync(f.fileno())
+        os.chmod(partial, 0o644)
+        os.replace(partial, path)
+
+
+class _CountingReader:
+    """Counts the bytes read from a stream."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.size += len(data)
+        return data
+
+
+def _is_missing(error):
+    response = getattr(error, 'response', None) or {}
+    return str(response.get('Error', {}).get('Code')) in ('404', 'NoSuchKey', 'NotFound')
+
+
+class S3Storage(Storage):
+    name = 's3'
+
+    def __init__(self, bucket, cache_dir, prefix='', fanout=2, client=None, url_expiry=300, **client_options):
+        super().__init__(fanout, os.path.join(cache_dir, '.partial'))
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        self.cache = LocalStorage(cache_dir, fanout=0)
+        self.url_expiry = url_expiry
+        if client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise StorageError("STORAGE_BACKEND=s3 needs the boto3 package")
+            client = boto3.client('s3', **{name: value for name, value in client_options.items() if value})
+        self.client = client
+
+    def _object(self, key):
+        return self.prefix + key
+
+    def _save(self, stream, key):
+        reader = _CountingReader(stream)
+        self.client.upload_fileobj(reader, self.bucket, self._object(key))
+        return reader.size
+
+    def _open(self, key):
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self._object(key))['Body']
+        except Exception as e:
+            if _is_missing(e):
+                raise FileNotFoundError(key) from e
+            raise
+
+    def _head(self, key):
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._object(key))
+        except Exception as e:
+            if _is_missing(e):
+                return None
+            raise
+
+    def _exists(self, key):
+        return self._head(key) is not None
+
+    def _size(self, key):
+        head = self._head(key)
+        if head is None:
+            raise FileNotFoundError(key)
+        return head['ContentLength']
+
+    def _delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._object(key))
+        self.cache.delete(key)
+
+    def _local_path(self, key):
+        if not self.cache.exists(key):
+            body = self._open(key)
+            try:
+                self.cache.save(body, key)
+            finally:
+                body.close()
+        return self.cache.local_path(key)
+
+    def url(self, key, download_name=None):
+        if is_legacy_path(key):
+            return None
+        params = {'Bucket': self.bucket, 'Key': self._object(key)}
+        if download_name:
+            params['ResponseContentDisposition'] = f'attachment; filename="{download_name}"'
+        return self.client.generate_presigned_url('get_object', Params=params, ExpiresIn=self.url_expiry)
+
+
+def create_storage(config):
+    """The driver ``config`` asks for."""
+    backend = config.get('STORAGE_BACKEND', 'local')
+    fanout = config.get('STORAGE_FANOUT', 2)
+    if backend == 'local':
+        return LocalStorage(config.get('STORAGE_ROOT') or config['UPLOAD_FOLDER'], fanout=fanout)
+    if backend == 's3':
+        if not config.get('S3_BUCKET'):
+            raise StorageError("STORAGE_BACKEND=s3 needs S3_BUCKET")
+        return S3Storage(
+            config['S3_BUCKET'],
+            config.get('STORAGE_CACHE_DIR') or os.path.join(config['UPLOAD_FOLDER'], 'storage_cache'),
+            prefix=config.get('S3_PREFIX') or '',
+            fanout=fanout,
+            url_expiry=config.get('S3_URL_EXPIRY', 300),
+            endpoint_url=config.get('S3_ENDPOINT_URL'),
+            region_name=config.get('S3_REGION'),
+            aws_access_key_id=config.get('S3_ACCESS_KEY_ID'),
+            aws_secret_access_key=config.get('S3_SECRET_ACCESS_KEY')
+        )
+    raise StorageError(f"Unknown STORAGE_BACKEND: {backend}")
+
+
+def get_storage(app=None):
+    """The storage of ``app`` (default the current app), created on first use."""
+    app = app or current_app
+    storage = app.extensions.get('storage')
+    if storage is None:
+        storage = app.extensions['storage'] = create_storage(app.config)
+    return storage
+
+
+def send_stored_file(key, download_name, mimetype='application/pdf'):
+    """Download response for a stored file: a redirect to the object store, or the file itself."""
+    storage = get_storage()
+    url = storage.url(key, download_name)
+    if url:
+        return redirect(url)
+    return send_file(storage.local_path(key), as_attachment=True, download_name=download_name, mimetype=mimetype)
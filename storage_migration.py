@@ -0,0 +1,184 @@
+"""Move files stored under absolute paths into the storage backend.
+
+Research papers and question documents uploaded before :mod:`storage` keep
+an absolute path in ``file_path``. This job copies each such file to its
+sharded key (``<namespace>/ab/cd/<row id>_<filename>``), points the row (and
+any bulk upload item sharing the file) at the key and commits after every
+batch. Originals are deleted only after the commit that stops referencing
+them, unless ``--keep-originals`` is given. Figures cropped before the
+move are copied the same way, to ``figures/ab/cd/<document id>_<crop name>``,
+and the lists in ``Question.image_paths`` are rewritten to the keys.
+
+The rows themselves record progress, so an interrupted run is resumed by
+starting it again: migrated rows hold keys and are skipped, and a file that
+was copied but not yet committed is found at its key and not copied twice.
+Rows whose file is missing are counted and left alone. The admin dashboard
+queues it as a low-priority ``migrate_storage`` job for the workers.
+
+    python storage_migration.py --dry-run
+    python storage_migration.py --batch-size 200 --keep-originals
+"""
+import os
+import json
+import logging
+import argparse
+
+from app import db
+from models import BulkUploadItem, Question, QuestionDocument, ResearchPaper
+from storage import FIGURES, PAPERS, QUESTION_DOCUMENTS, get_storage, is_legacy_path
+
+logger = logging.getLogger(__name__)
+
+MODELS = ((ResearchPaper, PAPERS), (QuestionDocument, QUESTION_DOCUMENTS))
+
+
+def legacy_rows(model, after_id=0, limit=None):
+    """Rows of ``model`` past ``after_id`` that still hold an absolute path, by id."""
+    query = model.query.filter(model.file_path.like('/%'), model.id > after_id).order_by(model.id)
+    return query.limit(limit).all() if limit else query.all()
+
+
+def legacy_figure_rows(after_id=0, limit=None):
+    """Questions past ``after_id`` whose ``image_paths`` still list an absolute path, by id."""
+    query = Question.query.filter(Question.image_paths.like('%"/%'), Question.id > after_id).order_by(Question.id)
+    return query.limit(limit).all() if limit else query.all()
+
+
+def count_legacy_rows():
+    return sum(model.query.filter(model.file_path.like('/%')).count() for model, _ in MODELS) + \
+        Question.query.filter(Question.image_paths.like('%"/%')).count()
+
+
+def migrate_file(storage, row, namespace):
+    """Copy the file of ``row`` into ``storage`` and return its key, or None if the file is missing."""
+    source = row.file_path
+    if not os.path.exists(source):
+        return None
+    # The id keeps keys unique; old question documents could share a filename
+    key = storage.key_for(namespace, f'{row.id}_{os.path.basename(source)}')
+    if not (storage.exists(key) and storage.size(key) == os.path.getsize(source)):
+        storage.save_file(source, key)
+    return key
+
+
+def migrate_figure(storage, path, document_id):
+    """Copy a figure into ``storage`` and return its key, or None if the figure is missing.
+
+    Questions of one document share deduplicated crops, so a figure whose
+    original was already moved for another question is found at its key.
+    """
+    key = storage.key_for(FIGURES, f'{document_id}_{os.path.basename(path)}')
+    if os.path.exists(path):
+        if not (storage.exists(key) and storage.size(key) == os.path.getsize(path)):
+            storage.save_file(path, key)
+        return key
+    return key if storage.exists(key) else None
+
+
+def _migrate_figures(storage, totals, batch_size, limit, dry_run, keep_originals):
+    after_id = 0
+    keys_by_path = {}  # figures moved in this run; questions of a document share crops
+    while limit is None or totals['migrated'] < limit:
+        size = batch_size if limit is None else min(batch_size, limit - totals['migrated'])
+        questions = legacy_figure_rows(after_id, size)
+        if not questions:
+            break
+        moved = []
+        for question in questions:
+            after_id = question.id
+            paths = json.loads(question.image_paths)
+            keys = []
+            for path in paths:
+                key = keys_by_path.get(path)
+                if key is None and is_legacy_path(path) and not dry_run:
+                    try:
+                        key = migrate_figure(storage, path, question.document_id)
+                    except Exception as e:
+                        logger.error("Could not migrate figure of question %s (%s): %s", question.id, path, e)
+                        totals['failed'] += 1
+                    else:
+                        if key is None:
+                            logger.warning("Figure of question %s is missing: %s", question.id, path)
+                            totals['missing'] += 1
+                        else:
+                            keys_by_path[path] = key
+                            moved.append(path)
+                            totals['migrated'] += 1
+                elif dry_run and is_legacy_path(path):
+                    totals['migrated' if os.path.exists(path) else 'missing'] += 1
+                keys.append(key or path)
+            if keys != paths:
+                question.image_paths = json.dumps(keys)
+
+        if dry_run:
+            continue
+        db.session.commit()
+        if not keep_originals:
+            for path in moved:
+                storage.delete(path)
+        logger.info("Migrated %d question figures to %s storage", len(moved), storage.name)
+
+
+def run_storage_migration(app, batch_size=100, limit=None, dry_run=False, keep_originals=False):
+    """Migrate legacy rows in batches; returns the totals."""
+    totals = {'migrated': 0, 'missing': 0, 'failed': 0}
+    with app.app_context():
+        storage = get_storage(app)
+        for model, namespace in MODELS:
+            after_id = 0
+            while limit is None or totals['migrated'] < limit:
+                size = batch_size if limit is None else min(batch_size, limit - totals['migrated'])
+                rows = legacy_rows(model, after_id, size)
+                if not rows:
+                    break
+                moved = []
+                for row in rows:
+                    after_id = row.id
+                    if dry_run:
+                        totals['migrated' if os.path.exists(row.file_path) else 'missing'] += 1
+                        continue
+                    source = row.file_path
+                    try:
+                        key = migrate_file(storage, row, namespace)
+                    except Exception as e:
+                        logger.error("Could not migrate %s %s (%s): %s", model.__tablename__, row.id, source, e)
+                        totals['failed'] += 1
+                        continue
+                    if key is None:
+                        logger.warning("File of %s %s is missing: %s", model.__tablename__, row.id, source)
+                        totals['missing'] += 1
+                        continue
+                    row.file_path = key
+                    BulkUploadItem.query.filter_by(file_path=source).update({'file_path': key},
+                                                                            synchronize_session=False)
+                    moved.append(source)
+                    totals['migrated'] += 1
+
+                if dry_run:
+                    continue
+                db.session.commit()
+                if not keep_originals:
+                    for source in moved:
+                        storage.delete(source)
+                logger.info("Migrated %d %s to %s storage", len(moved), model.__tablename__, storage.name)
+        _migrate_figures(storage, totals, batch_size, limit, dry_run, keep_originals)
+        db.session.remove()
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--batch-size', type=int, default=100, help='rows per commit')
+    parser.add_argument('--limit', type=int, help='migrate at most this many files')
+    parser.add_argument('--dry-run', action='store_true', help='count what would be migrated')
+    parser.add_argument('--keep-originals', action='store_true', help='do not delete the migrated files')
+    args = parser.parse_args()
+
+    from app import app
+    totals = run_storage_migration(app, batch_size=args.batch_size, limit=args.limit,
+                                   dry_run=args.dry_run, keep_originals=args.keep_originals)
+    print(', '.join(f'{key}: {value}' for key, value in totals.items()))
+
+
+if __name__ == '__main__':
+    main()
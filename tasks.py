@@ -0,0 +1,249 @@
+"""Handlers for the background jobs in :mod:`jobs`.
+
+Only worker processes import this module (``python -m worker``, or the
+embedded worker of a process running every role); the web role queues these
+kinds by name. It imports :mod:`question_processor` and :mod:`reextract`
+only in the two views that need them (paper generation and the admin
+re-extraction button), never at start-up.
+"""
+import json
+import logging
+
+from sqlalchemy import func
+
+from app import db
+from bulk_ingest import run_bulk_ingest
+from extraction_profile import ExtractionProfile, capture
+from jobs import (job_handler, EXTRACT_QUESTIONS, BULK_INGEST, REEXTRACT, RENDER_PAGE, INDEX_KEYWORDS,
+                  MIGRATE_STORAGE, OPTIMIZE_PDFS, RECLASSIFY, EMBED_QUESTIONS, PROFILE_EXTRACTION)
+from keyword_index import index_paper_keywords
+from models import Question, QuestionDocument, ResearchPaper
+from page_cache import source_token
+from pdf_optimizer import run_optimization
+from progress import publish_document
+from query_audit import record_queries
+from question_processor import QuestionExtractor
+from reclassify import FIELDS, run_reclassification
+from reextract import run_reextraction
+from similar_questions import build_question_index, queue_index_refresh
+from storage import get_storage
+from storage_migration import run_storage_migration
+
+logger = logging.getLogger(__name__)
+
+
+@job_handler(EXTRACT_QUESTIONS)
+def extract_questions(app, payload):
+    """Extract the questions of an uploaded question document; stage timings are stored with it."""
+    doc_id = payload['document_id']
+    profile = ExtractionProfile()
+    with app.app_context():
+        with record_queries(keep_statements=False) as queries:
+            _extract_document(doc_id, profile, queries)
+
+
+@job_handler(PROFILE_EXTRACTION)
+def profile_extraction(app, payload):
+    """Time an extracted document again under ``payload['profiler']``, saving no questions.
+
+    The extractor, figure cropping and topic matching run as in
+    ``extract_questions``, but the results are thrown away; only the stage
+    timings and the profiler report are stored. The document keeps its
+    status and its questions keep their ids.
+    """
+    doc_id = payload['document_id']
+    profile = ExtractionProfile()
+    with app.app_context():
+        doc = db.session.get(QuestionDocument, doc_id)
+        if not doc:
+            logger.error("Document %s not found for profiling", doc_id)
+            return
+        with capture(payload.get('profiler')) as captured:
+            with record_queries(keep_statements=False) as queries:
+                found = QuestionExtractor().profile_document(doc, profile)
+        timings = _store_timings(doc, profile, queries)
+        if captured.report is not None:
+            doc.extraction_profile_report = f'[{captured.profiler}]\n{captured.report}'
+        db.session.commit()
+        logger.info("Profiled extraction of document %s: %d questions in %.0f ms", doc_id, found,
+                    timings['total_ms'])
+
+
+def _store_timings(doc, profile, queries):
+    """Put the timings so far on ``doc``; they go out with its next commit."""
+    profile.finish()
+    timings = profile.as_dict()
+    timings['counters'].update(sql_statements=queries.count,
+                               sql_ms=round(queries.total_time * 1000, 2))
+    doc.extraction_timings = json.dumps(timings)
+    return timings
+
+
+def _extract_document(doc_id, profile, queries):
+    try:
+        doc = db.session.get(QuestionDocument, doc_id)
+        if not doc:
+            logger.error("Document %s not found for processing", doc_id)
+            return
+
+        # A retried job starts over; keep only what users edited
+        Question.query.filter_by(document_id=doc_id, manually_edited=False)\
+            .delete(synchronize_session=False)
+
+        # Update status to processing
+        with profile.stage('status_updates'):
+            doc.update_status(
+                status=QuestionDocument.STATUS_PROCESSING,
+                message="Starting document processing...",
+                progress=10
+            )
+            publish_document(doc, 0)
+
+        # Get total pages for progress calculation
+        try:
+            import fitz  # PyMuPDF
+            with profile.stage('open'), fitz.open(get_storage().local_path(doc.file_path)) as doc_ref:
+                doc.total_pages = len(doc_ref)
+            db.session.commit()
+        except Exception as e:
+            logger.warning("Could not get total pages for document %s: %s", doc_id, e)
+
+        with profile.stage('status_updates'):
+            doc.update_status(
+                status=QuestionDocument.STATUS_EXTRACTING,
+                message="Extracting questions from document...",
+                progress=30
+            )
+            publish_document(doc, 0)
+
+        # Process the document with progress updates
+        def progress_callback(current_page, total_pages, message=None):
+            if total_pages > 0:
+                progress = 30 + int(60 * (current_page / total_pages))  # 30-90% for extraction
+                progress = min(progress, 90)  # Cap at 90% to leave room for saving
+            else:
+                progress = 90  # Default to 90% if we can't calculate progress
+
+            with profile.stage('status_updates'):
+                doc.update_status(
+                    status=QuestionDocument.STATUS_EXTRACTING,
+                    message=message or f"Processing page {current_page} of {total_pages if total_pages > 0 else '?'}...",
+                    progress=progress
+                )
+                doc.processed_pages = current_page
+                db.session.commit()
+                publish_document(doc, getattr(extractor, 'questions_found', 0))
+
+        extractor = QuestionExtractor()
+        extractor.set_progress_callback(progress_callback)
+        if not extractor.process_document(doc_id, profile=profile):
+            raise RuntimeError('Question extraction failed')
+
+        with profile.stage('status_updates'):
+            doc.update_status(
+                status=QuestionDocument.STATUS_SAVING,
+                message="Saving extracted questions to database...",
+                progress=95
+            )
+            publish_document(doc, extractor.questions_found)
+
+        # Count the saved questions without loading them
+        doc = db.session.get(QuestionDocument, doc_id)
+        total_questions = db.session.query(func.count(Question.id))\
+            .filter(Question.document_id == doc_id).scalar()
+
+        timings = _store_timings(doc, profile, queries)
+        doc.update_status(
+            status=QuestionDocument.STATUS_COMPLETED,
+            message=f"Successfully extracted {total_questions} questions",
+            progress=100
+        )
+        publish_document(doc, total_questions)
+        queue_index_refresh()
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Extracted document %s in %.0f ms (%s)", doc_id, timings['total_ms'],
+                        ', '.join(f"{name} {stage['ms']:.0f} ms" for name, stage in timings['stages'].items()))
+
+    except Exception as e:
+        logger.error("Failed to process document %s: %s", doc_id, e, exc_info=True)
+        db.session.rollback()
+
+        doc = db.session.get(QuestionDocument, doc_id)
+        if doc:
+            _store_timings(doc, profile, queries)
+            doc.update_status(
+                status=QuestionDocument.STATUS_FAILED,
+                message=f"Error: {str(e)[:200]}",
+                progress=100
+            )
+            publish_document(doc)
+
+        # Let the queue record the failure and retry the job
+        raise
+
+
+@job_handler(BULK_INGEST)
+def bulk_ingest(app, payload):
+    run_bulk_ingest(app, payload['batch_id'])
+
+
+@job_handler(REEXTRACT)
+def reextract(app, payload):
+    totals = run_reextraction(app, document_ids=payload.get('document_ids'), limit=payload.get('limit'))
+    logger.info("Re-extraction finished: %s", totals)
+
+
+@job_handler(RENDER_PAGE)
+def render_page(app, payload):
+    """Render every tile of one page and zoom level into the page cache."""
+    with app.app_context():
+        file_path = db.session.query(QuestionDocument.file_path)\
+            .filter(QuestionDocument.id == payload['document_id']).scalar()
+        db.session.remove()
+        if file_path is None:
+            return
+        pdf_path = get_storage(app).local_path(file_path)
+        # The PDF changed since the job was queued; the viewer asks again
+        if source_token(pdf_path) != payload['token']:
+            return
+        page_cache = app.extensions['page_cache']
+        page_cache.render_page(pdf_path, payload['token'], payload['page'], payload['zoom'])
+
+
+@job_handler(INDEX_KEYWORDS)
+def index_keywords(app, payload):
+    """Link uploaded papers to their keywords."""
+    with app.app_context():
+        papers = db.session.query(ResearchPaper.id, ResearchPaper.keywords)\
+            .filter(ResearchPaper.id.in_(payload['paper_ids'])).all()
+        index_paper_keywords([(paper_id, keywords) for paper_id, keywords in papers if keywords])
+        db.session.commit()
+
+
+@job_handler(MIGRATE_STORAGE)
+def migrate_storage(app, payload):
+    totals = run_storage_migration(app, batch_size=payload.get('batch_size', 100), limit=payload.get('limit'))
+    logger.info("Storage migration finished: %s", totals)
+
+
+@job_handler(OPTIMIZE_PDFS)
+def optimize_pdfs(app, payload):
+    """Rewrite uploaded PDFs smaller; without ids, every file not tried yet."""
+    totals = run_optimization(app, paper_ids=payload.get('paper_ids'), document_ids=payload.get('document_ids'),
+                              limit=payload.get('limit'))
+    logger.info("PDF optimization finished: %s", totals)
+
+
+@job_handler(RECLASSIFY)
+def reclassify_questions(app, payload):
+    """Re-run the question classifiers; without options, every kind over every question."""
+    totals = run_reclassification(app, fields=tuple(payload.get('fields') or FIELDS),
+                                  subject_ids=payload.get('subject_ids'),
+                                  reassign_topics=payload.get('reassign_topics', False), limit=payload.get('limit'))
+    logger.info("Question re-classification finished: %s", totals)
+
+
+@job_handler(EMBED_QUESTIONS)
+def index_question_embeddings(app, payload):
+    totals = build_question_index(app)
+    logger.info("Similar-question index built: %s", totals)
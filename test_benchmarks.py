@@ -0,0 +1,30 @@
+"""The benchmark suite flags medians that slowed down beyond the threshold and
+cases that stopped working, and the app starts without loading the heavy
+modules.
+"""
+import os
+
+from benchmarks.bench_startup import run_once
+from benchmarks.suite import compare
+
+
+def run(**medians):
+    return {'cases': {name: {'median_ms': ms} for name, ms in medians.items()}}
+
+
+def test_compare_flags_regressions():
+    baseline = run(fast=0.2, search=10.0, paper=50.0, removed=1.0)
+    current = run(fast=0.5, search=14.0, paper=60.0, added=3.0)
+    current['cases']['paper']['threshold'] = 0.5
+
+    current['cases']['broken'] = {'error': 'extraction failed'}
+    baseline['cases']['broken'] = {'median_ms': 5.0}
+
+    rows = {name: regressed for name, _, _, _, regressed in compare(current, baseline, 0.25)}
+    # Sub-millisecond noise and slowdowns within a case's own threshold pass;
+    # a case that now fails or no longer runs does not
+    assert rows == {'fast': False, 'search': True, 'paper': False, 'removed': True, 'broken': True}
+
+
+def test_app_import_loads_no_heavy_modules():
+    assert run_once({**os.environ, 'DATABASE_URL': 'sqlite://'})['heavy_modules'] == []
@@ -0,0 +1,94 @@
+"""Bulk uploads produce the same papers whether metadata is extracted in a
+process pool or inline, and a failed insert fails its whole chunk.
+"""
+import io
+
+import pytest
+
+from app import app, db
+from models import BulkUploadBatch, Department, ResearchPaper
+import bulk_ingest
+import worker
+
+
+@pytest.fixture(scope='module')
+def papers(make_pdf):
+    """Six papers, the same bytes for both runs; paper 3 has no metadata."""
+    abstract = ('Abstract: sparse graphs and graph partitioning with sparse matrices; '
+                'graph partitioning improves sparse solvers.')
+    return [make_pdf([[(f'Graph Algorithms Study Number {i}', 16), (abstract, 9)]], spacing=38,
+                     metadata={'title': f'Graph Algorithms {i}', 'author': 'Ada Lovelace'} if i != 3 else None)
+            for i in range(6)]
+
+
+def upload_batch(client, papers, workers):
+    app.config['BULK_INGEST_WORKERS'] = workers
+    with app.app_context():
+        department = Department.query.first()
+
+    files = [(io.BytesIO(data), f'paper{i}.pdf') for i, data in enumerate(papers)]
+    files.append((io.BytesIO(b'not a pdf'), 'notes.txt'))
+    response = client.post('/bulk-upload', data={
+        'files': files,
+        'form_data': f'{{"department_id": {department.id}, "publication_year": 2021}}'
+    }, content_type='multipart/form-data')
+    assert response.status_code == 202, response.get_data(as_text=True)
+    body = response.get_json()
+    assert body['queued'] == 6
+    assert body['errors'] == ['notes.txt: Invalid file type']
+
+    # The upload only queues the batch; run the ingest job here
+    with app.app_context():
+        runner = worker.Worker(app)
+        while runner.run_once():
+            pass
+    return client.get(body['status_url']).get_json()
+
+
+def paper_fields(status):
+    with app.app_context():
+        ids = [item['paper_id'] for item in status['items'] if item['paper_id']]
+        papers = ResearchPaper.query.filter(ResearchPaper.id.in_(ids)).order_by(ResearchPaper.id).all()
+        return [(p.original_filename, p.title, p.authors, p.abstract, p.keywords, p.file_size)
+                for p in papers]
+
+
+@pytest.fixture(scope='module')
+def client():
+    app.config.update(WTF_CSRF_ENABLED=False, TESTING=True, BULK_INGEST_COMMIT_SIZE=4)
+    test_client = app.test_client()
+    test_client.post('/login', data={'email': 'admin@researchnest.local', 'password': 'admin123'})
+    return test_client
+
+
+def test_parallel_ingest_matches_serial(client, papers):
+    serial = upload_batch(client, papers, workers=0)
+    parallel = upload_batch(client, papers, workers=2)
+
+    for status in (serial, parallel):
+        assert status['status'] == BulkUploadBatch.STATUS_COMPLETED
+        assert (status['total'], status['processed']) == (7, 7)
+        # paper3.pdf has no author metadata or byline
+        assert [(item['status'], item['error']) for item in status['items']] == (
+            [('completed', None)] * 3 + [('failed', 'Could not determine authors')] +
+            [('completed', None)] * 2 + [('failed', 'Invalid file type')]
+        )
+
+    assert paper_fields(parallel) == paper_fields(serial)
+    assert len(paper_fields(serial)) == 5
+
+
+def test_failed_insert_keeps_failures_of_unreadable_files(client, papers, monkeypatch):
+    def broken_index(papers):
+        raise RuntimeError('keyword index is down')
+    monkeypatch.setattr(bulk_ingest, 'index_paper_keywords', broken_index)
+
+    status = upload_batch(client, papers, workers=0)
+
+    assert status['status'] == BulkUploadBatch.STATUS_COMPLETED
+    assert (status['succeeded'], status['failed'], status['processed']) == (0, 7, 7)
+    # paper3.pdf failed before the insert of its chunk, and stays failed with its own error
+    assert [(item['status'], item['error']) for item in status['items']] == (
+        [('failed', 'keyword index is down')] * 3 + [('failed', 'Could not determine authors')] +
+        [('failed', 'keyword index is down')] * 2 + [('failed', 'Invalid file type')]
+    )
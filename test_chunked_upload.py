@@ -0,0 +1,107 @@
+"""Chunked uploads: offsets, resuming, early rejection of non-PDFs and attaching to a form."""
+import hashlib
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import app, db
+import chunked_upload
+from models import QuestionDocument, Subject, UploadSession
+from storage import LocalStorage
+
+
+@pytest.fixture
+def client(tmp_path):
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False, UPLOAD_CHUNK_SIZE=1000)
+    previous = app.extensions.get('storage')
+    app.extensions['storage'] = LocalStorage(str(tmp_path / 'store'))
+    client = app.test_client()
+    client.post('/login', data={'email': 'admin@researchnest.local', 'password': 'admin123'})
+    yield client
+    app.extensions['storage'] = previous
+
+
+@pytest.fixture
+def pdf_data(make_pdf):
+    # Long enough for several chunks
+    return make_pdf([['1. Explain how a stack differs from a queue. (5 marks)']]) + b'\n' * 3000
+
+
+def open_upload(client, data, purpose='questions', filename='midterm.pdf'):
+    response = client.post('/uploads', json={'filename': filename, 'size': len(data), 'purpose': purpose})
+    assert response.status_code == 201
+    return response.get_json()
+
+
+def send(client, token, offset, chunk):
+    return client.patch(f'/uploads/{token}', data=chunk, headers={'Upload-Offset': str(offset)})
+
+
+def test_chunks_resume_and_attach_to_the_upload_form(client, pdf_data):
+    data = pdf_data
+    state = open_upload(client, data)
+    token = state['id']
+    assert (state['offset'], state['chunk_size'], state['status']) == (0, 1000, 'uploading')
+
+    assert send(client, token, 0, data[:1000]).get_json()['offset'] == 1000
+    stale = send(client, token, 0, data[:1000])
+    assert stale.status_code == 409 and stale.get_json()['offset'] == 1000
+
+    # Another process picks up from the partial file alone
+    chunked_upload._hashers.clear()
+    offset = client.get(f'/uploads/{token}').get_json()['offset']
+    while offset < len(data):
+        state = send(client, token, offset, data[offset:offset + 1000]).get_json()
+        offset = state['offset']
+    assert state['status'] == 'complete'
+    assert state['sha256'] == hashlib.sha256(data).hexdigest()
+
+    with app.app_context():
+        subject_id = Subject.query.first().id
+    response = client.post('/questions/upload', data={
+        'title': 'Chunked midterm', 'subject_id': subject_id, 'document_type': 'quiz',
+        'academic_year': '2024', 'semester': '1', 'upload_id': token})
+    assert response.status_code == 302
+
+    with app.app_context():
+        document = QuestionDocument.query.filter_by(title='Chunked midterm').one()
+        assert document.original_filename == 'midterm.pdf'
+        with app.extensions['storage'].open(document.file_path) as f:
+            assert f.read() == data
+        assert UploadSession.query.filter_by(token=token).one().status == UploadSession.STATUS_ATTACHED
+    assert client.delete(f'/uploads/{token}').status_code == 409
+
+
+def test_files_that_are_not_pdfs_are_refused_early(client, pdf_data):
+    data = b'<html>' + b' ' * 5000
+    token = open_upload(client, data)['id']
+    response = send(client, token, 0, data[:2000])
+    assert response.status_code == 415
+    assert response.get_json()['status'] == 'failed'
+    assert app.extensions['storage'].partial_size(token) == 0
+
+    assert client.post('/uploads', json={'filename': 'notes.txt', 'size': 10,
+                                         'purpose': 'questions'}).status_code == 415
+    assert client.post('/uploads', json={'filename': 'huge.pdf', 'size': app.config['UPLOAD_MAX_FILE_SIZE'] + 1,
+                                         'purpose': 'papers'}).status_code == 413
+
+    short = pdf_data[:1500]
+    token = open_upload(client, short, purpose='papers')['id']
+    assert send(client, token, 0, short + b'extra').status_code == 413
+    assert client.get(f'/uploads/{token}').get_json()['offset'] == 0
+
+
+def test_only_idle_uploads_expire(client, pdf_data):
+    data = pdf_data
+    active, idle = open_upload(client, data)['id'], open_upload(client, data)['id']
+    long_ago = datetime.utcnow() - timedelta(seconds=app.config['UPLOAD_SESSION_TTL'] + 60)
+    with app.app_context():
+        UploadSession.query.filter(UploadSession.token.in_([active, idle])) \
+            .update({'created_at': long_ago, 'last_activity_at': long_ago})
+        db.session.commit()
+
+    # Still sending chunks past the TTL, counted from its last chunk
+    assert send(client, active, 0, data[:1000]).status_code == 200
+    open_upload(client, data)
+    assert client.get(f'/uploads/{active}').get_json()['offset'] == 1000
+    assert client.get(f'/uploads/{idle}').status_code == 404
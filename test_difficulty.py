@@ -0,0 +1,27 @@
+"""Difficulty classification beats always guessing ``medium`` on the labelled
+banks and is applied to extracted questions.
+"""
+import app  # noqa: F401  -- set up the app before question_processor
+from benchmarks.calibrate_difficulty import bank_features, evaluate, labels
+from benchmarks.question_banks import load_banks
+from difficulty import get_classifier
+from question_processor import PDFQuestionExtractor
+
+
+def test_fitted_weights_beat_the_medium_baseline():
+    banks = load_banks()
+    assert {name: len(questions) for name, questions in banks.items()} == {'ds': 103, 'sql': 32, 'rdbms': 40}
+
+    for questions in banks.values():
+        result = evaluate(get_classifier(), bank_features(questions), labels(questions))
+        assert result['accuracy'] > result['baseline']
+        assert 0 < result['mean_confidence'] <= 1
+
+
+def test_extracted_questions_are_classified(tmp_path, make_pdf):
+    path = make_pdf([['1. Define a stack. (2 marks)',
+                      '2. Design and analyze an algorithm merging k sorted lists. (15 marks)']], tmp_path / 'exam.pdf')
+
+    easy, hard = PDFQuestionExtractor(path).extract_questions()
+    assert (easy.difficulty, hard.difficulty) == ('easy', 'hard')
+    assert 0 < easy.difficulty_confidence <= 1 and 0 < hard.difficulty_confidence <= 1
@@ -0,0 +1,76 @@
+"""Extraction jobs store per-stage timings, and an extracted document can be
+profiled again without touching its questions.
+"""
+import os
+import time
+
+import pytest
+
+from app import app, db
+from models import Job, Question, QuestionDocument, Subject, User
+from extraction_profile import ExtractionProfile
+import jobs
+import worker
+
+
+def test_nested_stages_are_exclusive():
+    profile = ExtractionProfile()
+    with profile.stage('segmentation'):
+        with profile.stage('page_text'):
+            time.sleep(0.02)
+    stages = profile.as_dict()['stages']
+    assert stages['page_text']['ms'] >= 20
+    assert stages['segmentation']['ms'] < 10
+
+
+@pytest.fixture
+def document_id(tmp_path, make_pdf):
+    questions = [f'{number}. Explain how a heap is rebalanced. (5 marks)' for number in range(1, 4)]
+    path = make_pdf([questions + ['4. Delete a key from binary search trees. (5 marks)']] * 2, tmp_path / 'exam.pdf')
+
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False, FIGURE_EXTRACTION_ENABLED=False)
+    with app.app_context():
+        Job.query.delete()
+        document = QuestionDocument(
+            title='Timed', filename='exam.pdf', original_filename='exam.pdf', file_path=path,
+            file_size=os.path.getsize(path), subject_id=Subject.query.first().id,
+            uploader_id=User.query.filter_by(is_admin=True).first().id
+        )
+        db.session.add(document)
+        db.session.commit()
+        return document.id
+
+
+def test_extraction_records_timings_and_profile(document_id):
+    with app.app_context():
+        jobs.enqueue(jobs.EXTRACT_QUESTIONS, {'document_id': document_id})
+        assert worker.Worker(app, name='test:profile').run_once()
+
+    client = app.test_client()
+    client.post('/login', data={'email': 'admin@researchnest.local', 'password': 'admin123'})
+    status = client.get(f'/questions/{document_id}/status').get_json()
+    assert status['status'] == 'completed'
+    timings = status['timings']
+    assert {'open', 'page_text', 'segmentation', 'classification', 'topics', 'persistence', 'status_updates'} \
+        <= set(timings['stages'])
+    assert timings['counters']['pages'] == 2 and timings['counters']['sql_statements'] > 0
+    assert sum(stage['ms'] for stage in timings['stages'].values()) <= timings['total_ms']
+    with app.app_context():
+        matched = Question.query.filter(Question.document_id == document_id,
+                                        Question.question_text.contains('binary search')).first()
+        assert matched.topic.name == 'Binary Search Trees'
+        question_ids = [question.id for question in Question.query.filter_by(document_id=document_id)]
+
+    assert b'Timed' in client.get('/admin/profiling').data
+    assert client.get(f'/admin/profiling/{document_id}/report').status_code == 404
+    client.post(f'/admin/profiling/{document_id}', data={'profiler': 'cprofile'})
+    with app.app_context():
+        assert worker.Worker(app, name='test:profile').run_once()
+        # Profiling saves nothing: the same questions, ids and status
+        assert [question.id for question in Question.query.filter_by(document_id=document_id)] == question_ids
+        assert db.session.get(QuestionDocument, document_id).extraction_status == 'completed'
+
+    timings = client.get(f'/questions/{document_id}/status').get_json()['timings']
+    assert {'page_text', 'topics'} <= set(timings['stages']) and 'persistence' not in timings['stages']
+    report = client.get(f'/admin/profiling/{document_id}/report')
+    assert report.status_code == 200 and b'cumulative' in report.data
@@ -0,0 +1,92 @@
+"""The job queue hands each job to one worker, retries failures and reports
+worker health.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import app, db
+from models import Job, WorkerHeartbeat
+import jobs
+import worker
+
+calls = []
+
+
+@jobs.job_handler('test_echo')
+def echo(app, payload):
+    if payload.get('fail'):
+        raise RuntimeError('boom')
+    calls.append(payload['value'])
+
+
+@pytest.fixture
+def queue():
+    role = app.config['PROCESS_ROLE']
+    app.config.update(TESTING=True, PROCESS_ROLE='web', JOB_MAX_ATTEMPTS=2)
+    calls.clear()
+    with app.app_context():
+        Job.query.delete()
+        WorkerHeartbeat.query.delete()
+        db.session.commit()
+        yield
+        db.session.rollback()
+    app.config['PROCESS_ROLE'] = role
+
+
+def test_claims_by_priority_and_only_once(queue):
+    low = jobs.enqueue('test_echo', {'value': 1}).id
+    high = jobs.enqueue('test_echo', {'value': 2}, priority=5).id
+    assert jobs.enqueue('test_echo', {'value': 2}, priority=5, dedupe=True).id == high
+
+    assert jobs.claim_job('a').id == high
+    assert jobs.claim_job('b').id == low
+    assert jobs.claim_job('c') is None
+    assert db.session.get(Job, low).locked_by == 'b'
+
+
+def test_worker_runs_and_retries_jobs(queue):
+    runner = worker.Worker(app, name='test:1')
+    ok = jobs.enqueue('test_echo', {'value': 7}).id
+    bad = jobs.enqueue('test_echo', {'fail': True}).id
+
+    assert runner.run_once() and runner.run_once()
+    assert calls == [7]
+    assert db.session.get(Job, ok).status == Job.STATUS_COMPLETED
+
+    job = db.session.get(Job, bad)
+    assert (job.status, job.attempts) == (Job.STATUS_QUEUED, 1)
+    assert job.run_after > datetime.utcnow() and 'boom' in job.error
+
+    # Once the backoff has passed the last attempt fails for good
+    job.run_after = datetime.utcnow()
+    db.session.commit()
+    assert runner.run_once()
+    assert db.session.get(Job, bad).status == Job.STATUS_FAILED
+    assert not runner.run_once()
+
+
+def test_stale_jobs_are_requeued(queue):
+    job_id = jobs.enqueue('test_echo', {'value': 1}).id
+    jobs.claim_job('gone')
+    job = db.session.get(Job, job_id)
+    job.heartbeat_at = datetime.utcnow() - timedelta(seconds=600)
+    db.session.commit()
+
+    assert jobs.requeue_stale_jobs(300) == 1
+    job = db.session.get(Job, job_id)
+    assert (job.status, job.locked_by) == (Job.STATUS_QUEUED, None)
+
+
+def test_health_checks(queue):
+    client = app.test_client()
+    response = client.get('/healthz')
+    assert response.status_code == 200
+    assert response.get_json()['role'] == 'web'
+    assert client.get('/healthz/worker').status_code == 503
+
+    jobs.enqueue('test_echo', {'value': 1})
+    worker.Worker(app, name='test:2')._beat()
+    assert client.get('/healthz').get_json()['queue']['queued'] == 1
+    assert client.get('/healthz/worker').status_code == 200
+    assert worker.check_health(app, 'test:2')
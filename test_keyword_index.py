@@ -0,0 +1,72 @@
+"""Paper keywords are normalized, counted once per paper and searchable by
+exact keyword.
+"""
+import pytest
+
+from app import app, db
+from keyword_index import index_paper_keywords, papers_with_keyword, parse_keywords
+from models import Department, Keyword, ResearchPaper, User
+
+
+@pytest.fixture
+def paper_ids():
+    with app.app_context():
+        department = Department.query.first()
+        uploader = User.query.filter_by(is_admin=True).first()
+        papers = [ResearchPaper(title=f'Indexed paper {number}', authors='A. Author', filename=f'i{number}.pdf',
+                                original_filename=f'i{number}.pdf', file_path=f'papers/i{number}.pdf',
+                                publication_year=2022, department_id=department.id, uploader_id=uploader.id,
+                                status='approved', keywords=keywords)
+                  for number, keywords in enumerate(['Lattice Sieving, lattice  sieving,Kyber',
+                                                     '  LATTICE sieving ,  post-quantum  signatures',
+                                                     'Kyber'])]
+        db.session.add_all(papers)
+        db.session.commit()
+        yield [paper.id for paper in papers]
+        for paper in papers:
+            db.session.delete(paper)
+        Keyword.query.filter(Keyword.name.in_(['lattice sieving', 'kyber', 'post-quantum signatures'])).delete()
+        db.session.commit()
+
+
+def frequencies():
+    return {keyword.name: keyword.frequency for keyword in
+            Keyword.query.filter(Keyword.name.in_(['lattice sieving', 'kyber', 'post-quantum signatures']))}
+
+
+def tagged(name):
+    return {paper_id for paper_id, in db.session.execute(papers_with_keyword(name))}
+
+
+def test_keywords_differing_in_case_or_spacing_are_one_keyword():
+    assert parse_keywords('Lattice Sieving, lattice  sieving,Kyber, ,') == ['lattice sieving', 'kyber']
+    assert parse_keywords('') == [] and parse_keywords(None) == []
+
+
+def test_index_counts_each_paper_once_and_search_finds_it(paper_ids):
+    with app.app_context():
+        papers = ResearchPaper.query.filter(ResearchPaper.id.in_(paper_ids)).order_by(ResearchPaper.id)
+        entries = [(paper.id, paper.keywords) for paper in papers]
+        assert index_paper_keywords(entries) == 5
+        db.session.commit()
+        assert frequencies() == {'lattice sieving': 2, 'kyber': 2, 'post-quantum signatures': 1}
+
+        # Indexing again (a retried job, or a paper listed twice) adds nothing
+        assert index_paper_keywords(entries + entries[:1]) == 0
+        db.session.commit()
+        assert frequencies() == {'lattice sieving': 2, 'kyber': 2, 'post-quantum signatures': 1}
+
+        # A paper given a new keyword gains just that one
+        assert index_paper_keywords([(paper_ids[2], 'Kyber, Post-Quantum Signatures')]) == 1
+        db.session.commit()
+        assert frequencies()['post-quantum signatures'] == 2
+
+        # Search matches the keyword exactly, however it is typed
+        assert tagged('  Lattice   SIEVING ') == set(paper_ids[:2])
+        assert tagged('kyber') == {paper_ids[0], paper_ids[2]}
+        assert tagged('lattice') == set()
+
+    client = app.test_client()
+    page = client.get('/search?keywords=post-quantum signatures, KYBER').get_data(as_text=True)
+    assert 'Indexed paper 2' in page
+    assert 'Indexed paper 0' not in page and 'Indexed paper 1' not in page
@@ -0,0 +1,46 @@
+"""The keyword automaton counts what the equivalent regular expressions find,
+and one scan classifies a question.
+"""
+import re
+import random
+
+from keyword_matcher import ANYWHERE, START, WORD, KeywordMatcher
+from question_features import scan_question
+
+GROUPS = [('any', ('he', 'she', 'his', 'hers', 'a)'), ANYWHERE),
+          ('start', ('her', 'a)'), START),
+          ('word', ('he', 'what is', 'x-axis'), WORD)]
+
+
+def expected_counts(text):
+    """The same counts with one lookahead regular expression per keyword."""
+    prefix = {ANYWHERE: '', START: r'\b', WORD: r'\b'}
+    suffix = {ANYWHERE: '', START: '', WORD: r'\b'}
+    return [sum(len(re.findall(f'(?={prefix[bounds]}{re.escape(keyword)}{suffix[bounds]})', text))
+                for keyword in keywords)
+            for _, keywords, bounds in GROUPS]
+
+
+def test_counts_match_regular_expressions():
+    matcher = KeywordMatcher(GROUPS)
+    assert matcher.count('ushers, he said: what is the x-axis? (a) her') == expected_counts(
+        'ushers, he said: what is the x-axis? (a) her')
+
+    rng = random.Random(0)
+    alphabet = 'heisrwatx-) _'
+    for _ in range(2000):
+        text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+        assert matcher.count(text) == expected_counts(text), text
+
+
+def test_one_scan_classifies_a_question():
+    scan = scan_question('Refer to the drawing 2 shows a heap. Calculate x = 2y + 3 and analyze it.')
+    assert (scan.question_type, scan.has_formula, scan.has_diagram) == ('Diagram-based', True, True)
+    assert scan.verb_counts == (0, 0, 1)
+
+    scan = scan_question('Give two uses of a linked list?')
+    assert (scan.question_type, scan.has_formula, scan.has_diagram) == ('Fill-in-the-Blank', False, False)
+    assert scan.verb_counts == (2, 0, 0)  # "give", and "list" as it cannot tell nouns from verbs
+
+    assert scan_question('Hence show Every bipartite network has no odd cycle.').question_type == 'Proof'
+    assert scan_question('Explain the idea behind hashing.').question_type == 'Short Answer'
@@ -0,0 +1,105 @@
+"""Layout-mode question extraction keeps reading order on two-column papers
+and finds the figures that belong to each question.
+"""
+import io
+import os
+
+import fitz
+import numpy as np
+import pytest
+from PIL import Image
+
+import app  # noqa: F401  -- set up the app before question_processor
+from question_processor import PDFQuestionExtractor
+from question_figures import extract_question_figures, store_question_figures
+from storage import LocalStorage
+
+ROWS = 4
+
+
+@pytest.fixture
+def two_column_paper(tmp_path):
+    """Questions 1-4 in the left column and 5-8 in the right, written row by row."""
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 80), 'Section A: Trees', fontsize=12, fontname='hebo')
+    for row in range(ROWS):
+        y = 120 + row * 120
+        for column, x in enumerate((72, 320)):
+            number = column * ROWS + row + 1
+            page.insert_text((x, y), f'{number}.', fontsize=10, fontname='hebo')
+            page.insert_textbox(fitz.Rect(x + 18, y - 9, x + 220, y + 70),
+                                f'Describe binary tree traversal number {number} in detail. (5 marks)',
+                                fontsize=10)
+            # Indented sub-part belongs to its question
+            page.insert_text((x + 30, y + 50), '(a) give an example', fontsize=10)
+    path = tmp_path / 'two_column.pdf'
+    doc.save(path)
+    doc.close()
+    return str(path)
+
+
+def test_layout_mode_reads_columns_in_order(two_column_paper):
+    questions = PDFQuestionExtractor(two_column_paper, mode='layout').extract_questions()
+
+    assert [q.question_number for q in questions] == [str(n) for n in range(1, 2 * ROWS + 1)]
+    first = questions[0]
+    assert first.question_text.startswith('Describe binary tree traversal number 1 ')
+    assert first.question_text.endswith('(a) give an example')
+    assert first.marks == 5
+    assert first.section == 'Trees'
+    assert first.bbox[0] < 100 and first.bbox[2] < 320
+
+
+def test_text_mode_is_still_available(two_column_paper):
+    questions = PDFQuestionExtractor(two_column_paper, mode='text').extract_questions()
+    assert questions
+
+
+@pytest.fixture
+def paper_with_figures(tmp_path):
+    """Q1 and Q3 show the same picture, Q2 a vector diagram, Q4 nothing."""
+    picture = Image.fromarray((np.indices((120, 160)).sum(0) % 40 * 6).astype('uint8')).convert('RGB')
+    png = io.BytesIO()
+    picture.save(png, 'PNG')
+
+    doc = fitz.open()
+    page = doc.new_page()
+    for number, y in enumerate((100, 270, 420, 600), start=1):
+        page.insert_text((72, y), f'{number}.', fontsize=10, fontname='hebo')
+        page.insert_text((90, y), f'Study the figure below and answer question {number}.', fontsize=10)
+    page.insert_image(fitz.Rect(90, 110, 250, 230), stream=png.getvalue())
+    page.draw_rect(fitz.Rect(90, 285, 300, 380))
+    page.draw_circle((200, 330), 30)
+    page.insert_image(fitz.Rect(90, 430, 250, 550), stream=png.getvalue())
+    path = tmp_path / 'figures.pdf'
+    doc.save(path)
+    doc.close()
+    return str(path)
+
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_figures_are_cropped_and_deduplicated(paper_with_figures, tmp_path, workers):
+    questions = PDFQuestionExtractor(paper_with_figures, mode='layout').extract_questions()
+    out_dir = tmp_path / 'figures'
+
+    paths = extract_question_figures(paper_with_figures, questions, str(out_dir), workers=workers)
+
+    assert sorted(paths) == [0, 1, 2]
+    assert paths[0] == paths[2]
+    assert paths[1] != paths[0]
+    assert len(os.listdir(out_dir)) == 2
+
+
+def test_figures_are_moved_into_storage(paper_with_figures, tmp_path):
+    questions = PDFQuestionExtractor(paper_with_figures, mode='layout').extract_questions()
+    out_dir = tmp_path / 'figures'
+    storage = LocalStorage(str(tmp_path / 'store'))
+
+    keys = store_question_figures(storage, 7, extract_question_figures(paper_with_figures, questions, str(out_dir)))
+
+    assert keys[0] == keys[2] and keys[1] != keys[0]
+    for key in keys[0] + keys[1]:
+        assert key.startswith('figures/') and key.rsplit('/', 1)[1].startswith('7_')
+        assert storage.exists(key)
+    assert not os.listdir(out_dir)
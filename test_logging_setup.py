@@ -0,0 +1,55 @@
+"""Queued logging: sampling of repeated messages, JSON lines and per-logger levels."""
+import json
+import logging
+
+import pytest
+
+from app import app
+from logging_setup import SamplingFilter, configure_logging, parse_levels, stop_logging
+
+
+def record(msg, args=(), level=logging.INFO, created=0.0):
+    entry = logging.makeLogRecord({'name': 'test', 'msg': msg, 'args': args, 'levelno': level})
+    entry.created = created
+    return entry
+
+
+def test_sampling_keeps_a_burst_per_window_and_counts_the_rest():
+    sampler = SamplingFilter(burst=2, window=10)
+    passed = [sampler.filter(record('Saved question %s', (n,), created=n)) for n in range(5)]
+    assert passed == [True, True, False, False, False]
+    assert sampler.filter(record('Saved question %s', (9,), level=logging.WARNING, created=5))
+    assert sampler.filter(record('Other message', created=5))
+
+    later = record('Saved question %s', (11,), created=11)
+    assert sampler.filter(later)
+    assert later.suppressed == 3
+
+
+def test_json_lines_and_levels(tmp_path):
+    log_file = tmp_path / 'app.log'
+    config = dict(app.config, LOG_FILE=str(log_file), LOG_FORMAT='json', LOG_LEVEL='INFO',
+                  LOG_LEVELS='noisy=ERROR', LOG_SAMPLE_BURST=0)
+    try:
+        configure_logging(config, app.name)
+        logging.getLogger('jobs').info("Ran job %s", 7, extra={'job_kind': 'extract'})
+        logging.getLogger('jobs').debug("Below the level")
+        logging.getLogger('noisy').warning("Below its own level")
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            logging.getLogger('jobs').exception("Job failed")
+        stop_logging()
+
+        lines = [json.loads(line) for line in log_file.read_text().splitlines()]
+        assert [line['message'] for line in lines] == ['Ran job 7', 'Job failed']
+        assert lines[0]['logger'] == 'jobs' and lines[0]['job_kind'] == 'extract'
+        assert 'ValueError: boom' in lines[1]['exception']
+    finally:
+        configure_logging(app.config, app.name)
+
+
+def test_parse_levels_rejects_unknown_levels():
+    assert parse_levels('werkzeug=info, socketio=ERROR') == {'werkzeug': 'INFO', 'socketio': 'ERROR'}
+    with pytest.raises(ValueError):
+        parse_levels('werkzeug=LOUD')
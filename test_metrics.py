@@ -0,0 +1,46 @@
+"""Request metrics: histograms per endpoint, queue gauges and the slow-request log."""
+import logging
+
+import pytest
+
+from app import app
+
+
+@pytest.fixture
+def client():
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False, METRICS_TOKEN=None)
+    return app.test_client()
+
+
+def test_metrics_report_requests_and_queue(client):
+    assert client.get('/login').status_code == 200
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+
+    body = response.get_data(as_text=True)
+    labels = 'endpoint="login",method="GET",status="200"'
+    assert f'researchnest_request_duration_seconds_count{{{labels}}}' in body
+    assert f'researchnest_request_duration_seconds_bucket{{{labels},le="+Inf"}}' in body
+    assert f'researchnest_request_sql_statements_sum{{{labels}}}' in body
+    assert f'researchnest_response_size_bytes_count{{{labels}}}' in body
+    assert 'researchnest_jobs_queued ' in body
+    assert 'researchnest_workers_alive ' in body
+
+
+def test_token_and_slow_request_log(client, caplog):
+    app.config['METRICS_TOKEN'] = 'secret'
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
+
+    metrics = app.extensions['metrics']
+    threshold = metrics.slow_request_ms
+    metrics.slow_request_ms = 0.001
+    try:
+        with caplog.at_level(logging.WARNING, logger='slow_requests'):
+            client.get('/search?query=graph')
+    finally:
+        metrics.slow_request_ms = threshold
+    messages = [record.getMessage() for record in caplog.records if record.name == 'slow_requests']
+    assert messages and messages[0].startswith('Slow request GET /search?query=graph -> ')
+    assert any('SELECT' in message for message in messages[1:])
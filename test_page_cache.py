@@ -0,0 +1,109 @@
+"""Page tiles are rendered off the request path, cached, and evicted LRU first."""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import app, db
+from models import QuestionDocument, Subject, User
+from page_cache import PageCache, install_page_cache
+
+POLL_TIMEOUT = 30
+
+
+def rotation_exam(make_pdf, path, pages=3):
+    """One question and a circle per page, so every page renders differently."""
+    return make_pdf([[f'{number}. Explain tree rotation number {number}.',
+                      lambda page, number=number: page.draw_circle((300, 400), 80 + number * 10)]
+                     for number in range(1, pages + 1)], path)
+
+
+@pytest.fixture(scope='module')
+def client(tmp_path_factory, make_pdf):
+    folder = tmp_path_factory.mktemp('pages')
+    pdf_path = rotation_exam(make_pdf, folder / 'exam.pdf')
+
+    app.config.update(WTF_CSRF_ENABLED=False, TESTING=True, PAGE_RENDER_WORKERS=1,
+                      PAGE_CACHE_FOLDER=str(folder / 'cache'))
+    page_cache = install_page_cache(app)
+    with app.app_context():
+        document = QuestionDocument(
+            title='Exam', filename='exam.pdf', original_filename='exam.pdf', file_path=pdf_path,
+            file_size=os.path.getsize(pdf_path), subject_id=Subject.query.first().id,
+            uploader_id=User.query.filter_by(is_admin=True).first().id
+        )
+        db.session.add(document)
+        db.session.commit()
+        document_id = document.id
+
+    test_client = app.test_client()
+    test_client.post('/login', data={'email': 'admin@researchnest.local', 'password': 'admin123'})
+    test_client.document_id = document_id
+    yield test_client
+    page_cache.shutdown()
+
+
+def test_cold_tile_is_queued_then_cached(client):
+    manifest = client.get(f'/questions/{client.document_id}/pages').get_json()
+    assert len(manifest['pages']) == 3
+    tile_url = f"{manifest['tile_url']}/1/1/0/0"
+
+    first = client.get(tile_url)
+    assert first.status_code == 202
+    assert first.headers['Retry-After']
+
+    deadline = time.time() + POLL_TIMEOUT
+    response = first
+    while response.status_code == 202 and time.time() < deadline:
+        time.sleep(0.05)
+        response = client.get(tile_url)
+    assert response.status_code == 200
+    assert response.mimetype.startswith('image/')
+    assert 'immutable' in response.headers['Cache-Control']
+    assert 'max-age=31536000' in response.headers['Cache-Control']
+
+    # A second view is served straight from disk
+    assert client.get(tile_url).status_code == 200
+
+
+def test_out_of_range_and_stale_tiles_are_not_found(client):
+    manifest = client.get(f'/questions/{client.document_id}/pages').get_json()
+    assert client.get(f"{manifest['tile_url']}/3/0/0/0").status_code == 404
+    assert client.get(f"{manifest['tile_url']}/0/0/5/0").status_code == 404
+    stale = manifest['tile_url'].rsplit('/', 1)[0] + '/0123456789abcdef'
+    assert client.get(f'{stale}/0/0/0/0').status_code == 404
+
+
+def test_eviction_keeps_cache_under_budget(tmp_path, make_pdf):
+    pdf_path = rotation_exam(make_pdf, tmp_path / 'exam.pdf', pages=6)
+    cache = PageCache(str(tmp_path / 'cache'), max_bytes=10 ** 9, zoom_levels=(0.25,))
+    token = cache.manifest(pdf_path)['token']
+
+    paths = [cache.tile(pdf_path, token, page, 0, 0, 0) for page in range(2)]
+    sizes = [os.path.getsize(path) for path in paths]
+    cache.max_bytes = sum(sizes) * 3
+
+    # Oldest first: the first tile is the least recently used
+    os.utime(paths[0], (1, 1))
+    for page in range(2, 6):
+        cache.tile(pdf_path, token, page, 0, 0, 0)
+
+    remaining = [page for page in range(6) if os.path.exists(cache.tile_path(token, page, 0, 0, 0))]
+    assert 0 not in remaining
+    assert 5 in remaining
+    assert cache._scan()[0] <= cache.max_bytes
+
+
+def test_pages_of_one_document_render_from_several_threads(tmp_path, make_pdf):
+    pdf_path = rotation_exam(make_pdf, tmp_path / 'exam.pdf', pages=6)
+    cache = PageCache(str(tmp_path / 'cache'), max_bytes=10 ** 9, zoom_levels=(0.25, 1.0), tile_size=128)
+    token = cache.manifest(pdf_path)['token']
+
+    # Each page twice, so two threads render the same page at once
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(lambda page: cache.render_page(pdf_path, token, page % 6, 1), range(12)))
+    columns, rows = cache.tile_count(cache.manifest(pdf_path, token)['pages'][0], 1)
+    for page in range(6):
+        assert all(os.path.exists(cache.tile_path(token, page, 1, x, y)) for x in range(columns) for y in range(rows))
+    assert not [name for _, _, files in os.walk(cache.folder) for name in files if name.endswith('.tmp')]
@@ -0,0 +1,87 @@
+"""Keyset pagination walks tied sort values in both directions, and falls back
+to the first page on cursors it cannot read.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import app, db
+from models import Department, ResearchPaper, User
+from pagination import decode_cursor, encode_cursor, keyset_paginate
+
+# Upload times with ties; the microseconds must survive the cursor
+UPLOADED = [datetime(2024, 3, 1, 12, 0, 0, 123456)] * 3 + [datetime(2024, 3, 2, 8, 30)] * 2 + \
+    [datetime(2024, 3, 1, 12, 0, 0, 123456) + timedelta(microseconds=1), datetime(2024, 2, 1)]
+
+
+@pytest.fixture(scope='module')
+def paper_ids():
+    with app.app_context():
+        department = Department.query.first()
+        uploader = User.query.filter_by(is_admin=True).first()
+        papers = [ResearchPaper(title=f'Keyset paper {number}', authors='A. Author', filename=f'k{number}.pdf',
+                                original_filename=f'k{number}.pdf', file_path=f'papers/k{number}.pdf',
+                                publication_year=2024, department_id=department.id, uploader_id=uploader.id,
+                                uploaded_at=uploaded_at)
+                  for number, uploaded_at in enumerate(UPLOADED)]
+        db.session.add_all(papers)
+        db.session.commit()
+        return [paper.id for paper in papers]
+
+
+def page(after=None, before=None, per_page=2, descending=True):
+    query = ResearchPaper.query.filter(ResearchPaper.title.startswith('Keyset paper'))
+    return keyset_paginate(query, ResearchPaper.uploaded_at, ResearchPaper.id, after=after, before=before,
+                           per_page=per_page, descending=descending)
+
+
+def expected_order(paper_ids, descending=True):
+    return [paper_id for _, paper_id in sorted(zip(UPLOADED, paper_ids), reverse=descending)]
+
+
+@pytest.mark.parametrize('descending', [True, False])
+def test_walk_forwards_and_back_through_ties(paper_ids, descending):
+    with app.app_context():
+        forwards = [page(descending=descending)]
+        while forwards[-1].has_next:
+            forwards.append(page(after=forwards[-1].next_cursor, descending=descending))
+        assert [paper.id for current in forwards for paper in current] == expected_order(paper_ids, descending)
+        assert [len(current) for current in forwards] == [2, 2, 2, 1]
+        assert not forwards[0].has_prev and not forwards[-1].has_next
+
+        # Back from the last page: the same pages, each still in display order
+        backwards = [forwards[-1]]
+        while backwards[-1].has_prev:
+            backwards.append(page(before=backwards[-1].prev_cursor, descending=descending))
+        assert [[paper.id for paper in current] for current in reversed(backwards)] == \
+            [[paper.id for paper in current] for current in forwards]
+
+
+def test_before_cursor_returns_the_preceding_rows_in_display_order(paper_ids):
+    with app.app_context():
+        third = page(after=page(after=page().next_cursor).next_cursor)
+        previous = page(before=third.prev_cursor, per_page=3)
+        # The three rows just above the third page, not the three after the cursor
+        assert [paper.id for paper in previous] == expected_order(paper_ids)[1:4]
+        assert previous.has_prev and previous.has_next
+
+
+@pytest.mark.parametrize('cursor', ['not a cursor!', encode_cursor([1]), encode_cursor(['yesterday', 1]),
+                                    encode_cursor(['2024-03-01T12:00:00', 1, 'extra'])])
+def test_unreadable_or_stale_cursor_falls_back_to_first_page(paper_ids, cursor):
+    with app.app_context():
+        first = [paper.id for paper in page()]
+        for fallback in (page(after=cursor), page(before=cursor)):
+            assert [paper.id for paper in fallback] == first
+            assert not fallback.has_prev
+
+
+def test_datetime_cursor_round_trips(paper_ids):
+    columns = [ResearchPaper.uploaded_at, ResearchPaper.id]
+    assert decode_cursor(encode_cursor([UPLOADED[0], 7]), columns) == [UPLOADED[0], 7]
+
+    with app.app_context():
+        # A cursor on the first of the tied rows continues with the rest of the tie
+        tied = sorted(paper_ids[:3], reverse=True)
+        after_first = page(after=encode_cursor([UPLOADED[0], tied[0]]), per_page=5)
+        assert [paper.id for paper in after_first][:2] == tied[1:]
@@ -0,0 +1,92 @@
+"""Title, author, abstract and keyword heuristics over generated papers, and
+the parsed-document cache.
+"""
+import shutil
+
+import pytest
+
+import pdf_metadata
+from pdf_metadata import extract_metadata, read_document
+
+ABSTRACT = ['Abstract', 'We partition sparse graphs so that parallel solvers exchange',
+            'less data between processors, and measure the speed-up on large matrices.']
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    pdf_metadata.clear_cache()
+    yield
+    pdf_metadata.clear_cache()
+
+
+@pytest.fixture
+def paper(tmp_path, make_pdf):
+    """Builds a paper with a two-line title set large, followed by ``lines`` in body text."""
+    def build(lines=(), name='paper.pdf', **options):
+        return make_pdf([[('Sparse Graph Partitioning', 18), ('for Parallel Solvers', 18), *lines]],
+                        tmp_path / name, spacing=16, bold_numbers=False, **options)
+    return build
+
+
+def test_title_font_and_list_of_names(paper):
+    metadata = extract_metadata(paper(['Department of Computer Science', 'Ada Lovelace1, Charles Babbage*',
+                                       *ABSTRACT, 'Keywords: graph partitioning, sparse matrices',
+                                       '1. Introduction', 'Solvers spend 2019 exchanging data.']))
+
+    assert metadata['title'] == 'Sparse Graph Partitioning for Parallel Solvers'
+    # The affiliation is not a list of names; the line after it is
+    assert metadata['authors'] == 'Ada Lovelace1, Charles Babbage*'
+    assert metadata['abstract'] == ('We partition sparse graphs so that parallel solvers exchange less data '
+                                    'between processors, and measure the speed-up on large matrices.')
+    # Keywords stop at the next section heading
+    assert metadata['keywords'] == 'graph partitioning, sparse matrices'
+    assert metadata['publication_year'] == 2019
+
+
+def test_fallback_title_and_byline(tmp_path, make_pdf):
+    path = make_pdf([['Preprint', 'A STUDY OF CACHE OBLIVIOUS ALGORITHMS', 'By Grace Hopper and Alan Turing',
+                      'Abstract: Cache oblivious algorithms use the memory hierarchy well without knowing it.',
+                      '', 'This paragraph comes after a break.']],
+                    tmp_path / 'plain.pdf', spacing=16, bold_numbers=False)
+    metadata = extract_metadata(path)
+
+    # Every line is body size, so the title comes from the text itself
+    assert metadata['title'] == 'A STUDY OF CACHE OBLIVIOUS ALGORITHMS'
+    assert metadata['authors'] == 'Grace Hopper and Alan Turing'
+    # The abstract ends at the paragraph break
+    assert metadata['abstract'] == 'Cache oblivious algorithms use the memory hierarchy well without knowing it.'
+    assert metadata['keywords'] == '' and metadata['publication_year'] is None
+
+
+def test_text_that_is_not_names_is_not_an_author_list(paper):
+    metadata = extract_metadata(paper(['Graph partitioning and sparse solvers', *ABSTRACT]))
+    assert metadata['authors'] == ''
+    assert metadata['abstract'].startswith('We partition')
+
+
+def test_abstract_ends_at_section_heading_and_properties_win(paper):
+    metadata = extract_metadata(paper([*ABSTRACT, 'Introduction', 'Solvers spend their time exchanging data.'],
+                                      metadata={'title': 'Stored Title', 'author': 'Stored Author'}))
+    assert (metadata['title'], metadata['authors']) == ('Stored Title', 'Stored Author')
+    assert metadata['abstract'].endswith('on large matrices.')
+
+
+def test_documents_are_cached_by_content(paper, tmp_path, monkeypatch):
+    path = paper(ABSTRACT)
+    copy = tmp_path / 'copy.pdf'
+    shutil.copy(path, copy)
+    other = paper(['Ada Lovelace'], name='other.pdf')
+
+    document = read_document(path)
+    # Same bytes under another name: parsed once
+    assert read_document(str(copy)) is document
+    assert read_document(other) is not document
+
+    pdf_metadata.clear_cache()
+    assert read_document(path) is not document
+
+    # Past CACHE_SIZE the least recently read document is parsed again
+    monkeypatch.setattr(pdf_metadata, 'CACHE_SIZE', 1)
+    document = read_document(path)
+    read_document(other)
+    assert read_document(path) is not document
@@ -0,0 +1,66 @@
+"""PDF optimization: resampled images, kept originals and recorded savings."""
+import io
+
+import fitz
+import numpy as np
+from PIL import Image
+
+from app import app, db
+from models import Department, ResearchPaper, User
+from pdf_optimizer import image_resolutions, optimization_savings, run_optimization
+from storage import LocalStorage
+
+
+def scanned_pdf(make_pdf):
+    """One 2 x 3 inch page holding a 400 DPI noisy scan and a line of text."""
+    pixels = (np.random.default_rng(0).random((1200, 800, 3)) * 60 + 150).astype('uint8')
+    image = io.BytesIO()
+    Image.fromarray(pixels).save(image, 'PNG')
+    return make_pdf([[lambda page: page.insert_image(page.rect, stream=image.getvalue()), ('1. Define entropy.', 8)]],
+                    page_size=(144, 216), top=20, left=10, bold_numbers=False)
+
+
+def text_pdf(make_pdf):
+    return make_pdf([['Abstract: nothing to squeeze here.']], garbage=4, deflate=True, use_objstms=1)
+
+
+def test_optimization_keeps_originals_and_records_savings(tmp_path, make_pdf):
+    storage = LocalStorage(str(tmp_path / 'store'))
+    previous = app.extensions.get('storage')
+    app.extensions['storage'] = storage
+    app.config.update(PDF_OPTIMIZE_WORKERS=0, PDF_OPTIMIZE_MIN_SAVING=5)
+    try:
+        with app.app_context():
+            admin = User.query.filter_by(is_admin=True).first()
+            department = Department.query.first()
+            paper_ids = []
+            for name, data in (('scan.pdf', scanned_pdf(make_pdf)), ('text.pdf', text_pdf(make_pdf))):
+                key = storage.key_for('papers', f'{len(paper_ids)}_{name}')
+                storage.save(io.BytesIO(data), key)
+                paper = ResearchPaper(title=name, authors='A. Author', filename=name, original_filename=name,
+                                      file_path=key, file_size=len(data), publication_year=2020,
+                                      department_id=department.id, uploader_id=admin.id)
+                db.session.add(paper)
+                db.session.flush()
+                paper_ids.append(paper.id)
+            db.session.commit()
+            optimized_before, saved_before = optimization_savings()
+
+        totals = run_optimization(app, paper_ids=paper_ids)
+        assert (totals['optimized'], totals['kept'], totals['failed'], totals['images']) == (1, 1, 0, 1)
+        assert run_optimization(app, paper_ids=paper_ids)['optimized'] == 0  # tried once
+
+        with app.app_context():
+            scan, text = (db.session.get(ResearchPaper, paper_id) for paper_id in paper_ids)
+            assert scan.file_path.endswith('0_scan.optimized.pdf') and scan.original_file_path.endswith('0_scan.pdf')
+            assert storage.size(scan.original_file_path) == scan.original_file_size
+            assert storage.size(scan.file_path) == scan.file_size < scan.original_file_size / 2
+            with fitz.open(storage.local_path(scan.file_path)) as doc:
+                assert doc[0].get_text().strip() == '1. Define entropy.'
+                assert all(round(dpi) <= 150 for dpi, _ in image_resolutions(doc).values())
+
+            assert text.optimized_at is not None and text.original_file_path is None
+            assert optimization_savings() == (optimized_before + 1,
+                                              saved_before + scan.original_file_size - scan.file_size)
+    finally:
+        app.extensions['storage'] = previous
@@ -0,0 +1,105 @@
+"""Progress rooms: only owners may join, joining sends a snapshot and
+progress events are throttled per room. Event streams do the same over
+server-sent events.
+"""
+import json
+import threading
+
+import pytest
+
+from app import app, db, socketio
+from models import QuestionDocument, Subject, User
+from progress import publish_document
+
+
+def login(email, password):
+    client = app.test_client()
+    client.post('/login', data={'email': email, 'password': password})
+    return client
+
+
+def received(socket_client, name):
+    return [event['args'][0] for event in socket_client.get_received() if event['name'] == name]
+
+
+@pytest.fixture
+def document_id():
+    app.config.update(WTF_CSRF_ENABLED=False, TESTING=True, PROGRESS_EMIT_INTERVAL=60)
+    with app.app_context():
+        if not User.query.filter_by(email='watcher@example.com').first():
+            user = User(email='watcher@example.com', first_name='Watcher')
+            user.set_password('password')
+            db.session.add(user)
+        document = QuestionDocument(
+            title='Live', filename='live.pdf', original_filename='live.pdf', file_path='/tmp/live.pdf',
+            file_size=1, subject_id=Subject.query.first().id,
+            uploader_id=User.query.filter_by(is_admin=True).first().id,
+            extraction_status=QuestionDocument.STATUS_EXTRACTING, total_pages=4, processed_pages=1
+        )
+        db.session.add(document)
+        db.session.commit()
+        return document.id
+
+
+def test_rooms_require_an_owner(document_id):
+    assert not socketio.test_client(app).is_connected()
+
+    stranger = socketio.test_client(app, flask_test_client=login('watcher@example.com', 'password'))
+    assert stranger.emit('subscribe', {'document_id': document_id}, callback=True) == {'error': 'Not found'}
+    assert received(stranger, 'status_update') == []
+
+    owner = socketio.test_client(app, flask_test_client=login('admin@researchnest.local', 'admin123'))
+    assert owner.emit('subscribe', {'document_id': document_id}, callback=True) == {'room': f'doc_{document_id}'}
+    [snapshot] = received(owner, 'status_update')
+    assert (snapshot['document_id'], snapshot['processed_pages'], snapshot['total_pages']) == (document_id, 1, 4)
+
+
+def test_progress_is_throttled_and_resumable(document_id):
+    owner = socketio.test_client(app, flask_test_client=login('admin@researchnest.local', 'admin123'))
+    owner.emit('subscribe', {'document_id': document_id})
+    owner.get_received()
+
+    with app.app_context():
+        doc = db.session.get(QuestionDocument, document_id)
+        assert publish_document(doc, 1)
+        doc.processed_pages = 2
+        assert not publish_document(doc, 3)
+
+        # A reconnecting page gets the latest state, including throttled progress
+        late = socketio.test_client(app, flask_test_client=login('admin@researchnest.local', 'admin123'))
+        late.emit('subscribe', {'document_id': document_id})
+        [snapshot] = received(late, 'status_update')
+        assert (snapshot['processed_pages'], snapshot['question_count']) == (2, 3)
+
+        # Status changes always go out
+        doc.extraction_status = QuestionDocument.STATUS_COMPLETED
+        assert publish_document(doc, 5)
+
+    events = received(owner, 'status_update')
+    assert [(event['status'], event['question_count']) for event in events] == [
+        ('extracting', 1), ('completed', 5)]
+
+
+def test_event_stream_follows_a_document(document_id):
+    app.config.update(SSE_HEARTBEAT_SECONDS=5)
+    stranger = login('watcher@example.com', 'password')
+    assert stranger.get(f'/questions/{document_id}/events').status_code == 403
+
+    response = login('admin@researchnest.local', 'admin123').get(f'/questions/{document_id}/events')
+    assert response.mimetype == 'text/event-stream'
+    chunks = (chunk.decode() for chunk in response.response)
+    assert next(chunks).startswith('retry:')
+    snapshot = next(chunks)
+    assert snapshot.startswith('event: status_update\n')
+    assert json.loads(snapshot.split('data: ')[1])['processed_pages'] == 1
+
+    def finish():
+        with app.app_context():
+            doc = db.session.get(QuestionDocument, document_id)
+            doc.extraction_status = QuestionDocument.STATUS_COMPLETED
+            publish_document(doc, 5)
+
+    # The stream ends once it has sent the final state
+    threading.Timer(0.2, finish).start()
+    events = [json.loads(chunk.split('data: ')[1]) for chunk in chunks]
+    assert [(event['status'], event['question_count']) for event in events] == [('completed', 5)]
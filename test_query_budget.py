@@ -0,0 +1,120 @@
+"""Assert that list, detail and status views stay within their SQL statement budgets.
+
+Budgets are declared on the views with ``@query_budget``; the seeded data has
+enough rows per relation that a lazy load inside a template loop would blow
+the budget.
+"""
+import os
+
+os.environ['QUERY_AUDIT_ENABLED'] = 'true'
+
+import pytest
+
+from app import app, db
+from models import (User, Department, ResearchPaper, DownloadLog, QuestionDocument,
+                    Question, Subject, Unit, Topic)
+from query_audit import budget_for
+
+
+def seed_data():
+    admin = User.query.filter_by(is_admin=True).first()
+    departments = Department.query.limit(3).all()
+    subject = Subject.query.filter_by(code='CS201').first()
+    units = Unit.query.filter_by(subject_id=subject.id).all()
+
+    users = []
+    for i in range(5):
+        user = User(email=f'user{i}@example.com', first_name=f'User{i}')
+        user.set_password('password')
+        users.append(user)
+    db.session.add_all(users)
+    db.session.flush()
+
+    papers = []
+    for i in range(15):
+        paper = ResearchPaper(
+            title=f'Paper {i}', authors='A. Author', keywords='graphs, trees',
+            filename=f'paper{i}.pdf', original_filename=f'paper{i}.pdf',
+            file_path=f'/tmp/paper{i}.pdf', file_size=1024, publication_year=2020,
+            department_id=departments[i % len(departments)].id,
+            uploader_id=users[i % len(users)].id, status='approved'
+        )
+        papers.append(paper)
+    db.session.add_all(papers)
+    db.session.flush()
+
+    for i, paper in enumerate(papers):
+        db.session.add(DownloadLog(paper_id=paper.id, user_id=users[i % len(users)].id))
+
+    document = QuestionDocument(
+        title='Midterm', filename='midterm.pdf', original_filename='midterm.pdf',
+        file_path='/tmp/midterm.pdf', file_size=2048, subject_id=subject.id,
+        uploader_id=admin.id, extraction_status='completed'
+    )
+    db.session.add(document)
+    db.session.flush()
+
+    for i in range(12):
+        unit = units[i % len(units)]
+        db.session.add(Question(
+            question_text=f'Explain question {i} in detail.', document_id=document.id,
+            unit_id=unit.id, topic_id=unit.topics[i % len(unit.topics)].id,
+            page_number=1 + i // 4, question_number=str(i + 1)
+        ))
+    db.session.commit()
+    return document.id
+
+
+@pytest.fixture(scope='module')
+def client():
+    app.config.update(WTF_CSRF_ENABLED=False, TESTING=True)
+    with app.app_context():
+        document_id = seed_data()
+    test_client = app.test_client()
+    test_client.post('/login', data={'email': 'admin@researchnest.local', 'password': 'admin123'})
+    test_client.document_id = document_id
+    return test_client
+
+
+def assert_within_budget(client, path):
+    response = client.get(path)
+    assert response.status_code == 200, f'{path} returned {response.status_code}'
+
+    endpoint = app.url_map.bind('localhost').match(path.split('?')[0])[0]
+    with app.app_context():
+        budget = budget_for(endpoint)
+    assert budget is not None, f'{endpoint} has no query budget'
+
+    count = int(response.headers['X-SQL-Query-Count'])
+    assert count <= budget, f'{path} issued {count} statements (budget {budget})'
+
+
+@pytest.mark.parametrize('path', [
+    '/',
+    '/search',
+    '/search?query=Paper',
+    '/my-papers',
+    '/admin',
+    '/admin/papers',
+    '/admin/users',
+    '/questions',
+    '/manage/questions',
+    '/my-generated-papers',
+])
+def test_list_views_within_budget(client, path):
+    assert_within_budget(client, path)
+
+
+def test_document_views_within_budget(client):
+    document_id = client.document_id
+    assert_within_budget(client, f'/questions/{document_id}')
+    assert_within_budget(client, f'/questions/{document_id}/status')
+    assert_within_budget(client, f'/questions/{document_id}/extraction-status')
+    with app.app_context():
+        question_id = Question.query.filter_by(document_id=document_id).first().id
+    assert_within_budget(client, f'/question/{question_id}')
+
+
+def test_status_reports_question_count(client):
+    response = client.get(f'/questions/{client.document_id}/status')
+    assert response.get_json()['question_count'] == 12
@@ -0,0 +1,80 @@
+"""Re-classification writes only changed questions, skips manual edits and
+keeps units and topics already assigned.
+"""
+import io
+import json
+
+import pytest
+
+from app import app, db
+from models import Department, Question, QuestionDocument, Subject, Topic, Unit, User
+from reclassify import run_reclassification
+
+TEXTS = ['Explain the rotations that keep a binary search tree balanced.',
+         'Define normalization of relational database tables.',
+         'Define the term deadlock.',
+         'Explain how normalization removes redundancy from tables.']
+
+
+@pytest.fixture
+def question_ids():
+    app.config.update(TESTING=True, RECLASSIFY_CHUNK_SIZE=2)
+    with app.app_context():
+        subject = Subject(name='Computing', code='CS-RC', department_id=Department.query.first().id)
+        db.session.add(subject)
+        db.session.flush()
+        trees = Unit(name='Trees', description='binary search tree balanced rotations', subject_id=subject.id)
+        databases = Unit(name='Databases', description='relational database tables normalization',
+                         subject_id=subject.id)
+        db.session.add_all([trees, databases])
+        db.session.flush()
+        db.session.add_all([Topic(name='Balanced trees', description='rotations', unit_id=trees.id),
+                            Topic(name='Normal forms', description='normalization redundancy', unit_id=databases.id)])
+        document = QuestionDocument(
+            title='Exam', filename='exam.pdf', original_filename='exam.pdf', file_path='exam.pdf', file_size=1,
+            subject_id=subject.id, uploader_id=User.query.filter_by(is_admin=True).first().id,
+            extraction_status=QuestionDocument.STATUS_COMPLETED)
+        db.session.add(document)
+        db.session.flush()
+        questions = [Question(question_text=text, question_type='text', marks=2, document_id=document.id)
+                     for text in TEXTS]
+        questions[2].manually_edited = True
+        questions[3].unit_id = trees.id
+        db.session.add_all(questions)
+        db.session.commit()
+        return [question.id for question in questions], trees.id, databases.id
+
+
+def stored(ids):
+    with app.app_context():
+        return {question.id: (question.question_type, question.difficulty_confidence, question.unit_id)
+                for question in Question.query.filter(Question.id.in_(ids))}
+
+
+@pytest.mark.parametrize('workers', [0, 1])
+def test_reclassification_updates_changed_questions(question_ids, workers):
+    ids, trees, databases = question_ids
+    app.config['RECLASSIFY_WORKERS'] = workers
+    before = stored(ids)
+
+    diff = io.StringIO()
+    totals = run_reclassification(app, dry_run=True, diff_file=diff)
+    changes = {change['id']: change for change in map(json.loads, diff.getvalue().splitlines())}
+    assert stored(ids) == before
+    assert ids[2] not in changes
+    assert changes[ids[0]]['question_type'] == ['text', 'Short Answer']
+    assert changes[ids[0]]['unit_id'] == [None, trees]
+    assert changes[ids[1]]['unit_id'] == [None, databases]
+    assert 'unit_id' not in changes[ids[3]]
+
+    assert run_reclassification(app) == totals
+    after = stored(ids)
+    assert after[ids[0]][0] == 'Short Answer' and after[ids[0]][1] is not None
+    assert after[ids[0]][2] == trees and after[ids[1]][2] == databases
+    assert after[ids[2]] == before[ids[2]]
+    # Existing units are kept unless asked to reassign them
+    assert after[ids[3]][2] == trees
+    assert run_reclassification(app, fields=('topics',), reassign_topics=True)['unit_id'] == 1
+    assert stored(ids)[ids[3]][2] == databases
+
+    assert run_reclassification(app)['changed'] == 0
@@ -0,0 +1,81 @@
+"""Re-extraction writes only changed questions, keeps manual edits and
+unit/topic assignments, and categorizes the questions it inserts.
+"""
+import os
+
+import pytest
+
+from app import app, db
+from models import Question, QuestionDocument, Subject, Unit, User
+from question_processor import EXTRACTOR_VERSION
+from reextract import run_reextraction
+
+QUESTIONS = 5
+
+
+@pytest.fixture
+def document_id(tmp_path, make_pdf):
+    path = make_pdf([[f'{number}. Explain the balancing of search tree variant {number}. (10 marks)'
+                      for number in range(1, QUESTIONS + 1)]], tmp_path / 'exam.pdf')
+
+    app.config.update(TESTING=True, FIGURE_EXTRACTION_ENABLED=False, REEXTRACT_DOCUMENTS_PER_MINUTE=0)
+    with app.app_context():
+        document = QuestionDocument(
+            title='Exam', filename='exam.pdf', original_filename='exam.pdf', file_path=path,
+            file_size=os.path.getsize(path), subject_id=Subject.query.first().id,
+            uploader_id=User.query.filter_by(is_admin=True).first().id,
+            extraction_status=QuestionDocument.STATUS_COMPLETED
+        )
+        db.session.add(document)
+        db.session.commit()
+        return document.id
+
+
+def questions_of(document_id):
+    with app.app_context():
+        return {q.question_number: (q.question_text, q.unit_id, q.manually_edited)
+                for q in Question.query.filter_by(document_id=document_id)}
+
+
+@pytest.mark.parametrize('workers', [0, 1])
+def test_reextraction_diffs_against_existing_questions(document_id, workers):
+    app.config['REEXTRACT_WORKERS'] = workers
+    first = run_reextraction(app, document_ids=[document_id])
+    assert (first['inserted'], first['failed']) == (QUESTIONS, 0)
+
+    with app.app_context():
+        by_number = {q.question_number: q for q in Question.query.filter_by(document_id=document_id)}
+        # Inserted questions are matched to the subject's units like a first extraction
+        matched_unit_id = by_number['1'].unit_id
+        assert matched_unit_id is not None
+        unit_id = Unit.query.filter(Unit.id != by_number['2'].unit_id).first().id
+        # Reviewer edits and categorisation
+        by_number['1'].question_text = 'Reviewer wording'
+        by_number['1'].manually_edited = True
+        by_number['2'].unit_id = unit_id
+        # Output of an older extractor, and a question it no longer finds
+        by_number['3'].question_text = 'Explain the balancing'
+        db.session.add(Question(question_text='Stray footer', document_id=document_id,
+                                page_number=1, question_number='99'))
+        document = db.session.get(QuestionDocument, document_id)
+        document.extractor_version = None
+        db.session.commit()
+
+    before = questions_of(document_id)
+    dry_run = run_reextraction(app, document_ids=[document_id], dry_run=True)
+    assert questions_of(document_id) == before
+
+    totals = run_reextraction(app, document_ids=[document_id])
+    for result in (dry_run, totals):
+        assert {key: result[key] for key in ('inserted', 'updated', 'deleted', 'unchanged', 'preserved')} == {
+            'inserted': 0, 'updated': 1, 'deleted': 1, 'unchanged': QUESTIONS - 2, 'preserved': 1}
+
+    after = questions_of(document_id)
+    assert '99' not in after
+    assert after['1'] == ('Reviewer wording', matched_unit_id, True)
+    assert after['2'][1] == unit_id
+    assert after['3'][0].startswith('Explain the balancing of search tree variant 3')
+    with app.app_context():
+        document = db.session.get(QuestionDocument, document_id)
+        assert document.extractor_version == EXTRACTOR_VERSION
+        assert document.total_questions == QUESTIONS
@@ -0,0 +1,77 @@
+"""Semantic topic matching, the vector index, and similar questions on the
+question page.
+"""
+import os
+
+import numpy as np
+
+from app import app, db
+from categorizer import make_categorizer
+from models import Question, QuestionDocument, Subject, User
+from similar_questions import build_question_index
+from vector_index import build_index, load_index
+
+TAXONOMY = ((1, 'Trees', ((10, 'Binary Search Trees'), (11, 'Heaps'))),
+            (2, 'Graphs', ((20, 'Graph Traversal'), (21, 'Shortest Paths'))))
+
+
+def test_semantic_categorizer_matches_abbreviations_and_inflections():
+    texts = ['Explain BST insertion.', 'Traverse the graph breadth first.', 'State the pumping lemma.']
+    tfidf = make_categorizer(TAXONOMY, 'tfidf').categorize(texts)
+    semantic = make_categorizer(TAXONOMY, 'semantic', embedding_dim=256).categorize(texts)
+    assert tfidf[0].topic_id is None
+    assert [(category.unit_id, category.topic_id) for category in semantic] == [(1, 10), (2, 20), (None, None)]
+
+
+def test_index_search_brute_force_and_ivf(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((3000, 32)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = np.arange(3000) * 7
+    batches = [(ids[start:start + 1000], vectors[start:start + 1000]) for start in range(0, 3000, 1000)]
+
+    build_index(str(tmp_path / 'flat'), 'test', batches, 32, 'test', ivf_min_vectors=10000)
+    build_index(str(tmp_path / 'ivf'), 'test', batches, 32, 'test', ivf_min_vectors=1000)
+    flat, ivf = load_index(str(tmp_path / 'flat'), 'test'), load_index(str(tmp_path / 'ivf'), 'test')
+    assert ivf.meta['lists'] > 1 and isinstance(flat.vectors, np.memmap)
+
+    query = vectors[42]
+    expected = [int(ids[row]) for row in np.argsort(-(vectors @ query))[:5]]
+    assert [vector_id for vector_id, _ in flat.search(query, 5)] == expected
+    assert [vector_id for vector_id, _ in ivf.search(query, 5, probes=ivf.meta['lists'])] == expected
+    assert ivf.search(query, 1, exclude={int(ids[42])})[0][0] == expected[1]
+    assert np.allclose(ivf.vector(int(ids[42])), query) and ivf.vector(1) is None
+
+    # A rebuild becomes current; the build before it is kept for readers still opening it
+    first = flat.meta['build']
+    build_index(str(tmp_path / 'flat'), 'test', batches[:1], 32, 'test')
+    build_index(str(tmp_path / 'flat'), 'test', batches[:2], 32, 'test')
+    assert len(load_index(str(tmp_path / 'flat'), 'test')) == 2000
+    assert first not in os.listdir(tmp_path / 'flat')
+
+
+def test_question_page_lists_similar_questions(tmp_path):
+    app.config.update(WTF_CSRF_ENABLED=False, TESTING=True, EMBEDDING_INDEX_FOLDER=str(tmp_path), EMBEDDING_DIM=256)
+    with app.app_context():
+        document = QuestionDocument(
+            title='Exam', filename='exam.pdf', original_filename='exam.pdf', file_path='exam.pdf', file_size=1,
+            subject_id=Subject.query.first().id, uploader_id=User.query.filter_by(is_admin=True).first().id)
+        db.session.add(document)
+        db.session.flush()
+        questions = [Question(question_text=text, document_id=document.id, question_number=str(number))
+                     for number, text in enumerate(['Explain the zig-zig step of splaying.',
+                                                    'Splay key 7 in the splay tree below, naming each zig-zig step.',
+                                                    'Define a relational database schema.'], 1)]
+        db.session.add_all(questions)
+        db.session.commit()
+        question_ids = [question.id for question in questions]
+
+    client = app.test_client()
+    client.post('/login', data={'email': 'admin@researchnest.local', 'password': 'admin123'})
+    assert b'No similar questions found' in client.get(f'/question/{question_ids[0]}').data
+
+    assert build_question_index(app)['questions'] >= 3
+    page = client.get(f'/question/{question_ids[0]}').data.decode()
+    similar = page[page.index('Similar Questions'):]
+    # The best match comes first
+    assert similar.index('href="/question/') == similar.index(f'href="/question/{question_ids[1]}"')
@@ -0,0 +1,187 @@
+"""Storage drivers and the migration of files stored under absolute paths.
+
+The S3 driver runs against a small in-memory stand-in for an S3-compatible
+service.
+"""
+import io
+import json
+import os
+
+import pytest
+
+from app import app, db
+from models import BulkUploadBatch, BulkUploadItem, Department, Question, QuestionDocument, ResearchPaper, Subject, User
+from storage import LocalStorage, S3Storage, StorageError
+from storage_migration import run_storage_migration
+
+
+class MissingObject(Exception):
+    response = {'Error': {'Code': 'NoSuchKey'}}
+
+
+class ObjectStore:
+    """The calls S3Storage makes, answered from a dict like a MinIO bucket would."""
+
+    def __init__(self):
+        self.objects = {}
+
+    def upload_fileobj(self, stream, bucket, key):
+        self.objects[(bucket, key)] = b''.join(iter(lambda: stream.read(4096), b''))
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise MissingObject()
+        return {'Body': io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise MissingObject()
+        return {'ContentLength': len(self.objects[(Bucket, Key)])}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"https://objects.example/{Params['Bucket']}/{Params['Key']}?expires={ExpiresIn}"
+
+
+class FailingStream(io.BytesIO):
+    def read(self, size=-1):
+        data = super().read(size)
+        if not data:
+            raise IOError('connection reset')
+        return data
+
+
+def test_local_storage_shards_keys_and_writes_atomically(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+    key = storage.key_for('papers', 'abc_thesis.pdf')
+    namespace, first, second, filename = key.split('/')
+    assert (namespace, filename) == ('papers', 'abc_thesis.pdf')
+    assert len(first) == len(second) == 2
+
+    assert storage.save(io.BytesIO(b'%PDF-1.7 thesis'), key) == 15
+    assert storage.size(key) == 15
+    with storage.open(key) as f:
+        assert f.read() == b'%PDF-1.7 thesis'
+
+    broken = storage.key_for('papers', 'broken.pdf')
+    with pytest.raises(IOError):
+        storage.save(FailingStream(b'%PDF-1.7 partial'), broken)
+    assert not storage.exists(broken)
+    assert os.listdir(os.path.dirname(storage.local_path(broken))) in ([], ['abc_thesis.pdf'])
+
+    storage.delete(key)
+    storage.delete(key)
+    assert not storage.exists(key)
+    with pytest.raises(StorageError):
+        storage.save(io.BytesIO(b''), '../outside.pdf')
+
+
+def test_s3_storage(tmp_path):
+    service = ObjectStore()
+    storage = S3Storage('papers-bucket', str(tmp_path / 'cache'), prefix='rn', client=service)
+    key = storage.key_for('questions', 'midterm.pdf')
+
+    assert storage.save(io.BytesIO(b'%PDF-1.4 midterm'), key) == 16
+    assert service.objects[('papers-bucket', f'rn/{key}')] == b'%PDF-1.4 midterm'
+    assert storage.exists(key) and storage.size(key) == 16
+    assert storage.open(key).read() == b'%PDF-1.4 midterm'
+
+    local = storage.local_path(key)
+    with open(local, 'rb') as f:
+        assert f.read() == b'%PDF-1.4 midterm'
+    service.objects.clear()
+    assert storage.local_path(key) == local  # served from the cache
+    assert storage.url(key, 'midterm.pdf').startswith('https://objects.example/papers-bucket/rn/questions/')
+
+    storage.delete(key)
+    assert not storage.exists(key) and not os.path.exists(local)
+    with pytest.raises(FileNotFoundError):
+        storage.open(key)
+
+
+def test_migration_moves_legacy_files_and_resumes(tmp_path):
+    storage = LocalStorage(str(tmp_path / 'store'))
+    previous = app.extensions.get('storage')
+    app.extensions['storage'] = storage
+    try:
+        with app.app_context():
+            admin = User.query.filter_by(is_admin=True).first()
+            department = Department.query.first()
+            batch = BulkUploadBatch(uploader_id=admin.id, department_id=department.id, publication_year=2020,
+                                    total_files=3)
+            paper_ids = []
+            for number in range(3):
+                path = tmp_path / f'legacy{number}.pdf'
+                path.write_bytes(b'%%PDF-1.4 legacy %d' % number)
+                paper = ResearchPaper(title=f'Legacy {number}', authors='A. Author', filename=path.name,
+                                      original_filename=path.name, file_path=str(path), file_size=17, publication_year=2020,
+                                      department_id=department.id, uploader_id=admin.id)
+                db.session.add(paper)
+                batch.items.append(BulkUploadItem(original_filename=path.name, file_path=str(path)))
+                db.session.flush()
+                paper_ids.append(paper.id)
+            db.session.add(batch)
+            db.session.commit()
+            batch_id = batch.id
+
+        assert run_storage_migration(app, batch_size=1, limit=1)['migrated'] == 1
+        with app.app_context():
+            paths = [db.session.get(ResearchPaper, paper_id).file_path for paper_id in paper_ids]
+            assert not os.path.isabs(paths[0]) and all(os.path.isabs(path) for path in paths[1:])
+        run_storage_migration(app, batch_size=1)
+
+        with app.app_context():
+            for number, paper_id in enumerate(paper_ids):
+                key = db.session.get(ResearchPaper, paper_id).file_path
+                assert key.startswith('papers/') and key.endswith(f'{paper_id}_legacy{number}.pdf')
+                with storage.open(key) as f:
+                    assert f.read() == b'%%PDF-1.4 legacy %d' % number
+                assert not (tmp_path / f'legacy{number}.pdf').exists()
+            assert {item.file_path for item in BulkUploadItem.query.filter_by(batch_id=batch_id)} == \
+                {db.session.get(ResearchPaper, paper_id).file_path for paper_id in paper_ids}
+    finally:
+        app.extensions['storage'] = previous
+
+
+def test_migration_moves_legacy_figures(tmp_path):
+    storage = LocalStorage(str(tmp_path / 'store'))
+    previous = app.extensions.get('storage')
+    app.extensions['storage'] = storage
+    crops = [tmp_path / 'question_images' / name for name in ('aaaa.webp', 'bbbb.webp')]
+    for number, crop in enumerate(crops):
+        crop.parent.mkdir(exist_ok=True)
+        crop.write_bytes(b'crop %d' % number)
+    try:
+        with app.app_context():
+            document = QuestionDocument(
+                title='Exam', filename='exam.pdf', original_filename='exam.pdf', file_path='questions/exam.pdf',
+                file_size=1, subject_id=Subject.query.first().id,
+                uploader_id=User.query.filter_by(is_admin=True).first().id)
+            db.session.add(document)
+            db.session.flush()
+            # Both questions show the first crop; the third question's crop is gone
+            image_paths = [[str(crops[0]), str(crops[1])], [str(crops[0])], [str(tmp_path / 'gone.webp')]]
+            questions = [Question(question_text=f'Question {number}', document_id=document.id,
+                                  question_number=str(number), has_image=True, image_paths=json.dumps(paths))
+                         for number, paths in enumerate(image_paths, 1)]
+            db.session.add_all(questions)
+            db.session.commit()
+            question_ids = [question.id for question in questions]
+            document_id = document.id
+
+        run_storage_migration(app, batch_size=1)
+
+        with app.app_context():
+            first, second, third = (json.loads(db.session.get(Question, question_id).image_paths)
+                                    for question_id in question_ids)
+            assert second == first[:1]
+            assert third == [str(tmp_path / 'gone.webp')]
+            for number, key in enumerate(first):
+                assert key.startswith('figures/') and key.endswith(f'{document_id}_{crops[number].name}')
+                with storage.open(key) as f:
+                    assert f.read() == b'crop %d' % number
+        assert not any(crop.exists() for crop in crops)
+    finally:
+        app.extensions['storage'] = previous
@@ -1,10 +1,10 @@
 import os
 import uuid
-import fitz  # PyMuPDF
 import re
-from datetime import datetime
 from werkzeug.utils import secure_filename
 from app import app
+from pdf_metadata import extract_metadata
+from storage import PAPERS, get_storage
 import logging
 
 def allowed_file(filename):
@@ -19,9 +19,10 @@ def generate_unique_filename(original_filename):
     return unique_name
 
 def extract_pdf_metadata(file_path):
-    """Extract comprehensive metadata from PDF file using PyMuPDF."""
-    from datetime import datetime
+    """Extract title, authors, keywords, abstract and year from a PDF file.
     
+    See :mod:`pdf_metadata`; results are cached by file content.
+    """
     metadata = {
         'title': '',
         'authors': '',
@@ -31,107 +32,7 @@ def extract_pdf_metadata(file_path):
     }
     
     try:
-        doc = fitz.open(file_path)
-        
-        # Extract metadata from PDF properties
-        pdf_metadata = doc.metadata
-        if pdf_metadata:
-            metadata['title'] = pdf_metadata.get('title', '').strip()
-            metadata['authors'] = pdf_metadata.get('author', '').strip()
-            metadata['keywords'] = pdf_metadata.get('keywords', '').strip()
-        
-        # Extract text from first few pages for analysis
-        full_text = ""
-        if doc.page_count > 0:
-            for page_num in range(min(3, doc.page_count)):
-                full_text += doc[page_num].get_text() + "\n"
-        
-        # Enhanced title extraction if missing
-        if not metadata['title'] and full_text:
-            lines = full_text.split('\n')
-            for i, line in enumerate(lines[:15]):
-                line = line.strip()
-                if (10 < len(line) < 150 and 
-                    not line.lower().startswith(('abstract', 'introduction', 'keywords', 'references')) and
-                    not re.match(r'^\d+\.', line) and  # Not numbered section
-                    re.search(r'[a-zA-Z]', line)):  # Contains letters
-                    # Prefer lines that look like titles
-                    if (line.isupper() or line.istitle() or 
-                        any(word in line.lower() for word in ['analysis', 'study', 'research', 'approach', 'method'])):
-                        metadata['title'] = line
-                        break
-                    elif not metadata['title'] and len(line) > 20:  # Fallback
-                        metadata['title'] = line
-        
-        # Enhanced author extraction
-        if not metadata['authors'] and full_text:
-            # Look for author patterns in first page
-            first_page_text = doc[0].get_text() if doc.page_count > 0 else ""
-            
-            # Common author patterns
-            author_patterns = [
-                r'(?i)(?:by|author[s]?[:\s]*)\s*([A-Z][a-z]+(?:\s+[A-Z][a-z]*\.?)*(?:\s*,\s*[A-Z][a-z]+(?:\s+[A-Z][a-z]*\.?)*)*)',
-                r'^([A-Z][a-z]+\s+[A-Z][a-z]+(?:\s*,\s*[A-Z][a-z]+\s+[A-Z][a-z]+)*)\s*$',
-                r'([A-Z][a-z]+\s+[A-Z]\.\s*[A-Z][a-z]+(?:\s*,\s*[A-Z][a-z]+\s+[A-Z]\.\s*[A-Z][a-z]+)*)'
-            ]
-            
-            for pattern in author_patterns:
-                matches = re.findall(pattern, first_page_text, re.MULTILINE)
-                if matches:
-                    # Take the first reasonable match
-                    for match in matches:
-                        if len(match) > 5 and len(match) < 100:
-                            metadata['authors'] = match.strip()
-                            break
-                    if metadata['authors']:
-                        break
-        
-        # Extract abstract
-        if full_text:
-            abstract_patterns = [
-                r'(?i)abstract[:\s]*\n?(.*?)(?:\n\s*(?:keywords|introduction|1\.|references))',
-                r'(?i)abstract[:\s]*\n?(.*?)(?:\n\s*\n\s*[A-Z])',  # Until next section
-            ]
-            
-            for pattern in abstract_patterns:
-                match = re.search(pattern, full_text, re.DOTALL)
-                if match:
-                    abstract = re.sub(r'\s+', ' ', match.group(1)).strip()
-                    if 50 < len(abstract) < 2000:  # Reasonable abstract length
-                        metadata['abstract'] = abstract
-                        break
-        
-        # Extract keywords if not in metadata
-        if not metadata['keywords'] and full_text:
-            keywords_patterns = [
-                r'(?i)keywords?[:\s]*\n?(.*?)(?:\n\s*(?:introduction|1\.))',
-                r'(?i)key\s*words?[:\s]*\n?(.*?)(?:\n\s*\n)'
-            ]
-            
-            for pattern in keywords_patterns:
-                match = re.search(pattern, full_text, re.DOTALL)
-                if match:
-                    keywords = re.sub(r'\s+', ' ', match.group(1)).strip()
-                    if 10 < len(keywords) < 300:
-                        metadata['keywords'] = keywords
-                        break
-        
-        # Extract publication year
-        current_year = datetime.now().year
-        year_matches = re.findall(r'\b(19|20)\d{2}\b', full_text)
-        if year_matches:
-            years = [int(year) for year in year_matches if 1990 <= int(year) <= current_year]
-            if years:
-                # Prefer years closer to current year for recent research
-                metadata['publication_year'] = max(years)
-        
-        doc.close()
-        
-        # Clean up extracted data
-        for key, value in metadata.items():
-            if isinstance(value, str):
-                metadata[key] = re.sub(r'\s+', ' ', value).strip()
-        
+        metadata.update(extract_metadata(file_path))
     except Exception as e:
         logging.error(f"Error extracting PDF metadata: {str(e)}")
     
@@ -162,20 +63,17 @@ def extract_keywords_from_text(text, max_keywords=10):
     return keywords
 
 def save_uploaded_file(file, paper_id, department_name, year):
-    """Save uploaded file to the appropriate directory."""
+    """Save an uploaded paper; returns its filename and storage key.
+
+    The department and year no longer pick the directory; see :mod:`storage`.
+    """
     if file and allowed_file(file.filename):
         filename = generate_unique_filename(file.filename)
+        storage = get_storage(app)
+        key = storage.key_for(PAPERS, filename)
+        storage.save(file.stream, key)
         
-        # Create directory structure: uploads/papers/year/department/
-        year_dir = os.path.join(app.config['UPLOAD_FOLDER'], str(year))
-        dept_dir = os.path.join(year_dir, secure_filename(department_name))
-        
-        os.makedirs(dept_dir, exist_ok=True)
-        
-        file_path = os.path.join(dept_dir, filename)
-        file.save(file_path)
-        
-        return filename, file_path
+        return filename, key
     
     return None, None
 
@@ -0,0 +1,214 @@
+"""Nearest-neighbour search over a memory-mapped matrix of unit vectors.
+
+An index is a folder holding ``vectors.npy`` (float32, one row per vector),
+``ids.npy`` (the id of each row) and, for large indexes, the IVF lists. It
+sits next to a ``<name>.json`` file that names the current build.
+``vectors.npy`` is opened with ``mmap_mode='r'``. Every process searching
+the index shares the operating system's page cache rather than holding its
+own copy.
+
+Search is an inner product, which is the cosine similarity for unit
+vectors. Below ``ivf_min_vectors`` rows it scans every row in blocks. From
+that size on, the rows are clustered by k-means into about ``sqrt(rows)``
+lists when the index is built. Rows are stored list by list, and a search
+scans only the lists whose centroids are closest to the query (``probes``).
+
+A build writes a new folder and then replaces ``<name>.json``, so readers
+keep the old build until they next open the index. The build before the
+current one is kept for readers that are still opening it; older ones are
+deleted.
+"""
+import os
+import json
+import time
+import shutil
+import logging
+import threading
+from datetime import datetime
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Rows scanned, and rows copied while building, per block
+BLOCK_ROWS = 65536
+
+# K-means: iterations, and training rows sampled per list
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 64
+
+_loaded = {}
+_lock = threading.Lock()
+
+
+class VectorIndex:
+    """One build of an index."""
+
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+        self.vectors = np.load(os.path.join(path, 'vectors.npy'), mmap_mode='r')
+        self.ids = np.load(os.path.join(path, 'ids.npy'))
+        self._by_id = np.argsort(self.ids, kind='stable')
+        self._sorted_ids = self.ids[self._by_id]
+        self.centroids = self.offsets = None
+        if meta.get('lists'):
+            self.centroids = np.load(os.path.join(path, 'centroids.npy'))
+            self.offsets = np.load(os.path.join(path, 'offsets.npy'))
+
+    @property
+    def embedder(self):
+        return self.meta['embedder']
+
+    def __len__(self):
+        return len(self.ids)
+
+    def vector(self, vector_id):
+        """The stored vector of ``vector_id``, or None."""
+        position = np.searchsorted(self._sorted_ids, vector_id)
+        if position == len(self._sorted_ids) or self._sorted_ids[position] != vector_id:
+            return None
+        return np.array(self.vectors[self._by_id[position]])
+
+    def search(self, query, k=10, probes=8, exclude=()):
+        """``[(id, score)]`` of the ``k`` rows closest to ``query``, best first."""
+        query = np.asarray(query, dtype=np.float32)
+        if self.centroids is None:
+            ranges = [(0, len(self.ids))]
+        else:
+            nearest = np.argsort(-(self.centroids @ query))[:probes]
+            ranges = [(self.offsets[number], self.offsets[number + 1]) for number in nearest]
+
+        wanted = k + len(exclude)
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start, end in ranges:
+            for block in range(start, end, BLOCK_ROWS):
+                scores = self.vectors[block:min(block + BLOCK_ROWS, end)] @ query
+                if len(scores) > wanted:
+                    top = np.argpartition(-scores, wanted)[:wanted]
+                else:
+                    top = np.arange(len(scores))
+                best_rows = np.concatenate([best_rows, top + block])
+                best_scores = np.concatenate([best_scores, scores[top]])
+                if len(best_scores) > wanted:
+                    keep = np.argpartition(-best_scores, wanted)[:wanted]
+                    best_rows, best_scores = best_rows[keep], best_scores[keep]
+
+        results = []
+        for position in np.argsort(-best_scores, kind='stable'):
+            vector_id = int(self.ids[best_rows[position]])
+            if vector_id not in exclude:
+                results.append((vector_id, round(float(best_scores[position]), 4)))
+        return results[:k]
+
+
+def load_index(folder, name):
+    """The current build of index ``name``, or None if it was never built.
+
+    Builds are cached per process and reopened once a newer one is current.
+    """
+    meta_path = os.path.join(folder, f'{name}.json')
+    try:
+        mtime = os.stat(meta_path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _lock:
+        cached = _loaded.get(meta_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with open(meta_path) as f:
+            meta = json.load(f)
+        index = VectorIndex(os.path.join(folder, meta['build']), meta)
+        _loaded[meta_path] = (mtime, index)
+        return index
+
+
+def build_index(folder, name, batches, dim, embedder, ivf_min_vectors=50000, seed=0):
+    """Build index ``name`` from ``(ids, vectors)`` batches and make it current; returns its size.
+
+    The batches are streamed to disk, so memory use does not grow with the
+    number of vectors beyond their ids.
+    """
+    os.makedirs(folder, exist_ok=True)
+    build = f'{name}-{time.time_ns():x}'
+    path = os.path.join(folder, build)
+    os.makedirs(path)
+    started = time.monotonic()
+
+    # The size is only known at the end, so rows go to a raw file first
+    raw_path = os.path.join(path, 'vectors.f32')
+    ids = []
+    with open(raw_path, 'wb') as raw:
+        for batch_ids, vectors in batches:
+            raw.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            ids.extend(batch_ids)
+    ids = np.array(ids, dtype=np.int64)
+    count = len(ids)
+
+    rows = np.memmap(raw_path, dtype=np.float32, mode='r', shape=(count, dim)) if count \
+        else np.zeros((0, dim), dtype=np.float32)
+    meta = {'build': build, 'embedder': embedder, 'dim': dim, 'count': count, 'lists': 0,
+            'built_at': datetime.utcnow().isoformat()}
+    order = None
+    if count >= max(ivf_min_vectors, 1):
+        centroids, lists = _cluster(rows, np.random.default_rng(seed))
+        order = np.argsort(lists, kind='stable')
+        np.save(os.path.join(path, 'centroids.npy'), centroids)
+        np.save(os.path.join(path, 'offsets.npy'), np.searchsorted(lists[order], np.arange(len(centroids) + 1)))
+        meta['lists'] = len(centroids)
+        ids = ids[order]
+
+    vectors = np.lib.format.open_memmap(os.path.join(path, 'vectors.npy'), mode='w+', dtype=np.float32,
+                                        shape=(count, dim))
+    for start in range(0, count, BLOCK_ROWS):
+        stop = min(start + BLOCK_ROWS, count)
+        if order is None:
+            vectors[start:stop] = rows[start:stop]
+        else:
+            # Read in file order, then put the rows in list order
+            chunk = order[start:stop]
+            in_file_order = np.sort(chunk)
+            vectors[start:stop] = rows[in_file_order][np.searchsorted(in_file_order, chunk)]
+    vectors.flush()
+    del vectors, rows
+    os.remove(raw_path)
+    np.save(os.path.join(path, 'ids.npy'), ids)
+
+    meta_path = os.path.join(folder, f'{name}.json')
+    previous = None
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            previous = json.load(f).get('build')
+    with open(meta_path + '.tmp', 'w') as f:
+        json.dump(meta, f)
+    os.replace(meta_path + '.tmp', meta_path)
+
+    for entry in os.listdir(folder):
+        if entry.startswith(f'{name}-') and entry not in (build, previous):
+            shutil.rmtree(os.path.join(folder, entry), ignore_errors=True)
+    logger.info("Built index %s of %d vectors (%d lists) in %.1fs", name, count, meta['lists'],
+                time.monotonic() - started)
+    return count
+
+
+def _cluster(rows, rng):
+    """Spherical k-means on a sample; returns ``(centroids, list of each row)``."""
+    count = len(rows)
+    lists = int(min(max(np.sqrt(count), 1), 4096))
+    sample = rows[np.sort(rng.choice(count, size=min(count, lists * KMEANS_SAMPLE_PER_LIST), replace=False))]
+    centroids = sample[rng.choice(len(sample), size=lists, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assigned = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assigned, sample)
+        empty = np.bincount(assigned, minlength=lists) == 0
+        # Restart empty lists from random rows
+        sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.where(norms > 0, norms, 1)
+
+    assigned = np.empty(count, dtype=np.int32)
+    for start in range(0, count, BLOCK_ROWS):
+        assigned[start:start + BLOCK_ROWS] = np.argmax(rows[start:start + BLOCK_ROWS] @ centroids.T, axis=1)
+    return centroids.astype(np.float32), assigned
@@ -0,0 +1,224 @@
+"""Worker process: runs the background jobs the web role queues.
+
+    python -m worker                                   # every job kind
+    python -m worker --kinds extract_questions,reextract --concurrency 4
+    python -m worker --health                          # exit 1 unless a worker is alive
+
+Each worker runs ``WORKER_CONCURRENCY`` job threads. Extraction, metadata
+and figure work inside a job still fan out to their own process pools, so a
+few threads keep all cores busy. Workers coordinate only through the
+database: start more of them, on this host or others, to scale extraction
+independently of the web servers. ``--kinds`` dedicates a worker to some
+job kinds.
+
+With ``PROCESS_ROLE=all`` (the default) the web process starts an embedded
+worker on its first request, so a single ``python main.py`` still does
+everything. With ``PROCESS_ROLE=web`` it only queues jobs.
+
+SIGTERM or SIGINT stops claiming new jobs and exits once the running ones
+finish.
+"""
+import os
+import sys
+import signal
+import socket
+import logging
+import argparse
+import threading
+from datetime import datetime
+
+from app import db
+from models import Job, WorkerHeartbeat
+import jobs
+
+logger = logging.getLogger(__name__)
+
+
+class Worker:
+    """Claims and runs jobs in ``concurrency`` threads."""
+
+    def __init__(self, app, concurrency=1, kinds=None, role='worker', name=None, daemon=False):
+        import tasks  # noqa: F401  -- registers the job handlers
+        self.app = app
+        self.concurrency = max(1, concurrency)
+        self.kinds = tuple(kinds or ())
+        self.role = role
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.daemon = daemon
+        self.poll_interval = app.config.get('WORKER_POLL_INTERVAL', 1.0)
+        self.heartbeat_interval = app.config.get('WORKER_HEARTBEAT_SECONDS', 10)
+        self.stale_seconds = app.config.get('JOB_STALE_SECONDS', 300)
+
+        self.completed = 0
+        self.failed = 0
+        self._running = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        self._threads = [threading.Thread(target=self._run_loop, name=f'worker-{index}', daemon=self.daemon)
+                         for index in range(self.concurrency)]
+        self._threads.append(threading.Thread(target=self._heartbeat_loop, name='worker-heartbeat',
+                                              daemon=self.daemon))
+        for thread in self._threads:
+            thread.start()
+        logger.info("Worker %s started (%s role, %d threads, kinds: %s)",
+                    self.name, self.role, self.concurrency, ', '.join(self.kinds) or 'all')
+
+    def stop(self):
+        self._stop.set()
+        jobs.wakeup.set()
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def run_once(self):
+        """Claim and run one job; returns False if there was nothing to do."""
+        try:
+            job = jobs.claim_job(self.name, self.kinds)
+        except Exception as e:
+            logger.error("Could not claim a job: %s", e)
+            db.session.rollback()
+            return False
+        if job is None:
+            return False
+
+        job_id, kind, payload = job.id, job.kind, jobs.job_payload(job)
+        with self._lock:
+            self._running.add(job_id)
+        logger.info("Running job %s (%s, attempt %d)", job_id, kind, job.attempts)
+        error = None
+        try:
+            handler = jobs.handler_for(kind)
+            if handler is None:
+                raise LookupError(f'No handler for job kind {kind!r}')
+            handler(self.app, payload)
+        except Exception as e:
+            logger.error("Job %s (%s) failed: %s", job_id, kind, e, exc_info=True)
+            db.session.rollback()
+            error = f'{type(e).__name__}: {e}'
+        finally:
+            with self._lock:
+                self._running.discard(job_id)
+
+        # Handlers may close the session; reload the job before updating it
+        try:
+            jobs.finish_job(db.session.get(Job, job_id), error)
+        except Exception as e:
+            logger.error("Could not record the result of job %s: %s", job_id, e)
+            db.session.rollback()
+        with self._lock:
+            if error is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+        return True
+
+    def _run_loop(self):
+        with self.app.app_context():
+            while not self._stop.is_set():
+                if not self.run_once():
+                    jobs.wakeup.wait(self.poll_interval)
+                    jobs.wakeup.clear()
+                db.session.remove()
+
+    def _beat(self):
+        with self._lock:
+            running = list(self._running)
+            completed, failed = self.completed, self.failed
+        heartbeat = db.session.get(WorkerHeartbeat, self.name) or WorkerHeartbeat(
+            name=self.name, role=self.role, started_at=datetime.utcnow())
+        heartbeat.kinds = ','.join(self.kinds)
+        heartbeat.concurrency = self.concurrency
+        heartbeat.running_jobs = len(running)
+        heartbeat.completed_jobs = completed
+        heartbeat.failed_jobs = failed
+        heartbeat.last_seen = datetime.utcnow()
+        db.session.add(heartbeat)
+        db.session.commit()
+        jobs.touch_jobs(running)
+        jobs.requeue_stale_jobs(self.stale_seconds)
+
+    def _heartbeat_loop(self):
+        with self.app.app_context():
+            while True:
+                try:
+                    self._beat()
+                except Exception as e:
+                    logger.error("Worker heartbeat failed: %s", e)
+                    db.session.rollback()
+                if self._stop.wait(self.heartbeat_interval):
+                    break
+            # Wait for the running jobs, then drop out of the health checks
+            for thread in self._threads:
+                if thread is not threading.current_thread():
+                    thread.join()
+            try:
+                WorkerHeartbeat.query.filter_by(name=self.name).delete()
+                db.session.commit()
+            except Exception as e:
+                logger.error("Could not remove heartbeat of %s: %s", self.name, e)
+                db.session.rollback()
+            db.session.remove()
+
+
+_embedded = None
+_embedded_lock = threading.Lock()
+
+
+def start_embedded_worker(app):
+    """Start the in-process worker used when one process plays every role."""
+    global _embedded
+    if _embedded is not None:
+        return _embedded
+    with _embedded_lock:
+        if _embedded is None:
+            worker = Worker(app, concurrency=app.config.get('WORKER_CONCURRENCY', 2), role='all', daemon=True)
+            worker.start()
+            _embedded = worker
+    return _embedded
+
+
+def check_health(app, name=None):
+    """Return the live worker heartbeats (of ``name`` only, if given)."""
+    with app.app_context():
+        workers = jobs.live_workers(app.config.get('WORKER_HEALTH_TIMEOUT', 30))
+        return [worker for worker in workers if name is None or worker.name == name]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--concurrency', type=int, help='job threads (default WORKER_CONCURRENCY)')
+    parser.add_argument('--kinds', help='comma-separated job kinds to run (default all)')
+    parser.add_argument('--health', action='store_true', help='exit 0 if a worker sent a heartbeat recently')
+    parser.add_argument('--name', help='worker name to check with --health (host:pid)')
+    args = parser.parse_args()
+
+    from app import app
+    # config.py was read when this module imported app, so set the role here
+    app.config['PROCESS_ROLE'] = os.environ.get('PROCESS_ROLE', 'worker')
+
+    if args.health:
+        workers = check_health(app, args.name)
+        for worker in workers:
+            print(f'{worker.name} {worker.role} running={worker.running_jobs} '
+                  f'completed={worker.completed_jobs} failed={worker.failed_jobs} last_seen={worker.last_seen:%H:%M:%S}')
+        sys.exit(0 if workers else 1)
+
+    kinds = [kind.strip() for kind in (args.kinds or '').split(',') if kind.strip()]
+    worker = Worker(app, concurrency=args.concurrency or app.config.get('WORKER_CONCURRENCY', 2), kinds=kinds)
+
+    def shutdown(signum, frame):
+        logger.info("Worker %s stopping after the running jobs", worker.name)
+        worker.stop()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    worker.start()
+    worker.join()
+
+
+if __name__ == '__main__':
+    main()